@@ -4,22 +4,39 @@ import json
 import logging
 from datetime import datetime, timedelta
 import threading
+import collections
+import concurrent.futures
+import config
 
 # Importar a exceção de cancelamento do novo arquivo exceptions.py
-from exceptions import DownloadCancelledError # <--- MUDANÇA AQUI!
+from exceptions import DownloadCancelledError, ListagemAPIError # <--- MUDANÇA AQUI!
+import tracing
 
 logger = logging.getLogger(__name__)
 
+# Limite de registros retornados pela API statusreport em uma única requisição.
+LIMITE_REGISTROS_API = 500
+
+# Número máximo de janelas consultadas simultaneamente na listagem particionada.
+MAX_CONSULTAS_PARALELAS = 4
+
+# Janelas submetidas e ainda não produzidas, por consulta simultânea: as demais aguardam a vez em uma fila
+# local, de modo que as respostas retidas não crescem com o período quando o consumidor está mais lento.
+JANELAS_EM_VOO_POR_CONSULTA = 2
+
+FORMATO_DATAHORA = "%Y-%m-%d %H:%M:%S"
+
 # ... (o restante das funções construir_url_api e obter_dados_chamadas permanecem o mesmo)
 def construir_url_api(url_base, login, token):
-    """Constrói a URL completa da API, removendo http/https se presentes na URL base."""
+    """Constrói a URL completa da API, removendo http/https se presentes na URL base (o protocolo vem de config.PROTOCOLO_SERVIDOR)."""
     url_base_limpa = url_base.replace("http://", "").replace("https://", "")
-    return f"https://{url_base_limpa}/api.php?acao=statusreport&login={login}&token={token}"
+    return f"{config.PROTOCOLO_SERVIDOR}://{url_base_limpa}/api.php?acao=statusreport&login={login}&token={token}"
 
-def obter_dados_chamadas(url_api, datainicio_str, datafim_str, status_callback=None):
+def obter_dados_chamadas(url_api, datainicio_str, datafim_str, status_callback=None, sessao_http=None):
     """
     Faz a requisição para a API e retorna os dados das chamadas.
     status_callback é uma função opcional para reportar o status na GUI.
+    sessao_http: objeto opcional com interface post() (ex.: HttpSessionPool) para reutilizar conexões.
     """
     payload = {
         "datainicio": datainicio_str,
@@ -27,11 +44,14 @@ def obter_dados_chamadas(url_api, datainicio_str, datafim_str, status_callback=N
     }
 
     try:
-        response = requests.post(url_api, json=payload, timeout=60)
+        cliente_http = sessao_http if sessao_http is not None else requests
+        with tracing.span("api.requisicao", "api", inicio=datainicio_str, fim=datafim_str):
+            response = cliente_http.post(url_api, json=payload, timeout=60)
         response.raise_for_status()
 
         try:
-            dados = response.json()
+            with tracing.span("api.json", "api", inicio=datainicio_str, fim=datafim_str):
+                dados = response.json()
             return dados
         except json.JSONDecodeError:
             mensagem_erro = "Erro ao decodificar a resposta JSON da API. A resposta pode não ser um JSON válido."
@@ -76,15 +96,94 @@ def obter_dados_chamadas(url_api, datainicio_str, datafim_str, status_callback=N
         return None
 
 
-def obter_dados_completos(url_api, datainicio_str, datafim_str, status_callback=None, cancel_event=None):
+def consultar_janela_api(url_api, inicio_str, fim_str, status_callback=None, sessao_http=None, cache_listagem=None):
+    """
+    Consulta uma janela da API, passando pelo cache de listagem opcional (listing_cache.ListingCache):
+    janelas passadas já consultadas são servidas do cache, e respostas válidas de janelas passadas são gravadas nele.
+    """
+    if cache_listagem is not None:
+        dados = cache_listagem.obter(url_api, inicio_str, fim_str)
+        if dados is not None:
+            logger.debug(f"API Handler: Faixa {inicio_str} a {fim_str} servida do cache de listagem ({len(dados)} registros).")
+            return dados
+    with tracing.span("api.janela", "api", inicio=inicio_str, fim=fim_str):
+        dados = obter_dados_chamadas(url_api, inicio_str, fim_str, status_callback, sessao_http=sessao_http)
+    if cache_listagem is not None:
+        cache_listagem.gravar(url_api, inicio_str, fim_str, dados)
+    return dados
+
+
+def obter_dados_completos(url_api, datainicio_str, datafim_str, status_callback=None, cancel_event=None, sessao_http=None,
+                          granularidade_particao=None, max_consultas_paralelas=MAX_CONSULTAS_PARALELAS):
     # ... (restante da função obter_dados_completos permanece o mesmo, apenas importa DownloadCancelledError do lugar certo)
     """
     Obtém todos os registros da API, respeitando o limite de 500 registros por requisição.
     Faz múltiplas chamadas incrementais com base na datahora.
-    Aceita um evento de cancelamento.
+    Aceita um evento de cancelamento e uma sessão HTTP opcional compartilhada.
+    Se granularidade_particao for 'dia' ou 'hora', delega para obter_dados_particionados.
+    Retorna None em caso de falha; levanta DownloadCancelledError se cancelado.
     """
+    if granularidade_particao:
+        return obter_dados_particionados(url_api, datainicio_str, datafim_str, status_callback, cancel_event,
+                                         sessao_http=sessao_http, granularidade=granularidade_particao,
+                                         max_consultas_paralelas=max_consultas_paralelas)
+
     todos_os_dados = []
-    formato_datahora = "%Y-%m-%d %H:%M:%S"
+    try:
+        for dados in iterar_paginas_chamadas(url_api, datainicio_str, datafim_str, status_callback, cancel_event,
+                                             sessao_http=sessao_http):
+            todos_os_dados.extend(dados)
+    except ListagemAPIError:
+        return None
+
+    return todos_os_dados
+
+
+def iterar_paginas_chamadas(url_api, datainicio_str, datafim_str, status_callback=None, cancel_event=None, sessao_http=None,
+                            granularidade_particao=None, max_consultas_paralelas=MAX_CONSULTAS_PARALELAS, cache_listagem=None):
+    """
+    Gerador que produz cada página de registros (lista de dicionários) assim que ela chega da API.
+    Permite que o consumidor comece a processar os primeiros registros enquanto as páginas seguintes
+    ainda estão sendo listadas.
+    Na listagem particionada ('dia' ou 'hora'), as páginas chegam na ordem em que as janelas terminam
+    e registros com 'id' já produzido são omitidos.
+    cache_listagem: ListingCache opcional; janelas passadas já consultadas não acessam a API.
+    Levanta ListagemAPIError em caso de falha (já reportada via status_callback)
+    e DownloadCancelledError se cancelado.
+    """
+    if granularidade_particao:
+        return _iterar_paginas_particionadas(url_api, datainicio_str, datafim_str, status_callback, cancel_event,
+                                             sessao_http, granularidade_particao, max_consultas_paralelas, cache_listagem)
+    return _iterar_paginas_sequenciais(url_api, datainicio_str, datafim_str, status_callback, cancel_event, sessao_http,
+                                       cache_listagem)
+
+
+def _validar_pagina(dados, inicio_str, fim_str, status_callback):
+    """Levanta ListagemAPIError se a API falhou ou retornou algo diferente de uma lista de registros."""
+    if dados is None:
+        raise ListagemAPIError(f"Falha ao consultar a API para a faixa {inicio_str} a {fim_str}.")
+    if not isinstance(dados, list):
+        mensagem_erro = f"Resposta da API em formato inesperado para a faixa {inicio_str} a {fim_str}."
+        if status_callback:
+            status_callback(mensagem_erro, level=logging.ERROR)
+        logger.error(f"API Handler: {mensagem_erro} Tipo recebido: {type(dados).__name__}")
+        raise ListagemAPIError(mensagem_erro)
+
+
+def _maior_datahora(dados):
+    """Maior 'datahora' de uma página da API: a listagem sequencial continua no segundo seguinte."""
+    return max(datetime.strptime(chamada.get('datahora', '0000-00-00 00:00:00'), FORMATO_DATAHORA) for chamada in dados)
+
+
+def _iterar_paginas_sequenciais(url_api, datainicio_str, datafim_str, status_callback, cancel_event, sessao_http,
+                                cache_listagem=None):
+    """
+    Listagem sequencial: avança o cursor para max(datahora)+1s após cada página de 500 registros.
+    Com cache de listagem, o período é dividido no limite de frescor e cada parte é listada separadamente,
+    para que as janelas da parte passada possam ser servidas do cache.
+    """
+    total_obtido = 0
+    formato_datahora = FORMATO_DATAHORA
 
     try:
         datainicio = datetime.strptime(datainicio_str, formato_datahora)
@@ -94,63 +193,242 @@ def obter_dados_completos(url_api, datainicio_str, datafim_str, status_callback=
         if status_callback:
             status_callback(mensagem_erro, level=logging.ERROR)
         logger.error(mensagem_erro)
-        return None
-
-    atual = datainicio
+        raise ListagemAPIError(mensagem_erro)
 
     mensagem_inicio_api = f"Consultando a API em: {url_api.split('?')[0]} para o período de {datainicio_str} a {datafim_str}"
     if status_callback:
          status_callback(mensagem_inicio_api)
     logger.info(mensagem_inicio_api)
 
+    segmentos = cache_listagem.dividir_periodo(datainicio, datafim) if cache_listagem is not None else [(datainicio, datafim)]
+    for atual, datafim in segmentos:
+        while atual <= datafim:
+            if cancel_event and cancel_event.is_set():
+                logger.debug("API Handler: Cancelamento detectado entre chamadas à API.")
+                raise DownloadCancelledError("Processo cancelado pelo usuário durante a consulta à API.")
 
-    while atual <= datafim:
-        if cancel_event and cancel_event.is_set():
-            logger.debug("API Handler: Cancelamento detectado entre chamadas à API.")
-            raise DownloadCancelledError("Processo cancelado pelo usuário durante a consulta à API.")
+            inicio_str = atual.strftime(formato_datahora)
+            fim_str = datafim.strftime(formato_datahora)
 
-        inicio_str = atual.strftime(formato_datahora)
-        fim_str = datafim.strftime(formato_datahora)
+            if status_callback:
+                status_callback(f"API: Consultando faixa: {inicio_str} até {fim_str}...")
 
-        if status_callback:
-            status_callback(f"API: Consultando faixa: {inicio_str} até {fim_str}...")
+            dados = consultar_janela_api(url_api, inicio_str, fim_str, status_callback, sessao_http, cache_listagem)
+            _validar_pagina(dados, inicio_str, fim_str, status_callback)
 
-        dados = obter_dados_chamadas(url_api, inicio_str, fim_str, status_callback)
+            if not dados:
+                 logger.debug(f"API Handler: Nenhuns dados retornados para a faixa {inicio_str} a {fim_str}. Avançando 1 dia.")
+                 atual = atual + timedelta(days=1)
+                 continue
 
-        if dados is None:
-            return None
+            total_obtido += len(dados)
+
+            if len(dados) < LIMITE_REGISTROS_API:
+                yield dados
+                break
+            else:
+                try:
+                    atual = _maior_datahora(dados) + timedelta(seconds=1)
+                    logger.debug(f"API Handler: Próxima faixa de consulta inicia em {atual.strftime(formato_datahora)}")
 
-        if not dados:
-             logger.debug(f"API Handler: Nenhuns dados retornados para a faixa {inicio_str} a {fim_str}. Avançando 1 dia.")
-             atual = atual + timedelta(days=1)
-             continue
-
-        todos_os_dados.extend(dados)
-
-        if len(dados) < 500:
-            break
-        else:
-            try:
-                ultima_datahora = max(
-                    datetime.strptime(chamada.get('datahora', '0000-00-00 00:00:00'), formato_datahora)
-                    for chamada in dados
-                )
-                atual = ultima_datahora + timedelta(seconds=1)
-                logger.debug(f"API Handler: Próxima faixa de consulta inicia em {atual.strftime(formato_datahora)}")
-
-            except (ValueError, KeyError) as e:
-                mensagem_erro = f"Erro ao interpretar datahora do último registro para determinar a próxima faixa: {e}. Abortando coleta."
-                if status_callback:
-                    status_callback(mensagem_erro, level=logging.ERROR)
-                logger.error(mensagem_erro, exc_info=True)
-                return None
+                except (ValueError, KeyError) as e:
+                    mensagem_erro = f"Erro ao interpretar datahora do último registro para determinar a próxima faixa: {e}. Abortando coleta."
+                    if status_callback:
+                        status_callback(mensagem_erro, level=logging.ERROR)
+                    logger.error(mensagem_erro, exc_info=True)
+                    raise ListagemAPIError(mensagem_erro)
+
+                yield dados
 
     if cancel_event and cancel_event.is_set():
          logger.debug("API Handler: Cancelamento detectado após a coleta de dados.")
          pass
 
     if status_callback:
-        status_callback(f"API: Coleta de dados finalizada. Total de registros obtidos: {len(todos_os_dados)}")
-    logger.info(f"API Handler: Coleta de dados finalizada. Total de registros obtidos: {len(todos_os_dados)}")
+        status_callback(f"API: Coleta de dados finalizada. Total de registros obtidos: {total_obtido}")
+    logger.info(f"API Handler: Coleta de dados finalizada. Total de registros obtidos: {total_obtido}")
+
 
-    return todos_os_dados
\ No newline at end of file
+def _dividir_periodo(datainicio, datafim, granularidade):
+    """
+    Divide [datainicio, datafim] em janelas inclusivas alinhadas ao início de cada dia ou hora.
+    Retorna uma lista de tuplas (inicio, fim).
+    """
+    if granularidade == 'dia':
+        proximo_limite = lambda dt: datetime(dt.year, dt.month, dt.day) + timedelta(days=1)
+    elif granularidade == 'hora':
+        proximo_limite = lambda dt: datetime(dt.year, dt.month, dt.day, dt.hour) + timedelta(hours=1)
+    else:
+        raise ValueError(f"Granularidade de partição inválida: {granularidade}. Use 'dia' ou 'hora'.")
+
+    janelas = []
+    atual = datainicio
+    while atual <= datafim:
+        fim_janela = min(proximo_limite(atual) - timedelta(seconds=1), datafim)
+        janelas.append((atual, fim_janela))
+        atual = fim_janela + timedelta(seconds=1)
+    return janelas
+
+
+def _bissectar_janela(inicio, fim):
+    """Divide uma janela inclusiva em duas metades. Retorna None se a janela tiver apenas um segundo."""
+    if fim <= inicio:
+        return None
+    meio = inicio + timedelta(seconds=int((fim - inicio).total_seconds()) // 2)
+    return (inicio, meio), (meio + timedelta(seconds=1), fim)
+
+
+def _datahora_na_faixa(chamada, inicio_str, fim_str):
+    """
+    True se a 'datahora' da chamada está em [inicio_str, fim_str], False se está fora, ou None se ausente
+    ou fora do formato FORMATO_DATAHORA (nesse formato, a comparação de strings segue a ordem cronológica).
+    """
+    datahora = chamada.get('datahora') if isinstance(chamada, dict) else None
+    if not isinstance(datahora, str) or len(datahora) != 19:
+        return None
+    return inicio_str <= datahora <= fim_str
+
+
+def _mesclar_sem_duplicatas(paginas):
+    """Mescla as páginas de registros removendo duplicatas por 'id' e ordenando por 'datahora'."""
+    por_id = {}
+    sem_id = []
+    for dados in paginas:
+        for chamada in dados:
+            chamada_id = chamada.get('id') if isinstance(chamada, dict) else None
+            if chamada_id is None:
+                sem_id.append(chamada)
+            elif chamada_id not in por_id:
+                por_id[chamada_id] = chamada
+    mesclados = list(por_id.values()) + sem_id
+    mesclados.sort(key=lambda chamada: str(chamada.get('datahora', '')) if isinstance(chamada, dict) else '')
+    return mesclados
+
+
+def obter_dados_particionados(url_api, datainicio_str, datafim_str, status_callback=None, cancel_event=None,
+                              sessao_http=None, granularidade='dia', max_consultas_paralelas=MAX_CONSULTAS_PARALELAS):
+    """
+    Obtém todos os registros da API dividindo o período em janelas (por dia ou por hora)
+    consultadas em paralelo por um pool limitado de threads.
+    Janelas que retornam o limite de 500 registros são bissectadas e consultadas novamente,
+    até que cada janela caiba em uma única requisição.
+    O resultado é mesclado sem duplicatas por 'id' e ordenado por 'datahora'.
+    Retorna None em caso de falha em qualquer janela; levanta DownloadCancelledError se cancelado.
+    """
+    try:
+        paginas = list(_iterar_paginas_particionadas(url_api, datainicio_str, datafim_str, status_callback, cancel_event,
+                                                     sessao_http, granularidade, max_consultas_paralelas))
+    except ListagemAPIError:
+        return None
+    return _mesclar_sem_duplicatas(paginas)
+
+
+def _iterar_paginas_particionadas(url_api, datainicio_str, datafim_str, status_callback, cancel_event,
+                                  sessao_http, granularidade, max_consultas_paralelas, cache_listagem=None):
+    """
+    Listagem particionada: produz cada janela concluída, sem registros repetidos.
+    As janelas (inclusive as bissectadas) são disjuntas, então cada registro pertence à janela que contém
+    sua 'datahora' e é produzido só por ela; um registro devolvido pela API fora da própria janela é
+    ignorado ali. Apenas registros sem 'datahora' utilizável ou fora do período inteiro são deduplicados
+    por 'id', de modo que a memória não cresce com o número de registros listados.
+    """
+    try:
+        datainicio = datetime.strptime(datainicio_str, FORMATO_DATAHORA)
+        datafim = datetime.strptime(datafim_str, FORMATO_DATAHORA)
+        janelas_iniciais = _dividir_periodo(datainicio, datafim, granularidade)
+    except ValueError as e:
+        mensagem_erro = f"Parâmetros inválidos passados para obter_dados_particionados: {e}"
+        if status_callback:
+            status_callback(mensagem_erro, level=logging.ERROR)
+        logger.error(mensagem_erro)
+        raise ListagemAPIError(mensagem_erro)
+
+    mensagem_inicio_api = (f"Consultando a API em: {url_api.split('?')[0]} para o período de {datainicio_str} a {datafim_str} "
+                           f"em {len(janelas_iniciais)} janelas (por {granularidade}), até {max_consultas_paralelas} consultas simultâneas.")
+    if status_callback:
+        status_callback(mensagem_inicio_api)
+    logger.info(mensagem_inicio_api)
+
+    def consultar_janela(inicio, fim):
+        inicio_str = inicio.strftime(FORMATO_DATAHORA)
+        fim_str = fim.strftime(FORMATO_DATAHORA)
+        if status_callback:
+            status_callback(f"API: Consultando janela: {inicio_str} até {fim_str}...", level=logging.DEBUG)
+        dados = consultar_janela_api(url_api, inicio_str, fim_str, status_callback, sessao_http, cache_listagem)
+        _validar_pagina(dados, inicio_str, fim_str, status_callback)
+        return dados
+
+    periodo_inicio_str = datainicio.strftime(FORMATO_DATAHORA)
+    periodo_fim_str = datafim.strftime(FORMATO_DATAHORA)
+    ids_fora_das_janelas = set()
+    total_obtido = 0
+    janelas_bissectadas = 0
+    janelas_a_consultar = collections.deque(janelas_iniciais)
+    limite_em_voo = max_consultas_paralelas * JANELAS_EM_VOO_POR_CONSULTA
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_consultas_paralelas) as executor:
+        pendentes = {}
+
+        def submeter_proximas():
+            while janelas_a_consultar and len(pendentes) < limite_em_voo:
+                inicio, fim = janelas_a_consultar.popleft()
+                pendentes[executor.submit(consultar_janela, inicio, fim)] = (inicio, fim)
+
+        try:
+            submeter_proximas()
+            while pendentes:
+                if cancel_event and cancel_event.is_set():
+                    logger.debug("API Handler: Cancelamento detectado durante a listagem particionada.")
+                    raise DownloadCancelledError("Processo cancelado pelo usuário durante a consulta à API.")
+
+                concluidos, _ = concurrent.futures.wait(pendentes, timeout=0.5,
+                                                        return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in concluidos:
+                    inicio, fim = pendentes.pop(future)
+                    dados = future.result()
+
+                    if len(dados) >= LIMITE_REGISTROS_API:
+                        metades = _bissectar_janela(inicio, fim)
+                        if metades:
+                            janelas_bissectadas += 1
+                            logger.debug(f"API Handler: Janela {inicio} a {fim} atingiu o limite de {LIMITE_REGISTROS_API} registros. Bissectando.")
+                            # As metades passam à frente das janelas ainda não submetidas.
+                            janelas_a_consultar.extendleft(reversed(metades))
+                            continue
+
+                        mensagem_aviso = (f"API: A janela de um segundo {inicio.strftime(FORMATO_DATAHORA)} retornou "
+                                          f"{len(dados)} registros (limite da API). Registros excedentes podem não ter sido listados.")
+                        if status_callback:
+                            status_callback(mensagem_aviso, level=logging.WARNING)
+                        logger.warning(mensagem_aviso)
+
+                    inicio_str = inicio.strftime(FORMATO_DATAHORA)
+                    fim_str = fim.strftime(FORMATO_DATAHORA)
+                    pagina = []
+                    for chamada in dados:
+                        na_janela = _datahora_na_faixa(chamada, inicio_str, fim_str)
+                        if na_janela:
+                            pagina.append(chamada)
+                            continue
+                        if na_janela is False and _datahora_na_faixa(chamada, periodo_inicio_str, periodo_fim_str):
+                            continue  # Sobreposição na fronteira: a janela dona do registro o produz.
+                        chamada_id = chamada.get('id') if isinstance(chamada, dict) else None
+                        if chamada_id is not None:
+                            if chamada_id in ids_fora_das_janelas:
+                                continue
+                            ids_fora_das_janelas.add(chamada_id)
+                        pagina.append(chamada)
+
+                    if pagina:
+                        total_obtido += len(pagina)
+                        yield pagina
+                submeter_proximas()
+        finally:
+            for future in pendentes:
+                future.cancel()
+
+    mensagem_fim = (f"API: Coleta de dados finalizada. Total de registros obtidos: {total_obtido} "
+                    f"({janelas_bissectadas} janelas bissectadas).")
+    if status_callback:
+        status_callback(mensagem_fim)
+    logger.info(f"API Handler: {mensagem_fim}")
\ No newline at end of file
@@ -0,0 +1,370 @@
+# async_downloader.py
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+
+try:
+    import aiohttp
+except ImportError:  # Dependência opcional: sem aiohttp, apenas o motor com threads está disponível.
+    aiohttp = None
+
+from event_bus import TransferStarted, TransferProgress, TransferDone
+from exceptions import DownloadCancelledError, TransferenciaIncompletaError, TransferenciaRetentavelError
+from recording_downloader import (
+    ERROS_HTTP_RETENTAVEIS,
+    MAX_RETRIES,
+    RETRY_DELAY,
+    baixar_gravacao,
+    cabecalhos_retomada,
+    caminho_parcial,
+    classificar_erro,
+    descartar_parcial,
+    finalizar_parcial,
+    gerar_arquivo_metadado,
+    gerar_metadado_de_falha,
+    iniciar_hash_parcial,
+    interpretar_resposta_retomada,
+    notificar_observador,
+    parcial_ja_completo,
+    preparar_destino_gravacao,
+    registrar_gravacao_no_manifesto,
+    tamanho_parcial_existente,
+)
+from retry_scheduler import interpretar_retry_after
+from transfer_io import preallocar
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Transferências simultâneas no event loop e conexões abertas por host.
+MAX_TRANSFERENCIAS_SIMULTANEAS = 200
+MAX_CONEXOES_POR_HOST = 50
+TAMANHO_CHUNK = 64 * 1024
+TIMEOUT_SEGUNDOS = 30
+# Os chunks recebidos são acumulados e gravados em disco (no executor) em blocos deste tamanho.
+TAMANHO_ESCRITA = 1024 * 1024
+
+
+def motor_asyncio_disponivel():
+    """Retorna True se a dependência opcional aiohttp estiver instalada."""
+    return aiohttp is not None
+
+
+def _classificar_erro_aiohttp(erro):
+    """Classifica erros do aiohttp nas mesmas categorias de recording_downloader.classificar_erro."""
+    if isinstance(erro, asyncio.TimeoutError):
+        return 'timeout'
+    if aiohttp is not None and isinstance(erro, aiohttp.ClientConnectionError):
+        return 'conexao'
+    return classificar_erro(erro)
+
+
+def _gravar_chunks(arquivo, chunks, hash_gravacao):
+    """Grava os chunks acumulados e atualiza o hash (roda no executor, fora do event loop)."""
+    for chunk in chunks:
+        arquivo.write(chunk)
+        if hash_gravacao is not None:
+            hash_gravacao.update(chunk)
+
+
+class AsyncDownloadEngine:
+    """
+    Motor de download baseado em asyncio/aiohttp, alternativo ao ThreadPoolExecutor.
+
+    Roda um event loop em uma thread dedicada e executa centenas de transferências
+    concorrentes nele, com limite de conexões por host. As tarefas são submetidas a partir
+    de qualquer thread e devolvem concurrent.futures.Future, de modo que o DownloadController
+    as trata exatamente como as tarefas do executor com threads.
+
+    Usa as mesmas regras de caminho e de metadado de baixar_gravacao. Todo acesso a disco
+    (diretórios, parcial, hash de retomada, escrita, manifesto e metadados) roda no executor
+    padrão do loop, para que um disco lento ou a releitura de um parcial grande não parem as
+    demais transferências; os chunks são acumulados e gravados em blocos de TAMANHO_ESCRITA.
+    """
+
+    def __init__(self, max_transferencias=MAX_TRANSFERENCIAS_SIMULTANEAS, max_conexoes_por_host=MAX_CONEXOES_POR_HOST):
+        self.max_transferencias = max_transferencias
+        self._max_conexoes_por_host = max_conexoes_por_host
+        self._loop = None
+        self._thread = None
+        self._sessao = None
+        self._semaforo = None
+        self._lock = threading.Lock()
+        self._requisicoes = 0
+        self._conexoes_novas = 0
+        self._conexoes_reutilizadas = 0
+
+    def iniciar(self):
+        """Inicia o event loop em uma thread dedicada e abre a sessão aiohttp."""
+        if aiohttp is None:
+            raise RuntimeError("O motor asyncio requer o pacote 'aiohttp' (pip install aiohttp).")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._executar_loop, name="MotorAsyncio", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._abrir_sessao(), self._loop).result()
+        logger.info(f"AsyncDownloadEngine: Iniciado com até {self.max_transferencias} transferências simultâneas "
+                    f"e {self._max_conexoes_por_host} conexões por host.")
+
+    def _executar_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    async def _abrir_sessao(self):
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._ao_iniciar_requisicao)
+        trace_config.on_connection_create_end.append(self._ao_criar_conexao)
+        trace_config.on_connection_reuseconn.append(self._ao_reutilizar_conexao)
+
+        connector = aiohttp.TCPConnector(limit=self.max_transferencias, limit_per_host=self._max_conexoes_por_host)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=TIMEOUT_SEGUNDOS, sock_read=TIMEOUT_SEGUNDOS)
+        self._sessao = aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace_config])
+        self._semaforo = asyncio.Semaphore(self.max_transferencias)
+
+    async def _ao_iniciar_requisicao(self, sessao, contexto, params):
+        with self._lock:
+            self._requisicoes += 1
+
+    async def _ao_criar_conexao(self, sessao, contexto, params):
+        with self._lock:
+            self._conexoes_novas += 1
+
+    async def _ao_reutilizar_conexao(self, sessao, contexto, params):
+        with self._lock:
+            self._conexoes_reutilizadas += 1
+
+    def estatisticas(self):
+        """Contadores no mesmo formato de HttpSessionPool.estatisticas()."""
+        with self._lock:
+            requisicoes = self._requisicoes
+            hits = self._conexoes_reutilizadas
+            misses = self._conexoes_novas
+        return {
+            "requisicoes": requisicoes,
+            "hits": hits,
+            "misses": misses,
+            "taxa_reuso": (hits / requisicoes) if requisicoes else 0.0,
+        }
+
+    def submeter_download(self, url_base, chamada, diretorio_base=None, status_callback=None, cancel_event=None,
+                          download_metadata_with_recording=True, download_metadata_without_recording=True,
+                          observador_transferencia=None, manifest=None, tentativa_unica=False, metadata_sink=None,
+                          eventos=None):
+        """
+        Agenda o download de uma gravação no event loop.
+        Retorna um concurrent.futures.Future cujo resultado segue o contrato de baixar_gravacao:
+        True em sucesso, False em falha, DownloadCancelledError se cancelado e, com tentativa_unica,
+        TransferenciaRetentavelError em erro transitório. Com eventos (EventBus), publica os mesmos eventos de transferência.
+        """
+        coroutine = self._baixar_gravacao(url_base, chamada, diretorio_base, status_callback, cancel_event,
+                                          download_metadata_with_recording, download_metadata_without_recording,
+                                          observador_transferencia, manifest, tentativa_unica, metadata_sink, eventos)
+        if tracing.ativo():
+            coroutine = self._com_span(coroutine, "tarefa.download", id=chamada.get('id', 'desconhecido'))
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    @staticmethod
+    async def _com_span(coroutine, nome, **args):
+        """Equivalente a tracing.com_span para as tarefas do event loop (mesmo span do motor com threads)."""
+        with tracing.span(nome, "tarefa", **args):
+            return await coroutine
+
+    async def _em_thread(self, funcao, *args, **kwargs):
+        return await self._loop.run_in_executor(None, functools.partial(funcao, *args, **kwargs))
+
+    async def _baixar_gravacao(self, url_base, chamada, diretorio_base, status_callback, cancel_event,
+                               download_metadata_with_recording, download_metadata_without_recording,
+                               observador_transferencia, manifest, tentativa_unica, metadata_sink, eventos):
+        chamada_id = chamada.get('id', 'desconhecido')
+
+        if cancel_event and cancel_event.is_set():
+            raise DownloadCancelledError(f"Processamento cancelado para Chamada ID {chamada_id}.")
+
+        if not chamada.get('gravacao'):
+            # Registros sem gravação não envolvem rede: seguem a lógica do motor com threads.
+            return await self._em_thread(baixar_gravacao, url_base, chamada, diretorio_base, status_callback, cancel_event,
+                                         download_metadata_with_recording, download_metadata_without_recording,
+                                         metadata_sink=metadata_sink)
+
+        async with self._semaforo:
+            destino = await self._em_thread(preparar_destino_gravacao, url_base, chamada, diretorio_base,
+                                            status_callback, download_metadata_with_recording, metadata_sink)
+            if destino is None:
+                return False
+            url_gravacao, caminho_arquivo_local = destino
+            nome_arquivo = os.path.basename(caminho_arquivo_local)
+            caminho_arquivo_parcial = caminho_parcial(caminho_arquivo_local)
+
+            for attempt in range(1 if tentativa_unica else MAX_RETRIES + 1):
+                inicio_tentativa = None
+                bytes_transferidos = 0
+                try:
+                    if cancel_event and cancel_event.is_set():
+                        raise DownloadCancelledError(f"Processo de download cancelado para Chamada ID {chamada_id}.")
+
+                    if attempt > 0:
+                        mensagem_tentativa = f"Tentativa {attempt}/{MAX_RETRIES} de baixar: {url_gravacao} (Chamada ID {chamada_id}). Aguardando {RETRY_DELAY * attempt}s..."
+                        if status_callback:
+                            status_callback(mensagem_tentativa)
+                        else:
+                            logger.info(mensagem_tentativa)
+                        await asyncio.sleep(RETRY_DELAY * attempt)
+                    elif eventos is None:
+                        mensagem_tentativa_inicial = f"Tentando baixar gravação da chamada {chamada_id}: {url_gravacao}"
+                        if status_callback:
+                            status_callback(mensagem_tentativa_inicial)
+                        else:
+                            logger.info(mensagem_tentativa_inicial)
+
+                    inicio_tentativa = time.monotonic()
+                    hash_gravacao = None
+                    offset = await self._em_thread(tamanho_parcial_existente, caminho_arquivo_parcial)
+                    if offset > 0:
+                        logger.info("async_downloader: Retomando download de %s a partir do byte %s (Chamada ID %s).", nome_arquivo, offset, chamada_id)
+                    if eventos is not None and eventos.tem_assinantes(TransferStarted):
+                        eventos.publicar(TransferStarted(chamada_id, url_gravacao, offset))
+
+                    async with self._sessao.get(url_gravacao, headers=cabecalhos_retomada(offset),
+                                                auto_decompress=False) as response_gravacao:
+                        if response_gravacao.status == 416 and offset > 0:
+                            if not parcial_ja_completo(response_gravacao.headers, offset):
+                                await self._em_thread(descartar_parcial, caminho_arquivo_parcial)
+                                raise TransferenciaIncompletaError(f"Arquivo parcial de {offset} bytes inválido para Chamada ID {chamada_id}. Descartado.")
+                            tamanho_total_esperado = offset
+                            if manifest is not None:
+                                hash_gravacao = await self._em_thread(iniciar_hash_parcial, caminho_arquivo_parcial, 'ab')
+                        else:
+                            response_gravacao.raise_for_status()
+                            try:
+                                modo_abertura, offset, tamanho_total_esperado = interpretar_resposta_retomada(
+                                    response_gravacao.status, response_gravacao.headers, offset)
+                            except TransferenciaIncompletaError:
+                                await self._em_thread(descartar_parcial, caminho_arquivo_parcial)
+                                raise
+
+                            if manifest is not None:
+                                # Na retomada, relê o parcial inteiro: nunca no event loop.
+                                hash_gravacao = await self._em_thread(iniciar_hash_parcial, caminho_arquivo_parcial, modo_abertura)
+                            publicar_progresso = eventos is not None and eventos.tem_assinantes(TransferProgress)
+                            f = await self._em_thread(open, caminho_arquivo_parcial, modo_abertura)
+                            try:
+                                if tamanho_total_esperado:
+                                    await self._em_thread(preallocar, f, offset, tamanho_total_esperado - offset)
+                                pendentes = []
+                                tamanho_pendente = 0
+                                async for chunk in response_gravacao.content.iter_chunked(TAMANHO_CHUNK):
+                                    if cancel_event and cancel_event.is_set():
+                                        raise DownloadCancelledError(f"Download cancelado durante a transferência para Chamada ID {chamada_id}.")
+                                    pendentes.append(chunk)
+                                    tamanho_pendente += len(chunk)
+                                    bytes_transferidos += len(chunk)
+                                    if tamanho_pendente >= TAMANHO_ESCRITA:
+                                        await self._em_thread(_gravar_chunks, f, pendentes, hash_gravacao)
+                                        pendentes = []
+                                        tamanho_pendente = 0
+                                    if publicar_progresso:
+                                        eventos.publicar(TransferProgress(chamada_id, offset + bytes_transferidos,
+                                                                          tamanho_total_esperado))
+                                if pendentes:
+                                    await self._em_thread(_gravar_chunks, f, pendentes, hash_gravacao)
+                            finally:
+                                await self._em_thread(f.close)
+
+                    tamanho_final = await self._em_thread(finalizar_parcial, caminho_arquivo_parcial, caminho_arquivo_local,
+                                                          tamanho_total_esperado)
+
+                    duracao = time.monotonic() - inicio_tentativa
+                    notificar_observador(observador_transferencia, True, duracao, bytes_transferidos)
+
+                    if eventos is not None:
+                        eventos.publicar(TransferDone(chamada_id, nome_arquivo, tamanho_final, duracao))
+                    else:
+                        mensagem_sucesso = f"Download bem-sucedido: {nome_arquivo} (Chamada ID {chamada_id})."
+                        if status_callback:
+                            status_callback(mensagem_sucesso, level=logging.INFO)
+                        else:
+                            logger.info(mensagem_sucesso)
+
+                    caminho_metadado = None
+                    if download_metadata_with_recording:
+                        caminho_metadado = await self._em_thread(gerar_arquivo_metadado, chamada, caminho_arquivo_local,
+                                                                 status_callback, metadata_sink, eventos=eventos)
+                    await self._em_thread(registrar_gravacao_no_manifesto, manifest, chamada, caminho_arquivo_local,
+                                          tamanho_final, hash_gravacao, caminho_metadado is not None)
+                    return True
+
+                except DownloadCancelledError:
+                    if os.path.exists(caminho_arquivo_parcial):
+                        logger.debug("async_downloader: Arquivo parcial mantido em %s para retomada (Chamada ID %s).", caminho_arquivo_parcial, chamada_id)
+                    raise
+
+                except aiohttp.ClientResponseError as e:
+                    tipo_erro = _classificar_erro_aiohttp(e)
+                    notificar_observador(observador_transferencia, False, time.monotonic() - inicio_tentativa,
+                                         bytes_transferidos, tipo_erro)
+                    if tentativa_unica and tipo_erro in ERROS_HTTP_RETENTAVEIS:
+                        logger.warning(f"async_downloader: Erro HTTP {e.status} ao baixar gravação {url_gravacao} (Chamada ID {chamada_id}). Retentativa a cargo do agendador.")
+                        cabecalhos = e.headers or {}
+                        raise TransferenciaRetentavelError(
+                            f"Erro HTTP {e.status} ao baixar gravação ID {chamada_id}.", tipo_erro,
+                            retry_after=interpretar_retry_after(cabecalhos.get('Retry-After')),
+                            caminho_arquivo_local=caminho_arquivo_local)
+                    mensagem_erro = f"Erro HTTP ({e.status} - {e.message}) ao baixar gravação {url_gravacao} (Chamada ID {chamada_id}). Não será retentado."
+                    if status_callback:
+                        status_callback(f"Erro HTTP {e.status} ao baixar gravação ID {chamada_id}.", level=logging.ERROR)
+                    logger.error(mensagem_erro)
+                    await self._em_thread(gerar_metadado_de_falha, chamada, caminho_arquivo_local, "_DOWNLOAD_FAILED.txt",
+                                          status_callback, download_metadata_with_recording, contexto="falha (erro HTTP)",
+                                          metadata_sink=metadata_sink)
+                    return False
+
+                except (aiohttp.ClientError, asyncio.TimeoutError, TransferenciaIncompletaError) as e:
+                    if inicio_tentativa is not None:
+                        notificar_observador(observador_transferencia, False, time.monotonic() - inicio_tentativa,
+                                             bytes_transferidos, _classificar_erro_aiohttp(e))
+                    if tentativa_unica:
+                        logger.warning(f"async_downloader: Erro na requisição de download para {url_gravacao} (Chamada ID {chamada_id}): {e!r}. Retentativa a cargo do agendador.")
+                        raise TransferenciaRetentavelError(f"Erro na requisição ao baixar gravação ID {chamada_id}: {e!r}",
+                                                           _classificar_erro_aiohttp(e), caminho_arquivo_local=caminho_arquivo_local)
+                    if status_callback:
+                        status_callback(f"Erro na requisição ao baixar gravação ID {chamada_id}.", level=logging.ERROR)
+                    logger.error(f"Erro na requisição de download para {url_gravacao}: {e!r}")
+
+                    if attempt >= MAX_RETRIES:
+                        if status_callback:
+                            status_callback(f"Falha final ao baixar gravação ID {chamada_id}.", level=logging.ERROR)
+                        logger.error(f"Falha final ao baixar gravação {url_gravacao} (Chamada ID {chamada_id}) após {MAX_RETRIES + 1} tentativas.")
+                        await self._em_thread(gerar_metadado_de_falha, chamada, caminho_arquivo_local, "_DOWNLOAD_FAILED.txt",
+                                              status_callback, download_metadata_with_recording, contexto="falha final",
+                                              metadata_sink=metadata_sink)
+                        return False
+
+                except Exception as e:
+                    if status_callback:
+                        status_callback(f"Erro inesperado ao processar gravação ID {chamada_id}.", level=logging.ERROR)
+                    logger.exception(f"Ocorreu um erro inesperado ao processar gravação da Chamada ID {chamada_id}: {e}")
+                    await self._em_thread(gerar_metadado_de_falha, chamada, caminho_arquivo_local, "_PROCESS_ERROR.txt",
+                                          status_callback, download_metadata_with_recording, contexto="erro inesperado",
+                                          metadata_sink=metadata_sink)
+                    return False
+
+        return False
+
+    def fechar(self):
+        """Fecha a sessão aiohttp e encerra o event loop. Seguro para chamar mais de uma vez."""
+        if self._loop is None:
+            return
+        try:
+            if self._sessao is not None:
+                asyncio.run_coroutine_threadsafe(self._sessao.close(), self._loop).result(timeout=10)
+        except Exception as e:
+            logger.error(f"AsyncDownloadEngine: Erro ao fechar a sessão aiohttp: {e}", exc_info=True)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop.run_until_complete(self._loop.shutdown_default_executor())
+        self._loop.close()
+        self._loop = None
+        self._sessao = None
+        logger.info("AsyncDownloadEngine: Event loop encerrado.")
@@ -0,0 +1,199 @@
+# bench_e2e.py
+"""
+Benchmark ponta a ponta: roda o DownloadController sem interface contra o servidor Widevoice
+simulado (mock_widevoice_server.py) e mede, para cada cenário, registros/s, MB/s, latência por
+gravação (p50/p99, do TransferDone) e o pico de memória (RSS) do processo que baixa.
+
+O servidor roda em outro processo, e cada cenário em um processo próprio, para que o pico de RSS
+de um cenário não contamine o seguinte. Os arquivos são gravados em um diretório temporário,
+apagado ao fim de cada cenário.
+
+Cenários (registros; tamanho padrão das gravações, para caber em disco):
+    1k     1.000 registros, 64-128 KB
+    100k   100.000 registros, 8-16 KB
+    1m     1.000.000 registros, 1-2 KB
+
+Uso:
+    python benchmarks/bench_e2e.py [--cenarios 1k,100k] [--motor threads|asyncio] [--workers 8]
+                                   [--latencia-ms 20] [--taxa-erro 0.01] [--json resultados.json]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import mock_widevoice_server  # noqa: E402
+
+CENARIOS = {
+    "1k": (1000, 64.0),
+    "100k": (100000, 8.0),
+    "1m": (1000000, 1.0),
+}
+
+
+def _pico_rss_mb():
+    """Pico de RSS do processo atual (MB), ou None se a plataforma não informar."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux e em bytes no macOS.
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def executar_cenario(url_base, datainicio, datafim, opcoes, fila_resultado):
+    """Alvo de multiprocessing.Process: um download completo do período, com os tempos medidos."""
+    import config
+    config.PROTOCOLO_SERVIDOR = "http"
+    logging.basicConfig(level=logging.WARNING)
+
+    import download_controller
+    from event_bus import TransferDone, TransferFailed
+
+    duracoes = array('d')
+    contagem = {"bytes": 0, "gravacoes": 0, "falhas": 0}
+    lock = threading.Lock()
+
+    def _receber_evento(evento):
+        with lock:
+            if isinstance(evento, TransferDone):
+                duracoes.append(evento.duracao)
+                contagem["bytes"] += evento.tamanho
+                contagem["gravacoes"] += 1
+            else:
+                contagem["falhas"] += 1
+
+    concluido = threading.Event()
+    controlador_opcoes = {"concorrencia_adaptativa": opcoes["concorrencia_adaptativa"]}
+    if opcoes["workers"]:
+        controlador_opcoes["max_workers"] = opcoes["workers"]
+
+    with tempfile.TemporaryDirectory(prefix="bench_e2e_") as diretorio:
+        controller = download_controller.DownloadController(
+            completion_callback=concluido.set,
+            directory_getter=lambda: diretorio,
+            **controlador_opcoes
+        )
+        controller.eventos.assinar((TransferDone, TransferFailed), _receber_evento)
+        motor = download_controller.MOTOR_ASYNCIO if opcoes["motor"] == "asyncio" else download_controller.MOTOR_THREADS
+
+        inicio = time.perf_counter()
+        controller.start_download(
+            url_base, "bench", "bench", datainicio, datafim, threading.Event(),
+            download_metadata_with_recording=opcoes["metadados"],
+            download_metadata_without_recording=opcoes["metadados"],
+            motor_download=motor,
+            usar_manifesto=False,
+            usar_journal=False,
+            usar_catalogo=False,
+            usar_cache_listagem=False,
+        )
+        concluido.wait()
+        tempo = time.perf_counter() - inicio
+
+    fila_resultado.put({
+        "tempo_s": tempo,
+        "gravacoes": contagem["gravacoes"],
+        "falhas": contagem["falhas"],
+        "bytes": contagem["bytes"],
+        "p50_ms": _ms(statistics.median(duracoes) if duracoes else None),
+        "p99_ms": _ms(_percentil(duracoes, 99)),
+        "pico_rss_mb": _pico_rss_mb(),
+    })
+
+
+def _ms(segundos):
+    return None if segundos is None else segundos * 1000
+
+
+def medir_cenario(nome, args):
+    registros, tamanho_padrao_kb = CENARIOS[nome]
+    opcoes_servidor = mock_widevoice_server.opcoes_de_argumentos(args, registros, tamanho_padrao_kb)
+    datainicio, datafim = opcoes_servidor.periodo()
+
+    fila_porta = multiprocessing.Queue()
+    servidor = multiprocessing.Process(target=mock_widevoice_server.executar_em_processo,
+                                       args=(opcoes_servidor, fila_porta), daemon=True)
+    servidor.start()
+    try:
+        url_base = f"127.0.0.1:{fila_porta.get(timeout=10)}"
+        opcoes = {
+            "motor": args.motor, "workers": args.workers, "metadados": args.metadados,
+            "concorrencia_adaptativa": not args.sem_concorrencia_adaptativa,
+        }
+        fila_resultado = multiprocessing.Queue()
+        processo = multiprocessing.Process(target=executar_cenario,
+                                           args=(url_base, datainicio, datafim, opcoes, fila_resultado))
+        processo.start()
+        resultado = fila_resultado.get()
+        processo.join()
+    finally:
+        servidor.terminate()
+
+    resultado.update(cenario=nome, registros=registros, motor=args.motor)
+    resultado["registros_s"] = registros / resultado["tempo_s"]
+    resultado["mb_s"] = resultado["bytes"] / (1024 * 1024) / resultado["tempo_s"]
+    return resultado
+
+
+def _formatar(valor, formato):
+    return "-" if valor is None else format(valor, formato)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cenarios", default="1k", help=f"cenários separados por vírgula ({', '.join(CENARIOS)}; padrão: %(default)s)")
+    parser.add_argument("--motor", choices=("threads", "asyncio"), default="threads", help="motor de download (padrão: %(default)s)")
+    parser.add_argument("--workers", type=int, help="número de workers do controlador (padrão: o do controlador)")
+    parser.add_argument("--sem-concorrencia-adaptativa", action="store_true", help="mantém a concorrência fixa em --workers")
+    parser.add_argument("--metadados", action="store_true", help="gera também os metadados .txt (padrão: apenas gravações)")
+    parser.add_argument("--json", metavar="ARQUIVO", help="grava os resultados em JSON")
+    mock_widevoice_server.adicionar_argumentos(parser)
+    args = parser.parse_args()
+
+    nomes = [nome.strip().lower() for nome in args.cenarios.split(",") if nome.strip()]
+    desconhecidos = [nome for nome in nomes if nome not in CENARIOS]
+    if desconhecidos:
+        parser.error(f"cenário(s) desconhecido(s): {', '.join(desconhecidos)}")
+
+    resultados = []
+    for nome in nomes:
+        print(f"Executando cenário {nome}...", flush=True)
+        resultados.append(medir_cenario(nome, args))
+
+    print(f"Motor: {args.motor}")
+    print(f"{'cenário':<9}{'registros':>11}{'gravações':>11}{'falhas':>8}{'tempo (s)':>11}"
+          f"{'reg/s':>10}{'MB/s':>9}{'p50 (ms)':>10}{'p99 (ms)':>10}{'pico RSS (MB)':>15}")
+    for r in resultados:
+        print(f"{r['cenario']:<9}{r['registros']:>11}{r['gravacoes']:>11}{r['falhas']:>8}{r['tempo_s']:>11.1f}"
+              f"{r['registros_s']:>10.0f}{r['mb_s']:>9.1f}{_formatar(r['p50_ms'], '.1f'):>10}"
+              f"{_formatar(r['p99_ms'], '.1f'):>10}{_formatar(r['pico_rss_mb'], '.0f'):>15}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# bench_hot_paths.py
+"""
+Microbenchmarks dos trechos em Python puro executados uma vez por registro, para detectar
+regressões de desempenho entre versões:
+
+    datahora.strptime          recording_downloader.componentes_datahora (baixar_gravacao,
+                               _processar_sem_gravacao e preparar_destino_gravacao)
+    datahora.cursor_pagina     api_handler._maior_datahora de cada página de 500 registros (listagem sequencial)
+    datahora.dia_metadado      dia da chamada nos formatos em lote (metadata_sink)
+    caminho.nome_arquivo       recording_downloader.nome_base_arquivo + '.gsm' e os.path.join do diretório Ano/Mês/Dia
+    caminho.makedirs           os.makedirs(exist_ok=True) de um diretório Ano/Mês/Dia já existente
+    destino.preparar           recording_downloader.preparar_destino_gravacao (URL, caminho e diretórios)
+    metadado.formatar          metadata_sink.formatar_metadado_txt
+    metadado.gerar             recording_downloader.gerar_arquivo_metadado (formatação + escrita do .txt)
+
+Os registros sintéticos são os do servidor simulado (mock_widevoice_server.montar_registro),
+gerados em lotes de 10.000 para que o conjunto de 1 milhão não precise ficar em memória. Cada
+medida soma, em blocos de 1.000 registros, o melhor tempo de --repeticoes execuções de cada bloco
+(após uma de aquecimento e com o coletor de lixo desligado), em ns por registro.
+Os casos caminho.* recebem os componentes da 'datahora' já calculados fora da medida, para não
+repetir o custo de datahora.strptime. Os casos que gravam em disco (caminho.makedirs, destino.preparar,
+metadado.gerar) usam no máximo --max-registros-io registros de cada conjunto, em um diretório temporário.
+
+Uso:
+    python benchmarks/bench_hot_paths.py --salvar-baseline             # mede e grava a baseline
+    python benchmarks/bench_hot_paths.py --comparar --limite 10        # mede e compara com a baseline
+    python benchmarks/bench_hot_paths.py --conjuntos 10k,1m --comparar outra_baseline.json
+
+Com --comparar, o código de saída é 1 se algum caso ficar mais de --limite % mais lento que a baseline.
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import api_handler  # noqa: E402
+import metadata_sink  # noqa: E402
+import recording_downloader  # noqa: E402
+from api_handler import LIMITE_REGISTROS_API  # noqa: E402
+from mock_widevoice_server import OpcoesServidor, montar_registro  # noqa: E402
+
+CONJUNTOS = {
+    "10k": 10000,
+    "1m": 1000000,
+}
+
+TAMANHO_LOTE = 10000
+# Cada lote é medido em blocos menores: uma interrupção do sistema operacional estraga só a amostra de um bloco.
+TAMANHO_BLOCO_MEDIDA = 1000
+BASELINE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_hot_paths.json")
+URL_BASE = "pabx.exemplo.com.br"
+
+
+def _datahora_strptime(registros, diretorio):
+    componentes_datahora = recording_downloader.componentes_datahora
+    for chamada in registros:
+        componentes_datahora(chamada['datahora'])
+
+
+def _datahora_cursor_pagina(registros, diretorio):
+    maior_datahora = api_handler._maior_datahora
+    for inicio in range(0, len(registros), LIMITE_REGISTROS_API):
+        maior_datahora(registros[inicio:inicio + LIMITE_REGISTROS_API])
+
+
+def _datahora_dia_metadado(registros, diretorio):
+    dia_da_chamada = metadata_sink._dia_da_chamada
+    for chamada in registros:
+        dia_da_chamada(chamada)
+
+
+def _com_componentes(lote):
+    """(chamada, componentes da 'datahora') de cada registro, calculados antes da medida."""
+    componentes_datahora = recording_downloader.componentes_datahora
+    return [(chamada, componentes_datahora(chamada['datahora'])) for chamada in lote]
+
+
+def _caminho_nome_arquivo(registros, diretorio):
+    nome_base_arquivo = recording_downloader.nome_base_arquivo
+    for chamada, componentes in registros:
+        ano, mes_str, dia_str, _ = componentes
+        nome_arquivo = nome_base_arquivo(componentes, chamada.get('numero', 'desconhecido'), chamada.get('id', 'desconhecido')) + ".gsm"
+        os.path.join(os.path.join(diretorio, ano, mes_str, dia_str), nome_arquivo)
+
+
+def _caminho_makedirs(registros, diretorio):
+    for _, (ano, mes_str, dia_str, _) in registros:
+        os.makedirs(os.path.join(diretorio, ano, mes_str, dia_str), exist_ok=True)
+
+
+def _destino_preparar(registros, diretorio):
+    preparar = recording_downloader.preparar_destino_gravacao
+    for chamada in registros:
+        preparar(URL_BASE, chamada, diretorio)
+
+
+def _metadado_formatar(registros, diretorio):
+    formatar = metadata_sink.formatar_metadado_txt
+    for chamada in registros:
+        formatar(chamada)
+
+
+def _metadado_gerar(registros, diretorio):
+    gerar = recording_downloader.gerar_arquivo_metadado
+    for chamada in registros:
+        gerar(chamada, os.path.join(diretorio, f"{chamada['id']}.gsm"))
+
+
+# (nome, função, grava em disco, preparação do lote fora da medida)
+CASOS = [
+    ("datahora.strptime", _datahora_strptime, False, None),
+    ("datahora.cursor_pagina", _datahora_cursor_pagina, False, None),
+    ("datahora.dia_metadado", _datahora_dia_metadado, False, None),
+    ("caminho.nome_arquivo", _caminho_nome_arquivo, False, _com_componentes),
+    ("caminho.makedirs", _caminho_makedirs, True, _com_componentes),
+    ("destino.preparar", _destino_preparar, True, None),
+    ("metadado.formatar", _metadado_formatar, False, None),
+    ("metadado.gerar", _metadado_gerar, True, None),
+]
+
+
+def _lotes(total):
+    opcoes = OpcoesServidor(registros=total, fracao_com_gravacao=1.0)
+    for inicio in range(0, total, TAMANHO_LOTE):
+        yield [montar_registro(opcoes, indice) for indice in range(inicio, min(total, inicio + TAMANHO_LOTE))]
+
+
+def _melhor_tempo(funcao, lote, diretorio, repeticoes):
+    """Soma, entre os blocos do lote, do melhor tempo (ns) de cada bloco."""
+    total = 0
+    gc.disable()
+    try:
+        for inicio_bloco in range(0, len(lote), TAMANHO_BLOCO_MEDIDA):
+            bloco = lote[inicio_bloco:inicio_bloco + TAMANHO_BLOCO_MEDIDA]
+            funcao(bloco, diretorio)  # aquecimento (diretórios criados, caches do interpretador)
+            melhor = None
+            for _ in range(repeticoes):
+                inicio = time.perf_counter_ns()
+                funcao(bloco, diretorio)
+                duracao = time.perf_counter_ns() - inicio
+                melhor = duracao if melhor is None else min(melhor, duracao)
+            total += melhor
+    finally:
+        gc.enable()
+    return total
+
+
+def medir_conjunto(total, repeticoes, max_registros_io):
+    """ns por registro de cada caso, para 'total' registros sintéticos."""
+    tempos = {nome: 0 for nome, _, _, _ in CASOS}
+    registros_medidos = {nome: 0 for nome, _, _, _ in CASOS}
+    with tempfile.TemporaryDirectory(prefix="bench_hot_paths_") as diretorio:
+        processados = 0
+        for lote in _lotes(total):
+            for nome, funcao, grava_em_disco, preparar in CASOS:
+                if grava_em_disco and processados >= max_registros_io:
+                    continue
+                entrada = preparar(lote) if preparar else lote
+                tempos[nome] += _melhor_tempo(funcao, entrada, diretorio, repeticoes)
+                registros_medidos[nome] += len(lote)
+            processados += len(lote)
+    return {nome: tempos[nome] / registros_medidos[nome] for nome in tempos if registros_medidos[nome]}
+
+
+def carregar_baseline(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def salvar_baseline(caminho, resultados, args):
+    dados = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "repeticoes": args.repeticoes,
+        "ns_por_registro": resultados,
+    }
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+
+
+def comparar(resultados, baseline, limite_percentual):
+    """Imprime a comparação com a baseline e retorna a lista de (conjunto, caso, variação %) acima do limite."""
+    regressoes = []
+    base = baseline.get("ns_por_registro", {})
+    print(f"Comparação com a baseline de {baseline.get('data', '?')} (Python {baseline.get('python', '?')}), "
+          f"limite de {limite_percentual:.0f}%")
+    print(f"{'conjunto':<10}{'caso':<26}{'baseline (ns)':>15}{'atual (ns)':>13}{'variação':>11}")
+    for conjunto, casos in resultados.items():
+        for nome, atual in casos.items():
+            anterior = base.get(conjunto, {}).get(nome)
+            if anterior is None:
+                print(f"{conjunto:<10}{nome:<26}{'-':>15}{atual:>13.0f}{'novo':>11}")
+                continue
+            variacao = (atual / anterior - 1) * 100
+            marca = "  REGRESSÃO" if variacao > limite_percentual else ""
+            print(f"{conjunto:<10}{nome:<26}{anterior:>15.0f}{atual:>13.0f}{variacao:>+10.1f}%{marca}")
+            if marca:
+                regressoes.append((conjunto, nome, variacao))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conjuntos", default="10k", help=f"conjuntos separados por vírgula ({', '.join(CONJUNTOS)}; padrão: %(default)s)")
+    parser.add_argument("--repeticoes", type=int, default=5, help="repetições por lote (melhor tempo; padrão: %(default)s)")
+    parser.add_argument("--max-registros-io", type=int, default=20000,
+                        help="máximo de registros nos casos que gravam em disco (padrão: %(default)s)")
+    parser.add_argument("--salvar-baseline", nargs="?", const=BASELINE_PADRAO, metavar="ARQUIVO",
+                        help="grava os resultados como baseline (padrão: benchmarks/baseline_hot_paths.json)")
+    parser.add_argument("--comparar", nargs="?", const=BASELINE_PADRAO, metavar="ARQUIVO",
+                        help="compara com a baseline (padrão: benchmarks/baseline_hot_paths.json)")
+    parser.add_argument("--limite", type=float, default=10.0, help="regressão tolerada, em %% (padrão: %(default)s)")
+    args = parser.parse_args()
+
+    nomes = [nome.strip().lower() for nome in args.conjuntos.split(",") if nome.strip()]
+    desconhecidos = [nome for nome in nomes if nome not in CONJUNTOS]
+    if desconhecidos:
+        parser.error(f"conjunto(s) desconhecido(s): {', '.join(desconhecidos)}")
+    baseline = None
+    if args.comparar:
+        try:
+            baseline = carregar_baseline(args.comparar)
+        except FileNotFoundError:
+            parser.error(f"baseline não encontrada: {args.comparar} (grave uma antes com --salvar-baseline)")
+        except (OSError, ValueError) as e:
+            parser.error(f"não foi possível ler a baseline {args.comparar}: {e}")
+
+    # As mensagens informativas de gerar_arquivo_metadado não devem ir para o console durante a medida.
+    logging.basicConfig(level=logging.WARNING)
+
+    resultados = {}
+    for nome in nomes:
+        print(f"Medindo conjunto {nome} ({CONJUNTOS[nome]} registros)...", flush=True)
+        resultados[nome] = medir_conjunto(CONJUNTOS[nome], args.repeticoes, args.max_registros_io)
+
+    print(f"{'conjunto':<10}{'caso':<26}{'ns/registro':>13}{'registros/s':>14}")
+    for conjunto, casos in resultados.items():
+        for nome, ns in casos.items():
+            print(f"{conjunto:<10}{nome:<26}{ns:>13.0f}{1e9 / ns:>14.0f}")
+
+    if args.salvar_baseline:
+        resultados_salvos = resultados
+        if os.path.exists(args.salvar_baseline):
+            # Mantém na baseline os conjuntos que não foram medidos agora.
+            resultados_salvos = dict(carregar_baseline(args.salvar_baseline).get("ns_por_registro", {}), **resultados)
+        salvar_baseline(args.salvar_baseline, resultados_salvos, args)
+        print(f"Baseline gravada em {args.salvar_baseline}")
+
+    if baseline is not None:
+        regressoes = comparar(resultados, baseline, args.limite)
+        if regressoes:
+            print(f"{len(regressoes)} caso(s) acima do limite de {args.limite:.0f}%.")
+            sys.exit(1)
+        print("Nenhuma regressão acima do limite.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# bench_write_path.py
+"""
+Microbenchmark do caminho de escrita das gravações: compara o laço original
+(iter_content(chunk_size=8192) + f.write) com transfer_io.gravar_resposta
+(readinto em buffer reutilizável, tamanho de leitura adaptativo e pré-alocação).
+
+Um servidor HTTP local, em outro processo, serve um corpo de tamanho fixo. Para cada variante
+são medidos a vazão (MB/s de relógio) e a vazão por núcleo (MB por segundo de CPU da thread
+que baixa), que isola o custo do interpretador e das syscalls do lado do cliente.
+
+Uso:
+    python benchmarks/bench_write_path.py [--tamanho-mb 256] [--repeticoes 5]
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+from transfer_io import gravar_resposta  # noqa: E402
+
+TAMANHO_BLOCO_SERVIDOR = 1024 * 1024
+
+
+def _servidor(tamanho, fila_porta):
+    corpo = os.urandom(TAMANHO_BLOCO_SERVIDOR)
+
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(tamanho))
+            self.end_headers()
+            restante = tamanho
+            while restante > 0:
+                parte = min(restante, TAMANHO_BLOCO_SERVIDOR)
+                self.wfile.write(corpo[:parte])
+                restante -= parte
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    fila_porta.put(servidor.server_address[1])
+    servidor.serve_forever()
+
+
+def laco_original(sessao, url, caminho):
+    """Laço de baixar_gravacao antes do novo caminho de escrita."""
+    with sessao.get(url, stream=True, timeout=30) as resposta:
+        resposta.raise_for_status()
+        with open(caminho, 'wb') as f:
+            for chunk in resposta.iter_content(chunk_size=8192):
+                f.write(chunk)
+
+
+def laco_transfer_io(sessao, url, caminho):
+    with sessao.get(url, stream=True, timeout=30, headers={'Accept-Encoding': 'identity'}) as resposta:
+        resposta.raise_for_status()
+        with open(caminho, 'wb') as f:
+            gravar_resposta(resposta, f, tamanho_esperado=int(resposta.headers['Content-Length']))
+
+
+def medir(funcao, sessao, url, caminho, repeticoes):
+    tempos, tempos_cpu = [], []
+    funcao(sessao, url, caminho)  # aquecimento (conexão keep-alive e cache de páginas)
+    for _ in range(repeticoes):
+        inicio, inicio_cpu = time.perf_counter(), time.thread_time()
+        funcao(sessao, url, caminho)
+        tempos.append(time.perf_counter() - inicio)
+        tempos_cpu.append(time.thread_time() - inicio_cpu)
+    return statistics.median(tempos), statistics.median(tempos_cpu)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanho-mb", type=int, default=256, help="tamanho do corpo servido (MB)")
+    parser.add_argument("--repeticoes", type=int, default=5, help="repetições por variante (mediana)")
+    args = parser.parse_args()
+
+    tamanho = args.tamanho_mb * 1024 * 1024
+    fila_porta = multiprocessing.Queue()
+    processo = multiprocessing.Process(target=_servidor, args=(tamanho, fila_porta), daemon=True)
+    processo.start()
+    url = f"http://127.0.0.1:{fila_porta.get(timeout=10)}/gravacao.gsm"
+
+    variantes = [
+        ("iter_content(8192) + write", laco_original),
+        ("transfer_io.gravar_resposta", laco_transfer_io),
+    ]
+    resultados = []
+    try:
+        with tempfile.TemporaryDirectory() as diretorio, requests.Session() as sessao:
+            caminho = os.path.join(diretorio, "gravacao.gsm")
+            for nome, funcao in variantes:
+                tempo, tempo_cpu = medir(funcao, sessao, url, caminho, args.repeticoes)
+                resultados.append((nome, args.tamanho_mb / tempo, args.tamanho_mb / tempo_cpu))
+    finally:
+        processo.terminate()
+
+    print(f"Corpo: {args.tamanho_mb} MB, mediana de {args.repeticoes} repetições")
+    print(f"{'variante':<32}{'MB/s':>10}{'MB/s por núcleo':>18}")
+    for nome, vazao, vazao_cpu in resultados:
+        print(f"{nome:<32}{vazao:>10.0f}{vazao_cpu:>18.0f}")
+    base = resultados[0][2]
+    for nome, _, vazao_cpu in resultados[1:]:
+        print(f"Ganho por núcleo de '{nome}': {vazao_cpu / base:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
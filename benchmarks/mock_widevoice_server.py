@@ -0,0 +1,303 @@
+# mock_widevoice_server.py
+"""
+Servidor Widevoice simulado, para benchmarks e testes locais sem acessar um PABX de produção.
+
+Implementa as duas rotas usadas pelo downloader:
+    POST /api.php?acao=statusreport   corpo JSON {"datainicio", "datafim"}; retorna no máximo 500
+                                      registros com 'datahora' no intervalo, em ordem cronológica
+                                      (a paginação do cliente avança para a maior datahora + 1s)
+    GET  /gravador28/<caminho>.gsm     corpo binário determinístico por gravação, com suporte a Range
+
+Os registros não ficam em memória: o registro i tem datahora = INICIO_REGISTROS + i * intervalo e
+é montado apenas quando aparece em uma página, de modo que 1 milhão de registros não custa memória.
+Latência, banda por conexão, tamanho dos arquivos, erros (503), timeouts e o número de registros
+são configuráveis.
+
+Uso (o downloader precisa de config.PROTOCOLO_SERVIDOR = "http", ou WIDEVOICE_PROTOCOLO=http):
+    python benchmarks/mock_widevoice_server.py --porta 8765 --registros 100000 --latencia-ms 20
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+LIMITE_REGISTROS_API = 500
+INICIO_REGISTROS = datetime(2024, 1, 1)
+FORMATO_DATAHORA = "%Y-%m-%d %H:%M:%S"
+
+# Bloco de bytes pseudoaleatórios do qual os corpos das gravações são fatiados.
+TAMANHO_BLOCO_CORPO = 1024 * 1024
+# Tamanho de cada escrita quando a banda é limitada.
+TAMANHO_ESCRITA = 16 * 1024
+
+
+class OpcoesServidor:
+    """Parâmetros do servidor simulado (os mesmos argumentos da linha de comando)."""
+
+    def __init__(self, registros=1000, intervalo_segundos=1, fracao_com_gravacao=0.75,
+                 tamanho_min=16 * 1024, tamanho_max=32 * 1024, latencia_api_ms=0.0, latencia_ms=0.0,
+                 banda_bytes_s=0, taxa_erro=0.0, taxa_timeout=0.0, atraso_timeout=60.0, max_conexoes=0,
+                 semente=42):
+        self.registros = registros
+        self.intervalo_segundos = intervalo_segundos
+        self.fracao_com_gravacao = fracao_com_gravacao
+        self.tamanho_min = tamanho_min
+        self.tamanho_max = max(tamanho_max, tamanho_min)
+        self.latencia_api_ms = latencia_api_ms
+        self.latencia_ms = latencia_ms
+        self.banda_bytes_s = banda_bytes_s
+        self.taxa_erro = taxa_erro
+        self.taxa_timeout = taxa_timeout
+        self.atraso_timeout = atraso_timeout
+        self.max_conexoes = max_conexoes
+        self.semente = semente
+
+    def periodo(self):
+        """(datainicio, datafim) que cobrem todos os registros, no formato da API."""
+        fim = INICIO_REGISTROS + timedelta(seconds=self.registros * self.intervalo_segundos)
+        return INICIO_REGISTROS.strftime(FORMATO_DATAHORA), fim.strftime(FORMATO_DATAHORA)
+
+
+class _Estado:
+    def __init__(self, opcoes):
+        self.opcoes = opcoes
+        self.corpo = random.Random(opcoes.semente).randbytes(TAMANHO_BLOCO_CORPO)
+        self.aleatorio = random.Random(opcoes.semente + 1)
+        self.lock = threading.Lock()
+        self.ativos = 0
+        self.requisicoes_api = 0
+        self.requisicoes_gravacao = 0
+
+    def sortear(self):
+        with self.lock:
+            return self.aleatorio.random()
+
+
+def montar_registro(opcoes, indice):
+    """Registro i da listagem simulada (determinístico)."""
+    datahora = INICIO_REGISTROS + timedelta(seconds=indice * opcoes.intervalo_segundos)
+    # Distribui as gravações uniformemente entre os registros, na fração configurada.
+    com_gravacao = int((indice + 1) * opcoes.fracao_com_gravacao) > int(indice * opcoes.fracao_com_gravacao)
+    gravacao = ""
+    if com_gravacao:
+        gravacao = datahora.strftime("%Y\\/%m\\/%d\\/") + f"{datahora:%Y%m%d%H%M%S}_{100000 + indice}"
+    return {
+        "id": str(100000 + indice),
+        "numero": f"55{indice % 100000:08d}",
+        "datahora": datahora.strftime(FORMATO_DATAHORA),
+        "duracao": str(30 + indice % 600),
+        "gravacao": gravacao,
+    }
+
+
+def pagina_listagem(opcoes, datainicio, datafim):
+    """Registros com datahora em [datainicio, datafim], no máximo LIMITE_REGISTROS_API."""
+    inicio = datetime.strptime(datainicio, FORMATO_DATAHORA)
+    fim = datetime.strptime(datafim, FORMATO_DATAHORA)
+    passo = opcoes.intervalo_segundos
+    primeiro = max(0, -(-int((inicio - INICIO_REGISTROS).total_seconds()) // passo))
+    ultimo = min(opcoes.registros - 1, int((fim - INICIO_REGISTROS).total_seconds()) // passo)
+    ultimo = min(ultimo, primeiro + LIMITE_REGISTROS_API - 1)
+    return [montar_registro(opcoes, indice) for indice in range(primeiro, ultimo + 1)]
+
+
+def tamanho_gravacao(opcoes, caminho):
+    """Tamanho determinístico da gravação, entre tamanho_min e tamanho_max."""
+    faixa = opcoes.tamanho_max - opcoes.tamanho_min
+    return opcoes.tamanho_min + (zlib.crc32(caminho.encode()) % (faixa + 1) if faixa else 0)
+
+
+def criar_handler(estado):
+    opcoes = estado.opcoes
+
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _responder_vazio(self, codigo, cabecalhos=()):
+            self.send_response(codigo)
+            for nome, valor in cabecalhos:
+                self.send_header(nome, valor)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            if not urlsplit(self.path).path.endswith("/api.php"):
+                self._responder_vazio(404)
+                return
+            with estado.lock:
+                estado.requisicoes_api += 1
+            corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if opcoes.latencia_api_ms:
+                time.sleep(opcoes.latencia_api_ms / 1000)
+            try:
+                dados = pagina_listagem(opcoes, corpo["datainicio"], corpo["datafim"])
+            except (KeyError, ValueError):
+                self._responder_vazio(400)
+                return
+            resposta = json.dumps(dados).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(resposta)))
+            self.end_headers()
+            self.wfile.write(resposta)
+
+        def do_GET(self):
+            caminho = urlsplit(self.path).path
+            if not caminho.startswith("/gravador28/"):
+                self._responder_vazio(404)
+                return
+            with estado.lock:
+                estado.ativos += 1
+                estado.requisicoes_gravacao += 1
+                ativos = estado.ativos
+            try:
+                if opcoes.max_conexoes and ativos > opcoes.max_conexoes:
+                    self._responder_vazio(429, [("Retry-After", "1")])
+                    return
+                if opcoes.latencia_ms:
+                    time.sleep(opcoes.latencia_ms / 1000)
+                sorteio = estado.sortear()
+                if sorteio < opcoes.taxa_timeout:
+                    # Não responde: o cliente deve desistir pelo próprio timeout.
+                    time.sleep(opcoes.atraso_timeout)
+                    self.close_connection = True
+                    return
+                if sorteio < opcoes.taxa_timeout + opcoes.taxa_erro:
+                    self._responder_vazio(503)
+                    return
+                self._enviar_gravacao(caminho)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+            finally:
+                with estado.lock:
+                    estado.ativos -= 1
+
+        def _enviar_gravacao(self, caminho):
+            tamanho = tamanho_gravacao(opcoes, caminho)
+            inicio = 0
+            intervalo = self.headers.get("Range")
+            if intervalo and intervalo.startswith("bytes="):
+                inicio = int(intervalo[6:].split("-")[0])
+                if inicio >= tamanho:
+                    self._responder_vazio(416, [("Content-Range", f"bytes */{tamanho}")])
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {inicio}-{tamanho - 1}/{tamanho}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(tamanho - inicio))
+            self.end_headers()
+
+            deslocamento = zlib.crc32(caminho.encode()) % TAMANHO_BLOCO_CORPO
+            posicao = inicio
+            passo = TAMANHO_ESCRITA if opcoes.banda_bytes_s else TAMANHO_BLOCO_CORPO
+            while posicao < tamanho:
+                parte = min(passo, tamanho - posicao)
+                origem = (deslocamento + posicao) % TAMANHO_BLOCO_CORPO
+                pedaco = estado.corpo[origem:origem + parte]
+                if len(pedaco) < parte:
+                    pedaco += estado.corpo[:parte - len(pedaco)]
+                self.wfile.write(pedaco)
+                posicao += parte
+                if opcoes.banda_bytes_s:
+                    time.sleep(parte / opcoes.banda_bytes_s)
+
+    return _Handler
+
+
+class MockWidevoiceServer:
+    """Servidor simulado em uma thread própria. Use porta=0 para uma porta livre (ver 'porta')."""
+
+    def __init__(self, opcoes=None, porta=0, endereco="127.0.0.1"):
+        self.opcoes = opcoes or OpcoesServidor()
+        self._estado = _Estado(self.opcoes)
+        self._servidor = ThreadingHTTPServer((endereco, porta), criar_handler(self._estado))
+        self._servidor.daemon_threads = True
+        self._servidor.request_queue_size = 1024
+        self.porta = self._servidor.server_address[1]
+        self.url_base = f"{endereco}:{self.porta}"
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="MockWidevoice", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def servir(self):
+        """Atende na thread atual até Ctrl+C."""
+        try:
+            self._servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._servidor.server_close()
+
+
+def executar_em_processo(opcoes, fila_porta, porta=0):
+    """Alvo de multiprocessing.Process: inicia o servidor e informa a porta em fila_porta."""
+    servidor = MockWidevoiceServer(opcoes, porta)
+    fila_porta.put(servidor.porta)
+    servidor.servir()
+
+
+def adicionar_argumentos(parser):
+    """Argumentos do servidor simulado (compartilhados com bench_e2e.py)."""
+    grupo = parser.add_argument_group("servidor simulado")
+    grupo.add_argument("--intervalo-segundos", type=int, default=1, help="segundos entre registros consecutivos")
+    grupo.add_argument("--fracao-com-gravacao", type=float, default=0.75, help="fração dos registros com gravação")
+    grupo.add_argument("--tamanho-min-kb", type=float, help="tamanho mínimo das gravações (KB)")
+    grupo.add_argument("--tamanho-max-kb", type=float, help="tamanho máximo das gravações (KB)")
+    grupo.add_argument("--latencia-api-ms", type=float, default=0.0, help="latência de cada página da listagem")
+    grupo.add_argument("--latencia-ms", type=float, default=0.0, help="latência até o início de cada gravação (TTFB)")
+    grupo.add_argument("--banda-kb-s", type=float, default=0.0, help="banda por conexão (KB/s; 0 = sem limite)")
+    grupo.add_argument("--taxa-erro", type=float, default=0.0, help="fração das gravações respondidas com 503")
+    grupo.add_argument("--taxa-timeout", type=float, default=0.0, help="fração das gravações que nunca respondem")
+    grupo.add_argument("--atraso-timeout", type=float, default=60.0, help="segundos que uma gravação 'travada' segura a conexão")
+    grupo.add_argument("--max-conexoes", type=int, default=0, help="acima deste número de downloads simultâneos, responde 429")
+    grupo.add_argument("--semente", type=int, default=42, help="semente dos sorteios de erro e do conteúdo")
+    return grupo
+
+
+def opcoes_de_argumentos(args, registros, tamanho_padrao_kb=16.0):
+    tamanho_min_kb = args.tamanho_min_kb if args.tamanho_min_kb is not None else tamanho_padrao_kb
+    tamanho_max_kb = args.tamanho_max_kb if args.tamanho_max_kb is not None else tamanho_min_kb * 2
+    return OpcoesServidor(
+        registros=registros, intervalo_segundos=args.intervalo_segundos, fracao_com_gravacao=args.fracao_com_gravacao,
+        tamanho_min=int(tamanho_min_kb * 1024), tamanho_max=int(tamanho_max_kb * 1024),
+        latencia_api_ms=args.latencia_api_ms, latencia_ms=args.latencia_ms, banda_bytes_s=int(args.banda_kb_s * 1024),
+        taxa_erro=args.taxa_erro, taxa_timeout=args.taxa_timeout, atraso_timeout=args.atraso_timeout,
+        max_conexoes=args.max_conexoes, semente=args.semente,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--porta", type=int, default=8765, help="porta TCP (padrão: %(default)s)")
+    parser.add_argument("--endereco", default="127.0.0.1", help="endereço de escuta (padrão: %(default)s)")
+    parser.add_argument("--registros", type=int, default=1000, help="número de registros da listagem")
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+
+    opcoes = opcoes_de_argumentos(args, args.registros)
+    servidor = MockWidevoiceServer(opcoes, args.porta, args.endereco)
+    datainicio, datafim = opcoes.periodo()
+    print(f"Servidor simulado em {servidor.url_base} com {opcoes.registros} registros de {datainicio} a {datafim}.")
+    print("Use WIDEVOICE_PROTOCOLO=http no downloader. Ctrl+C encerra.")
+    servidor.servir()
+
+
+if __name__ == "__main__":
+    main()
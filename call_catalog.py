@@ -0,0 +1,229 @@
+# call_catalog.py
+"""
+Catálogo local (SQLite) das chamadas listadas pela API, mantido no diretório de destino.
+
+Cada registro retornado pela listagem é gravado (ou atualizado) no catálogo, que pode ser
+consultado por número, período e presença de gravação sem acessar a API:
+
+    python call_catalog.py --numero 5500000031 --inicio 2024-01-01 --fim 2024-03-31 --com-gravacao
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Arquivo do catálogo, criado na raiz do diretório de destino.
+NOME_ARQUIVO_CATALOGO = ".widevoice_catalogo.sqlite3"
+
+# Colunas exibidas pela CLI no formato tabela.
+COLUNAS_TABELA = ('id', 'numero', 'datahora', 'tem_gravacao', 'servidor')
+
+
+def _limite_periodo(valor, fim=False):
+    """Aceita 'AAAA-MM-DD' ou 'AAAA-MM-DD HH:MM:SS'; uma data sem hora cobre o dia inteiro."""
+    if valor and len(valor) == 10:
+        return f"{valor} 23:59:59" if fim else f"{valor} 00:00:00"
+    return valor
+
+
+class CallCatalog:
+    """
+    Catálogo SQLite das chamadas listadas, indexado por id, número, datahora e presença de gravação.
+    A chave é (servidor, id): o mesmo diretório pode receber chamadas de mais de um servidor.
+    Os campos principais ficam em colunas; o registro completo da API é guardado em JSON.
+    Seguro para uso por várias threads; cada página é gravada em uma única transação.
+    """
+
+    def __init__(self, diretorio_raiz, somente_leitura=False):
+        self._diretorio_raiz = os.path.abspath(diretorio_raiz)
+        self.caminho = os.path.join(self._diretorio_raiz, NOME_ARQUIVO_CATALOGO)
+        self._lock = threading.Lock()
+        if somente_leitura:
+            if not os.path.exists(self.caminho):
+                raise FileNotFoundError(f"Catálogo não encontrado em {self.caminho}.")
+            self._conexao = sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True, check_same_thread=False)
+            return
+
+        os.makedirs(self._diretorio_raiz, exist_ok=True)
+        self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chamadas (
+                servidor TEXT NOT NULL,
+                id TEXT NOT NULL,
+                numero TEXT,
+                datahora TEXT,
+                gravacao TEXT,
+                tem_gravacao INTEGER NOT NULL DEFAULT 0,
+                dados TEXT NOT NULL,
+                atualizado_em TEXT NOT NULL,
+                PRIMARY KEY (servidor, id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_chamadas_id ON chamadas (id);
+            CREATE INDEX IF NOT EXISTS idx_chamadas_numero_datahora ON chamadas (numero, datahora);
+            CREATE INDEX IF NOT EXISTS idx_chamadas_datahora ON chamadas (datahora);
+            CREATE INDEX IF NOT EXISTS idx_chamadas_gravacao_datahora ON chamadas (tem_gravacao, datahora);
+            """
+        )
+        self._conexao.commit()
+        logger.info(f"CallCatalog: Catálogo aberto em {self.caminho}.")
+
+    def registrar(self, registros, servidor=''):
+        """Grava ou atualiza os registros de uma página da listagem em uma única transação."""
+        agora = datetime.now().isoformat(timespec='seconds')
+        linhas = [
+            (servidor, str(chamada['id']), chamada.get('numero'), chamada.get('datahora'), chamada.get('gravacao'),
+             int(bool(chamada.get('gravacao'))), json.dumps(chamada, ensure_ascii=False, default=str), agora)
+            for chamada in registros if chamada.get('id') not in (None, '')
+        ]
+        if not linhas:
+            return 0
+        with self._lock:
+            with self._conexao:
+                self._conexao.executemany(
+                    "INSERT INTO chamadas (servidor, id, numero, datahora, gravacao, tem_gravacao, dados, atualizado_em) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (servidor, id) DO UPDATE SET numero = excluded.numero, datahora = excluded.datahora, "
+                    "gravacao = excluded.gravacao, tem_gravacao = excluded.tem_gravacao, dados = excluded.dados, "
+                    "atualizado_em = excluded.atualizado_em",
+                    linhas,
+                )
+        return len(linhas)
+
+    def consultar(self, numero=None, inicio=None, fim=None, com_gravacao=None, chamada_id=None, servidor=None,
+                  limite=None):
+        """
+        Retorna as chamadas (registros completos da API, em ordem de datahora) que atendem aos filtros.
+        inicio/fim: 'AAAA-MM-DD' ou 'AAAA-MM-DD HH:MM:SS' (inclusivos).
+        com_gravacao: True/False filtra pela presença de gravação; None não filtra.
+        Cada registro recebe as chaves '_servidor' e '_tem_gravacao'.
+        """
+        condicoes, parametros = self._filtros(numero, inicio, fim, com_gravacao, chamada_id, servidor)
+        sql = "SELECT servidor, tem_gravacao, dados FROM chamadas"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        sql += " ORDER BY datahora, id"
+        if limite:
+            sql += " LIMIT ?"
+            parametros.append(int(limite))
+        with self._lock:
+            linhas = self._conexao.execute(sql, parametros).fetchall()
+        resultado = []
+        for servidor_linha, tem_gravacao, dados in linhas:
+            chamada = json.loads(dados)
+            chamada['_servidor'] = servidor_linha
+            chamada['_tem_gravacao'] = bool(tem_gravacao)
+            resultado.append(chamada)
+        return resultado
+
+    def contar(self, numero=None, inicio=None, fim=None, com_gravacao=None, chamada_id=None, servidor=None):
+        """Número de chamadas que atendem aos filtros de consultar()."""
+        condicoes, parametros = self._filtros(numero, inicio, fim, com_gravacao, chamada_id, servidor)
+        sql = "SELECT COUNT(*) FROM chamadas"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        with self._lock:
+            return self._conexao.execute(sql, parametros).fetchone()[0]
+
+    @staticmethod
+    def _filtros(numero, inicio, fim, com_gravacao, chamada_id, servidor):
+        condicoes, parametros = [], []
+        if chamada_id is not None:
+            condicoes.append("id = ?")
+            parametros.append(str(chamada_id))
+        if numero is not None:
+            condicoes.append("numero = ?")
+            parametros.append(str(numero))
+        if inicio:
+            condicoes.append("datahora >= ?")
+            parametros.append(_limite_periodo(inicio))
+        if fim:
+            condicoes.append("datahora <= ?")
+            parametros.append(_limite_periodo(fim, fim=True))
+        if com_gravacao is not None:
+            condicoes.append("tem_gravacao = ?")
+            parametros.append(int(bool(com_gravacao)))
+        if servidor is not None:
+            condicoes.append("servidor = ?")
+            parametros.append(servidor)
+        return condicoes, parametros
+
+    def total(self):
+        return self.contar()
+
+    def fechar(self):
+        with self._lock:
+            if self._conexao is None:
+                return
+            self._conexao.close()
+            self._conexao = None
+        logger.debug("CallCatalog: Catálogo fechado.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulta o catálogo local de chamadas (sem acessar a API).")
+    parser.add_argument("--diretorio", default=config.DIRETORIO_BASE_GRAVACOES,
+                        help="diretório de destino onde está o catálogo (padrão: %(default)s)")
+    parser.add_argument("--id", dest="chamada_id", help="ID da chamada")
+    parser.add_argument("--numero", help="número da chamada")
+    parser.add_argument("--inicio", help="início do período (AAAA-MM-DD ou 'AAAA-MM-DD HH:MM:SS')")
+    parser.add_argument("--fim", help="fim do período (AAAA-MM-DD ou 'AAAA-MM-DD HH:MM:SS')")
+    grupo_gravacao = parser.add_mutually_exclusive_group()
+    grupo_gravacao.add_argument("--com-gravacao", dest="com_gravacao", action="store_const", const=True,
+                                help="apenas chamadas com gravação")
+    grupo_gravacao.add_argument("--sem-gravacao", dest="com_gravacao", action="store_const", const=False,
+                                help="apenas chamadas sem gravação")
+    parser.add_argument("--servidor", help="URL base do servidor (quando o diretório recebe mais de um)")
+    parser.add_argument("--limite", type=int, help="número máximo de chamadas retornadas")
+    parser.add_argument("--contar", action="store_true", help="apenas informa o número de chamadas")
+    parser.add_argument("--formato", choices=("tabela", "json", "csv"), default="tabela", help="formato da saída")
+    args = parser.parse_args(argv)
+
+    try:
+        catalogo = CallCatalog(args.diretorio, somente_leitura=True)
+    except (FileNotFoundError, sqlite3.Error) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+
+    filtros = dict(numero=args.numero, inicio=args.inicio, fim=args.fim, com_gravacao=args.com_gravacao,
+                   chamada_id=args.chamada_id, servidor=args.servidor)
+    try:
+        if args.contar:
+            print(catalogo.contar(**filtros))
+            return 0
+        chamadas = catalogo.consultar(limite=args.limite, **filtros)
+    finally:
+        catalogo.fechar()
+
+    if args.formato == "json":
+        for chamada in chamadas:
+            print(json.dumps(chamada, ensure_ascii=False))
+    elif args.formato == "csv":
+        colunas = list(dict.fromkeys(campo for chamada in chamadas for campo in chamada))
+        escritor = csv.DictWriter(sys.stdout, fieldnames=colunas, restval='')
+        escritor.writeheader()
+        escritor.writerows(chamadas)
+    else:
+        linhas = [[str(chamada.get(coluna if coluna in ('id', 'numero', 'datahora') else f"_{coluna}", ''))
+                   for coluna in COLUNAS_TABELA] for chamada in chamadas]
+        larguras = [max([len(coluna)] + [len(linha[i]) for linha in linhas]) for i, coluna in enumerate(COLUNAS_TABELA)]
+        print("  ".join(coluna.ljust(larguras[i]) for i, coluna in enumerate(COLUNAS_TABELA)))
+        for linha in linhas:
+            print("  ".join(valor.ljust(larguras[i]) for i, valor in enumerate(linha)))
+        print(f"{len(chamadas)} chamada(s).", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
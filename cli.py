@@ -0,0 +1,408 @@
+# cli.py
+"""
+Ponto de entrada sem interface gráfica, para servidores sem display e execuções agendadas.
+
+Aciona o DownloadController diretamente e escreve o andamento em stdout como JSON lines
+(um objeto por linha, com a chave "evento": status, progresso, estatisticas, total, concorrencia, fim,
+e os eventos tipados do controlador, como transferencia_concluida, transferencia_falhou e retentativa).
+Nunca importa tkinter/ttkbootstrap nem os módulos da GUI:
+
+    python cli.py --url servidor.exemplo.com --login usuario --inicio 2024-01-01 --fim 2024-01-31
+
+O token pode ser informado por --token ou pela variável de ambiente WIDEVOICE_TOKEN.
+Com --seguir, roda como serviço contínuo (follow_mode.py) até receber SIGTERM ou Ctrl+C.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+import config
+from event_bus import EVENTOS_DE_STATUS, StatusMessage
+from logging_setup import configurar_logging
+import tracing
+
+logger = logging.getLogger(__name__)
+
+VARIAVEL_TOKEN = "WIDEVOICE_TOKEN"
+
+# Intervalo mínimo entre dois eventos de progresso (o último é sempre emitido).
+INTERVALO_PROGRESSO = 0.5
+
+# Valores aceitos pela CLI -> valores do controlador (os mesmos das listas da GUI).
+OPCOES_LISTAGEM = {"sequencial": None, "dia": "dia", "hora": "hora"}
+OPCOES_FORMATO_METADADOS = ("txt", "jsonl", "csv", "parquet")
+
+CODIGO_SUCESSO = 0
+CODIGO_ERROS = 1
+CODIGO_ARGUMENTOS = 2
+CODIGO_CANCELADO = 130
+
+
+class SaidaJsonLines:
+    """Escreve os eventos do controlador em stdout, um objeto JSON por linha (seguro entre threads)."""
+
+    def __init__(self, fluxo=None, intervalo_progresso=INTERVALO_PROGRESSO, nivel_status=logging.INFO):
+        self._fluxo = fluxo or sys.stdout
+        self._nivel_status = nivel_status
+        self._intervalo_progresso = intervalo_progresso
+        self._lock = threading.Lock()
+        self._ultimo_progresso = 0.0
+        self._ultimas_estatisticas = 0.0
+        self.erros = 0
+
+    def emitir(self, evento, **campos):
+        linha = json.dumps({"evento": evento, "ts": round(time.time(), 3), **campos}, ensure_ascii=False, default=str)
+        with self._lock:
+            self._fluxo.write(linha + "\n")
+            self._fluxo.flush()
+
+    def status(self, mensagem, level=logging.INFO):
+        if level >= logging.ERROR:
+            self.erros += 1
+        if level < self._nivel_status:
+            return
+        self.emitir("status", nivel=logging.getLevelName(level), mensagem=mensagem)
+
+    def evento(self, evento):
+        """
+        Assinante do EventBus do controlador: StatusMessage vira um evento 'status'; os eventos tipados
+        são escritos com seus campos (ex.: transferencia_falhou com chamada_id e tipo_erro), sem formatar texto.
+        """
+        if isinstance(evento, StatusMessage):
+            self.status(evento.texto, evento.nivel)
+            return
+        if evento.nivel >= logging.ERROR:
+            self.erros += 1
+        if evento.nivel < self._nivel_status:
+            return
+        self.emitir(evento.nome, nivel=logging.getLevelName(evento.nivel), **evento.campos())
+
+    def assinar(self, eventos):
+        """Assina os eventos de status do EventBus a partir do nível exibido (erros sempre, para a contagem)."""
+        eventos.assinar(EVENTOS_DE_STATUS, self.evento, nivel_minimo=min(self._nivel_status, logging.ERROR))
+
+    def progresso(self, valor, total=None):
+        agora = time.monotonic()
+        if total is None or valor < total:
+            if agora - self._ultimo_progresso < self._intervalo_progresso:
+                return
+        self._ultimo_progresso = agora
+        self.emitir("progresso", processados=valor, total=total)
+
+    def estatisticas(self, instantaneo):
+        """Estatísticas agregadas do controlador (progress_stats), no máximo uma vez por intervalo de progresso."""
+        agora = time.monotonic()
+        if instantaneo['processados'] < (instantaneo['total'] or 0) or not instantaneo['total']:
+            if agora - self._ultimas_estatisticas < self._intervalo_progresso:
+                return
+        self._ultimas_estatisticas = agora
+        self.emitir("estatisticas", **{campo: round(valor, 3) if isinstance(valor, float) else valor
+                                      for campo, valor in instantaneo.items()})
+
+    def total(self, maximo):
+        self.emitir("total", total=maximo)
+
+    def concorrencia(self, limite):
+        self.emitir("concorrencia", limite=limite)
+
+
+def _normalizar_data(valor, fim=False):
+    """Aceita 'AAAA-MM-DD' (o dia inteiro, como na GUI) ou 'AAAA-MM-DD HH:MM:SS'."""
+    if len(valor) == 10:
+        valor = f"{valor} 23:59:59" if fim else f"{valor} 00:00:00"
+    datetime.strptime(valor, '%Y-%m-%d %H:%M:%S')
+    return valor
+
+
+def _configurar_logging(verboso):
+    """Log completo em arquivo; em stderr, só avisos e erros (ou tudo, com --verbose). stdout fica para o JSON."""
+    configurar_logging(nivel_console=logging.INFO if verboso else logging.WARNING)
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        description="Baixa gravações e metadados da API Widevoice sem interface gráfica (andamento em JSON lines).")
+    acesso = parser.add_argument_group("acesso")
+    acesso.add_argument("--url", help="URL do servidor Widevoice")
+    acesso.add_argument("--login", help="login da API")
+    acesso.add_argument("--token", help=f"token da API (padrão: variável de ambiente {VARIAVEL_TOKEN})")
+    acesso.add_argument("--usar-config", action="store_true",
+                        help="usa URL, login, token e diretório salvos pela GUI em config.json quando não informados")
+
+    periodo = parser.add_argument_group("período")
+    periodo.add_argument("--inicio", help="início do período (AAAA-MM-DD ou 'AAAA-MM-DD HH:MM:SS')")
+    periodo.add_argument("--fim", help="fim do período (AAAA-MM-DD ou 'AAAA-MM-DD HH:MM:SS'; padrão: agora)")
+    periodo.add_argument("--incremental", action="store_true",
+                         help="lista apenas as chamadas posteriores à última sincronização (--inicio vale só na primeira)")
+
+    continuo = parser.add_argument_group("modo contínuo")
+    continuo.add_argument("--seguir", action="store_true",
+                          help="serviço contínuo: consulta a API em ciclos e baixa as chamadas novas assim que aparecem "
+                               "(--inicio opcional, vale só na primeira sincronização)")
+    continuo.add_argument("--intervalo", type=float,
+                          help="segundos entre consultas com chamadas novas (padrão: INTERVALO_CONSULTA de follow_mode.py)")
+    continuo.add_argument("--intervalo-maximo", type=float,
+                          help="limite do backoff quando a API está ociosa ou falhando (padrão: INTERVALO_MAXIMO de follow_mode.py)")
+
+    destino = parser.add_argument_group("destino e metadados")
+    destino.add_argument("--destino", help=f"diretório de destino (padrão: {config.DIRETORIO_BASE_GRAVACOES})")
+    destino.add_argument("--sem-metadados-com-gravacao", dest="metadados_com_gravacao", action="store_false",
+                         help="não gera metadados das chamadas com gravação")
+    destino.add_argument("--sem-metadados-sem-gravacao", dest="metadados_sem_gravacao", action="store_false",
+                         help="não gera metadados das chamadas sem gravação")
+    destino.add_argument("--formato-metadados", choices=OPCOES_FORMATO_METADADOS, default="txt",
+                         help="um .txt por chamada ou um arquivo por dia (padrão: %(default)s)")
+
+    execucao = parser.add_argument_group("execução")
+    execucao.add_argument("--listagem", choices=tuple(OPCOES_LISTAGEM), default="sequencial",
+                          help="listagem da API sequencial ou em janelas paralelas (padrão: %(default)s)")
+    execucao.add_argument("--motor", choices=("threads", "asyncio"), default="threads",
+                          help="motor de download (padrão: %(default)s)")
+    execucao.add_argument("--workers", type=int, help="workers paralelos (limite inicial com a concorrência adaptativa)")
+    execucao.add_argument("--concorrencia-maxima", type=int, help="limite máximo da concorrência adaptativa")
+    execucao.add_argument("--sem-concorrencia-adaptativa", dest="concorrencia_adaptativa", action="store_false",
+                          help="usa um número fixo de workers")
+    execucao.add_argument("--sem-manifesto", dest="usar_manifesto", action="store_false",
+                          help="processa todos os registros, mesmo os já concluídos")
+    execucao.add_argument("--sem-journal", dest="usar_journal", action="store_false",
+                          help="não registra o job para retomada")
+    execucao.add_argument("--sem-catalogo", dest="usar_catalogo", action="store_false",
+                          help="não grava os registros listados no catálogo")
+    execucao.add_argument("--sem-cache-listagem", dest="usar_cache_listagem", action="store_false",
+                          help="consulta todas as janelas na API")
+    execucao.add_argument("--nivel-status", choices=("INFO", "WARNING", "ERROR"), default="INFO",
+                          help="nível mínimo das mensagens emitidas como eventos de status (padrão: %(default)s)")
+    execucao.add_argument("--verbose", action="store_true", help="também escreve o log em stderr")
+    metricas = parser.add_argument_group("métricas (Prometheus)")
+    metricas.add_argument("--metricas-porta", type=int, metavar="PORTA",
+                          help="expõe as métricas em http://127.0.0.1:PORTA/metrics durante a execução")
+    metricas.add_argument("--metricas-arquivo", metavar="ARQUIVO",
+                          help="grava as métricas em ARQUIVO (.prom) periodicamente, para o textfile collector do node_exporter")
+    execucao.add_argument("--trace", metavar="ARQUIVO",
+                          help="grava spans de tempo por etapa em ARQUIVO (Chrome trace JSON, para chrome://tracing ou "
+                               "ui.perfetto.dev); no Linux, SIGUSR1 desliga (e grava) ou religa o tracing durante a execução")
+    return parser
+
+
+def _configurar_tracing(args, saida):
+    """Com --trace, liga o tracing desde o início; SIGUSR1 (POSIX) alterna entre gravar/desligar e religar."""
+    if not args.trace:
+        return
+    tracing.ativar()
+    if hasattr(signal, "SIGUSR1"):
+        def _alternar(signum, frame):
+            if tracing.ativo():
+                _exportar_tracing(args, saida)
+            else:
+                tracing.ativar()
+                saida.emitir("tracing", ativo=True)
+        signal.signal(signal.SIGUSR1, _alternar)
+
+
+def _exportar_tracing(args, saida):
+    """Desliga o tracing e grava os spans coletados no arquivo de --trace."""
+    spans = tracing.desativar()
+    if spans is None:
+        return
+    try:
+        total = tracing.exportar_chrome(args.trace, spans)
+    except OSError as e:
+        saida.status(f"CLI: Não foi possível gravar o trace em {args.trace}: {e}", logging.WARNING)
+        return
+    saida.emitir("tracing", ativo=False, arquivo=os.path.abspath(args.trace), spans=total)
+
+
+def _iniciar_metricas(args, saida):
+    """Com --metricas-porta e/ou --metricas-arquivo, cria as métricas e seus exportadores. Retorna (metricas, exportadores)."""
+    if not args.metricas_porta and not args.metricas_arquivo:
+        return None, []
+    from metrics import DownloadMetrics, ServidorMetricas, ArquivoMetricas
+
+    metricas = DownloadMetrics()
+    exportadores = []
+    if args.metricas_porta:
+        try:
+            servidor = ServidorMetricas(metricas.registry, args.metricas_porta)
+        except OSError as e:
+            saida.status(f"CLI: Não foi possível abrir a porta de métricas {args.metricas_porta}: {e}", logging.WARNING)
+        else:
+            servidor.iniciar()
+            exportadores.append(servidor)
+            saida.emitir("metricas", url=f"http://127.0.0.1:{servidor.porta}/metrics")
+    if args.metricas_arquivo:
+        arquivo = ArquivoMetricas(metricas.registry, args.metricas_arquivo)
+        arquivo.iniciar()
+        exportadores.append(arquivo)
+    return metricas, exportadores
+
+
+def _completar_com_config(args):
+    """Preenche os argumentos ausentes com a configuração salva pela GUI."""
+    import security_manager
+    dados = security_manager.load_configuration() or {}
+    args.url = args.url or dados.get("url_base")
+    args.login = args.login or dados.get("login")
+    args.token = args.token or dados.get("token")
+    args.destino = args.destino or dados.get("diretorio_destino")
+
+
+def _opcoes_download(args):
+    """Argumentos de DownloadController.start_download comuns ao job único e ao modo contínuo."""
+    import download_controller
+    return dict(
+        download_metadata_with_recording=args.metadados_com_gravacao,
+        download_metadata_without_recording=args.metadados_sem_gravacao,
+        granularidade_listagem=OPCOES_LISTAGEM[args.listagem],
+        motor_download=download_controller.MOTOR_ASYNCIO if args.motor == "asyncio" else download_controller.MOTOR_THREADS,
+        usar_manifesto=args.usar_manifesto,
+        formato_metadados=args.formato_metadados,
+        usar_catalogo=args.usar_catalogo,
+    )
+
+
+def _opcoes_controlador(args, metricas=None):
+    opcoes = {'concorrencia_adaptativa': args.concorrencia_adaptativa}
+    if metricas is not None:
+        opcoes['metricas'] = metricas
+    if args.workers:
+        opcoes['max_workers'] = args.workers
+    if args.concorrencia_maxima:
+        opcoes['limite_maximo_concorrencia'] = args.concorrencia_maxima
+    return opcoes
+
+
+def _executar_job(args, saida, datainicio_str, datafim_str, diretorio_destino, metricas=None):
+    """Um único job para o período informado. Ctrl+C ou SIGTERM cancelam o job."""
+    import download_controller
+
+    concluido = threading.Event()
+    cancel_event = threading.Event()
+    controller = download_controller.DownloadController(
+        progress_callback=saida.progresso,
+        completion_callback=concluido.set,
+        directory_getter=lambda: diretorio_destino,
+        progress_maximum_callback=saida.total,
+        concurrency_callback=saida.concorrencia,
+        stats_callback=saida.estatisticas,
+        **_opcoes_controlador(args, metricas)
+    )
+    saida.assinar(controller.eventos)
+
+    def _cancelar(signum, frame):
+        saida.status("CLI: Cancelamento solicitado. Aguardando tarefas em execução finalizarem...", logging.WARNING)
+        cancel_event.set()
+
+    signal.signal(signal.SIGINT, _cancelar)
+    signal.signal(signal.SIGTERM, _cancelar)
+
+    saida.emitir("inicio", url=args.url, login=args.login, inicio=datainicio_str, fim=datafim_str,
+                 destino=os.path.abspath(diretorio_destino))
+    controller.start_download(
+        args.url, args.login, args.token, datainicio_str, datafim_str, cancel_event,
+        usar_journal=args.usar_journal,
+        usar_cache_listagem=args.usar_cache_listagem,
+        modo_incremental=args.incremental,
+        **_opcoes_download(args)
+    )
+    # Espera em fatias curtas para que o sinal de interrupção seja tratado no thread principal.
+    while not concluido.wait(0.5):
+        pass
+    return cancel_event.is_set()
+
+
+def _executar_modo_continuo(args, saida, datainicio_str, diretorio_destino, metricas=None):
+    """
+    Modo contínuo (follow_mode.FollowMode) até um sinal de parada: o primeiro Ctrl+C/SIGTERM encerra
+    o serviço ao fim do ciclo atual; o segundo cancela também o ciclo em andamento.
+    """
+    from follow_mode import FollowMode, INTERVALO_CONSULTA, INTERVALO_MAXIMO
+
+    servico = FollowMode(
+        args.url, args.login, args.token, diretorio_destino, datainicio_str=datainicio_str,
+        intervalo=args.intervalo or INTERVALO_CONSULTA, intervalo_maximo=args.intervalo_maximo or INTERVALO_MAXIMO,
+        progress_callback=saida.progresso,
+        opcoes_download=_opcoes_download(args),
+        opcoes_controlador=dict(_opcoes_controlador(args, metricas), stats_callback=saida.estatisticas)
+    )
+    saida.assinar(servico.eventos)
+    sinais_recebidos = []
+
+    def _parar(signum, frame):
+        sinais_recebidos.append(signum)
+        if len(sinais_recebidos) == 1:
+            saida.status("CLI: Parada solicitada. O serviço será encerrado ao fim do ciclo atual (repita para cancelar o ciclo).", logging.WARNING)
+            servico.parar()
+        else:
+            saida.status("CLI: Cancelando o ciclo em andamento...", logging.WARNING)
+            servico.parar(cancelar=True)
+
+    signal.signal(signal.SIGINT, _parar)
+    signal.signal(signal.SIGTERM, _parar)
+
+    saida.emitir("inicio", url=args.url, login=args.login, inicio=datainicio_str, modo="continuo",
+                 destino=os.path.abspath(diretorio_destino))
+    thread_servico = threading.Thread(target=servico.executar, name="ModoContinuo")
+    thread_servico.start()
+    while thread_servico.is_alive():
+        thread_servico.join(0.5)
+    return len(sinais_recebidos) > 1
+
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if args.usar_config:
+        _completar_com_config(args)
+    args.token = args.token or os.environ.get(VARIAVEL_TOKEN)
+
+    obrigatorios = [("--url", args.url), ("--login", args.login), ("--token", args.token)]
+    if not args.seguir:
+        obrigatorios.append(("--inicio", args.inicio))
+    faltando = [nome for nome, valor in obrigatorios if not valor]
+    if faltando:
+        parser.error(f"argumentos obrigatórios ausentes: {', '.join(faltando)}")
+    if args.seguir and args.fim:
+        parser.error("--fim não se aplica ao modo contínuo (--seguir).")
+    try:
+        datainicio_str = _normalizar_data(args.inicio) if args.inicio else None
+        datafim_str = _normalizar_data(args.fim, fim=True) if args.fim else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        parser.error("formato de data inválido. Use AAAA-MM-DD ou 'AAAA-MM-DD HH:MM:SS'.")
+    diretorio_destino = args.destino or config.DIRETORIO_BASE_GRAVACOES
+
+    _configurar_logging(args.verbose)
+
+    saida = SaidaJsonLines(nivel_status=getattr(logging, args.nivel_status))
+    inicio = time.monotonic()
+    _configurar_tracing(args, saida)
+    metricas, exportadores = _iniciar_metricas(args, saida)
+    # O controlador é importado só a partir daqui, para que --help e erros de uso respondam imediatamente.
+    try:
+        if args.seguir:
+            cancelado = _executar_modo_continuo(args, saida, datainicio_str, diretorio_destino, metricas)
+        else:
+            cancelado = _executar_job(args, saida, datainicio_str, datafim_str, diretorio_destino, metricas)
+    finally:
+        for exportador in exportadores:
+            exportador.parar()
+    if args.trace:
+        _exportar_tracing(args, saida)
+
+    if cancelado:
+        codigo = CODIGO_CANCELADO
+    elif saida.erros and not args.seguir:
+        codigo = CODIGO_ERROS
+    else:
+        codigo = CODIGO_SUCESSO
+    saida.emitir("fim", codigo=codigo, erros=saida.erros, duracao=round(time.monotonic() - inicio, 3))
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,168 @@
+# concurrency_controller.py
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Limites padrão de transferências simultâneas.
+LIMITE_INICIAL = 5
+LIMITE_MINIMO = 1
+LIMITE_MAXIMO = 64
+
+# Redução multiplicativa aplicada a cada sinal de sobrecarga.
+FATOR_REDUCAO = 0.5
+
+# A redução multiplicativa não leva o limite abaixo deste valor: com erros esparsos (ou uma leitura
+# travada até o timeout), um limite de 1 serializaria todas as transferências atrás da tentativa lenta.
+PISO_REDUCAO = 4
+
+# Categorias de erro (recording_downloader.classificar_erro) que indicam sobrecarga do servidor ou da rede.
+ERROS_DE_SOBRECARGA = ('timeout', 'conexao', 'http_5xx', 'http_429')
+
+# Vazão por transferência (bytes/s, média móvel) abaixo desta fração da melhor observada indica
+# saturação: o limite deixa de crescer enquanto ela persistir.
+LIMIAR_SATURACAO = 0.5
+
+# Peso das novas amostras nas médias móveis exponenciais.
+PESO_MEDIA_MOVEL = 0.2
+
+
+class AdaptiveConcurrencyController:
+    """
+    Controle adaptativo (AIMD) do número de transferências simultâneas.
+
+    Recebe o resultado de cada tentativa HTTP pela mesma assinatura do observador_transferencia
+    de baixar_gravacao: (sucesso, duracao, bytes_transferidos, tipo_erro).
+
+    - Partida lenta: enquanto não houver sinal de sobrecarga, cada sucesso soma 1 ao limite
+      (o limite dobra a cada rodada de transferências).
+    - Aumento aditivo: depois disso, o limite cresce 1 a cada 'limite' sucessos, desde que a
+      vazão por transferência não indique saturação.
+    - Redução multiplicativa: timeouts, erros de conexão, 5xx e 429 multiplicam o limite por
+      FATOR_REDUCAO, sem descer abaixo de piso_reducao. No máximo um corte por rodada: falhas de
+      transferências iniciadas antes da última redução são ignoradas, e um novo corte só acontece
+      depois que tantas tentativas quanto o limite reduzido terminarem. Assim uma taxa constante de
+      erros esparsos causa um corte por rodada de transferências, e não um por falha.
+
+    Thread-safe. ao_alterar_limite(limite) é chamado (fora do lock) sempre que o limite muda.
+    """
+
+    def __init__(self, limite_inicial=LIMITE_INICIAL, limite_minimo=LIMITE_MINIMO, limite_maximo=LIMITE_MAXIMO,
+                 fator_reducao=FATOR_REDUCAO, piso_reducao=PISO_REDUCAO, ao_alterar_limite=None):
+        self._lock = threading.Lock()
+        self.limite_minimo = limite_minimo
+        self.limite_maximo = limite_maximo
+        self._fator_reducao = fator_reducao
+        self._piso_reducao = max(piso_reducao, limite_minimo)
+        self._ao_alterar_limite = ao_alterar_limite
+
+        self._limite = min(max(limite_inicial, limite_minimo), limite_maximo)
+        self._partida_lenta = True
+        self._credito = 0.0
+        self._instante_ultimo_corte = 0.0
+        # Tentativas concluídas desde o último corte (nenhum corte ainda: qualquer falha pode cortar).
+        self._concluidas_desde_corte = None
+
+        self._latencia_media = None
+        self._vazao_media = None
+        self._melhor_vazao = None
+        self._taxa_erros = 0.0
+        self.sucessos = 0
+        self.falhas = 0
+        self.reducoes = 0
+
+    @property
+    def limite(self):
+        return self._limite
+
+    def registrar(self, sucesso, duracao, bytes_transferidos, tipo_erro=None):
+        """Observador de transferência: ajusta o limite a partir do resultado de uma tentativa."""
+        agora = time.monotonic()
+        with self._lock:
+            limite_anterior = self._limite
+            self._taxa_erros += PESO_MEDIA_MOVEL * ((0.0 if sucesso else 1.0) - self._taxa_erros)
+            if self._concluidas_desde_corte is not None:
+                self._concluidas_desde_corte += 1
+            if sucesso:
+                self.sucessos += 1
+                self._registrar_sucesso(duracao, bytes_transferidos)
+            else:
+                self.falhas += 1
+                if tipo_erro in ERROS_DE_SOBRECARGA and self._pode_reduzir(agora, duracao):
+                    self._reduzir(agora)
+            novo_limite = self._limite
+
+        if novo_limite != limite_anterior:
+            if novo_limite < limite_anterior:
+                logger.info(f"AdaptiveConcurrencyController: Limite reduzido de {limite_anterior} para {novo_limite} ({tipo_erro}).")
+            else:
+                logger.debug(f"AdaptiveConcurrencyController: Limite aumentado para {novo_limite}.")
+            self._notificar(novo_limite)
+
+    def _registrar_sucesso(self, duracao, bytes_transferidos):
+        # Chamado com self._lock adquirido.
+        self._latencia_media = self._media_movel(self._latencia_media, duracao)
+        if duracao > 0 and bytes_transferidos > 0:
+            self._vazao_media = self._media_movel(self._vazao_media, bytes_transferidos / duracao)
+            self._melhor_vazao = max(self._melhor_vazao or 0.0, self._vazao_media)
+
+        saturado = (self._melhor_vazao is not None and
+                    self._vazao_media < self._melhor_vazao * LIMIAR_SATURACAO)
+        if saturado:
+            self._partida_lenta = False
+            return
+
+        if self._partida_lenta:
+            self._limite = min(self._limite + 1, self.limite_maximo)
+            return
+
+        self._credito += 1.0 / self._limite
+        if self._credito >= 1.0:
+            self._credito = 0.0
+            self._limite = min(self._limite + 1, self.limite_maximo)
+
+    def _pode_reduzir(self, agora, duracao):
+        # Chamado com self._lock adquirido. Um corte por rodada: a falha precisa ser de uma transferência
+        # iniciada depois do último corte, e ao menos 'limite' tentativas precisam ter terminado desde então.
+        if self._concluidas_desde_corte is None:
+            return True
+        iniciada_apos_corte = agora - duracao >= self._instante_ultimo_corte
+        return iniciada_apos_corte and self._concluidas_desde_corte >= self._limite
+
+    def _reduzir(self, agora):
+        # Chamado com self._lock adquirido. Nunca aumenta o limite (se ele já estiver abaixo do piso, fica onde está).
+        self._partida_lenta = False
+        self._credito = 0.0
+        piso = min(self._piso_reducao, self._limite)
+        self._limite = max(int(self._limite * self._fator_reducao), piso, self.limite_minimo)
+        self._instante_ultimo_corte = agora
+        self._concluidas_desde_corte = 0
+        # A vazão de referência é medida de novo a partir do limite reduzido.
+        self._melhor_vazao = self._vazao_media
+        self.reducoes += 1
+
+    @staticmethod
+    def _media_movel(media, amostra):
+        return amostra if media is None else media + PESO_MEDIA_MOVEL * (amostra - media)
+
+    def _notificar(self, limite):
+        if self._ao_alterar_limite is None:
+            return
+        try:
+            self._ao_alterar_limite(limite)
+        except Exception as e:
+            logger.error(f"AdaptiveConcurrencyController: Erro ao chamar ao_alterar_limite: {e}", exc_info=True)
+
+    def snapshot(self):
+        """Retorna o limite atual e as métricas observadas (latência, vazão por transferência, taxa de erros)."""
+        with self._lock:
+            return {
+                "limite": self._limite,
+                "latencia_media": self._latencia_media,
+                "vazao_media": self._vazao_media,
+                "taxa_erros": self._taxa_erros,
+                "sucessos": self.sucessos,
+                "falhas": self.falhas,
+                "reducoes": self.reducoes,
+            }
@@ -3,4 +3,8 @@ import os
 # Defina o diretório base onde as gravações serão salvas.
 # Exemplo: C:\Users\<USER>\Documents\Gravacoes
 # Certifique-se de que este diretório base exista ou que o script tenha permissão para criá-lo.
-DIRETORIO_BASE_GRAVACOES = os.path.join(os.path.expanduser("~"), "Documents", "Gravacoes_Widevoice")
\ No newline at end of file
+DIRETORIO_BASE_GRAVACOES = os.path.join(os.path.expanduser("~"), "Documents", "Gravacoes_Widevoice")
+
+# Protocolo de acesso ao servidor Widevoice (API e gravações). Use "http" apenas com servidores locais de teste,
+# como o servidor simulado de benchmarks/mock_widevoice_server.py.
+PROTOCOLO_SERVIDOR = os.environ.get("WIDEVOICE_PROTOCOLO", "https")
\ No newline at end of file
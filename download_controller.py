@@ -3,33 +3,164 @@ import logging
 import threading
 import concurrent.futures
 import os
-from datetime import datetime
+import queue
 import time
 
-from api_handler import construir_url_api, obter_dados_completos
-from recording_downloader import baixar_gravacao, gerar_arquivo_metadado
+from api_handler import construir_url_api, iterar_paginas_chamadas
+from recording_downloader import (baixar_gravacao, gerar_arquivo_metadado, gerar_metadado_de_falha, componentes_datahora,
+                                  nome_base_arquivo, informar_sem_gravacao, COMPONENTES_DATAHORA_PADRAO)
+from http_session_pool import HttpSessionPool
+from async_downloader import AsyncDownloadEngine, motor_asyncio_disponivel
+from download_manifest import DownloadManifest, TIPO_GRAVACAO, TIPO_METADADO_SEM_GRAVACAO
+from call_catalog import CallCatalog
+from listing_cache import ListingCache
+from sync_state import SyncState
+from job_journal import JobJournal, ESTADO_CONCLUIDO, ESTADO_FALHA, ESTADO_CANCELADO
+from concurrency_controller import AdaptiveConcurrencyController, LIMITE_MAXIMO
+from retry_scheduler import RetryScheduler, calcular_atraso_retentativa
+from progress_stats import ProgressStats, ProgressPublisher
+import tracing
+from event_bus import EventBus, EVENTOS_DE_STATUS, StatusMessage, ListingPage, TransferFailed, Retry
+from metadata_sink import MetadataSink, FORMATO_TXT, FORMATO_JSONL, FORMATO_PARQUET, SITUACAO_SEM_GRAVACAO, parquet_disponivel
 import config
 
-from exceptions import DownloadCancelledError
+from exceptions import DownloadCancelledError, ListagemAPIError, TransferenciaRetentavelError
 
 logger = logging.getLogger(__name__)
 
-MAX_WORKERS = 5
+MAX_WORKERS = 5 # Paralelismo fixo; com a concorrência adaptativa, é o limite inicial.
+
+# Motores de download disponíveis. O motor com threads é o padrão e o fallback do motor asyncio.
+MOTOR_THREADS = 'threads'
+MOTOR_ASYNCIO = 'asyncio'
+
+# Capacidade da fila entre a listagem da API (produtora) e a submissão de downloads (consumidora).
+TAMANHO_FILA_TRABALHO = 2000
+
+
+# Limite de tarefas submetidas e ainda não concluídas, por worker. Mantém o uso de memória
+# constante independentemente do número de registros retornados pela API.
+MAX_TAREFAS_EM_VOO_POR_WORKER = 4
+
+
+class _ResumoProcesso:
+    """Contadores do resumo final, atualizados à medida que cada tarefa termina."""
+
+    def __init__(self):
+        self.processados = 0
+        self.gravacoes_baixadas = 0
+        self.erros_download = 0
+        self.processados_sem_gravacao = 0
+        self.erros_metadado_sem_gravacao = 0
+        self.canceladas = 0
+        self.ja_sincronizados = 0
+        self.retentativas = 0
+
+    def registrar_resultado(self, tipo_tarefa, sucesso):
+        if tipo_tarefa == 'download':
+            if sucesso: self.gravacoes_baixadas += 1
+            else: self.erros_download += 1
+        elif tipo_tarefa == 'metadado_sem_gravacao':
+            if sucesso: self.processados_sem_gravacao += 1
+            else: self.erros_metadado_sem_gravacao += 1
+
+
+class _EstatisticasTransferencia:
+    """Bytes e tempo de transferência acumulados pelos workers, para o cálculo de vazão do resumo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bytes_transferidos = 0
+        self.tentativas = 0
+        self.falhas = 0
+
+    def registrar(self, sucesso, duracao, bytes_transferidos, tipo_erro=None):
+        with self._lock:
+            self.tentativas += 1
+            self.bytes_transferidos += bytes_transferidos
+            if not sucesso:
+                self.falhas += 1
+
+
+class _FimDaListagem:
+    """Sentinela colocada na fila de trabalho quando a listagem termina (com ou sem erro)."""
+
+    def __init__(self, erro=None):
+        self.erro = erro
 
 class DownloadController:
     def __init__(self, status_callback=None, progress_callback=None,
                  completion_callback=None, directory_getter=None,
-                 progress_maximum_callback=None):
+                 progress_maximum_callback=None, max_workers=MAX_WORKERS, max_tarefas_em_voo=None,
+                 concorrencia_adaptativa=True, limite_maximo_concorrencia=LIMITE_MAXIMO, concurrency_callback=None,
+                 registro_callback=None, stats_callback=None, event_bus=None, metricas=None):
         """
         Inicializa o controlador de download.
+        max_workers: número de workers paralelos; também dimensiona o pool de conexões HTTP.
+        max_tarefas_em_voo: máximo de tarefas submetidas e não concluídas (padrão: max_workers * MAX_TAREFAS_EM_VOO_POR_WORKER).
+        concorrencia_adaptativa: se True, o número de transferências simultâneas é ajustado durante o
+                                 download (AIMD), partindo de max_workers até limite_maximo_concorrencia
+                                 (no motor asyncio, até o limite de transferências do motor).
+        concurrency_callback: função opcional chamada com o limite de concorrência atual sempre que ele muda.
+        registro_callback: função opcional chamada com (id da chamada, estado) quando um registro termina
+                           (ESTADO_CONCLUIDO, ESTADO_FALHA ou ESTADO_CANCELADO de job_journal).
+        stats_callback: função opcional chamada cerca de 10 vezes por segundo durante o processo com um
+                        dict de estatísticas agregadas (progress_stats.ProgressStats.instantaneo: processados,
+                        total, registros/s, bytes/s, ETA, transferências ativas, retentativas, falhas, ...).
+        event_bus: EventBus (event_bus.py) onde o controlador e os downloaders publicam eventos tipados
+                   (StatusMessage, ListingPage, TransferStarted/Progress/Done/Failed, Retry); se omitido, um
+                   barramento próprio é criado e fica disponível em 'eventos'. status_callback, se informado,
+                   é assinado aos eventos de status e recebe (mensagem, nível), como antes.
+        metricas: metrics.DownloadMetrics opcional, atualizada durante o processo (registros listados e
+                  processados, transferências, bytes, latências) e com os medidores lidos deste controlador.
         """
         self._status_callback = status_callback
         self._progress_callback = progress_callback
         self._completion_callback = completion_callback
         self._directory_getter = directory_getter
         self._progress_maximum_callback = progress_maximum_callback
-
+        self._concurrency_callback = concurrency_callback
+        self._registro_callback = registro_callback
+        self._stats_callback = stats_callback
+
+        self.eventos = event_bus if event_bus is not None else EventBus()
+        if status_callback:
+            self.eventos.assinar(EVENTOS_DE_STATUS, self._repassar_status)
+        # StatusMessage já é registrada no log por _log_and_status; os demais eventos de status, pelo assinante abaixo,
+        # a partir do nível do log (eventos DEBUG nem são criados se ninguém mais os assinar).
+        self.eventos.assinar(tuple(tipo for tipo in EVENTOS_DE_STATUS if tipo is not StatusMessage),
+                             self._registrar_evento_no_log, nivel_minimo=logger.getEffectiveLevel())
+
+        self._metricas = metricas
+        if metricas is not None:
+            metricas.assinar(self.eventos)
+            metricas.transferencias_ativas.definir_funcao(lambda: self._downloads_em_voo)
+            metricas.fila_trabalho.definir_funcao(lambda: self._fila_trabalho.qsize() if self._fila_trabalho is not None else 0)
+            metricas.retentativas_pendentes.definir_funcao(
+                lambda: len(self._agendador_retentativas) if self._agendador_retentativas else 0)
+            metricas.limite_concorrencia.definir_funcao(self._limite_tarefas_em_voo)
+
+        self._max_workers = max_workers
+        self._max_tarefas_em_voo = max_tarefas_em_voo or max_workers * MAX_TAREFAS_EM_VOO_POR_WORKER
+        self._concorrencia_adaptativa = concorrencia_adaptativa
+        self._limite_maximo_concorrencia = max(limite_maximo_concorrencia, max_workers)
+        self._controle_concorrencia = None
         self._executor = None
+        self._http_pool = None
+        self._motor_async = None
+        self._estatisticas_transferencia = None
+        self._manifest = None
+        self._journal = None
+        self._metadata_sink = None
+        self._catalogo = None
+        self._cache_listagem = None
+        self._sincronizacao = None
+        self._filtro_registros = None
+        self._agendador_retentativas = None
+        self._publicador_estatisticas = None
+        self._resumo = None
+        self._downloads_em_voo = 0
+        self._fila_trabalho = None
         self._is_running = False
         self._cancel_event = None
 
@@ -37,13 +168,19 @@ class DownloadController:
         self._download_metadata_with_recording = True # Valor padrão
         self._download_metadata_without_recording = True # Valor padrão
         # --- Fim do armazenamento ---
+        self._granularidade_listagem = None # None = listagem sequencial; 'dia' ou 'hora' = listagem particionada
+        self._url_base = None
+        self._diretorio_destino = None
 
         self._total_items_to_process = 0
 
 
     # Adicionar os dois parâmetros de metadado aqui
     def start_download(self, url_base, login, token, datainicio_str, datafim_str, cancel_event,
-                         download_metadata_with_recording, download_metadata_without_recording): # --- NOVOS PARAMS ---
+                         download_metadata_with_recording, download_metadata_without_recording, # --- NOVOS PARAMS ---
+                         granularidade_listagem=None, motor_download=MOTOR_THREADS, usar_manifesto=True,
+                         usar_journal=True, formato_metadados=FORMATO_TXT, usar_catalogo=True,
+                         usar_cache_listagem=True, modo_incremental=False, filtro_registros=None):
         """
         Inicia o processo de download em uma thread separada.
 
@@ -52,6 +189,24 @@ class DownloadController:
             cancel_event: Um threading.Event para sinalizar o cancelamento.
             download_metadata_with_recording: Booleano para baixar metadados com gravação. # --- NOVO ---
             download_metadata_without_recording: Booleano para baixar metadados sem gravação. # --- NOVO ---
+            granularidade_listagem: None para listagem sequencial, ou 'dia'/'hora' para consultar
+                                    o período em janelas paralelas.
+            motor_download: MOTOR_THREADS (ThreadPoolExecutor) ou MOTOR_ASYNCIO (event loop com aiohttp).
+            usar_manifesto: se True, consulta o manifesto do diretório de destino e ignora os registros
+                            já concluídos em execuções anteriores.
+            usar_journal: se True, registra o job em um journal no diretório de destino e, se houver
+                          um job interrompido com os mesmos parâmetros, retoma-o sem listar novamente.
+            formato_metadados: FORMATO_TXT (um .txt por chamada) ou um formato em lote de metadata_sink
+                               (FORMATO_JSONL, FORMATO_CSV, FORMATO_PARQUET), com um arquivo por dia.
+            usar_catalogo: se True, grava cada registro listado no catálogo SQLite do diretório de destino
+                           (consultável com call_catalog.py, sem acessar a API).
+            usar_cache_listagem: se True, janelas da listagem inteiramente no passado são servidas do cache
+                                 em disco (listing_cache.py) quando já foram consultadas antes.
+            modo_incremental: se True, lista apenas as chamadas posteriores à última sincronização deste
+                              servidor e login (sync_state.py), com uma pequena sobreposição de segurança;
+                              datainicio_str só é usada na primeira sincronização.
+            filtro_registros: função opcional que recebe cada página listada e retorna os registros que
+                              devem ser processados (ex.: o modo contínuo descarta os 'id's já concluídos).
         """
         if self._is_running:
             self._log_and_status("Aviso: O processo de download já está em execução.", level=logging.WARNING)
@@ -63,6 +218,8 @@ class DownloadController:
         self._download_metadata_with_recording = download_metadata_with_recording
         self._download_metadata_without_recording = download_metadata_without_recording
         # --- Fim do armazenamento ---
+        self._granularidade_listagem = granularidade_listagem
+        self._filtro_registros = filtro_registros
 
 
         self._log_and_status("Controlador: Processo de download iniciado.")
@@ -75,7 +232,47 @@ class DownloadController:
             self._process_completed()
             return
 
-        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        # Com a concorrência adaptativa, o executor e o pool comportam o limite máximo; o limite
+        # efetivo é o do controle AIMD, aplicado ao número de tarefas em andamento.
+        max_threads = self._limite_maximo_concorrencia if self._concorrencia_adaptativa else self._max_workers
+        # Pool de conexões keep-alive compartilhado pela listagem da API e por todos os workers.
+        self._http_pool = HttpSessionPool(max_workers=max_threads)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_threads)
+        self._estatisticas_transferencia = _EstatisticasTransferencia()
+        # Retentativas ficam em uma fila de atraso do orquestrador, sem ocupar workers enquanto aguardam.
+        self._agendador_retentativas = RetryScheduler()
+        self._url_base = url_base
+        self._diretorio_destino = diretorio_destino
+
+        if motor_download == MOTOR_ASYNCIO:
+            self._iniciar_motor_async()
+
+        if self._concorrencia_adaptativa:
+            self._iniciar_controle_concorrencia()
+
+        if usar_manifesto:
+            self._abrir_manifesto(diretorio_destino)
+
+        if usar_catalogo:
+            self._abrir_catalogo(diretorio_destino)
+
+        if usar_cache_listagem:
+            self._abrir_cache_listagem()
+
+        if formato_metadados != FORMATO_TXT and (download_metadata_with_recording or download_metadata_without_recording):
+            self._abrir_metadata_sink(diretorio_destino, formato_metadados)
+
+        if modo_incremental:
+            datainicio_str = self._abrir_sincronizacao(diretorio_destino, url_base, login, datainicio_str)
+
+        if usar_journal:
+            self._abrir_journal(diretorio_destino, {
+                'url_base': url_base, 'login': login,
+                'datainicio': datainicio_str, 'datafim': datafim_str,
+                'granularidade_listagem': granularidade_listagem,
+                'download_metadata_with_recording': download_metadata_with_recording,
+                'download_metadata_without_recording': download_metadata_without_recording,
+            })
 
 
         # Inicia a thread principal para orquestrar o download
@@ -99,162 +296,155 @@ class DownloadController:
         """
         logger.info("DownloadController: Thread de processamento principal iniciada.")
         total_chamadas = 0
+        inicio_processo = time.monotonic()
+        job_terminado = False
+        # Sinaliza à produtora que a fila não será mais lida (fim do job, inclusive por exceção).
+        consumidor_encerrado = threading.Event()
         try:
             if self._cancel_event and self._cancel_event.is_set():
                  raise DownloadCancelledError("Processo cancelado pelo usuário durante a obtenção de dados da API.")
 
             self._log_and_status("Controlador: Obtendo lista de chamadas da API...")
             url_api = construir_url_api(url_base, login, token)
-            dados_chamadas = obter_dados_completos(url_api, datainicio_str, datafim_str,
-                                                    status_callback=self._log_and_status,
-                                                    cancel_event=self._cancel_event)
-
-
-            if self._cancel_event and self._cancel_event.is_set():
-                 raise DownloadCancelledError("Processo cancelado pelo usuário após a obtenção de dados da API.")
 
+            # A listagem roda em uma thread produtora que alimenta uma fila limitada; os registros
+            # são submetidos para download assim que cada página chega da API.
+            fila_trabalho = queue.Queue(maxsize=TAMANHO_FILA_TRABALHO)
+            self._fila_trabalho = fila_trabalho
+            produtor = threading.Thread(
+                target=self._produzir_registros,
+                args=(url_api, datainicio_str, datafim_str, fila_trabalho, consumidor_encerrado),
+                name="ListagemAPI",
+                daemon=True
+            )
+            produtor.start()
+
+            resumo = _ResumoProcesso()
+            self._resumo = resumo
+            self._iniciar_publicador_estatisticas()
+            # Apenas as tarefas em andamento ficam em memória: future -> (chamada, tipo da tarefa, número da tentativa).
+            tarefas_em_voo = {}
+            falha_listagem = False
+
+            self._log_and_status("Controlador: Iniciando processamento paralelo de gravações e metadados à medida que a API retorna os registros...")
 
-            if dados_chamadas is None:
+            try:
+                for chamada in self._consumir_registros(fila_trabalho):
+                     if chamada is None:
+                          # Listagem lenta: recolhe as tarefas já concluídas e submete as retentativas vencidas.
+                          if tarefas_em_voo:
+                               self._aguardar_tarefas(tarefas_em_voo, resumo, bloquear=False)
+                          self._submeter_retentativas_vencidas(tarefas_em_voo, resumo)
+                          continue
+                     if self._sincronizacao is not None:
+                          self._sincronizacao.observar(chamada)
+                     if self._ja_concluido(chamada, download_metadata_with_recording, download_metadata_without_recording):
+                          # Concluído em uma execução anterior e ainda presente em disco: nenhuma transferência.
+                          self._registrar_estado(chamada.get('id', 'desconhecido'), ESTADO_CONCLUIDO)
+                          total_chamadas += 1
+                          resumo.processados += 1
+                          resumo.ja_sincronizados += 1
+                          self._update_progress(resumo.processados, self._total_items_to_process)
+                          continue
+
+                     # Retentativas vencidas têm prioridade sobre registros novos.
+                     self._submeter_retentativas_vencidas(tarefas_em_voo, resumo)
+                     # Backpressure: não submete novas tarefas enquanto o limite de tarefas em andamento estiver cheio.
+                     while len(tarefas_em_voo) >= self._limite_tarefas_em_voo():
+                          self._aguardar_tarefas(tarefas_em_voo, resumo)
+                          self._submeter_retentativas_vencidas(tarefas_em_voo, resumo)
+
+                     total_chamadas += 1
+                     future, tipo_tarefa = self._submeter_chamada(
+                          chamada, url_base, diretorio_destino,
+                          download_metadata_with_recording, download_metadata_without_recording
+                     )
+                     tarefas_em_voo[future] = (chamada, tipo_tarefa, 1)
+                     if tipo_tarefa == 'download':
+                          self._downloads_em_voo += 1
+            except ListagemAPIError:
+                falha_listagem = True
                 self._log_and_status("Controlador: Falha ao obter dados da API. Verifique logs para mais detalhes.", level=logging.ERROR)
                 logger.error("DownloadController: Falha ao obter dados da API.")
-                self._update_progress(0, 0)
-                return
 
-            if not isinstance(dados_chamadas, list) or not dados_chamadas:
-                self._log_and_status("Controlador: Nenhum registro encontrado ou resposta da API em formato inesperado.", level=logging.WARNING)
-                logger.info("DownloadController: Nenhum registro encontrado ou resposta da API em formato inesperado.")
+            if total_chamadas == 0:
+                if not falha_listagem:
+                    self._log_and_status("Controlador: Nenhum registro encontrado ou resposta da API em formato inesperado.", level=logging.WARNING)
+                    logger.info("DownloadController: Nenhum registro encontrado ou resposta da API em formato inesperado.")
                 self._total_items_to_process = 0
                 self._update_progress_maximum(0)
                 self._update_progress(0, 0)
+                job_terminado = not falha_listagem and not (self._cancel_event and self._cancel_event.is_set())
                 return
 
-            total_chamadas = len(dados_chamadas)
             self._total_items_to_process = total_chamadas
             self._log_and_status(f"Controlador: Encontrados {total_chamadas} registros de chamadas para processar.")
             logger.info(f"DownloadController: Encontrados {total_chamadas} registros de chamadas.")
-
             self._update_progress_maximum(total_chamadas)
-            self._update_progress(0, total_chamadas)
-
-            processados_count = 0
-            future_to_chamada = {}
-
-            self._log_and_status("Controlador: Iniciando processamento paralelo de gravações e metadados...")
-
-            if self._cancel_event and self._cancel_event.is_set():
-                 raise DownloadCancelledError("Processo cancelado pelo usuário antes de submeter tarefas.")
-
-            for chamada in dados_chamadas:
-                 tem_gravacao = 'gravacao' in chamada and bool(chamada.get('gravacao'))
-
-                 if tem_gravacao:
-                      # Passa as duas opções de metadado para baixar_gravacao
-                      future = self._executor.submit(
-                          baixar_gravacao, url_base, chamada, diretorio_destino, self._log_and_status, self._cancel_event,
-                          download_metadata_with_recording, download_metadata_without_recording # --- PASSA AS OPÇÕES ---
-                      )
-                      future_to_chamada[future] = (chamada, 'download')
-                 else:
-                      # Passa as duas opções de metadado para _processar_sem_gravacao
-                      future = self._executor.submit(
-                          self._processar_sem_gravacao, chamada, self._log_and_status, diretorio_destino, self._cancel_event,
-                          download_metadata_with_recording, download_metadata_without_recording # --- PASSA AS OPÇÕES ---
-                      )
-                      future_to_chamada[future] = (chamada, 'metadado_sem_gravacao')
-
 
             self._log_and_status("Controlador: Aguardando conclusão das tarefas...")
 
-            for future in concurrent.futures.as_completed(future_to_chamada):
-                if self._cancel_event and self._cancel_event.is_set():
-                    logger.info("Controlador: Evento de cancelamento detectado no loop as_completed.")
+            while tarefas_em_voo or self._agendador_retentativas:
+                if tarefas_em_voo:
+                    self._aguardar_tarefas(tarefas_em_voo, resumo)
+                else:
+                    self._aguardar_retentativa()
+                self._submeter_retentativas_vencidas(tarefas_em_voo, resumo)
 
-                processados_count += 1
-                self._update_progress(processados_count, self._total_items_to_process)
-
-                chamada_info = future_to_chamada[future]
-                chamada_original = chamada_info[0]
-                tipo_tarefa = chamada_info[1]
-                chamada_id = chamada_original.get('id', 'desconhecido')
-
-                try:
-                    result = future.result()
-                    if tipo_tarefa == 'download' and result is False:
-                         logger.warning(f"DownloadController: Tarefa de download falhou para Chamada ID {chamada_id}.")
-                    elif tipo_tarefa == 'metadado_sem_gravacao' and result is False:
-                         logger.warning(f"DownloadController: Tarefa de gerar metadado para Chamada ID {chamada_id} (sem gravação) falhou.")
-
-                except DownloadCancelledError:
-                    logger.debug(f"Controlador: Tarefa para Chamada ID {chamada_id} relatou cancelamento.")
-
-                except Exception as exc:
-                    mensagem_erro = f"Controlador: Ocorreu uma exceção não tratada ao processar a chamada ID {chamada_id}: {exc}"
-                    self._log_and_status(mensagem_erro, level=logging.ERROR)
-                    logger.exception(f"DownloadController: Exceção não tratada ao processar chamada ID {chamada_id}")
+            processados_count = resumo.processados
 
             if self._cancel_event and self._cancel_event.is_set():
-                 self._log_and_status("Controlador: Processo de download cancelado pelo usuário.", level=logging.WARNING)
+                 self._log_and_status("Controlador: Processo de download cancelado pelo usuário.", level=logging.WARNING, cancelamento=True)
                  logger.info("Controlador: Processo de download interrompido por cancelamento.")
                  self._update_progress(processados_count, self._total_items_to_process)
 
             else:
-                 gravacoes_baixadas_count = 0
-                 erros_download_count = 0
-                 processados_sem_gravacao_count = 0
-                 erros_metadado_sem_gravacao_count = 0
-                 cancelled_count = 0
-
-                 for future in future_to_chamada:
-                      tipo_tarefa = future_to_chamada[future][1]
-                      try:
-                          result = future.result()
-                          if result is True:
-                              if tipo_tarefa == 'download': gravacoes_baixadas_count += 1
-                              elif tipo_tarefa == 'metadado_sem_gravacao': processados_sem_gravacao_count += 1
-                          elif result is False:
-                              if tipo_tarefa == 'download': erros_download_count += 1
-                              elif tipo_tarefa == 'metadado_sem_gravacao': erros_metadado_sem_gravacao_count += 1
-                      except DownloadCancelledError:
-                           cancelled_count += 1
-                      except Exception:
-                          if tipo_tarefa == 'download': erros_download_count += 1
-                          elif tipo_tarefa == 'metadado_sem_gravacao': erros_metadado_sem_gravacao_count += 1
-
-
                  self._log_and_status("\n--- Resumo do Processo ---")
                  self._log_and_status(f"Controlador: Total de registros da API encontrados: {total_chamadas}")
                  self._log_and_status(f"Controlador: Total de registros processados (baixados ou metadado gerado): {processados_count}")
-                 self._log_and_status(f"Controlador: Gravações baixadas com sucesso: {gravacoes_baixadas_count}")
+                 self._log_and_status(f"Controlador: Gravações baixadas com sucesso: {resumo.gravacoes_baixadas}")
+                 if resumo.ja_sincronizados > 0:
+                      self._log_and_status(f"Controlador: Registros já concluídos em execuções anteriores (ignorados): {resumo.ja_sincronizados}")
 
                  # --- Ajustar o resumo para refletir as novas opções de metadado ---
                  if download_metadata_with_recording and download_metadata_without_recording:
-                     self._log_and_status(f"Controlador: Registros sem gravação processados (metadado gerado): {processados_sem_gravacao_count}")
+                     self._log_and_status(f"Controlador: Registros sem gravação processados (metadado gerado): {resumo.processados_sem_gravacao}")
                  elif download_metadata_without_recording:
-                     self._log_and_status(f"Controlador: Registros sem gravação processados (metadado gerado): {processados_sem_gravacao_count}")
+                     self._log_and_status(f"Controlador: Registros sem gravação processados (metadado gerado): {resumo.processados_sem_gravacao}")
                  elif download_metadata_with_recording:
                       self._log_and_status("Controlador: Geração de metadados para registros sem gravação foi ignorada conforme opção.")
                  else:
                       self._log_and_status("Controlador: Geração de metadados (com ou sem gravação) foi ignorada conforme opção.")
 
-                 if download_metadata_with_recording and (erros_download_count > 0 or any(f.exception() for f in future_to_chamada if future_to_chamada[f][1] == 'download' and not isinstance(f.exception(), DownloadCancelledError))):
+                 if download_metadata_with_recording and resumo.erros_download > 0:
                       self._log_and_status("Controlador: Metadados de falha de download podem ter sido gerados.", level=logging.WARNING)
 
-                 if download_metadata_without_recording and erros_metadado_sem_gravacao_count > 0:
-                     self._log_and_status(f"Controlador: Erros ao processar registros sem gravação (geração de metadado): {erros_metadado_sem_gravacao_count}", level=logging.WARNING)
+                 if download_metadata_without_recording and resumo.erros_metadado_sem_gravacao > 0:
+                     self._log_and_status(f"Controlador: Erros ao processar registros sem gravação (geração de metadado): {resumo.erros_metadado_sem_gravacao}", level=logging.WARNING)
                      self._log_and_status("Controlador: Verifique as mensagens de error acima e os logs para detalhes.")
 
 
-                 if cancelled_count > 0:
-                      self._log_and_status(f"Controlador: Tarefas individuais canceladas: {cancelled_count}", level=logging.WARNING)
+                 if resumo.retentativas > 0:
+                      self._log_and_status(f"Controlador: Retentativas agendadas após falhas transitórias: {resumo.retentativas}")
+
+                 if resumo.canceladas > 0:
+                      self._log_and_status(f"Controlador: Tarefas individuais canceladas: {resumo.canceladas}", level=logging.WARNING)
+
+                 if falha_listagem:
+                      self._log_and_status("Controlador: A listagem da API foi interrompida por erro; apenas os registros listados até a falha foram processados.", level=logging.ERROR)
 
+                 self._log_estatisticas_pool_http()
+                 self._log_controle_concorrencia()
+                 self._log_vazao(processados_count, time.monotonic() - inicio_processo)
 
-                 if erros_download_count == 0 and erros_metadado_sem_gravacao_count == 0 and cancelled_count == 0:
+                 sem_erros = resumo.erros_download == 0 and resumo.erros_metadado_sem_gravacao == 0 and not falha_listagem
+                 if sem_erros and resumo.canceladas == 0:
                       if download_metadata_with_recording or download_metadata_without_recording:
                            self._log_and_status("Controlador: Todos os registros aplicáveis foram processados sem erros ou cancelamentos.")
                       else:
                            self._log_and_status("Controlador: Todos os registros foram processados (download de gravação opcional, metadados ignorados).")
                       logger.info("Controlador: Processo finalizado com sucesso (sem erros ou cancelamentos nas tarefas aplicáveis).")
-                 elif cancelled_count > 0 and erros_download_count == 0 and erros_metadado_sem_gravacao_count == 0:
+                 elif sem_erros:
                        self._log_and_status("Controlador: Processo finalizado com algumas tarefas canceladas, mas sem outros erros.", level=logging.WARNING)
                        logger.info("Controlador: Processo finalizado com algumas tarefas canceladas.")
                  else:
@@ -265,9 +455,12 @@ class DownloadController:
 
 
                  self._update_progress(total_chamadas, total_chamadas)
+                 job_terminado = not falha_listagem
+                 if job_terminado and self._sincronizacao is not None:
+                      self._avancar_sincronizacao()
 
         except DownloadCancelledError as e:
-            self._log_and_status(f"Controlador: Processo de download cancelado: {e}", level=logging.WARNING)
+            self._log_and_status(f"Controlador: Processo de download cancelado: {e}", level=logging.WARNING, cancelamento=True)
             logger.info("Controlador: Processo de download interrompido por cancelamento.")
 
         except Exception as e:
@@ -276,19 +469,571 @@ class DownloadController:
             logger.exception("Controlador: Erro inesperado durante o processamento principal.")
 
         finally:
+            consumidor_encerrado.set()
             if self._executor:
                 logger.info("Controlador: Desligando ThreadPoolExecutor.")
                 self._executor.shutdown(wait=True)
                 self._executor = None
+            if self._publicador_estatisticas:
+                self._publicador_estatisticas.parar()
+                self._publicador_estatisticas = None
+            self._resumo = None
+            self._downloads_em_voo = 0
+            self._fila_trabalho = None
+            if self._motor_async:
+                self._motor_async.fechar()
+                self._motor_async = None
+            if self._http_pool:
+                self._http_pool.fechar()
+                self._http_pool = None
+            if self._metadata_sink:
+                self._fechar_metadata_sink()
+            if self._manifest:
+                self._manifest.fechar()
+                self._manifest = None
+            if self._catalogo:
+                self._catalogo.fechar()
+                self._catalogo = None
+            if self._cache_listagem:
+                self._fechar_cache_listagem()
+            self._sincronizacao = None
+            self._filtro_registros = None
+            if self._journal:
+                self._fechar_journal(job_terminado)
+            self._controle_concorrencia = None
+            self._agendador_retentativas = None
+            self._url_base = None
+            self._diretorio_destino = None
             self._is_running = False
             self._cancel_event = None
             # --- Resetar as opções de metadado para padrão ao finalizar (opcional, mas seguro) ---
             self._download_metadata_with_recording = True
             self._download_metadata_without_recording = True
             # --- Fim do reset ---
+            self._granularidade_listagem = None
             self._process_completed()
 
 
+    def _iniciar_motor_async(self):
+        """Inicia o motor asyncio; em caso de indisponibilidade, mantém o motor com threads."""
+        if not motor_asyncio_disponivel():
+            self._log_and_status("Controlador: Motor asyncio indisponível (pacote 'aiohttp' não instalado). Usando motor com threads.", level=logging.WARNING)
+            return
+        try:
+            motor_async = AsyncDownloadEngine()
+            motor_async.iniciar()
+        except Exception as e:
+            self._log_and_status(f"Controlador: Falha ao iniciar o motor asyncio ({e}). Usando motor com threads.", level=logging.WARNING)
+            logger.exception("Controlador: Falha ao iniciar o motor asyncio.")
+            return
+        self._motor_async = motor_async
+        self._log_and_status(f"Controlador: Usando motor de download asyncio com até {motor_async.max_transferencias} transferências simultâneas.")
+
+    def _abrir_manifesto(self, diretorio_destino):
+        """Abre o manifesto do diretório de destino; em caso de erro, o download segue sem ele."""
+        try:
+            self._manifest = DownloadManifest(diretorio_destino)
+        except Exception as e:
+            self._log_and_status(f"Controlador: Não foi possível abrir o manifesto de downloads ({e}). Todos os registros serão processados.", level=logging.WARNING)
+            logger.exception("Controlador: Falha ao abrir o manifesto de downloads.")
+            self._manifest = None
+
+    def _abrir_catalogo(self, diretorio_destino):
+        """Abre o catálogo de chamadas do diretório de destino; em caso de erro, o download segue sem ele."""
+        try:
+            self._catalogo = CallCatalog(diretorio_destino)
+        except Exception as e:
+            self._log_and_status(f"Controlador: Não foi possível abrir o catálogo de chamadas ({e}). Os registros listados não serão catalogados.", level=logging.WARNING)
+            logger.exception("Controlador: Falha ao abrir o catálogo de chamadas.")
+            self._catalogo = None
+
+    def _abrir_cache_listagem(self):
+        """Abre o cache de listagem da API; em caso de erro, todas as janelas são consultadas na API."""
+        try:
+            self._cache_listagem = ListingCache()
+        except Exception as e:
+            self._log_and_status(f"Controlador: Não foi possível abrir o cache de listagem ({e}). Todas as janelas serão consultadas na API.", level=logging.WARNING)
+            logger.exception("Controlador: Falha ao abrir o cache de listagem.")
+            self._cache_listagem = None
+
+    def _fechar_cache_listagem(self):
+        cache = self._cache_listagem
+        self._cache_listagem = None
+        if cache.acertos or cache.faltas:
+            self._log_and_status(f"Controlador: Cache da listagem - janelas servidas do cache: {cache.acertos}, "
+                                 f"janelas passadas consultadas na API: {cache.faltas}.")
+        try:
+            cache.fechar()
+        except Exception as e:
+            logger.error(f"Controlador: Erro ao fechar o cache de listagem: {e}", exc_info=True)
+
+    def _catalogar_pagina(self, pagina):
+        """Grava uma página da listagem no catálogo. Um erro desativa o catálogo, sem interromper a listagem."""
+        if self._catalogo is None:
+            return
+        try:
+            self._catalogo.registrar(pagina, servidor=self._url_base or '')
+        except Exception as e:
+            self._log_and_status(f"Controlador: Erro ao gravar no catálogo de chamadas ({e}). O catálogo foi desativado nesta execução.", level=logging.WARNING)
+            logger.exception("Controlador: Falha ao gravar página no catálogo de chamadas.")
+            catalogo, self._catalogo = self._catalogo, None
+            catalogo.fechar()
+
+    def _abrir_sincronizacao(self, diretorio_destino, url_base, login, datainicio_str):
+        """
+        Carrega a marca d'água da sincronização incremental e retorna o início da listagem.
+        Em caso de erro, o período informado é listado por completo.
+        """
+        try:
+            self._sincronizacao = SyncState(diretorio_destino, url_base, login)
+        except Exception as e:
+            self._log_and_status(f"Controlador: Não foi possível carregar o estado da sincronização incremental ({e}). Listando o período informado.", level=logging.WARNING)
+            logger.exception("Controlador: Falha ao carregar o estado da sincronização incremental.")
+            self._sincronizacao = None
+            return datainicio_str
+        if not self._sincronizacao.datahora:
+            self._log_and_status(f"Controlador: Sincronização incremental: nenhuma sincronização anterior. Listando a partir de {datainicio_str}.")
+            return datainicio_str
+        inicio = self._sincronizacao.inicio_listagem(datainicio_str)
+        self._log_and_status(f"Controlador: Sincronização incremental: última sincronização até {self._sincronizacao.datahora}. "
+                             f"Listando a partir de {inicio}.")
+        return inicio
+
+    def _filtrar_registros(self, pagina):
+        if self._sincronizacao is not None:
+            pagina = self._sincronizacao.filtrar(pagina)
+        if self._filtro_registros is not None:
+            pagina = self._filtro_registros(pagina)
+        return pagina
+
+    def _registrar_pendencia_sincronizacao(self, chamada):
+        if self._sincronizacao is not None:
+            self._sincronizacao.registrar_pendencia(chamada)
+
+    def _avancar_sincronizacao(self):
+        """Grava a marca d'água ao fim de um job completo; um erro apenas mantém a marca anterior."""
+        try:
+            datahora = self._sincronizacao.avancar()
+        except Exception as e:
+            self._log_and_status(f"Controlador: Erro ao gravar o estado da sincronização incremental ({e}). A próxima execução repetirá este período.", level=logging.WARNING)
+            logger.exception("Controlador: Falha ao gravar o estado da sincronização incremental.")
+            return
+        if datahora:
+            self._log_and_status(f"Controlador: Sincronização incremental: marca d'água atualizada para {datahora}.")
+
+    def _abrir_metadata_sink(self, diretorio_destino, formato):
+        """Abre o destino de metadados em lote; em caso de erro, os metadados seguem no formato TXT."""
+        if formato == FORMATO_PARQUET and not parquet_disponivel():
+            self._log_and_status("Controlador: Formato Parquet indisponível (pacote 'pyarrow' não instalado). Usando JSONL.", level=logging.WARNING)
+            formato = FORMATO_JSONL
+        try:
+            self._metadata_sink = MetadataSink(diretorio_destino, formato)
+        except Exception as e:
+            self._log_and_status(f"Controlador: Não foi possível abrir o destino de metadados {formato} ({e}). Usando um TXT por chamada.", level=logging.WARNING)
+            logger.exception("Controlador: Falha ao abrir o destino de metadados.")
+            self._metadata_sink = None
+
+    def _fechar_metadata_sink(self):
+        """Grava os metadados ainda na fila e informa o total gravado."""
+        sink = self._metadata_sink
+        self._metadata_sink = None
+        sink.fechar()
+        self._log_and_status(f"Controlador: Metadados ({sink.formato}): {sink.registros_gravados} registros gravados em {sink.diretorio}.")
+        if sink.erros:
+            self._log_and_status(f"Controlador: Erros ao gravar metadados ({sink.formato}): {sink.erros} registros.", level=logging.WARNING)
+
+    def _abrir_journal(self, diretorio_destino, parametros):
+        """Abre (ou retoma) o journal do job; em caso de erro, o download segue sem ele."""
+        try:
+            self._journal = JobJournal(diretorio_destino, parametros)
+        except Exception as e:
+            self._log_and_status(f"Controlador: Não foi possível abrir o journal do job ({e}). O processo não poderá ser retomado após uma interrupção.", level=logging.WARNING)
+            logger.exception("Controlador: Falha ao abrir o journal do job.")
+            self._journal = None
+
+    def _fechar_journal(self, job_terminado):
+        """Remove o journal de um job terminado; mantém o de um job interrompido, para retomada."""
+        try:
+            if job_terminado:
+                self._journal.concluir()
+            else:
+                self._journal.fechar()
+                self._log_and_status("Controlador: Job interrompido. Inicie novamente com os mesmos parâmetros para retomá-lo.", level=logging.WARNING)
+        except Exception as e:
+            logger.error(f"Controlador: Erro ao fechar o journal do job: {e}", exc_info=True)
+        self._journal = None
+
+    def _registrar_estado(self, chamada_id, estado):
+        """Registra o resultado de um registro no journal e nas métricas e o informa ao registro_callback."""
+        if self._metricas is not None:
+            self._metricas.registrar_estado(estado)
+        if self._registro_callback:
+            try:
+                self._registro_callback(chamada_id, estado)
+            except Exception as e:
+                logger.error(f"Controlador: Erro ao chamar registro_callback: {e} - Chamada ID: {chamada_id}", exc_info=True)
+        if self._journal is None:
+            return
+        try:
+            self._journal.registrar_estado(chamada_id, estado)
+        except Exception as e:
+            logger.error(f"Controlador: Erro ao registrar estado da Chamada ID {chamada_id} no journal: {e}", exc_info=True)
+
+    def _ja_concluido(self, chamada, download_metadata_with_recording, download_metadata_without_recording):
+        """
+        Indica se a chamada já foi concluída: pelo journal de um job retomado ou pelo manifesto
+        (com o metadado, se a opção o exigir).
+        """
+        if self._journal is not None and self._journal.ja_concluido(chamada.get('id')):
+            return True
+        if self._manifest is None:
+            return False
+        if 'gravacao' in chamada and bool(chamada.get('gravacao')):
+            return self._manifest.ja_concluido(chamada.get('id'), TIPO_GRAVACAO,
+                                               exigir_metadado=download_metadata_with_recording)
+        if not download_metadata_without_recording:
+            return False # Nada a fazer para esse registro; não há o que consultar.
+        return self._manifest.ja_concluido(chamada.get('id'), TIPO_METADADO_SEM_GRAVACAO)
+
+    def _iniciar_controle_concorrencia(self):
+        limite_maximo = self._motor_async.max_transferencias if self._motor_async is not None else self._limite_maximo_concorrencia
+        self._controle_concorrencia = AdaptiveConcurrencyController(
+            limite_inicial=self._max_workers,
+            limite_maximo=limite_maximo,
+            ao_alterar_limite=self._update_concurrency
+        )
+        self._log_and_status(f"Controlador: Concorrência adaptativa ativada (inicial: {self._max_workers}, máximo: {limite_maximo} transferências simultâneas).")
+        self._update_concurrency(self._controle_concorrencia.limite)
+
+    def _iniciar_publicador_estatisticas(self):
+        """Inicia o canal de estatísticas (cerca de 10 Hz), se houver um stats_callback."""
+        if not self._stats_callback:
+            return
+        progress_stats = ProgressStats()
+        self._publicador_estatisticas = ProgressPublisher(
+            lambda: self._coletar_estatisticas(progress_stats), self._stats_callback
+        )
+        self._publicador_estatisticas.iniciar()
+
+    def _coletar_estatisticas(self, progress_stats):
+        """Instantâneo das estatísticas agregadas do processo (chamado pela thread publicadora)."""
+        resumo = self._resumo or _ResumoProcesso()
+        estatisticas = self._estatisticas_transferencia
+        agendador = self._agendador_retentativas
+        return progress_stats.instantaneo(
+            resumo.processados, self._total_items_to_process,
+            estatisticas.bytes_transferidos if estatisticas else 0,
+            transferencias_ativas=self._downloads_em_voo,
+            limite_concorrencia=self._limite_tarefas_em_voo(),
+            retentativas=resumo.retentativas,
+            retentativas_pendentes=len(agendador) if agendador else 0,
+            falhas=resumo.erros_download + resumo.erros_metadado_sem_gravacao,
+            canceladas=resumo.canceladas,
+            ja_sincronizados=resumo.ja_sincronizados,
+        )
+
+    def _observar_transferencia(self, sucesso, duracao, bytes_transferidos, tipo_erro=None):
+        """Observador de cada tentativa HTTP: alimenta as estatísticas de vazão e o controle de concorrência."""
+        self._estatisticas_transferencia.registrar(sucesso, duracao, bytes_transferidos, tipo_erro)
+        controle = self._controle_concorrencia
+        if controle is not None:
+            controle.registrar(sucesso, duracao, bytes_transferidos, tipo_erro)
+        if self._metricas is not None:
+            self._metricas.observar_transferencia(sucesso, duracao, bytes_transferidos, tipo_erro)
+
+    def _limite_tarefas_em_voo(self):
+        """
+        Com a concorrência adaptativa, o limite é o do controle AIMD. Sem ela, no motor asyncio
+        o limite acompanha o número de transferências simultâneas do event loop.
+        """
+        controle = self._controle_concorrencia
+        if controle is not None:
+            return controle.limite
+        if self._motor_async is not None:
+            return max(self._max_tarefas_em_voo, self._motor_async.max_transferencias)
+        return self._max_tarefas_em_voo
+
+    def _submeter_chamada(self, chamada, url_base, diretorio_destino,
+                          download_metadata_with_recording, download_metadata_without_recording):
+        """Submete o processamento de uma chamada ao executor. Retorna (future, tipo_tarefa)."""
+        tem_gravacao = 'gravacao' in chamada and bool(chamada.get('gravacao'))
+
+        if tem_gravacao and self._motor_async is not None:
+             future = self._motor_async.submeter_download(
+                 url_base, chamada, diretorio_destino, self._log_and_status, self._cancel_event,
+                 download_metadata_with_recording, download_metadata_without_recording,
+                 observador_transferencia=self._observar_transferencia,
+                 manifest=self._manifest,
+                 tentativa_unica=True,
+                 metadata_sink=self._metadata_sink,
+                 eventos=self.eventos
+             )
+             return future, 'download'
+
+        chamada_id = chamada.get('id', 'desconhecido')
+        if tem_gravacao:
+             # Passa as duas opções de metadado para baixar_gravacao
+             future = self._executor.submit(
+                 tracing.com_span(baixar_gravacao, "tarefa.download", "tarefa", id=chamada_id), url_base, chamada, diretorio_destino, self._log_and_status, self._cancel_event,
+                 download_metadata_with_recording, download_metadata_without_recording, # --- PASSA AS OPÇÕES ---
+                 sessao_http=self._http_pool,
+                 observador_transferencia=self._observar_transferencia,
+                 manifest=self._manifest,
+                 tentativa_unica=True,
+                 metadata_sink=self._metadata_sink,
+                 eventos=self.eventos
+             )
+             return future, 'download'
+
+        # Passa as duas opções de metadado para _processar_sem_gravacao
+        future = self._executor.submit(
+            tracing.com_span(self._processar_sem_gravacao, "tarefa.metadado_sem_gravacao", "tarefa", id=chamada_id), chamada, self._log_and_status, diretorio_destino, self._cancel_event,
+            download_metadata_with_recording, download_metadata_without_recording # --- PASSA AS OPÇÕES ---
+        )
+        return future, 'metadado_sem_gravacao'
+
+    def _aguardar_tarefas(self, tarefas_em_voo, resumo, bloquear=True):
+        """
+        Aguarda ao menos uma tarefa em andamento terminar (ou a próxima retentativa vencer),
+        contabiliza o resultado no resumo e a remove de tarefas_em_voo. Falhas transitórias
+        com tentativas restantes são reagendadas em vez de contabilizadas.
+        Com o limite de tarefas em andamento cheio, uma retentativa vencida não poderia ser submetida:
+        nesse caso a espera é só pela próxima tarefa concluída (sem timeout), para não girar em vão.
+        Com bloquear=False, apenas recolhe as tarefas que já terminaram, sem esperar.
+        """
+        timeout = None
+        if not bloquear:
+            timeout = 0
+        elif len(tarefas_em_voo) < self._limite_tarefas_em_voo():
+            timeout = self._agendador_retentativas.tempo_ate_proximo()
+        with tracing.span("controlador.aguardar", "controlador", em_voo=len(tarefas_em_voo)):
+            concluidas, _ = concurrent.futures.wait(tarefas_em_voo, timeout=timeout,
+                                                    return_when=concurrent.futures.FIRST_COMPLETED)
+
+        if self._cancel_event and self._cancel_event.is_set():
+            logger.debug("Controlador: Evento de cancelamento detectado ao aguardar tarefas.")
+
+        for future in concluidas:
+            chamada, tipo_tarefa, tentativa = tarefas_em_voo.pop(future)
+            if tipo_tarefa == 'download':
+                self._downloads_em_voo -= 1
+            chamada_id = chamada.get('id', 'desconhecido')
+            if self._reagendar_se_transitoria(future, chamada, tentativa, resumo):
+                continue
+
+            resumo.processados += 1
+            self._update_progress(resumo.processados, self._total_items_to_process)
+
+            try:
+                result = future.result()
+                if result is False:
+                    if tipo_tarefa == 'download':
+                         logger.warning(f"DownloadController: Tarefa de download falhou para Chamada ID {chamada_id}.")
+                    elif tipo_tarefa == 'metadado_sem_gravacao':
+                         logger.warning(f"DownloadController: Tarefa de gerar metadado para Chamada ID {chamada_id} (sem gravação) falhou.")
+                if result is True or result is False:
+                    resumo.registrar_resultado(tipo_tarefa, result)
+                self._registrar_estado(chamada_id, ESTADO_FALHA if result is False else ESTADO_CONCLUIDO)
+                if result is False:
+                    self._registrar_pendencia_sincronizacao(chamada)
+
+            except DownloadCancelledError:
+                resumo.canceladas += 1
+                self._registrar_estado(chamada_id, ESTADO_CANCELADO)
+                self._registrar_pendencia_sincronizacao(chamada)
+                logger.debug(f"Controlador: Tarefa para Chamada ID {chamada_id} relatou cancelamento.")
+
+            except TransferenciaRetentavelError as e:
+                if self._cancel_event and self._cancel_event.is_set():
+                    resumo.canceladas += 1
+                    self._registrar_estado(chamada_id, ESTADO_CANCELADO)
+                    self._registrar_pendencia_sincronizacao(chamada)
+                    continue
+                # Tentativas esgotadas para a categoria do erro: falha definitiva.
+                resumo.registrar_resultado(tipo_tarefa, False)
+                self._registrar_estado(chamada_id, ESTADO_FALHA)
+                self._registrar_pendencia_sincronizacao(chamada)
+                self.eventos.publicar(TransferFailed(chamada_id, e.tipo_erro, tentativa))
+                if e.caminho_arquivo_local:
+                    gerar_metadado_de_falha(chamada, e.caminho_arquivo_local, "_DOWNLOAD_FAILED.txt", self._log_and_status,
+                                            self._download_metadata_with_recording, contexto="falha final",
+                                            metadata_sink=self._metadata_sink)
+
+            except Exception as exc:
+                resumo.registrar_resultado(tipo_tarefa, False)
+                self._registrar_estado(chamada_id, ESTADO_FALHA)
+                self._registrar_pendencia_sincronizacao(chamada)
+                mensagem_erro = f"Controlador: Ocorreu uma exceção não tratada ao processar a chamada ID {chamada_id}: {exc}"
+                self._log_and_status(mensagem_erro, level=logging.ERROR)
+                logger.exception(f"DownloadController: Exceção não tratada ao processar chamada ID {chamada_id}")
+
+    def _reagendar_se_transitoria(self, future, chamada, tentativa, resumo):
+        """
+        Se a tarefa falhou por um erro transitório e a política da categoria permite nova tentativa,
+        agenda a retentativa com backoff exponencial e jitter e retorna True.
+        """
+        if future.cancelled():
+            return False
+        erro = future.exception()
+        if not isinstance(erro, TransferenciaRetentavelError):
+            return False
+        if self._cancel_event and self._cancel_event.is_set():
+            return False
+        atraso = calcular_atraso_retentativa(erro.tipo_erro, tentativa, erro.retry_after)
+        if atraso is None:
+            return False
+
+        self._agendador_retentativas.agendar((chamada, tentativa + 1), atraso)
+        resumo.retentativas += 1
+        self.eventos.publicar(Retry(chamada.get('id', 'desconhecido'), erro.tipo_erro, tentativa, atraso))
+        return True
+
+    def _submeter_retentativas_vencidas(self, tarefas_em_voo, resumo):
+        """
+        Submete as retentativas vencidas, respeitando o limite de tarefas em andamento.
+        No cancelamento, descarta as retentativas pendentes, contabilizando-as como canceladas.
+        """
+        agendador = self._agendador_retentativas
+        if not agendador:
+            return
+        if self._cancel_event and self._cancel_event.is_set():
+            for chamada, _ in agendador.retirar_todos():
+                resumo.processados += 1
+                resumo.canceladas += 1
+                self._registrar_estado(chamada.get('id', 'desconhecido'), ESTADO_CANCELADO)
+                self._registrar_pendencia_sincronizacao(chamada)
+            self._update_progress(resumo.processados, self._total_items_to_process)
+            return
+
+        while len(tarefas_em_voo) < self._limite_tarefas_em_voo():
+            item = agendador.retirar_vencido()
+            if item is None:
+                return
+            chamada, tentativa = item
+            future, tipo_tarefa = self._submeter_chamada(
+                chamada, self._url_base, self._diretorio_destino,
+                self._download_metadata_with_recording, self._download_metadata_without_recording
+            )
+            tarefas_em_voo[future] = (chamada, tipo_tarefa, tentativa)
+            if tipo_tarefa == 'download':
+                self._downloads_em_voo += 1
+
+    def _aguardar_retentativa(self):
+        """Sem tarefas em andamento, aguarda a próxima retentativa vencer (ou o cancelamento)."""
+        espera = self._agendador_retentativas.tempo_ate_proximo()
+        if espera is None:
+            return
+        if self._cancel_event:
+            self._cancel_event.wait(espera)
+        else:
+            time.sleep(espera)
+
+    def _produzir_registros(self, url_api, datainicio_str, datafim_str, fila_trabalho, consumidor_encerrado):
+        """
+        Thread produtora: percorre as páginas da API e coloca cada registro na fila de trabalho.
+        Sempre termina colocando um _FimDaListagem na fila, com o erro ocorrido (se houver),
+        a menos que o orquestrador já tenha deixado de consumir a fila (consumidor_encerrado).
+        """
+        erro = None
+        total_listado = 0
+        journal = self._journal
+        try:
+            if journal is not None and journal.retomado:
+                self._log_and_status(f"Controlador: Retomando job interrompido a partir do journal ({journal.total_listado} registros já listados).")
+                for chamada in journal.registros_gravados():
+                    if not self._colocar_na_fila(fila_trabalho, chamada, consumidor_encerrado):
+                        raise DownloadCancelledError("Processo cancelado pelo usuário durante a retomada do job.")
+                total_listado = journal.total_listado
+                self._total_items_to_process = total_listado
+                self._update_progress_maximum(total_listado)
+                if journal.listagem_concluida:
+                    return
+                if journal.cursor:
+                    self._log_and_status(f"Controlador: Continuando a listagem da API a partir de {journal.cursor}.")
+                    datainicio_str = journal.cursor
+
+            instante = time.monotonic()
+            for pagina in iterar_paginas_chamadas(url_api, datainicio_str, datafim_str,
+                                                  status_callback=self._log_and_status,
+                                                  cancel_event=self._cancel_event,
+                                                  sessao_http=self._http_pool,
+                                                  granularidade_particao=self._granularidade_listagem,
+                                                  cache_listagem=self._cache_listagem):
+                espera_pagina = time.monotonic() - instante
+                with tracing.span("listagem.pagina", "listagem", registros=len(pagina)):
+                    self._catalogar_pagina(pagina)
+                    cursor = self._cursor_da_pagina(pagina)
+                    # Descarta o que já foi sincronizado no segundo da marca d'água e o que o filtro do chamador rejeitar.
+                    pagina = self._filtrar_registros(pagina)
+                    if journal is not None:
+                        # Write-ahead: a página é gravada no journal antes de entrar na fila de trabalho.
+                        pagina = journal.registrar_pagina(pagina, cursor)
+                # Tempo bloqueado na fila de trabalho cheia: a listagem está à frente dos downloads.
+                with tracing.span("listagem.fila", "listagem", registros=len(pagina)):
+                    for chamada in pagina:
+                        if not self._colocar_na_fila(fila_trabalho, chamada, consumidor_encerrado):
+                            raise DownloadCancelledError("Processo cancelado pelo usuário durante a obtenção de dados da API.")
+                total_listado += len(pagina)
+                self._total_items_to_process = total_listado
+                self._update_progress_maximum(total_listado)
+                if self.eventos.tem_assinantes(ListingPage):
+                    self.eventos.publicar(ListingPage(len(pagina), total_listado, cursor, espera_pagina))
+                instante = time.monotonic()
+            if journal is not None:
+                journal.registrar_fim_listagem()
+        except (DownloadCancelledError, ListagemAPIError) as e:
+            erro = e
+        except Exception as e:
+            logger.exception("Controlador: Erro inesperado na thread de listagem da API.")
+            erro = ListagemAPIError(f"Erro inesperado durante a listagem da API: {e}")
+        finally:
+            self._colocar_na_fila(fila_trabalho, _FimDaListagem(erro), consumidor_encerrado, ignorar_cancelamento=True)
+
+    def _cursor_da_pagina(self, pagina):
+        """
+        Cursor da listagem após uma página: a maior datahora listada. Só é válido na listagem sequencial,
+        em que as páginas chegam em ordem cronológica; na particionada, a retomada lista o período
+        novamente e o journal descarta os registros repetidos.
+        """
+        if self._granularidade_listagem:
+            return None
+        datahoras = [chamada.get('datahora') for chamada in pagina if chamada.get('datahora')]
+        return max(datahoras) if datahoras else None
+
+    def _colocar_na_fila(self, fila_trabalho, item, consumidor_encerrado, ignorar_cancelamento=False):
+        """
+        Coloca um item na fila limitada, desistindo se o processo for cancelado ou se o orquestrador
+        deixou de consumir a fila (consumidor_encerrado). Retorna True se colocou.
+        """
+        while not consumidor_encerrado.is_set():
+            if not ignorar_cancelamento and self._cancel_event and self._cancel_event.is_set():
+                return False
+            try:
+                fila_trabalho.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _consumir_registros(self, fila_trabalho):
+        """
+        Gerador consumidor da fila de trabalho: produz os registros à medida que chegam, e None quando
+        nenhum registro chega em meio segundo, devolvendo o controle ao orquestrador enquanto a listagem
+        está lenta. Levanta ListagemAPIError se a listagem falhou e DownloadCancelledError se foi cancelada.
+        """
+        while True:
+            try:
+                item = fila_trabalho.get(timeout=0.5)
+            except queue.Empty:
+                yield None
+                continue
+            if isinstance(item, _FimDaListagem):
+                if item.erro is not None:
+                    raise item.erro
+                return
+            yield item
+
+
     # Adicionar os dois parâmetros de metadado aqui
     def _processar_sem_gravacao(self, chamada, status_callback, diretorio_raiz, cancel_event,
                                  download_metadata_with_recording, download_metadata_without_recording): # --- NOVOS PARAMS ---
@@ -300,11 +1045,7 @@ class DownloadController:
         """
         # --- Verifica a opção de metadado SEM gravação ANTES de processar ---
         if not download_metadata_without_recording:
-             chamada_id = chamada.get('id', 'desconhecido')
-             mensagem = f"Chamada: ID {chamada_id} - Não possui gravação. Geração de metadado ignorada conforme opção."
-             if status_callback:
-                 status_callback(mensagem, level=logging.DEBUG)
-             logger.debug(f"Controlador._processar_sem_gravacao: {mensagem}")
+             informar_sem_gravacao(chamada, False, eventos=self.eventos)
              return True
 
         if cancel_event and cancel_event.is_set():
@@ -315,17 +1056,22 @@ class DownloadController:
         numero_chamada = chamada.get('numero', 'desconhecido')
         datahora_chamada = chamada.get('datahora', 'desconhecido')
 
+        metadata_sink = self._metadata_sink
+        if metadata_sink is not None:
+            # Formato em lote: o registro vai para o arquivo diário, sem criar diretórios por chamada.
+            caminho_metadado = gerar_arquivo_metadado(chamada, None, status_callback, metadata_sink, SITUACAO_SEM_GRAVACAO)
+            if caminho_metadado is None:
+                return False
+            if self._manifest is not None:
+                self._manifest.registrar(chamada_id, TIPO_METADADO_SEM_GRAVACAO, caminho_metadado)
+            return True
+
         datahora_str = datahora_chamada
-        ano, mes_str, dia_str = "0000", "00", "00"
-        hora_min_seg = "000000"
+        componentes = COMPONENTES_DATAHORA_PADRAO
 
         try:
              if datahora_str:
-                  data_chamada = datetime.strptime(datahora_str, '%Y-%m-%d %H:%M:%S')
-                  ano = str(data_chamada.year)
-                  mes_str = f"{data_chamada.month:02d}"
-                  dia_str = f"{data_chamada.day:02d}"
-                  hora_min_seg = data_chamada.strftime('%H%M%S')
+                  componentes = componentes_datahora(datahora_str)
              else:
                   logger.warning(f"Controlador._processar_sem_gravacao: Campo 'datahora' vazio ou inválido para a chamada com ID {chamada_id}. Usando data padrão (0000/00/00) para metadado sem gravação.")
 
@@ -337,6 +1083,7 @@ class DownloadController:
              diretorio_raiz = config.DIRETORIO_BASE_GRAVACOES
              logger.warning(f"Controlador._processar_sem_gravacao: Diretório raiz vazio para Chamada ID {chamada_id}. Usando diretório do config: {diretorio_raiz}")
 
+        ano, mes_str, dia_str, _ = componentes
         diretorio_base_metadado = os.path.join(diretorio_raiz, "Metadata_Only")
         diretorio_destino_dia = os.path.join(diretorio_base_metadado, ano, mes_str, dia_str)
 
@@ -349,17 +1096,17 @@ class DownloadController:
              return False
 
 
-        nome_arquivo_base = f"{ano}_{mes_str}_{dia_str}_{numero_chamada}_{hora_min_seg}_{chamada_id}"
+        nome_arquivo_base = nome_base_arquivo(componentes, numero_chamada, chamada_id)
         caminho_arquivo_metadado_sem_gravacao = os.path.join(diretorio_destino_dia, f"{nome_arquivo_base}_METADADO_SEM_GRAVACAO.txt")
 
         try:
-            mensagem = f"Chamada: Número {numero_chamada} em {datahora_chamada} (ID {chamada_id}) - Não possui gravação. Gerando apenas metadado em pasta separada."
-            if status_callback:
-                 status_callback(mensagem)
-            logger.info(f"Controlador._processar_sem_gravacao: {mensagem}")
+            informar_sem_gravacao(chamada, True, eventos=self.eventos)
 
             # gerar_arquivo_metadado já verifica cancelamento internamente se o parâmetro for passado
-            gerar_arquivo_metadado(chamada, caminho_arquivo_metadado_sem_gravacao, status_callback)
+            gerar_arquivo_metadado(chamada, caminho_arquivo_metadado_sem_gravacao, status_callback, eventos=self.eventos)
+            manifest = self._manifest
+            if manifest is not None and os.path.exists(caminho_arquivo_metadado_sem_gravacao):
+                manifest.registrar(chamada_id, TIPO_METADADO_SEM_GRAVACAO, caminho_arquivo_metadado_sem_gravacao)
             return True
 
         except Exception as e:
@@ -370,23 +1117,72 @@ class DownloadController:
             return False
 
 
-    def _log_and_status(self, message, level=logging.INFO):
-        if level == logging.INFO:
-            logger.info(message)
-        elif level == logging.WARNING:
-            logger.warning(message)
-        elif level == logging.ERROR:
-            logger.error(message)
-        elif level == logging.DEBUG:
-             logger.debug(message)
-
-
-        if self._status_callback:
-            try:
-                self._status_callback(message, level)
-            except Exception as e:
-                logger.error(f"Controlador: Erro ao chamar status_callback: {e} - Mensagem: {message}",
-                             exc_info=True)
+    def estatisticas_pool_http(self):
+        """
+        Retorna os contadores do pool de conexões HTTP do download em andamento
+        (requisicoes, hits = conexões reutilizadas, misses = novos handshakes TCP/TLS),
+        ou None se não houver download em execução.
+        """
+        http_pool = self._http_pool
+        if http_pool is None:
+            return None
+        return http_pool.estatisticas()
+
+    def _log_estatisticas_pool_http(self):
+        if self._motor_async is not None:
+            estatisticas_async = self._motor_async.estatisticas()
+            self._log_and_status(
+                f"Controlador: Motor asyncio - Requisições: {estatisticas_async['requisicoes']}, "
+                f"conexões reutilizadas (hits): {estatisticas_async['hits']}, "
+                f"novas conexões (misses): {estatisticas_async['misses']}"
+            )
+        estatisticas = self.estatisticas_pool_http()
+        if not estatisticas:
+            return
+        self._log_and_status(
+            f"Controlador: Pool HTTP - Requisições: {estatisticas['requisicoes']}, "
+            f"conexões reutilizadas (hits): {estatisticas['hits']}, "
+            f"novas conexões (misses): {estatisticas['misses']}, "
+            f"taxa de reuso: {estatisticas['taxa_reuso']:.1%}"
+        )
+
+    def _log_controle_concorrencia(self):
+        controle = self._controle_concorrencia
+        if controle is None:
+            return
+        estado = controle.snapshot()
+        latencia = f"{estado['latencia_media']:.2f}s" if estado['latencia_media'] is not None else "n/d"
+        self._log_and_status(
+            f"Controlador: Concorrência adaptativa - Limite final: {estado['limite']} transferências simultâneas, "
+            f"reduções por sobrecarga: {estado['reducoes']}, latência média: {latencia}, "
+            f"taxa de erros recente: {estado['taxa_erros']:.1%}"
+        )
+
+    def _log_vazao(self, processados, duracao):
+        """Registra a vazão do processo (registros/s e MB/s), para comparar os motores de download."""
+        estatisticas = self._estatisticas_transferencia
+        if estatisticas is None or duracao <= 0:
+            return
+        motor = MOTOR_ASYNCIO if self._motor_async is not None else MOTOR_THREADS
+        megabytes = estatisticas.bytes_transferidos / (1024 * 1024)
+        self._log_and_status(
+            f"Controlador: Motor de download: {motor} | Duração: {duracao:.1f}s | "
+            f"Vazão: {processados / duracao:.1f} registros/s, {megabytes / duracao:.2f} MB/s "
+            f"({megabytes:.1f} MB em {estatisticas.tentativas} tentativas de transferência)"
+        )
+
+    def _log_and_status(self, message, level=logging.INFO, cancelamento=False):
+        """Registra a mensagem no log e a publica como StatusMessage (se houver assinantes para o nível)."""
+        logger.log(level, message)
+        if self.eventos.tem_assinantes(StatusMessage, level):
+            self.eventos.publicar(StatusMessage(message, level, cancelamento))
+
+    def _repassar_status(self, evento):
+        """Assinante dos eventos de status que os entrega ao status_callback como (mensagem, nível)."""
+        self._status_callback(evento.mensagem(), evento.nivel)
+
+    def _registrar_evento_no_log(self, evento):
+        logger.log(evento.nivel, evento.mensagem())
 
     def _update_progress(self, value, total=None):
         if self._progress_callback:
@@ -406,6 +1202,14 @@ class DownloadController:
         else:
              logger.debug(f"Controlador: progress_maximum_callback não configurado. Máximo: {maximum}")
 
+    def _update_concurrency(self, limite):
+        """Chama o callback com o limite de concorrência atual."""
+        if self._concurrency_callback:
+            try:
+                self._concurrency_callback(limite)
+            except Exception as e:
+                logger.error(f"Controlador: Erro ao chamar concurrency_callback: {e} - Limite: {limite}", exc_info=True)
+
     def _get_download_directory(self):
         if self._directory_getter:
             try:
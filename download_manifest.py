@@ -0,0 +1,135 @@
+# download_manifest.py
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Arquivo do manifesto, criado na raiz do diretório de destino.
+NOME_ARQUIVO_MANIFESTO = ".widevoice_manifest.sqlite3"
+
+TIPO_GRAVACAO = 'gravacao'
+TIPO_METADADO_SEM_GRAVACAO = 'metadado_sem_gravacao'
+
+# Intervalo máximo (segundos) entre commits dos registros acumulados.
+INTERVALO_COMMIT = 1.0
+
+
+class DownloadManifest:
+    """
+    Manifesto persistente (SQLite) dos itens já concluídos em um diretório de destino,
+    indexado pelo 'id' da chamada. Guarda caminho (relativo à raiz), tamanho e SHA-256
+    de cada gravação baixada, e o caminho do metadado das chamadas sem gravação.
+
+    O controlador consulta o manifesto antes de submeter cada registro: itens concluídos
+    cujo arquivo ainda existe em disco (com o mesmo tamanho) não geram nenhuma transferência.
+    Itens que falharam nunca são registrados e, portanto, são processados novamente.
+
+    Seguro para uso por várias threads; os registros são gravados em lote a cada
+    INTERVALO_COMMIT segundos e ao fechar.
+    """
+
+    def __init__(self, diretorio_raiz, intervalo_commit=INTERVALO_COMMIT):
+        self._diretorio_raiz = os.path.abspath(diretorio_raiz)
+        self._intervalo_commit = intervalo_commit
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self._ultimo_commit = time.monotonic()
+
+        os.makedirs(self._diretorio_raiz, exist_ok=True)
+        self.caminho = os.path.join(self._diretorio_raiz, NOME_ARQUIVO_MANIFESTO)
+        self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            """
+            CREATE TABLE IF NOT EXISTS itens (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                caminho TEXT NOT NULL,
+                tamanho INTEGER,
+                sha256 TEXT,
+                com_metadado INTEGER NOT NULL DEFAULT 0,
+                atualizado_em TEXT NOT NULL
+            )
+            """
+        )
+        self._conexao.commit()
+        logger.info(f"DownloadManifest: Manifesto aberto em {self.caminho} ({self.total()} itens concluídos).")
+
+    def ja_concluido(self, chamada_id, tipo, exigir_metadado=False):
+        """
+        Retorna True se o item já foi concluído e o arquivo correspondente ainda está em disco.
+        Para gravações, o tamanho em disco deve coincidir com o registrado; com exigir_metadado,
+        o item só conta como concluído se o metadado também foi gerado.
+        """
+        if chamada_id in (None, '', 'desconhecido'):
+            return False
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT tipo, caminho, tamanho, com_metadado FROM itens WHERE id = ?", (str(chamada_id),)
+            ).fetchone()
+        if linha is None:
+            return False
+
+        tipo_registrado, caminho_relativo, tamanho, com_metadado = linha
+        if tipo_registrado != tipo or (exigir_metadado and not com_metadado):
+            return False
+
+        try:
+            tamanho_em_disco = os.path.getsize(os.path.join(self._diretorio_raiz, caminho_relativo))
+        except OSError:
+            return False
+        return tamanho is None or tamanho_em_disco == tamanho
+
+    def registrar(self, chamada_id, tipo, caminho, tamanho=None, sha256=None, com_metadado=False):
+        """Registra (ou atualiza) um item concluído. O caminho é armazenado relativo à raiz do destino."""
+        if chamada_id in (None, '', 'desconhecido'):
+            return
+        caminho_relativo = os.path.relpath(os.path.abspath(caminho), self._diretorio_raiz)
+        try:
+            with self._lock:
+                self._conexao.execute(
+                    "INSERT OR REPLACE INTO itens (id, tipo, caminho, tamanho, sha256, com_metadado, atualizado_em) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(chamada_id), tipo, caminho_relativo, tamanho, sha256, int(bool(com_metadado)),
+                     datetime.now().isoformat(timespec='seconds')),
+                )
+                self._pendentes += 1
+                if time.monotonic() - self._ultimo_commit >= self._intervalo_commit:
+                    self._commit()
+        except sqlite3.Error as e:
+            logger.error(f"DownloadManifest: Erro ao registrar Chamada ID {chamada_id} no manifesto: {e}", exc_info=True)
+
+    def remover(self, chamada_id):
+        """Remove um item do manifesto, forçando seu processamento na próxima execução."""
+        with self._lock:
+            self._conexao.execute("DELETE FROM itens WHERE id = ?", (str(chamada_id),))
+            self._pendentes += 1
+            self._commit()
+
+    def total(self):
+        with self._lock:
+            return self._conexao.execute("SELECT COUNT(*) FROM itens").fetchone()[0]
+
+    def _commit(self):
+        # Chamado com self._lock adquirido.
+        if self._pendentes:
+            self._conexao.commit()
+            self._pendentes = 0
+        self._ultimo_commit = time.monotonic()
+
+    def fechar(self):
+        """Grava os registros pendentes e fecha o manifesto."""
+        with self._lock:
+            if self._conexao is None:
+                return
+            try:
+                self._commit()
+            finally:
+                self._conexao.close()
+                self._conexao = None
+        logger.debug("DownloadManifest: Manifesto fechado.")
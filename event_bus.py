@@ -0,0 +1,239 @@
+# event_bus.py
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Evento:
+    """
+    Base dos eventos publicados no EventBus. Cada evento guarda apenas os dados (sem texto formatado);
+    a mensagem legível é montada por mensagem() somente quando um assinante a pede.
+    'nome' identifica o evento fora do processo (ex.: JSON lines da CLI); 'nivel' segue os níveis do logging.
+    """
+    __slots__ = ()
+    nome = 'evento'
+    nivel = logging.INFO
+    cancelamento = False
+
+    def mensagem(self):
+        return self.nome
+
+    def campos(self):
+        """Dados do evento como dict (sem formatação), para serialização."""
+        return {campo: getattr(self, campo) for tipo in type(self).__mro__ for campo in getattr(tipo, '__slots__', ())}
+
+
+class StatusMessage(Evento):
+    """Mensagem de status em texto livre (avisos, erros, resumo do processo)."""
+    __slots__ = ('texto', 'nivel', 'cancelamento')
+    nome = 'status'
+
+    def __init__(self, texto, nivel=logging.INFO, cancelamento=False):
+        self.texto = texto
+        self.nivel = nivel
+        self.cancelamento = cancelamento
+
+    def mensagem(self):
+        return self.texto
+
+
+class ListingPage(Evento):
+    """Uma página da listagem da API entrou na fila de trabalho (duracao: espera pela página, em segundos)."""
+    __slots__ = ('registros', 'total_listado', 'cursor', 'duracao')
+    nome = 'pagina_listagem'
+    nivel = logging.DEBUG
+
+    def __init__(self, registros, total_listado, cursor=None, duracao=None):
+        self.registros = registros
+        self.total_listado = total_listado
+        self.cursor = cursor
+        self.duracao = duracao
+
+    def mensagem(self):
+        return f"Controlador: Página da listagem com {self.registros} registros (total listado: {self.total_listado})."
+
+
+class TransferStarted(Evento):
+    """Início de uma tentativa de download de gravação."""
+    __slots__ = ('chamada_id', 'url', 'offset')
+    nome = 'transferencia_iniciada'
+    nivel = logging.DEBUG
+
+    def __init__(self, chamada_id, url, offset=0):
+        self.chamada_id = chamada_id
+        self.url = url
+        self.offset = offset
+
+    def mensagem(self):
+        if self.offset:
+            return f"Retomando gravação da chamada {self.chamada_id} a partir do byte {self.offset}: {self.url}"
+        return f"Tentando baixar gravação da chamada {self.chamada_id}: {self.url}"
+
+
+class TransferProgress(Evento):
+    """Bytes gravados até agora na tentativa atual (publicado por bloco, apenas se houver assinantes)."""
+    __slots__ = ('chamada_id', 'bytes_transferidos', 'tamanho_total')
+    nome = 'transferencia_progresso'
+    nivel = logging.DEBUG
+
+    def __init__(self, chamada_id, bytes_transferidos, tamanho_total=None):
+        self.chamada_id = chamada_id
+        self.bytes_transferidos = bytes_transferidos
+        self.tamanho_total = tamanho_total
+
+    def mensagem(self):
+        total = f"/{self.tamanho_total}" if self.tamanho_total else ""
+        return f"Chamada ID {self.chamada_id}: {self.bytes_transferidos}{total} bytes transferidos."
+
+
+class TransferDone(Evento):
+    """Gravação baixada e movida para o destino final."""
+    __slots__ = ('chamada_id', 'nome_arquivo', 'tamanho', 'duracao')
+    nome = 'transferencia_concluida'
+
+    def __init__(self, chamada_id, nome_arquivo, tamanho, duracao):
+        self.chamada_id = chamada_id
+        self.nome_arquivo = nome_arquivo
+        self.tamanho = tamanho
+        self.duracao = duracao
+
+    def mensagem(self):
+        return f"Download bem-sucedido: {self.nome_arquivo} (Chamada ID {self.chamada_id})."
+
+
+class TransferFailed(Evento):
+    """Falha definitiva de um download, após esgotar as tentativas da categoria do erro."""
+    __slots__ = ('chamada_id', 'tipo_erro', 'tentativas')
+    nome = 'transferencia_falhou'
+    nivel = logging.ERROR
+
+    def __init__(self, chamada_id, tipo_erro, tentativas):
+        self.chamada_id = chamada_id
+        self.tipo_erro = tipo_erro
+        self.tentativas = tentativas
+
+    def mensagem(self):
+        return f"Falha final ao baixar gravação ID {self.chamada_id} após {self.tentativas} tentativa(s) ({self.tipo_erro})."
+
+
+class Retry(Evento):
+    """Falha transitória com nova tentativa agendada pelo orquestrador."""
+    __slots__ = ('chamada_id', 'tipo_erro', 'tentativa', 'atraso')
+    nome = 'retentativa'
+
+    def __init__(self, chamada_id, tipo_erro, tentativa, atraso):
+        self.chamada_id = chamada_id
+        self.tipo_erro = tipo_erro
+        self.tentativa = tentativa
+        self.atraso = atraso
+
+    def mensagem(self):
+        return (f"Controlador: Falha transitória ({self.tipo_erro}) na Chamada ID {self.chamada_id}, "
+                f"tentativa {self.tentativa}. Nova tentativa agendada em {self.atraso:.1f}s.")
+
+
+class MetadataGenerated(Evento):
+    """Arquivo TXT de metadado de uma chamada gravado em disco (os formatos em lote não publicam por registro)."""
+    __slots__ = ('chamada_id', 'caminho')
+    nome = 'metadado_gerado'
+
+    def __init__(self, chamada_id, caminho):
+        self.chamada_id = chamada_id
+        self.caminho = caminho
+
+    def mensagem(self):
+        return f"Arquivo de metadado gerado: {os.path.basename(self.caminho)}"
+
+
+class RecordSkipped(Evento):
+    """
+    Chamada sem gravação: nenhum download. Com gera_metadado, apenas o metadado é gerado (nível INFO);
+    sem ele, o registro é ignorado conforme a opção (nível DEBUG).
+    """
+    __slots__ = ('chamada_id', 'numero', 'datahora', 'gera_metadado')
+    nome = 'registro_sem_gravacao'
+
+    def __init__(self, chamada_id, numero, datahora, gera_metadado):
+        self.chamada_id = chamada_id
+        self.numero = numero
+        self.datahora = datahora
+        self.gera_metadado = gera_metadado
+
+    @property
+    def nivel(self):
+        return logging.INFO if self.gera_metadado else logging.DEBUG
+
+    def mensagem(self):
+        acao = "Gerando apenas metadado em pasta separada." if self.gera_metadado else "Processamento ignorado conforme opção (sem gravação)."
+        return f"Chamada: Número {self.numero} em {self.datahora} (ID {self.chamada_id}) - Não possui gravação. {acao}"
+
+
+# Eventos que têm uma mensagem de status (área de status da GUI, status da CLI, log).
+# TransferProgress fica de fora: é publicado por bloco e interessa apenas a painéis e métricas.
+EVENTOS_DE_STATUS = (StatusMessage, ListingPage, TransferStarted, TransferDone, TransferFailed, Retry,
+                     MetadataGenerated, RecordSkipped)
+
+
+class EventBus:
+    """
+    Barramento de eventos em processo: assinantes (GUI, CLI, log, métricas) registram os tipos de evento
+    que querem receber, opcionalmente a partir de um nível mínimo, e são chamados na thread que publica.
+
+    Para que eventos sem interessados custem quase nada, quem publica no caminho crítico consulta
+    tem_assinantes(tipo) antes de criar o evento; a mensagem só é formatada pelo assinante que a usa.
+    Assinar ou cancelar é raro e recria a tabela de despacho; publicar não usa lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinaturas = []
+        self._despacho = {}
+
+    def assinar(self, tipos_evento, callback, nivel_minimo=logging.NOTSET):
+        """
+        Registra callback(evento) para um tipo de evento (ou tupla de tipos; subclasses incluídas).
+        Eventos abaixo de nivel_minimo não são entregues. Retorna o callback, para cancelar_assinatura.
+        """
+        if not isinstance(tipos_evento, tuple):
+            tipos_evento = (tipos_evento,)
+        with self._lock:
+            self._assinaturas.append((tipos_evento, callback, nivel_minimo))
+            self._despacho = {}
+        return callback
+
+    def cancelar_assinatura(self, callback):
+        with self._lock:
+            self._assinaturas = [assinatura for assinatura in self._assinaturas if assinatura[1] != callback]
+            self._despacho = {}
+
+    def _assinantes(self, tipo_evento):
+        """(callback, nivel_minimo) dos assinantes de um tipo concreto, calculados uma vez por tipo."""
+        despacho = self._despacho
+        assinantes = despacho.get(tipo_evento)
+        if assinantes is None:
+            with self._lock:
+                assinantes = tuple((callback, nivel_minimo) for tipos, callback, nivel_minimo in self._assinaturas
+                                   if issubclass(tipo_evento, tipos))
+                self._despacho[tipo_evento] = assinantes
+        return assinantes
+
+    def tem_assinantes(self, tipo_evento, nivel=None):
+        """True se algum assinante receberia um evento deste tipo (no nível informado ou no nível do tipo)."""
+        if nivel is None:
+            nivel = tipo_evento.nivel
+        for _, nivel_minimo in self._assinantes(tipo_evento):
+            if nivel >= nivel_minimo:
+                return True
+        return False
+
+    def publicar(self, evento):
+        """Entrega o evento aos assinantes, na thread atual. Erros de um assinante não afetam os demais."""
+        for callback, nivel_minimo in self._assinantes(type(evento)):
+            if evento.nivel < nivel_minimo:
+                continue
+            try:
+                callback(evento)
+            except Exception as e:
+                logger.error(f"EventBus: Erro no assinante {callback!r} do evento {evento.nome}: {e}", exc_info=True)
@@ -2,4 +2,30 @@
 
 class DownloadCancelledError(Exception):
     """Exceção levantada quando o download é cancelado."""
-    pass
\ No newline at end of file
+    pass
+
+
+class ListagemAPIError(Exception):
+    """Exceção levantada quando a listagem de chamadas da API falha (erro já reportado ao usuário)."""
+    pass
+
+
+class TransferenciaIncompletaError(Exception):
+    """Exceção levantada quando o arquivo recebido não corresponde ao tamanho anunciado pelo servidor."""
+    pass
+
+
+class TransferenciaRetentavelError(Exception):
+    """
+    Exceção levantada quando uma tentativa de download falha por um erro transitório e a retentativa
+    fica a cargo do chamador (agendador de retentativas do controlador).
+    tipo_erro: categoria de recording_downloader.classificar_erro.
+    retry_after: segundos indicados pelo servidor no cabeçalho Retry-After, se houver.
+    caminho_arquivo_local: destino da gravação, para o metadado de falha se as tentativas se esgotarem.
+    """
+
+    def __init__(self, mensagem, tipo_erro, retry_after=None, caminho_arquivo_local=None):
+        super().__init__(mensagem)
+        self.tipo_erro = tipo_erro
+        self.retry_after = retry_after
+        self.caminho_arquivo_local = caminho_arquivo_local
\ No newline at end of file
@@ -0,0 +1,159 @@
+# follow_mode.py
+import logging
+import random
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from download_controller import DownloadController
+from event_bus import EVENTOS_DE_STATUS, StatusMessage
+from job_journal import ESTADO_CONCLUIDO
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre consultas enquanto a API retorna chamadas novas (segundos).
+INTERVALO_CONSULTA = 30.0
+# Sem chamadas novas ou com falhas, o intervalo dobra a cada ciclo (com jitter) até este limite.
+INTERVALO_MAXIMO = 300.0
+# Fração de jitter aplicada ao intervalo normal, para que várias instâncias não consultem a API em sincronia.
+JITTER_INTERVALO = 0.1
+
+# Sem sincronização anterior, o primeiro ciclo lista a partir de agora menos esta janela.
+JANELA_INICIAL = timedelta(minutes=15)
+
+# Máximo de 'id's concluídos mantidos em memória (os mais antigos saem primeiro).
+LIMITE_IDS_VISTOS = 200000
+
+FORMATO_DATAHORA = "%Y-%m-%d %H:%M:%S"
+
+
+class FollowMode:
+    """
+    Modo contínuo (serviço): consulta a API statusreport em ciclos curtos e baixa as chamadas novas
+    assim que aparecem.
+
+    Cada ciclo é um job do DownloadController em modo incremental: a listagem começa na marca d'água
+    da última sincronização (menos a sobreposição de segurança de sync_state) e vai até o momento da
+    consulta, de modo que a janela consultada é curta enquanto o serviço acompanha a API e uma
+    parada do serviço é recuperada no ciclo seguinte. Os 'id's já concluídos ficam em memória e
+    são descartados da listagem, sem passar pelo manifesto; registros com falha não entram nesse
+    conjunto e são tentados de novo no ciclo seguinte.
+
+    Sem chamadas novas, ou quando o ciclo falha, o intervalo até a próxima consulta dobra (com jitter)
+    até intervalo_maximo; volta ao intervalo normal assim que chegam chamadas novas.
+
+    parar() encerra o serviço ao fim do ciclo atual; parar(cancelar=True) também cancela o ciclo.
+    """
+
+    def __init__(self, url_base, login, token, diretorio_destino, datainicio_str=None,
+                 intervalo=INTERVALO_CONSULTA, intervalo_maximo=INTERVALO_MAXIMO,
+                 status_callback=None, progress_callback=None, opcoes_download=None, opcoes_controlador=None):
+        """
+        datainicio_str: início da primeira sincronização (padrão: agora menos JANELA_INICIAL).
+        opcoes_download: argumentos adicionais de DownloadController.start_download (metadados, motor, ...).
+        opcoes_controlador: argumentos adicionais do DownloadController (max_workers, event_bus, ...).
+        Os eventos dos ciclos e do próprio serviço são publicados em 'eventos' (o EventBus do controlador).
+        """
+        self._url_base = url_base
+        self._login = login
+        self._token = token
+        self._diretorio_destino = diretorio_destino
+        self._datainicio_str = datainicio_str
+        self._intervalo = intervalo
+        self._intervalo_maximo = max(intervalo_maximo, intervalo)
+        self._progress_callback = progress_callback
+        self._opcoes_download = dict(opcoes_download or {})
+
+        self._ids_vistos = OrderedDict()
+        self._lock = threading.Lock()
+        self._evento_parada = threading.Event()
+        self._cancel_event = threading.Event()
+        self._ciclo_concluido = threading.Event()
+        self._ciclos_ociosos = 0
+        self.ciclos = 0
+
+        self._processados_ciclo = 0
+        self._erros_ciclo = 0
+
+        self._controller = DownloadController(
+            status_callback=status_callback,
+            progress_callback=progress_callback,
+            completion_callback=self._ciclo_concluido.set,
+            directory_getter=lambda: self._diretorio_destino,
+            registro_callback=self._registrar_resultado,
+            **(opcoes_controlador or {})
+        )
+        self.eventos = self._controller.eventos
+        self.eventos.assinar(EVENTOS_DE_STATUS, self._contar_erro, nivel_minimo=logging.ERROR)
+
+    def executar(self):
+        """Executa ciclos até parar() ser chamado. Bloqueia a thread chamadora."""
+        self._log_and_status(f"Modo contínuo: Iniciado (intervalo de {self._intervalo:.0f}s, máximo de {self._intervalo_maximo:.0f}s sem chamadas novas).")
+        while not self._evento_parada.is_set():
+            self._executar_ciclo()
+            if self._evento_parada.is_set():
+                break
+            espera = self._proximo_intervalo()
+            logger.info(f"FollowMode: Próxima consulta em {espera:.1f}s.")
+            self._evento_parada.wait(espera)
+        self._log_and_status(f"Modo contínuo: Encerrado após {self.ciclos} ciclo(s).")
+
+    def parar(self, cancelar=False):
+        """Encerra o serviço ao fim do ciclo atual; com cancelar=True, cancela também o ciclo em andamento."""
+        self._evento_parada.set()
+        if cancelar:
+            self._cancel_event.set()
+
+    def _executar_ciclo(self):
+        agora = datetime.now()
+        datainicio_str = self._datainicio_str or (agora - JANELA_INICIAL).strftime(FORMATO_DATAHORA)
+        datafim_str = agora.strftime(FORMATO_DATAHORA)
+        with self._lock:
+            self._processados_ciclo = 0
+            self._erros_ciclo = 0
+        self._ciclo_concluido.clear()
+        self.ciclos += 1
+        logger.info(f"FollowMode: Ciclo {self.ciclos} até {datafim_str}.")
+
+        # Journal e cache de listagem não se aplicam: as janelas mudam a cada ciclo e são sempre recentes;
+        # o manifesto e a marca d'água cobrem a retomada após uma parada.
+        opcoes = dict(self._opcoes_download, usar_journal=False, usar_cache_listagem=False, modo_incremental=True,
+                      filtro_registros=self._filtrar_vistos)
+        opcoes.setdefault('download_metadata_with_recording', True)
+        opcoes.setdefault('download_metadata_without_recording', True)
+        self._controller.start_download(self._url_base, self._login, self._token, datainicio_str, datafim_str,
+                                        self._cancel_event, **opcoes)
+        self._ciclo_concluido.wait()
+
+    def _proximo_intervalo(self):
+        """Intervalo até a próxima consulta: normal com atividade; backoff exponencial com jitter quando ociosa ou com falha."""
+        with self._lock:
+            com_atividade = self._processados_ciclo and not self._erros_ciclo
+        if com_atividade:
+            self._ciclos_ociosos = 0
+            return self._intervalo * random.uniform(1 - JITTER_INTERVALO, 1 + JITTER_INTERVALO)
+        self._ciclos_ociosos += 1
+        teto = min(self._intervalo_maximo, self._intervalo * (2 ** self._ciclos_ociosos))
+        return random.uniform(teto / 2, teto)
+
+    def _filtrar_vistos(self, pagina):
+        with self._lock:
+            return [chamada for chamada in pagina if str(chamada.get('id')) not in self._ids_vistos]
+
+    def _registrar_resultado(self, chamada_id, estado):
+        with self._lock:
+            self._processados_ciclo += 1
+            if estado != ESTADO_CONCLUIDO:
+                return
+            self._ids_vistos[str(chamada_id)] = None
+            self._ids_vistos.move_to_end(str(chamada_id))
+            while len(self._ids_vistos) > LIMITE_IDS_VISTOS:
+                self._ids_vistos.popitem(last=False)
+
+    def _contar_erro(self, evento):
+        with self._lock:
+            self._erros_ciclo += 1
+
+    def _log_and_status(self, message, level=logging.INFO):
+        logger.log(level, message)
+        self.eventos.publicar(StatusMessage(message, level))
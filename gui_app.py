@@ -14,11 +14,46 @@ import logging
 
 import security_manager
 import config
-from download_controller import DownloadController
+from download_controller import DownloadController, MOTOR_THREADS, MOTOR_ASYNCIO
+from metadata_sink import FORMATO_TXT, FORMATO_JSONL, FORMATO_CSV, FORMATO_PARQUET
+from status_buffer import StatusBuffer
+from event_bus import EVENTOS_DE_STATUS
 
 
 logger = logging.getLogger(__name__)
 
+# Opções de listagem da API exibidas na GUI, mapeadas para a granularidade usada pelo controlador.
+OPCOES_LISTAGEM = {
+    "Sequencial": None,
+    "Paralela por dia": "dia",
+    "Paralela por hora": "hora",
+}
+
+# Motores de download exibidos na GUI.
+OPCOES_MOTOR = {
+    "Threads": MOTOR_THREADS,
+    "Asyncio": MOTOR_ASYNCIO,
+}
+
+# Formatos de metadados exibidos na GUI.
+OPCOES_FORMATO_METADADOS = {
+    "TXT por chamada": FORMATO_TXT,
+    "JSONL diário": FORMATO_JSONL,
+    "CSV diário": FORMATO_CSV,
+    "Parquet diário": FORMATO_PARQUET,
+}
+
+# Níveis mínimos das mensagens exibidas na área de status (as demais são descartadas antes de chegar ao Tk).
+OPCOES_NIVEL_STATUS = {
+    "Tudo (depuração)": logging.DEBUG,
+    "Informações": logging.INFO,
+    "Avisos e erros": logging.WARNING,
+}
+
+# A área de status é atualizada em lote a cada tick, e mantém apenas as últimas linhas.
+INTERVALO_ATUALIZACAO_STATUS_MS = 100
+MAX_LINHAS_STATUS = 5000
+
 class WidevoiceDownloaderGUI:
     def __init__(self, master):
         self.master = master
@@ -102,6 +137,52 @@ class WidevoiceDownloaderGUI:
             bootstyle="round-toggle"
         )
         self.download_metadata_without_recording_checkbox.grid(row=1, column=0, padx=5, pady=2, sticky="w")
+
+        # Modo de listagem da API (sequencial ou particionada em janelas paralelas)
+        self.frame_listagem = ttk.Frame(self.frame_opcoes)
+        self.frame_listagem.grid(row=2, column=0, padx=5, pady=2, sticky="w")
+        ttk.Label(self.frame_listagem, text="Listagem da API:").grid(row=0, column=0, padx=(0, 5), sticky="w")
+        self.modo_listagem_var = tk.StringVar(value="Sequencial")
+        self.modo_listagem_combobox = ttk.Combobox(
+            self.frame_listagem,
+            textvariable=self.modo_listagem_var,
+            values=list(OPCOES_LISTAGEM.keys()),
+            state="readonly",
+            width=20
+        )
+        self.modo_listagem_combobox.grid(row=0, column=1, sticky="w")
+
+        ttk.Label(self.frame_listagem, text="Motor de download:").grid(row=0, column=2, padx=(15, 5), sticky="w")
+        self.motor_download_var = tk.StringVar(value="Threads")
+        self.motor_download_combobox = ttk.Combobox(
+            self.frame_listagem,
+            textvariable=self.motor_download_var,
+            values=list(OPCOES_MOTOR.keys()),
+            state="readonly",
+            width=10
+        )
+        self.motor_download_combobox.grid(row=0, column=3, sticky="w")
+
+        ttk.Label(self.frame_listagem, text="Formato dos metadados:").grid(row=1, column=0, padx=(0, 5), pady=(4, 0), sticky="w")
+        self.formato_metadados_var = tk.StringVar(value="TXT por chamada")
+        self.formato_metadados_combobox = ttk.Combobox(
+            self.frame_listagem,
+            textvariable=self.formato_metadados_var,
+            values=list(OPCOES_FORMATO_METADADOS.keys()),
+            state="readonly",
+            width=20
+        )
+        self.formato_metadados_combobox.grid(row=1, column=1, pady=(4, 0), sticky="w")
+
+        # Sincronização incremental: lista apenas as chamadas posteriores à última sincronização
+        self.modo_incremental_var = tk.BooleanVar(value=False)
+        self.modo_incremental_checkbox = ttk.Checkbutton(
+            self.frame_opcoes,
+            text="Sincronização Incremental (desde a última sincronização, até agora)",
+            variable=self.modo_incremental_var,
+            bootstyle="round-toggle"
+        )
+        self.modo_incremental_checkbox.grid(row=3, column=0, padx=5, pady=2, sticky="w")
         # --- Fim do Frame para Opções de Download ---
 
 
@@ -119,6 +200,16 @@ class WidevoiceDownloaderGUI:
         self.progress_bar = ttk.Progressbar(self.frame_botoes_acao, orient="horizontal", length=400, mode="determinate")
         self.progress_bar.grid(row=1, column=0, padx=5, pady=5, sticky="ew", columnspan=1)
 
+        # Limite atual de transferências simultâneas (concorrência adaptativa do controlador)
+        self.concorrencia_label = ttk.Label(self.frame_botoes_acao, text="Paralelismo: -")
+        self.concorrencia_label.grid(row=1, column=1, padx=5, pady=2, sticky="w", columnspan=2)
+
+        # Painel de vazão: estatísticas agregadas do controlador (stats_callback), renderizadas a cada tick
+        self.painel_label = ttk.Label(self.frame_botoes_acao, text=self._formatar_painel(None))
+        self.painel_label.grid(row=2, column=0, padx=5, pady=2, sticky="w", columnspan=3)
+        self._painel_pendente = None
+        self._painel_renderizado = None
+
 
         self.save_button = ttk.Button(self.frame_botoes_acao, text="Salvar Configurações", command=self.salvar_configuracoes_button_click)
         self.save_button.grid(row=0, column=1, padx=5, pady=5, sticky="w")
@@ -130,8 +221,26 @@ class WidevoiceDownloaderGUI:
 
 
         # Área de Status/Log da GUI
-        self.status_label = ttk.Label(master, text="Status:")
-        self.status_label.grid(row=4, column=0, padx=10, pady=2, sticky="w")
+        self.frame_status = ttk.Frame(master)
+        self.frame_status.grid(row=4, column=0, padx=10, pady=2, sticky="ew")
+        self.status_label = ttk.Label(self.frame_status, text="Status:")
+        self.status_label.grid(row=0, column=0, sticky="w")
+        self.frame_status.columnconfigure(0, weight=1)
+        ttk.Label(self.frame_status, text="Exibir:").grid(row=0, column=1, padx=(0, 5), sticky="e")
+        self.nivel_status_var = tk.StringVar(value="Informações")
+        self.nivel_status_combobox = ttk.Combobox(
+            self.frame_status,
+            textvariable=self.nivel_status_var,
+            values=list(OPCOES_NIVEL_STATUS.keys()),
+            state="readonly",
+            width=16
+        )
+        self.nivel_status_combobox.grid(row=0, column=2, sticky="e")
+        self.nivel_status_combobox.bind("<<ComboboxSelected>>", self._atualizar_nivel_status)
+        # Lido pelas threads do download em atualizar_status.
+        self._nivel_status = logging.INFO
+        self._buffer_status = StatusBuffer(capacidade=MAX_LINHAS_STATUS)
+
         self.status_text = scrolledtext.ScrolledText(master, wrap=ttk.WORD, width=80, height=15)
         self.status_text.grid(row=5, column=0, padx=10, pady=10, sticky="nsew")
 
@@ -153,12 +262,14 @@ class WidevoiceDownloaderGUI:
 
         # Cria uma instância do DownloadController, passando os callbacks da GUI
         self.download_controller = DownloadController(
-            status_callback=self.atualizar_status,
-            progress_callback=self.atualizar_progresso,
+            stats_callback=self.atualizar_painel,
             completion_callback=self._process_download_completed,
             directory_getter=self._get_download_directory,
-            progress_maximum_callback=self.atualizar_progresso_maximo
+            progress_maximum_callback=self.atualizar_progresso_maximo,
+            concurrency_callback=self.atualizar_concorrencia
         )
+        # As mensagens de status chegam como eventos do controlador, a partir do nível exibido (_atualizar_nivel_status).
+        self.download_controller.eventos.assinar(EVENTOS_DE_STATUS, self._receber_evento, nivel_minimo=self._nivel_status)
 
 
         # Carregar configurações ao iniciar
@@ -167,6 +278,9 @@ class WidevoiceDownloaderGUI:
         # Garantir que o botão "Iniciar Download" esteja visível ao iniciar
         self._hide_cancel_button()
 
+        # Inicia o tick da interface (mensagens de status e painel de vazão)
+        self.master.after(INTERVALO_ATUALIZACAO_STATUS_MS, self._tick_interface)
+
 
     # --- Métodos Auxiliares para Gerenciar Botões e Estado (seguro para thread - chamados via after) ---
 
@@ -218,37 +332,71 @@ class WidevoiceDownloaderGUI:
 
     # --- Métodos Auxiliares para Atualizar GUI (seguro para thread - chamados via after) ---
 
-    def atualizar_status(self, mensagem, level=logging.INFO):
+    def atualizar_status(self, mensagem, level=logging.INFO, cancelamento=False):
         """
-        Atualiza a área de texto de status (seguro para chamar de qualquer thread).
-        Mapeia o nível de log para uma tag de formatação.
+        Acrescenta uma mensagem à área de status (seguro para chamar de qualquer thread).
+        Mensagens abaixo do nível selecionado são descartadas; as demais vão para o buffer de status,
+        descarregado na área de texto a cada tick da interface (_tick_interface).
+        Mapeia o nível de log (ou o cancelamento) para uma tag de formatação.
         """
+        if level < self._nivel_status:
+            return
         tag = 'info'
-        if level == logging.WARNING:
+        if cancelamento:
+            tag = 'cancelled'
+        elif level == logging.WARNING:
             tag = 'warning'
         elif level == logging.ERROR:
             tag = 'error'
-        elif level == logging.INFO and ("Cancelamento solicitado" in mensagem or "Processo de download cancelado" in mensagem):
-             tag = 'cancelled'
         elif level == logging.DEBUG:
              tag = 'debug'
 
 
+        self._buffer_status.adicionar(mensagem, tag)
+
+    def _tick_interface(self):
+        """Tick da interface: descarrega o buffer de status, renderiza o painel e agenda o próximo tick."""
         try:
-            self.master.after(0, self._inserir_status, mensagem, tag)
+            self._descarregar_status()
+            self._renderizar_painel()
+        finally:
+            self.master.after(INTERVALO_ATUALIZACAO_STATUS_MS, self._tick_interface)
+
+    def _descarregar_status(self):
+        """Insere de uma vez as mensagens acumuladas no buffer, mantendo apenas as últimas MAX_LINHAS_STATUS linhas."""
+        try:
+            mensagens, descartadas = self._buffer_status.retirar_todas()
+            if descartadas:
+                self._inserir_status([(f"... {descartadas} mensagens de status omitidas ...", 'debug')])
+            if mensagens:
+                self._inserir_status(mensagens)
         except Exception as e:
-            logger.error(f"GUI: Erro ao agendar atualização de status: {e} - Mensagem: {mensagem}, Nível: {level}",
-                         exc_info=True)
+            logger.error(f"GUI: Erro ao atualizar a área de status: {e}", exc_info=True)
 
-    def _inserir_status(self, mensagem, tag=None):
+    def _inserir_status(self, mensagens):
         """
-        Metodo interno para inserir texto no widget de status.
+        Metodo interno para inserir um lote de (mensagem, tag) no widget de status.
         """
         try:
-            self.status_text.insert(tk.END, mensagem + "\n", tag)
+            for mensagem, tag in mensagens:
+                self.status_text.insert(tk.END, mensagem + "\n", tag)
+            linhas = int(self.status_text.index('end-1c').split('.')[0]) - 1
+            if linhas > MAX_LINHAS_STATUS:
+                self.status_text.delete('1.0', f"{linhas - MAX_LINHAS_STATUS + 1}.0")
             self.status_text.see(tk.END)
         except Exception as e:
-            logger.error(f"GUI: Erro ao inserir status na GUI: {e} - Mensagem: {mensagem}", exc_info=True)
+            logger.error(f"GUI: Erro ao inserir status na GUI: {e} - Mensagens: {len(mensagens)}", exc_info=True)
+
+    def _receber_evento(self, evento):
+        """Assinante dos eventos de status do controlador (chamado nas threads do download)."""
+        self.atualizar_status(evento.mensagem(), evento.nivel, evento.cancelamento)
+
+    def _atualizar_nivel_status(self, event=None):
+        self._nivel_status = OPCOES_NIVEL_STATUS.get(self.nivel_status_var.get(), logging.INFO)
+        # Reassina com o novo nível: eventos abaixo dele deixam de ser entregues (e de ser formatados).
+        eventos = self.download_controller.eventos
+        eventos.cancelar_assinatura(self._receber_evento)
+        eventos.assinar(EVENTOS_DE_STATUS, self._receber_evento, nivel_minimo=self._nivel_status)
 
 
     def atualizar_progresso(self, valor, total=None):
@@ -297,6 +445,58 @@ class WidevoiceDownloaderGUI:
              logger.error(f"GUI: Erro ao configurar máximo da barra de progresso: {e} - Máximo: {maximum}", exc_info=True)
 
 
+    def atualizar_concorrencia(self, limite):
+         """Exibe o limite atual de transferências simultâneas (seguro para thread)."""
+         try:
+              self.master.after(0, self._configurar_concorrencia, limite)
+         except Exception as e:
+              logger.error(f"GUI: Erro ao agendar atualização do paralelismo: {e} - Limite: {limite}", exc_info=True)
+
+    def atualizar_painel(self, instantaneo):
+         """
+         Recebe as estatísticas agregadas do controlador (seguro para thread). Apenas guarda o último
+         instantâneo; a renderização acontece no tick da interface.
+         """
+         self._painel_pendente = instantaneo
+
+    def _renderizar_painel(self):
+         """Método interno: atualiza a barra de progresso e o painel com o último instantâneo recebido."""
+         instantaneo = self._painel_pendente
+         if instantaneo is None or instantaneo is self._painel_renderizado:
+             return
+         self._painel_renderizado = instantaneo
+         try:
+             total = instantaneo['total']
+             if total:
+                 self.progress_bar['maximum'] = total
+             self._configurar_progresso(instantaneo['processados'], total)
+             self.painel_label.config(text=self._formatar_painel(instantaneo))
+         except Exception as e:
+             logger.error(f"GUI: Erro ao renderizar o painel de vazão: {e}", exc_info=True)
+
+    @staticmethod
+    def _formatar_painel(instantaneo):
+         if instantaneo is None:
+             return "Vazão: - | ETA: - | Transferências ativas: - | Retentativas: - | Falhas: -"
+         eta = instantaneo['eta_segundos']
+         if eta is None:
+             eta_texto = "-"
+         else:
+             horas, resto = divmod(int(eta), 3600)
+             eta_texto = f"{horas}:{resto // 60:02d}:{resto % 60:02d}" if horas else f"{resto // 60:02d}:{resto % 60:02d}"
+         return (f"Vazão: {instantaneo['registros_por_segundo']:.1f} reg/s, {instantaneo['bytes_por_segundo'] / (1024 * 1024):.2f} MB/s | "
+                 f"ETA: {eta_texto} | Transferências ativas: {instantaneo['transferencias_ativas']} | "
+                 f"Retentativas: {instantaneo['retentativas']} ({instantaneo['retentativas_pendentes']} pendentes) | "
+                 f"Falhas: {instantaneo['falhas']}")
+
+    def _configurar_concorrencia(self, limite):
+         """Método interno para atualizar o texto de paralelismo."""
+         try:
+             self.concorrencia_label.config(text=f"Paralelismo: {limite}")
+         except Exception as e:
+             logger.error(f"GUI: Erro ao configurar texto de paralelismo: {e} - Limite: {limite}", exc_info=True)
+
+
     # --- Métodos de Interação da GUI ---
     def selecionar_diretorio(self):
         """Abre uma caixa de diálogo para o usuário selecionar o diretório de destino."""
@@ -324,7 +524,10 @@ class WidevoiceDownloaderGUI:
         logger.info("GUI: Botão 'Iniciar Download' clicado. Coletando dados.")
 
         try:
+            self._buffer_status.limpar()
             self.status_text.delete(1.0, tk.END)
+            self._painel_pendente = None
+            self.painel_label.config(text=self._formatar_painel(None))
             self.atualizar_progresso(0, 0)
             self.progress_bar['maximum'] = 100
         except Exception as e:
@@ -347,6 +550,17 @@ class WidevoiceDownloaderGUI:
         logger.info(f"GUI: Opção 'Baixar Metadados (Com Gravação)' selecionada: {download_metadata_with_recording}")
         logger.info(f"GUI: Opção 'Baixar Metadados (Sem Gravação)' selecionada: {download_metadata_without_recording}")
         # --- Fim da obtenção do estado dos checkboxes ---
+        granularidade_listagem = OPCOES_LISTAGEM.get(self.modo_listagem_var.get())
+        logger.info(f"GUI: Modo de listagem da API selecionado: {self.modo_listagem_var.get()}")
+        motor_download = OPCOES_MOTOR.get(self.motor_download_var.get(), MOTOR_THREADS)
+        logger.info(f"GUI: Motor de download selecionado: {motor_download}")
+        formato_metadados = OPCOES_FORMATO_METADADOS.get(self.formato_metadados_var.get(), FORMATO_TXT)
+        logger.info(f"GUI: Formato dos metadados selecionado: {formato_metadados}")
+        modo_incremental = self.modo_incremental_var.get()
+        if modo_incremental and datafim_str:
+            # A Data Início vale apenas para a primeira sincronização; o fim é o momento atual.
+            datafim_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        logger.info(f"GUI: Sincronização incremental selecionada: {modo_incremental}")
 
         logger.info(f"GUI: Dados coletados para passar ao controlador - URL: {url_base}, Login: {login}, Data Início (com hora): {datainicio_str}, Data Fim (com hora): {datafim_str}")
 
@@ -386,14 +600,18 @@ class WidevoiceDownloaderGUI:
             datafim_str,
             cancel_event=self._cancel_event,
             download_metadata_with_recording=download_metadata_with_recording, # --- Passa a opção 1 ---
-            download_metadata_without_recording=download_metadata_without_recording # --- Passa a opção 2 ---
+            download_metadata_without_recording=download_metadata_without_recording, # --- Passa a opção 2 ---
+            granularidade_listagem=granularidade_listagem,
+            motor_download=motor_download,
+            formato_metadados=formato_metadados,
+            modo_incremental=modo_incremental
         )
 
 
     def cancel_download(self):
         """Método chamado quando o botão Cancelar é clicado."""
         logger.info("GUI: Botão 'Cancelar Download' clicado. Sinalizando cancelamento.")
-        self.atualizar_status("GUI: Cancelamento solicitado. Aguardando tarefas em execução finalizarem...", level=logging.WARNING)
+        self.atualizar_status("GUI: Cancelamento solicitado. Aguardando tarefas em execução finalizarem...", level=logging.WARNING, cancelamento=True)
         self._set_button_state(self.cancel_button, tk.DISABLED)
         self._cancel_event.set()
 
@@ -431,7 +649,12 @@ class WidevoiceDownloaderGUI:
             "datainicio": datainicio_date_str_save,
             "datafim": datafim_date_str_save,
             "download_metadata_with_recording": download_metadata_with_recording_save, # --- Salvar opção 1 ---
-            "download_metadata_without_recording": download_metadata_without_recording_save # --- Salvar opção 2 ---
+            "download_metadata_without_recording": download_metadata_without_recording_save, # --- Salvar opção 2 ---
+            "granularidade_listagem": OPCOES_LISTAGEM.get(self.modo_listagem_var.get()),
+            "motor_download": OPCOES_MOTOR.get(self.motor_download_var.get(), MOTOR_THREADS),
+            "formato_metadados": OPCOES_FORMATO_METADADOS.get(self.formato_metadados_var.get(), FORMATO_TXT),
+            "modo_incremental": self.modo_incremental_var.get(),
+            "nivel_status": OPCOES_NIVEL_STATUS.get(self.nivel_status_var.get(), logging.INFO)
         }
 
         logger.info("GUI: Chamando security_manager.save_configuration.")
@@ -481,6 +704,11 @@ class WidevoiceDownloaderGUI:
                 self.download_metadata_with_recording_var.set(loaded_metadata_with_recording)
                 self.download_metadata_without_recording_var.set(loaded_metadata_without_recording)
                 # --- Fim do carregamento do estado dos checkboxes ---
+                self._set_modo_listagem(config_data.get("granularidade_listagem"))
+                self._set_motor_download(config_data.get("motor_download", MOTOR_THREADS))
+                self._set_formato_metadados(config_data.get("formato_metadados", FORMATO_TXT))
+                self.modo_incremental_var.set(config_data.get("modo_incremental", False))
+                self._set_nivel_status(config_data.get("nivel_status", logging.INFO))
 
 
                 logger.info("GUI: Configurações carregadas pelo security_manager e GUI preenchida.")
@@ -506,6 +734,44 @@ class WidevoiceDownloaderGUI:
             self.download_metadata_without_recording_var.set(True)
 
 
+    def _set_modo_listagem(self, granularidade):
+        """Seleciona no combobox a opção de listagem correspondente à granularidade salva."""
+        for rotulo, valor in OPCOES_LISTAGEM.items():
+            if valor == granularidade:
+                self.modo_listagem_var.set(rotulo)
+                return
+        self.modo_listagem_var.set("Sequencial")
+
+
+    def _set_motor_download(self, motor):
+        """Seleciona no combobox o motor de download salvo."""
+        for rotulo, valor in OPCOES_MOTOR.items():
+            if valor == motor:
+                self.motor_download_var.set(rotulo)
+                return
+        self.motor_download_var.set("Threads")
+
+
+    def _set_formato_metadados(self, formato):
+        """Seleciona no combobox o formato de metadados salvo."""
+        for rotulo, valor in OPCOES_FORMATO_METADADOS.items():
+            if valor == formato:
+                self.formato_metadados_var.set(rotulo)
+                return
+        self.formato_metadados_var.set("TXT por chamada")
+
+
+    def _set_nivel_status(self, nivel):
+        """Seleciona no combobox o nível mínimo de status salvo."""
+        for rotulo, valor in OPCOES_NIVEL_STATUS.items():
+            if valor == nivel:
+                self.nivel_status_var.set(rotulo)
+                break
+        else:
+            self.nivel_status_var.set("Informações")
+        self._atualizar_nivel_status()
+
+
     def _clear_gui_fields(self):
         """Limpa campos de entrada específicos na GUI."""
         self.url_entry.delete(0, tk.END)
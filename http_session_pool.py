@@ -0,0 +1,164 @@
+# http_session_pool.py
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+
+logger = logging.getLogger(__name__)
+
+# Quantidade de hosts distintos mantidos em cache pelo pool (API + servidor de gravações).
+MAX_HOSTS_POOL = 10
+
+# Espera máxima (segundos) por um slot livre do pool quando todas as conexões do host estão em uso.
+# Esgotada a espera, a requisição falha como erro de conexão (retentável) em vez de bloquear para sempre.
+TIMEOUT_ESPERA_CONEXAO = 60.0
+
+
+class _EstatisticasPool:
+    """Contadores thread-safe de requisições e de novas conexões (handshakes TCP/TLS)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.conexoes_novas = 0
+
+    def registrar_requisicao(self):
+        with self._lock:
+            self.requisicoes += 1
+
+    def registrar_conexao_nova(self):
+        with self._lock:
+            self.conexoes_novas += 1
+
+    def snapshot(self):
+        with self._lock:
+            requisicoes = self.requisicoes
+            conexoes_novas = self.conexoes_novas
+        reutilizadas = max(requisicoes - conexoes_novas, 0)
+        return {
+            "requisicoes": requisicoes,
+            "hits": reutilizadas,
+            "misses": conexoes_novas,
+            "taxa_reuso": (reutilizadas / requisicoes) if requisicoes else 0.0,
+        }
+
+
+def _criar_classes_de_pool(estatisticas):
+    """
+    Cria subclasses dos pools do urllib3 cujas conexões contam cada connect() como um miss.
+    Uma requisição que não dispara connect() reutilizou uma conexão keep-alive (hit).
+    A espera por um slot livre é limitada a TIMEOUT_ESPERA_CONEXAO (o requests não informa pool_timeout).
+    """
+    class _HTTPConnectionContadora(HTTPConnection):
+        def connect(self):
+            estatisticas.registrar_conexao_nova()
+            return super().connect()
+
+    class _HTTPSConnectionContadora(HTTPSConnection):
+        def connect(self):
+            estatisticas.registrar_conexao_nova()
+            return super().connect()
+
+    class _HTTPConnectionPoolContador(HTTPConnectionPool):
+        ConnectionCls = _HTTPConnectionContadora
+
+        def _get_conn(self, timeout=None):
+            return super()._get_conn(timeout=TIMEOUT_ESPERA_CONEXAO if timeout is None else timeout)
+
+    class _HTTPSConnectionPoolContador(HTTPSConnectionPool):
+        ConnectionCls = _HTTPSConnectionContadora
+
+        def _get_conn(self, timeout=None):
+            return super()._get_conn(timeout=TIMEOUT_ESPERA_CONEXAO if timeout is None else timeout)
+
+    return {"http": _HTTPConnectionPoolContador, "https": _HTTPSConnectionPoolContador}
+
+
+class _AdapterContador(HTTPAdapter):
+    """HTTPAdapter que usa os pools contadores e registra cada requisição enviada."""
+
+    def __init__(self, estatisticas, **kwargs):
+        self._estatisticas = estatisticas
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _criar_classes_de_pool(self._estatisticas)
+
+    def send(self, request, **kwargs):
+        self._estatisticas.registrar_requisicao()
+        try:
+            return super().send(request, **kwargs)
+        except EmptyPoolError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+
+class HttpSessionPool:
+    """
+    Pool de conexões HTTP keep-alive compartilhado por todos os workers de um download.
+
+    Cada thread recebe sua própria requests.Session (Session não é thread-safe), mas todas
+    montam o mesmo adapter, de modo que as conexões TCP/TLS com o servidor são reutilizadas
+    entre threads. O número de conexões por host é limitado (pool_block=True), evitando
+    abrir conexões descartáveis quando todos os slots estão em uso; a espera por um slot é
+    limitada a TIMEOUT_ESPERA_CONEXAO. Respostas com stream=True precisam ser fechadas
+    (with resposta: ...), inclusive em erro, para devolver a conexão ao pool.
+
+    Expõe get()/post() com a mesma assinatura de requests.get/requests.post.
+    """
+
+    def __init__(self, max_workers, max_conexoes_por_host=None, max_hosts=MAX_HOSTS_POOL):
+        self._max_conexoes_por_host = max_conexoes_por_host or max_workers
+        self._estatisticas = _EstatisticasPool()
+        self._adapter = _AdapterContador(
+            self._estatisticas,
+            pool_connections=max_hosts,
+            pool_maxsize=self._max_conexoes_por_host,
+            pool_block=True,
+        )
+        self._local = threading.local()
+        self._sessoes = []
+        self._lock = threading.Lock()
+        self._fechado = False
+        logger.debug(f"HttpSessionPool: Criado com {self._max_conexoes_por_host} conexões por host e até {max_hosts} hosts.")
+
+    def obter_sessao(self):
+        """Retorna a requests.Session da thread atual, criando-a na primeira chamada."""
+        sessao = getattr(self._local, "sessao", None)
+        if sessao is None:
+            sessao = requests.Session()
+            sessao.mount("http://", self._adapter)
+            sessao.mount("https://", self._adapter)
+            self._local.sessao = sessao
+            with self._lock:
+                self._sessoes.append(sessao)
+        return sessao
+
+    def get(self, url, **kwargs):
+        return self.obter_sessao().get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.obter_sessao().post(url, **kwargs)
+
+    def estatisticas(self):
+        """Retorna um dicionário com requisições, hits (conexões reutilizadas) e misses (novos handshakes)."""
+        return self._estatisticas.snapshot()
+
+    def fechar(self):
+        """Fecha todas as conexões do pool. Seguro para chamar mais de uma vez."""
+        with self._lock:
+            if self._fechado:
+                return
+            self._fechado = True
+            sessoes = list(self._sessoes)
+            self._sessoes.clear()
+        for sessao in sessoes:
+            # Sessões compartilham o adapter; ele é fechado uma única vez abaixo.
+            sessao.adapters.clear()
+            sessao.close()
+        self._adapter.close()
+        logger.debug("HttpSessionPool: Conexões fechadas.")
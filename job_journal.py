@@ -0,0 +1,203 @@
+# job_journal.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Subdiretório (na raiz do destino) onde ficam os journals dos jobs não concluídos.
+DIRETORIO_JOBS = ".widevoice_jobs"
+
+# Estados de um registro no journal. Um registro listado e sem estado gravado está pendente.
+ESTADO_PENDENTE = 'pendente'
+ESTADO_CONCLUIDO = 'concluido'
+ESTADO_FALHA = 'falha'
+ESTADO_CANCELADO = 'cancelado'
+
+# Os estados por registro são acumulados em memória e gravados (com fsync) em lote,
+# a cada INTERVALO_SINCRONIZACAO segundos ou MAX_ESTADOS_PENDENTES entradas.
+INTERVALO_SINCRONIZACAO = 1.0
+MAX_ESTADOS_PENDENTES = 500
+
+# Parâmetros que identificam um job. O token não faz parte da identificação nem é gravado.
+CHAVES_IDENTIFICACAO = ('url_base', 'login', 'datainicio', 'datafim')
+
+
+def identificador_job(parametros):
+    """Identificador estável de um job (servidor, login e período), usado como nome do journal."""
+    chave = json.dumps({k: parametros.get(k) for k in CHAVES_IDENTIFICACAO}, sort_keys=True)
+    return hashlib.sha256(chave.encode('utf-8')).hexdigest()[:24]
+
+
+class JobJournal:
+    """
+    Journal append-only (JSON Lines) de um job de download, gravado antes de cada etapa (write-ahead)
+    em <destino>/.widevoice_jobs/<id do job>.jsonl. Cada linha é um evento:
+
+    - {"ev": "job", ...}: parâmetros do job (sem o token);
+    - {"ev": "pagina", "cursor": ..., "registros": [...]}: registros listados, ainda pendentes,
+      e o cursor da listagem (datahora a partir da qual a listagem pode continuar);
+    - {"ev": "estado", "id": ..., "estado": ...}: resultado de um registro (concluido, falha, cancelado);
+    - {"ev": "fim_listagem"}: a listagem da API terminou.
+
+    Ao abrir um journal existente para os mesmos parâmetros, o job é retomado: os registros já
+    listados são reprocessados a partir do journal (exceto os concluídos) e a listagem só continua,
+    a partir do cursor, se não havia terminado. O journal é removido quando o job termina.
+    Uma última linha incompleta (queda durante a escrita) é ignorada na leitura.
+    """
+
+    def __init__(self, diretorio_raiz, parametros):
+        self._lock = threading.Lock()
+        self._estados_pendentes = 0
+        self._ultima_sincronizacao = time.monotonic()
+        self.parametros = {k: v for k, v in parametros.items() if k != 'token'}
+
+        diretorio_jobs = os.path.join(diretorio_raiz, DIRETORIO_JOBS)
+        os.makedirs(diretorio_jobs, exist_ok=True)
+        self.id_job = identificador_job(self.parametros)
+        self.caminho = os.path.join(diretorio_jobs, f"{self.id_job}.jsonl")
+
+        self.retomado = False
+        self.listagem_concluida = False
+        self.cursor = None
+        self.total_listado = 0
+        self._concluidos = set()
+        self._ids_listados = None
+
+        if os.path.exists(self.caminho) and self._reler():
+            self.retomado = True
+            if not self.listagem_concluida:
+                # A listagem continuará do cursor; os registros já gravados não devem ser repetidos.
+                self._ids_listados = {str(chamada.get('id')) for chamada in self._ler_registros()}
+            self._arquivo = open(self.caminho, 'a', encoding='utf-8', newline='\n')
+            if not self._termina_com_nova_linha():
+                # Isola a linha incompleta deixada por uma queda, para não corromper o próximo evento.
+                self._arquivo.write("\n")
+            logger.info(f"JobJournal: Retomando job {self.id_job} ({self.total_listado} registros listados, "
+                        f"{len(self._concluidos)} concluídos, listagem {'concluída' if self.listagem_concluida else 'incompleta'}).")
+        else:
+            self._arquivo = open(self.caminho, 'w', encoding='utf-8', newline='\n')
+            self._anexar({"ev": "job", "id_job": self.id_job, "parametros": self.parametros,
+                          "criado_em": datetime.now().isoformat(timespec='seconds')}, sincronizar=True)
+            logger.info(f"JobJournal: Novo job {self.id_job} registrado em {self.caminho}.")
+
+    def _eventos(self, avisar=False):
+        """Lê os eventos do journal, ignorando linhas incompletas ou corrompidas."""
+        with open(self.caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    yield json.loads(linha)
+                except json.JSONDecodeError:
+                    if avisar:
+                        logger.warning(f"JobJournal: Linha inválida ignorada em {self.caminho}.")
+
+    def _termina_com_nova_linha(self):
+        with open(self.caminho, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _reler(self):
+        """Reconstrói o estado a partir do journal. Retorna False se o arquivo não pertence a um job válido."""
+        primeiro = True
+        for evento in self._eventos(avisar=True):
+            tipo = evento.get('ev')
+            if primeiro:
+                primeiro = False
+                if tipo != 'job':
+                    logger.warning(f"JobJournal: Journal {self.caminho} sem cabeçalho de job. Descartado.")
+                    return False
+            elif tipo == 'pagina':
+                self.total_listado += len(evento.get('registros', []))
+                if evento.get('cursor'):
+                    self.cursor = evento['cursor']
+            elif tipo == 'estado':
+                if evento.get('estado') == ESTADO_CONCLUIDO:
+                    self._concluidos.add(str(evento.get('id')))
+                else:
+                    self._concluidos.discard(str(evento.get('id')))
+            elif tipo == 'fim_listagem':
+                self.listagem_concluida = True
+        return not primeiro
+
+    def _ler_registros(self):
+        for evento in self._eventos():
+            if evento.get('ev') == 'pagina':
+                yield from evento.get('registros', [])
+
+    def registros_gravados(self):
+        """Gerador dos registros já listados no journal (na ordem em que foram listados)."""
+        return self._ler_registros()
+
+    def ja_concluido(self, chamada_id):
+        """Indica se o registro foi concluído em uma execução anterior deste job."""
+        return str(chamada_id) in self._concluidos
+
+    def registrar_pagina(self, registros, cursor=None):
+        """
+        Grava (com fsync) uma página listada e retorna os registros que ainda não estavam no journal.
+        cursor: datahora a partir da qual a listagem pode continuar, se a página for cronológica.
+        """
+        if self._ids_listados is not None:
+            registros = [chamada for chamada in registros if str(chamada.get('id')) not in self._ids_listados]
+            self._ids_listados.update(str(chamada.get('id')) for chamada in registros)
+        if cursor:
+            self.cursor = cursor
+        if registros or cursor:
+            self._anexar({"ev": "pagina", "cursor": self.cursor, "registros": registros}, sincronizar=True)
+        self.total_listado += len(registros)
+        return registros
+
+    def registrar_fim_listagem(self):
+        self.listagem_concluida = True
+        self._anexar({"ev": "fim_listagem"}, sincronizar=True)
+
+    def registrar_estado(self, chamada_id, estado):
+        """Registra o resultado de um registro. Gravado em lote; uma queda perde no máximo o último lote."""
+        self._anexar({"ev": "estado", "id": str(chamada_id), "estado": estado})
+
+    def _anexar(self, evento, sincronizar=False):
+        linha = json.dumps(evento, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._arquivo is None:
+                return
+            self._arquivo.write(linha)
+            if not sincronizar:
+                self._estados_pendentes += 1
+                sincronizar = (self._estados_pendentes >= MAX_ESTADOS_PENDENTES or
+                               time.monotonic() - self._ultima_sincronizacao >= INTERVALO_SINCRONIZACAO)
+            if sincronizar:
+                self._sincronizar()
+
+    def _sincronizar(self):
+        # Chamado com self._lock adquirido.
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+        self._estados_pendentes = 0
+        self._ultima_sincronizacao = time.monotonic()
+
+    def fechar(self):
+        """Sincroniza e fecha o journal, mantendo-o em disco para uma retomada futura."""
+        with self._lock:
+            if self._arquivo is None:
+                return
+            try:
+                self._sincronizar()
+            finally:
+                self._arquivo.close()
+                self._arquivo = None
+
+    def concluir(self):
+        """Fecha e remove o journal de um job terminado."""
+        self.fechar()
+        try:
+            os.remove(self.caminho)
+            logger.info(f"JobJournal: Job {self.id_job} concluído; journal removido.")
+        except OSError as e:
+            logger.error(f"JobJournal: Erro ao remover o journal {self.caminho}: {e}", exc_info=True)
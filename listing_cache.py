@@ -0,0 +1,188 @@
+# listing_cache.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Local do cache, relativo ao diretório de execução (como logs/ e config.json).
+DIRETORIO_CACHE = "cache"
+NOME_ARQUIVO_CACHE = "listagem_api.sqlite3"
+
+# Janelas que terminam dentro do horizonte de frescor (a partir da meia-noite de hoje) sempre são
+# consultadas na API: chamadas recentes ainda podem ser registradas ou alteradas no servidor.
+HORIZONTE_FRESCOR_DIAS = 1
+
+# Despejo: entradas mais antigas que a idade máxima são removidas, e as menos acessadas quando
+# o cache ultrapassa o tamanho máximo (dados compactados).
+IDADE_MAXIMA_DIAS = 180
+TAMANHO_MAXIMO_BYTES = 256 * 1024 * 1024
+
+FORMATO_DATAHORA = "%Y-%m-%d %H:%M:%S"
+
+
+def identificar_origem(url_api):
+    """(servidor, login) de uma URL da API statusreport. O token não faz parte da chave do cache."""
+    partes = urlsplit(url_api)
+    login = parse_qs(partes.query).get('login', [''])[0]
+    return partes.netloc.lower(), login
+
+
+class ListingCache:
+    """
+    Cache em disco (SQLite) das respostas da API statusreport, por servidor, login e janela consultada.
+
+    Apenas janelas inteiramente anteriores ao limite de frescor (meia-noite de hoje menos
+    horizonte_frescor_dias) são lidas ou gravadas no cache: as chamadas desses dias não mudam mais,
+    e uma nova listagem do mesmo período é servida sem acessar a API. As demais janelas são
+    sempre consultadas. Somente respostas válidas (listas de registros) são gravadas.
+
+    Seguro para uso por várias threads (listagem particionada).
+    """
+
+    def __init__(self, diretorio=DIRETORIO_CACHE, horizonte_frescor_dias=HORIZONTE_FRESCOR_DIAS,
+                 idade_maxima_dias=IDADE_MAXIMA_DIAS, tamanho_maximo_bytes=TAMANHO_MAXIMO_BYTES):
+        self._horizonte_frescor = timedelta(days=horizonte_frescor_dias)
+        self._idade_maxima = timedelta(days=idade_maxima_dias)
+        self._tamanho_maximo = tamanho_maximo_bytes
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho = os.path.join(diretorio, NOME_ARQUIVO_CACHE)
+        self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS paginas (
+                chave TEXT PRIMARY KEY,
+                servidor TEXT NOT NULL,
+                login TEXT NOT NULL,
+                inicio TEXT NOT NULL,
+                fim TEXT NOT NULL,
+                dados BLOB NOT NULL,
+                tamanho INTEGER NOT NULL,
+                criado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_paginas_acessado_em ON paginas (acessado_em);
+            """
+        )
+        self._conexao.commit()
+        self.despejar()
+
+    def limite_frescor(self, agora=None):
+        """Instante a partir do qual as janelas não são mais cacheáveis."""
+        agora = agora or datetime.now()
+        return datetime(agora.year, agora.month, agora.day) - self._horizonte_frescor
+
+    def cacheavel(self, fim_str):
+        try:
+            return datetime.strptime(fim_str, FORMATO_DATAHORA) < self.limite_frescor()
+        except (TypeError, ValueError):
+            return False
+
+    def dividir_periodo(self, datainicio, datafim):
+        """
+        Divide [datainicio, datafim] para a listagem sequencial: a parte anterior ao limite de frescor
+        em dias do calendário, e a parte recente em uma única janela (sempre consultada na API).
+        Como cada página é guardada pela janela consultada, paginar dentro do dia (e não até o fim do
+        período pedido) mantém as chaves dos dias passados iguais entre execuções com outro 'fim'
+        (ex.: o período de ontem estendido por mais um dia). Retorna uma lista de (inicio, fim).
+        """
+        limite = self.limite_frescor()
+        janelas = []
+        atual = datainicio
+        while atual <= datafim and atual < limite:
+            fim_dia = datetime(atual.year, atual.month, atual.day) + timedelta(days=1, seconds=-1)
+            fim_janela = min(fim_dia, datafim)
+            janelas.append((atual, fim_janela))
+            atual = fim_janela + timedelta(seconds=1)
+        if atual <= datafim:
+            janelas.append((atual, datafim))
+        return janelas
+
+    @staticmethod
+    def _chave(servidor, login, inicio_str, fim_str):
+        return hashlib.sha256("\x1f".join((servidor, login, inicio_str, fim_str)).encode('utf-8')).hexdigest()
+
+    def obter(self, url_api, inicio_str, fim_str):
+        """Registros da janela, se estiverem no cache; None caso contrário (ou se a janela não for cacheável)."""
+        if not self.cacheavel(fim_str):
+            return None
+        servidor, login = identificar_origem(url_api)
+        chave = self._chave(servidor, login, inicio_str, fim_str)
+        with self._lock:
+            linha = self._conexao.execute("SELECT dados FROM paginas WHERE chave = ?", (chave,)).fetchone()
+            if linha is None:
+                self.faltas += 1
+                return None
+            self.acertos += 1
+            self._conexao.execute("UPDATE paginas SET acessado_em = ? WHERE chave = ?", (time.time(), chave))
+            self._conexao.commit()
+        try:
+            return json.loads(zlib.decompress(linha[0]).decode('utf-8'))
+        except (zlib.error, ValueError) as e:
+            logger.warning(f"ListingCache: Entrada corrompida para {inicio_str} a {fim_str} ({e}). Consultando a API.")
+            with self._lock:
+                self._conexao.execute("DELETE FROM paginas WHERE chave = ?", (chave,))
+                self._conexao.commit()
+            return None
+
+    def gravar(self, url_api, inicio_str, fim_str, dados):
+        """Grava a resposta de uma janela cacheável. Respostas que não são listas são ignoradas."""
+        if not isinstance(dados, list) or not self.cacheavel(fim_str):
+            return
+        servidor, login = identificar_origem(url_api)
+        compactado = zlib.compress(json.dumps(dados, ensure_ascii=False).encode('utf-8'))
+        agora = time.time()
+        try:
+            with self._lock:
+                self._conexao.execute(
+                    "INSERT OR REPLACE INTO paginas (chave, servidor, login, inicio, fim, dados, tamanho, criado_em, acessado_em) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self._chave(servidor, login, inicio_str, fim_str), servidor, login, inicio_str, fim_str,
+                     compactado, len(compactado), agora, agora),
+                )
+                self._conexao.commit()
+        except sqlite3.Error as e:
+            logger.error(f"ListingCache: Erro ao gravar a janela {inicio_str} a {fim_str} no cache: {e}", exc_info=True)
+
+    def despejar(self):
+        """Remove as entradas expiradas e, acima do tamanho máximo, as menos acessadas recentemente."""
+        with self._lock:
+            expiradas = self._conexao.execute(
+                "DELETE FROM paginas WHERE criado_em < ?", (time.time() - self._idade_maxima.total_seconds(),)
+            ).rowcount
+            tamanho_total = self._conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM paginas").fetchone()[0]
+            excedentes = 0
+            if tamanho_total > self._tamanho_maximo:
+                excesso = tamanho_total - self._tamanho_maximo
+                chaves = []
+                for chave, tamanho in self._conexao.execute("SELECT chave, tamanho FROM paginas ORDER BY acessado_em").fetchall():
+                    if excesso <= 0:
+                        break
+                    chaves.append((chave,))
+                    excesso -= tamanho
+                self._conexao.executemany("DELETE FROM paginas WHERE chave = ?", chaves)
+                excedentes = len(chaves)
+            self._conexao.commit()
+        if expiradas or excedentes:
+            logger.info(f"ListingCache: {expiradas} entradas expiradas e {excedentes} excedentes removidas do cache.")
+
+    def fechar(self):
+        with self._lock:
+            if self._conexao is None:
+                return
+            self._conexao.close()
+            self._conexao = None
+        logger.debug(f"ListingCache: Cache fechado ({self.acertos} acertos, {self.faltas} faltas).")
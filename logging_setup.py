@@ -0,0 +1,132 @@
+# logging_setup.py
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Diretório e arquivo de log, relativos ao diretório de execução.
+LOG_DIR = "logs"
+LOG_FILE = os.path.join(LOG_DIR, "widevoice_downloader.log")
+
+# Rotação por tamanho: ao atingir TAMANHO_MAXIMO_LOG, o arquivo é renomeado (.1, .2, ...) e
+# são mantidos ARQUIVOS_BACKUP_LOG arquivos antigos.
+TAMANHO_MAXIMO_LOG = 10 * 1024 * 1024
+ARQUIVOS_BACKUP_LOG = 5
+
+# Mensagens idênticas (mesmo nível e texto) repetidas dentro desta janela são registradas uma única vez.
+JANELA_DEDUPLICACAO = 2.0
+MAX_MENSAGENS_DEDUPLICACAO = 1024
+
+FORMATO_LOG = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_lock = threading.Lock()
+
+
+class FiltroDuplicadas(logging.Filter):
+    """
+    Descarta mensagens idênticas (mesmo nível e texto) repetidas dentro de JANELA_DEDUPLICACAO segundos,
+    como o mesmo evento de um registro registrado pelo controlador (via status) e pelo downloader.
+    Usado apenas pela thread do QueueListener.
+    """
+
+    def __init__(self, janela=JANELA_DEDUPLICACAO, capacidade=MAX_MENSAGENS_DEDUPLICACAO):
+        super().__init__()
+        self._janela = janela
+        self._capacidade = capacidade
+        self._recentes = OrderedDict()
+        self.descartadas = 0
+
+    def filter(self, record):
+        chave = (record.levelno, record.getMessage())
+        agora = time.monotonic()
+        anterior = self._recentes.get(chave)
+        if anterior is not None and agora - anterior <= self._janela:
+            self.descartadas += 1
+            return False
+        self._recentes[chave] = agora
+        self._recentes.move_to_end(chave)
+        while len(self._recentes) > self._capacidade:
+            self._recentes.popitem(last=False)
+        return True
+
+
+class QueueHandlerAdiado(logging.handlers.QueueHandler):
+    """
+    QueueHandler que apenas enfileira o registro: a formatação da mensagem e do traceback fica para a
+    thread do QueueListener, fora das threads de download.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class QueueListenerDeduplicado(logging.handlers.QueueListener):
+    """QueueListener que aplica o FiltroDuplicadas uma vez por registro, antes de repassá-lo aos handlers."""
+
+    def __init__(self, fila, *handlers, filtro=None):
+        super().__init__(fila, *handlers, respect_handler_level=True)
+        self.filtro = filtro or FiltroDuplicadas()
+
+    def handle(self, record):
+        if not self.filtro.filter(record):
+            return
+        super().handle(record)
+
+
+def configurar_logging(nivel=logging.INFO, nivel_console=logging.INFO, arquivo=LOG_FILE,
+                       tamanho_maximo=TAMANHO_MAXIMO_LOG, arquivos_backup=ARQUIVOS_BACKUP_LOG):
+    """
+    Configura o logging da aplicação sem bloquear as threads que registram mensagens: o logger raiz
+    recebe apenas um QueueHandler, e uma thread (QueueListener) formata, deduplica e grava os registros
+    no arquivo com rotação por tamanho e no console (stderr, a partir de nivel_console).
+    Pode ser chamado mais de uma vez; a configuração anterior é encerrada. Retorna o listener.
+    """
+    global _listener
+    encerrar_logging()
+
+    diretorio = os.path.dirname(arquivo)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    formatador = logging.Formatter(FORMATO_LOG)
+
+    handler_arquivo = logging.handlers.RotatingFileHandler(
+        arquivo, maxBytes=tamanho_maximo, backupCount=arquivos_backup, encoding='utf-8'
+    )
+    handler_arquivo.setFormatter(formatador)
+    handler_arquivo.setLevel(nivel)
+    handler_console = logging.StreamHandler(sys.stderr)
+    handler_console.setFormatter(formatador)
+    handler_console.setLevel(nivel_console)
+
+    fila = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(QueueHandlerAdiado(fila))
+    raiz.setLevel(min(nivel, nivel_console))
+
+    with _lock:
+        _listener = QueueListenerDeduplicado(fila, handler_arquivo, handler_console)
+        _listener.start()
+    return _listener
+
+
+def encerrar_logging():
+    """Grava os registros ainda na fila e encerra a thread de logging (registrado em atexit)."""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+atexit.register(encerrar_logging)
@@ -1,27 +1,18 @@
 import tkinter as tk
 # from gui_app import WidevoiceDownloaderGUI # Remova esta linha
 import logging
-import os
 
 # Importe ttkbootstrap e o GUI_APP modificado
 import ttkbootstrap as ttk # Importe ttkbootstrap
 from gui_app import WidevoiceDownloaderGUI # Mantenha a importação da classe GUI
-
-# Configurar o diretório para logs
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-LOG_FILE = os.path.join(LOG_DIR, "widevoice_downloader.log")
+from logging_setup import configurar_logging, encerrar_logging
 
 def setup_logging():
-    """Configura o sistema de logging."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler()
-        ]
-    )
+    """
+    Configura o sistema de logging: arquivo com rotação (logs/widevoice_downloader.log) e console,
+    gravados por uma thread própria (logging_setup), sem bloquear as threads de download.
+    """
+    configurar_logging()
     # Opcional: Desativar logs de bibliotecas externas se forem muito verbosos
     # logging.getLogger("requests").setLevel(logging.WARNING)
     # logging.getLogger("urllib3").setLevel(logging.WARNING)
@@ -42,6 +33,7 @@ def main():
     root.mainloop()
 
     logging.info("Aplicativo Widevoice Downloader GUI finalizado.")
+    encerrar_logging()
 
 
 if __name__ == "__main__":
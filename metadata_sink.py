@@ -0,0 +1,319 @@
+# metadata_sink.py
+import csv
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Dependência opcional: sem pyarrow, o formato Parquet não está disponível.
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Formatos de metadado. FORMATO_TXT é o formato original (um .txt ao lado de cada gravação),
+# gravado diretamente pelo worker; os demais acumulam os registros em um arquivo por dia.
+FORMATO_TXT = 'txt'
+FORMATO_JSONL = 'jsonl'
+FORMATO_CSV = 'csv'
+FORMATO_PARQUET = 'parquet'
+
+# Diretório dos arquivos diários de metadados, na raiz do destino.
+DIRETORIO_METADADOS = "Metadados"
+
+# Situação registrada em cada metadado em lote (no formato TXT, indicada pelo nome do arquivo).
+SITUACAO_GRAVACAO = 'gravacao'
+SITUACAO_SEM_GRAVACAO = 'sem_gravacao'
+
+# Colunas adicionadas pelo sink, antes dos campos da chamada.
+CAMPOS_SINK = ('situacao_metadado', 'arquivo_gravacao')
+
+# Fila entre os workers e a thread de escrita; cheia, bloqueia os workers até a escrita avançar.
+TAMANHO_FILA_METADADOS = 10000
+# Registros gravados por lote e intervalo máximo (segundos) até um lote parcial ser gravado.
+TAMANHO_LOTE = 500
+INTERVALO_DESCARGA = 1.0
+# Arquivos diários mantidos abertos ao mesmo tempo (os mais antigos são fechados).
+MAX_ARQUIVOS_ABERTOS = 16
+# Linhas acumuladas por dia antes de gravar um row group Parquet.
+TAMANHO_GRUPO_PARQUET = 50000
+
+_FIM = object()
+
+
+def formatar_metadado_txt(chamada):
+    """Conteúdo do metadado no formato TXT (uma linha 'Campo: valor' por campo da chamada)."""
+    linhas = ["--- Metadados da Chamada ---\n"]
+    linhas.extend(f"{key.replace('_', ' ').capitalize()}: {value}\n" for key, value in chamada.items())
+    return "".join(linhas)
+
+
+def situacao_de_sufixo(sufixo):
+    """Situação correspondente ao sufixo de um metadado de falha (ex.: "_DOWNLOAD_FAILED.txt" -> 'download_failed')."""
+    return os.path.splitext(sufixo)[0].strip('_').lower()
+
+
+def parquet_disponivel():
+    """Retorna True se a dependência opcional pyarrow estiver instalada."""
+    return pa is not None
+
+
+def _dia_da_chamada(chamada):
+    try:
+        return datetime.strptime(chamada.get('datahora', '')[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (ValueError, TypeError):
+        return "0000-00-00"
+
+
+class _BackendArquivoDiario:
+    """Base dos formatos em lote: um arquivo de texto por dia da chamada, aberto em modo append."""
+
+    extensao = None
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self._arquivos = {}
+
+    def caminho_do_dia(self, dia):
+        return os.path.join(self.diretorio, f"{dia}.{self.extensao}")
+
+    def gravar(self, registros_por_dia):
+        for dia, registros in registros_por_dia.items():
+            self._gravar_dia(dia, self._arquivo_do_dia(dia), registros)
+
+    def _arquivo_do_dia(self, dia):
+        arquivo = self._arquivos.pop(dia, None)
+        if arquivo is None:
+            if len(self._arquivos) >= MAX_ARQUIVOS_ABERTOS:
+                self._fechar_arquivo(next(iter(self._arquivos)))
+            arquivo = self._abrir(dia)
+        self._arquivos[dia] = arquivo  # Reinsere no fim: o primeiro item é sempre o menos usado.
+        return arquivo
+
+    def _abrir(self, dia):
+        return open(self.caminho_do_dia(dia), 'a', encoding='utf-8', newline='')
+
+    def _fechar_arquivo(self, dia):
+        self._arquivos.pop(dia).close()
+
+    def _gravar_dia(self, dia, arquivo, registros):
+        raise NotImplementedError
+
+    def descarregar(self):
+        for arquivo in self._arquivos.values():
+            arquivo.flush()
+
+    def fechar(self):
+        for dia in list(self._arquivos):
+            self._fechar_arquivo(dia)
+
+
+class BackendMetadadoJsonl(_BackendArquivoDiario):
+    """Um objeto JSON por linha, com todos os campos da chamada."""
+
+    extensao = FORMATO_JSONL
+
+    def _gravar_dia(self, dia, arquivo, registros):
+        arquivo.write("".join(json.dumps(registro, ensure_ascii=False, default=str) + "\n" for registro in registros))
+
+
+class BackendMetadadoCsv(_BackendArquivoDiario):
+    """
+    CSV com cabeçalho. As colunas de um arquivo são definidas pelo primeiro registro gravado nele
+    (ou pelo cabeçalho existente, ao continuar um arquivo); campos fora delas são ignorados.
+    """
+
+    extensao = FORMATO_CSV
+
+    def __init__(self, diretorio):
+        super().__init__(diretorio)
+        self._escritores = {}
+
+    def _abrir(self, dia):
+        caminho = self.caminho_do_dia(dia)
+        colunas = None
+        if os.path.exists(caminho) and os.path.getsize(caminho) > 0:
+            with open(caminho, 'r', encoding='utf-8', newline='') as existente:
+                colunas = next(csv.reader(existente), None)
+        arquivo = super()._abrir(dia)
+        self._escritores[dia] = (csv.DictWriter(arquivo, fieldnames=colunas, extrasaction='ignore', restval='')
+                                 if colunas else None)
+        return arquivo
+
+    def _fechar_arquivo(self, dia):
+        self._escritores.pop(dia, None)
+        super()._fechar_arquivo(dia)
+
+    def _gravar_dia(self, dia, arquivo, registros):
+        escritor = self._escritores.get(dia)
+        if escritor is None:
+            colunas = list(CAMPOS_SINK) + [campo for campo in registros[0] if campo not in CAMPOS_SINK]
+            escritor = csv.DictWriter(arquivo, fieldnames=colunas, extrasaction='ignore', restval='')
+            escritor.writeheader()
+            self._escritores[dia] = escritor
+        escritor.writerows(registros)
+
+
+class BackendMetadadoParquet:
+    """
+    Arquivo colunar Parquet por dia e por execução (Parquet não admite append), com todas as
+    colunas como texto. As linhas são acumuladas em memória e gravadas em row groups de até
+    TAMANHO_GRUPO_PARQUET linhas. O arquivo é gravado como '.part' e só recebe o nome final ao
+    fechar o sink, pois um Parquet sem o rodapé não pode ser lido.
+    """
+
+    extensao = FORMATO_PARQUET
+
+    def __init__(self, diretorio):
+        if not parquet_disponivel():
+            raise RuntimeError("Formato Parquet indisponível (pacote 'pyarrow' não instalado).")
+        self.diretorio = diretorio
+        self._execucao = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self._pendentes = {}
+        self._escritores = {}
+        self._schemas = {}
+
+    def caminho_do_dia(self, dia):
+        return os.path.join(self.diretorio, f"{dia}_{self._execucao}.{self.extensao}")
+
+    def gravar(self, registros_por_dia):
+        for dia, registros in registros_por_dia.items():
+            pendentes = self._pendentes.setdefault(dia, [])
+            pendentes.extend(registros)
+            if len(pendentes) >= TAMANHO_GRUPO_PARQUET:
+                self._gravar_grupo(dia)
+
+    def _gravar_grupo(self, dia):
+        registros = self._pendentes.pop(dia, None)
+        if not registros:
+            return
+        escritor = self._escritores.get(dia)
+        if escritor is None:
+            colunas = list(CAMPOS_SINK) + sorted({campo for registro in registros for campo in registro} - set(CAMPOS_SINK))
+            schema = pa.schema([(coluna, pa.string()) for coluna in colunas])
+            escritor = pq.ParquetWriter(self.caminho_do_dia(dia) + ".part", schema)
+            self._escritores[dia] = escritor
+            self._schemas[dia] = schema
+        schema = self._schemas[dia]
+        colunas = {
+            coluna: [None if registro.get(coluna) is None else str(registro.get(coluna)) for registro in registros]
+            for coluna in schema.names
+        }
+        escritor.write_table(pa.table(colunas, schema=schema))
+
+    def descarregar(self):
+        pass
+
+    def fechar(self):
+        for dia in list(self._pendentes):
+            self._gravar_grupo(dia)
+        for dia, escritor in self._escritores.items():
+            escritor.close()
+            os.replace(self.caminho_do_dia(dia) + ".part", self.caminho_do_dia(dia))
+        self._escritores.clear()
+        self._schemas.clear()
+
+
+BACKENDS_EM_LOTE = {
+    FORMATO_JSONL: BackendMetadadoJsonl,
+    FORMATO_CSV: BackendMetadadoCsv,
+    FORMATO_PARQUET: BackendMetadadoParquet,
+}
+
+
+class MetadataSink:
+    """
+    Destino dos metadados nos formatos em lote (JSONL, CSV ou Parquet): os workers enfileiram os
+    registros com registrar() e uma única thread de escrita os grava, agrupados por dia da chamada,
+    em DIRETORIO_METADADOS. Em vez de um arquivo pequeno por chamada, há um arquivo por dia,
+    gravado em lotes de até TAMANHO_LOTE registros ou a cada INTERVALO_DESCARGA segundos.
+
+    Registros aceitos pelo sink mas ainda não gravados se perdem se o processo cair; fechar()
+    grava tudo o que estiver na fila.
+    """
+
+    def __init__(self, diretorio_raiz, formato=FORMATO_JSONL, tamanho_lote=TAMANHO_LOTE,
+                 intervalo_descarga=INTERVALO_DESCARGA):
+        if formato not in BACKENDS_EM_LOTE:
+            raise ValueError(f"Formato de metadado em lote inválido: {formato}")
+        self.formato = formato
+        self._diretorio_raiz = os.path.abspath(diretorio_raiz)
+        self.diretorio = os.path.join(self._diretorio_raiz, DIRETORIO_METADADOS)
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._backend = BACKENDS_EM_LOTE[formato](self.diretorio)
+        self._tamanho_lote = tamanho_lote
+        self._intervalo_descarga = intervalo_descarga
+        self._fila = queue.Queue(maxsize=TAMANHO_FILA_METADADOS)
+        self.registros_gravados = 0
+        self.erros = 0
+        self._thread = threading.Thread(target=self._escrever, name="MetadataSink", daemon=True)
+        self._thread.start()
+        logger.info(f"MetadataSink: Gravando metadados no formato {formato} em {self.diretorio}.")
+
+    def registrar(self, chamada, situacao, caminho_arquivo_gravacao=None):
+        """
+        Enfileira o metadado de uma chamada. Bloqueia se a fila estiver cheia.
+        Retorna o caminho do arquivo diário em que o registro será gravado.
+        """
+        registro = {
+            'situacao_metadado': situacao,
+            'arquivo_gravacao': (os.path.relpath(os.path.abspath(caminho_arquivo_gravacao), self._diretorio_raiz)
+                                 if caminho_arquivo_gravacao else ''),
+        }
+        registro.update(chamada)
+        dia = _dia_da_chamada(chamada)
+        self._fila.put((dia, registro))
+        return self._backend.caminho_do_dia(dia)
+
+    def _escrever(self):
+        lote = []
+        ultima_descarga = time.monotonic()
+        encerrar = False
+        while not encerrar:
+            espera = max(self._intervalo_descarga - (time.monotonic() - ultima_descarga), 0.0)
+            try:
+                item = self._fila.get(timeout=espera)
+                if item is _FIM:
+                    encerrar = True
+                else:
+                    lote.append(item)
+            except queue.Empty:
+                pass
+
+            vencido = time.monotonic() - ultima_descarga >= self._intervalo_descarga
+            if lote and (len(lote) >= self._tamanho_lote or vencido or encerrar):
+                self._gravar_lote(lote)
+                lote = []
+            if vencido or encerrar:
+                ultima_descarga = time.monotonic()
+
+    def _gravar_lote(self, lote):
+        registros_por_dia = {}
+        for dia, registro in lote:
+            registros_por_dia.setdefault(dia, []).append(registro)
+        try:
+            self._backend.gravar(registros_por_dia)
+            self._backend.descarregar()
+            self.registros_gravados += len(lote)
+        except Exception as e:
+            self.erros += len(lote)
+            logger.error(f"MetadataSink: Erro ao gravar lote de {len(lote)} metadados ({self.formato}): {e}", exc_info=True)
+
+    def fechar(self):
+        """Grava os registros pendentes, encerra a thread de escrita e fecha os arquivos."""
+        if self._thread is None:
+            return
+        self._fila.put(_FIM)
+        self._thread.join()
+        self._thread = None
+        try:
+            self._backend.fechar()
+        except Exception as e:
+            logger.error(f"MetadataSink: Erro ao fechar os arquivos de metadados: {e}", exc_info=True)
+        logger.debug(f"MetadataSink: Fechado ({self.registros_gravados} registros gravados, {self.erros} erros).")
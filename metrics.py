@@ -0,0 +1,303 @@
+# metrics.py
+"""
+Métricas do processo no formato texto do Prometheus (contadores, medidores e histogramas),
+atualizadas durante o download e expostas por um endpoint HTTP local opcional (ServidorMetricas)
+e/ou por um arquivo para o textfile collector do node_exporter (ArquivoMetricas).
+
+DownloadMetrics reúne as métricas do downloader; o DownloadController a alimenta pelos eventos do
+EventBus (event_bus.py), pelo observador de transferências e pelo resultado de cada registro.
+"""
+import bisect
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from event_bus import ListingPage, TransferDone, TransferFailed, Retry
+
+logger = logging.getLogger(__name__)
+
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites (segundos) dos histogramas de latência.
+BUCKETS_PAGINA_API = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BUCKETS_TRANSFERENCIA = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Intervalo entre gravações do arquivo do textfile collector (segundos).
+INTERVALO_ARQUIVO = 15.0
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_valor(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+class Counter:
+    """Contador monotônico, opcionalmente com rótulos (um valor por combinação de rótulos)."""
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor=1, **rotulos):
+        chave = tuple(str(rotulos.get(nome, "")) for nome in self._rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        chave = tuple(str(rotulos.get(nome, "")) for nome in self._rotulos)
+        with self._lock:
+            return self._valores.get(chave, 0)
+
+    def amostras(self):
+        with self._lock:
+            valores = dict(self._valores)
+        if not valores and not self._rotulos:
+            valores = {(): 0}
+        return [(self.nome + _formatar_rotulos(self._rotulos, chave), valor) for chave, valor in sorted(valores.items())]
+
+
+class Gauge:
+    """Medidor de valor instantâneo: definido com definir() ou lido de uma função no momento da coleta."""
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, funcao=None):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._funcao = funcao
+        self._valor = 0
+
+    def definir(self, valor):
+        self._valor = valor
+
+    def definir_funcao(self, funcao):
+        self._funcao = funcao
+
+    def amostras(self):
+        valor = self._valor
+        if self._funcao is not None:
+            try:
+                valor = self._funcao()
+            except Exception as e:
+                logger.error(f"Metrics: Erro ao ler o medidor {self.nome}: {e}", exc_info=True)
+        return [(self.nome, valor)]
+
+
+class Histogram:
+    """Histograma com limites fixos (cumulativos na exportação), soma e contagem."""
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, buckets):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._limites = tuple(sorted(buckets))
+        self._contagens = [0] * (len(self._limites) + 1)
+        self._soma = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        indice = bisect.bisect_left(self._limites, valor)
+        with self._lock:
+            self._contagens[indice] += 1
+            self._soma += valor
+
+    def amostras(self):
+        with self._lock:
+            contagens = list(self._contagens)
+            soma = self._soma
+        amostras = []
+        acumulado = 0
+        for limite, contagem in zip(self._limites + (float("inf"),), contagens):
+            acumulado += contagem
+            amostras.append((f'{self.nome}_bucket{{le="{_formatar_valor(float(limite))}"}}', acumulado))
+        amostras.append((f"{self.nome}_sum", soma))
+        amostras.append((f"{self.nome}_count", acumulado))
+        return amostras
+
+
+class MetricsRegistry:
+    """Conjunto de métricas exportadas juntas no formato texto do Prometheus."""
+
+    def __init__(self):
+        self._metricas = []
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Counter(nome, ajuda, rotulos))
+
+    def medidor(self, nome, ajuda, funcao=None):
+        return self._registrar(Gauge(nome, ajuda, funcao))
+
+    def histograma(self, nome, ajuda, buckets):
+        return self._registrar(Histogram(nome, ajuda, buckets))
+
+    def exportar_texto(self):
+        with self._lock:
+            metricas = list(self._metricas)
+        linhas = []
+        for metrica in metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            for nome, valor in metrica.amostras():
+                linhas.append(f"{nome} {_formatar_valor(valor)}")
+        return "\n".join(linhas) + "\n"
+
+
+class DownloadMetrics:
+    """
+    Métricas do downloader. Os contadores e histogramas são atualizados durante o processo; os medidores
+    (transferências ativas, fila de trabalho, retentativas pendentes, limite de concorrência) são lidos
+    do controlador no momento da coleta (DownloadController com o parâmetro metricas).
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.registros_listados = r.contador("widevoice_registros_listados_total", "Registros retornados pela listagem da API.")
+        self.registros_processados = r.contador("widevoice_registros_processados_total",
+                                                "Registros processados, por estado final (concluido, falha, cancelado).",
+                                                rotulos=("estado",))
+        self.gravacoes_baixadas = r.contador("widevoice_gravacoes_baixadas_total", "Gravações baixadas com sucesso.")
+        self.gravacoes_falhas = r.contador("widevoice_gravacoes_falhas_total",
+                                           "Gravações com falha definitiva após esgotar as retentativas, por categoria de erro.",
+                                           rotulos=("tipo_erro",))
+        self.retentativas = r.contador("widevoice_retentativas_total", "Retentativas agendadas, por categoria de erro.",
+                                       rotulos=("tipo_erro",))
+        self.transferencias = r.contador("widevoice_transferencias_total",
+                                         "Tentativas de transferência HTTP, por resultado (sucesso ou categoria de erro).",
+                                         rotulos=("resultado",))
+        self.bytes_transferidos = r.contador("widevoice_bytes_transferidos_total", "Bytes de gravações gravados em disco.")
+        self.latencia_pagina_api = r.histograma("widevoice_pagina_api_segundos",
+                                                "Tempo de espera por cada página da listagem da API.", BUCKETS_PAGINA_API)
+        self.latencia_transferencia = r.histograma("widevoice_transferencia_segundos",
+                                                   "Duração de cada tentativa de transferência HTTP.", BUCKETS_TRANSFERENCIA)
+        self.transferencias_ativas = r.medidor("widevoice_transferencias_ativas", "Downloads de gravação em andamento.")
+        self.fila_trabalho = r.medidor("widevoice_fila_trabalho", "Registros listados aguardando submissão.")
+        self.retentativas_pendentes = r.medidor("widevoice_retentativas_pendentes", "Retentativas aguardando o atraso.")
+        self.limite_concorrencia = r.medidor("widevoice_limite_concorrencia", "Limite atual de transferências simultâneas.")
+
+    def assinar(self, eventos):
+        """Assina os eventos do EventBus que alimentam as métricas."""
+        eventos.assinar((ListingPage, TransferDone, TransferFailed, Retry), self._receber_evento)
+
+    def _receber_evento(self, evento):
+        if isinstance(evento, TransferDone):
+            self.gravacoes_baixadas.incrementar()
+        elif isinstance(evento, ListingPage):
+            self.registros_listados.incrementar(evento.registros)
+            if evento.duracao is not None:
+                self.latencia_pagina_api.observar(evento.duracao)
+        elif isinstance(evento, Retry):
+            self.retentativas.incrementar(tipo_erro=evento.tipo_erro)
+        elif isinstance(evento, TransferFailed):
+            self.gravacoes_falhas.incrementar(tipo_erro=evento.tipo_erro)
+
+    def observar_transferencia(self, sucesso, duracao, bytes_transferidos, tipo_erro=None):
+        """Observador de cada tentativa HTTP (mesma assinatura do observador_transferencia dos downloaders)."""
+        self.transferencias.incrementar(resultado="sucesso" if sucesso else (tipo_erro or "erro"))
+        self.bytes_transferidos.incrementar(bytes_transferidos)
+        self.latencia_transferencia.observar(duracao)
+
+    def registrar_estado(self, estado):
+        self.registros_processados.incrementar(estado=estado)
+
+
+class _HandlerMetricas(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        corpo = self.registry.exportar_texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", TIPO_CONTEUDO)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        logger.debug("ServidorMetricas: " + formato, *args)
+
+
+class ServidorMetricas:
+    """Endpoint HTTP (GET /metrics) em uma thread própria. Por padrão, escuta apenas em 127.0.0.1."""
+
+    def __init__(self, registry, porta, endereco="127.0.0.1"):
+        handler = type("HandlerMetricas", (_HandlerMetricas,), {"registry": registry})
+        self._servidor = ThreadingHTTPServer((endereco, porta), handler)
+        self._servidor.daemon_threads = True
+        self.porta = self._servidor.server_address[1]
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="ServidorMetricas", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+        logger.info(f"ServidorMetricas: Métricas disponíveis em http://{self._servidor.server_address[0]}:{self.porta}/metrics")
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+
+class ArquivoMetricas:
+    """
+    Grava as métricas periodicamente em um arquivo .prom para o textfile collector do node_exporter.
+    A gravação é atômica (arquivo temporário + os.replace), para o coletor nunca ler um arquivo pela metade.
+    """
+
+    def __init__(self, registry, caminho, intervalo=INTERVALO_ARQUIVO):
+        self._registry = registry
+        self._caminho = caminho
+        self._intervalo = intervalo
+        self._evento_parada = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name="ArquivoMetricas", daemon=True)
+
+    def iniciar(self):
+        self.gravar()
+        self._thread.start()
+
+    def parar(self):
+        """Encerra a thread e grava os valores finais."""
+        self._evento_parada.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.gravar()
+
+    def _executar(self):
+        while not self._evento_parada.wait(self._intervalo):
+            self.gravar()
+
+    def gravar(self):
+        caminho_temporario = f"{self._caminho}.{os.getpid()}.tmp"
+        try:
+            diretorio = os.path.dirname(self._caminho)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+            with open(caminho_temporario, "w", encoding="utf-8") as f:
+                f.write(self._registry.exportar_texto())
+            os.replace(caminho_temporario, self._caminho)
+        except OSError as e:
+            logger.error(f"ArquivoMetricas: Erro ao gravar {self._caminho}: {e}", exc_info=True)
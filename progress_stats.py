@@ -0,0 +1,86 @@
+# progress_stats.py
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Frequência do canal de estatísticas (10 Hz): a interface recebe no máximo um instantâneo por intervalo.
+INTERVALO_PUBLICACAO = 0.1
+
+# Janela (segundos) usada no cálculo das taxas: reflete quedas de vazão em poucos segundos.
+JANELA_TAXA = 5.0
+
+
+class ProgressStats:
+    """
+    Calcula taxas e ETA a partir de amostras cumulativas (registros processados e bytes transferidos).
+    As taxas usam uma janela deslizante de JANELA_TAXA segundos; o ETA usa a taxa de registros da janela.
+    Usado apenas pela thread publicadora.
+    """
+
+    def __init__(self, janela=JANELA_TAXA):
+        self._janela = janela
+        self._amostras = deque()
+        self._inicio = time.monotonic()
+
+    def instantaneo(self, processados, total, bytes_transferidos, **extras):
+        """Retorna um dict com os contadores, as taxas, o ETA e os campos extras informados."""
+        agora = time.monotonic()
+        self._amostras.append((agora, processados, bytes_transferidos))
+        while len(self._amostras) > 2 and agora - self._amostras[0][0] > self._janela:
+            self._amostras.popleft()
+
+        instante_inicial, processados_inicial, bytes_inicial = self._amostras[0]
+        intervalo = agora - instante_inicial
+        registros_por_segundo = (processados - processados_inicial) / intervalo if intervalo > 0 else 0.0
+        bytes_por_segundo = (bytes_transferidos - bytes_inicial) / intervalo if intervalo > 0 else 0.0
+
+        eta_segundos = None
+        if total and registros_por_segundo > 0:
+            eta_segundos = max(total - processados, 0) / registros_por_segundo
+
+        return {
+            'processados': processados,
+            'total': total,
+            'bytes_transferidos': bytes_transferidos,
+            'registros_por_segundo': registros_por_segundo,
+            'bytes_por_segundo': bytes_por_segundo,
+            'eta_segundos': eta_segundos,
+            'decorrido': agora - self._inicio,
+            **extras,
+        }
+
+
+class ProgressPublisher:
+    """
+    Thread que publica, a cada intervalo, o instantâneo retornado por coletar() em publicar(instantaneo).
+    parar() encerra a thread e publica um último instantâneo, com os valores finais.
+    """
+
+    def __init__(self, coletar, publicar, intervalo=INTERVALO_PUBLICACAO):
+        self._coletar = coletar
+        self._publicar = publicar
+        self._intervalo = intervalo
+        self._evento_parada = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name="EstatisticasProgresso", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def parar(self):
+        self._evento_parada.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._publicar_instantaneo()
+
+    def _executar(self):
+        while not self._evento_parada.wait(self._intervalo):
+            self._publicar_instantaneo()
+
+    def _publicar_instantaneo(self):
+        try:
+            self._publicar(self._coletar())
+        except Exception as e:
+            logger.error(f"ProgressPublisher: Erro ao publicar estatísticas de progresso: {e}", exc_info=True)
@@ -1,52 +1,367 @@
 # recording_downloader.py
 import requests
 import os
+import hashlib
 import datetime
 import config
 import time
 import logging
 import threading
 
-from exceptions import DownloadCancelledError
+from exceptions import DownloadCancelledError, TransferenciaIncompletaError, TransferenciaRetentavelError
+from download_manifest import TIPO_GRAVACAO
+from metadata_sink import SITUACAO_GRAVACAO, SITUACAO_SEM_GRAVACAO, formatar_metadado_txt, situacao_de_sufixo
+from retry_scheduler import interpretar_retry_after
+from transfer_io import gravar_resposta
+from event_bus import TransferStarted, TransferProgress, TransferDone, MetadataGenerated, RecordSkipped
+import tracing
 
 logger = logging.getLogger(__name__)
 
 MAX_RETRIES = 3
 RETRY_DELAY = 5
 
+# Categorias de erro HTTP que podem ser retentadas (as demais respostas de erro são definitivas).
+ERROS_HTTP_RETENTAVEIS = ('http_5xx', 'http_429')
 
-def gerar_arquivo_metadado(chamada, caminho_arquivo_gravacao, status_callback=None):
+# Sufixo dos arquivos parcialmente baixados. O arquivo só recebe o nome final quando completo,
+# e um parcial existente é retomado com "Range: bytes=N-" na próxima tentativa ou execução.
+SUFIXO_PARCIAL = ".part"
+
+# Tamanho dos blocos lidos ao calcular o SHA-256 de um parcial já existente em disco.
+TAMANHO_BLOCO_HASH = 1024 * 1024
+
+# (ano, mês, dia, HHMMSS) usados quando a 'datahora' da chamada está vazia ou inválida (diretório 0000/00/00).
+COMPONENTES_DATAHORA_PADRAO = ("0000", "00", "00", "000000")
+
+
+def gerar_arquivo_metadado(chamada, caminho_arquivo_gravacao, status_callback=None, metadata_sink=None,
+                           situacao=SITUACAO_GRAVACAO, eventos=None):
     """
     Gera um arquivo TXT com os metadados da chamada.
     Salva no mesmo diretório da gravação ou com um nome indicando falha.
+    Com metadata_sink (formatos em lote), o registro é enfileirado no arquivo diário do sink, com a situação informada.
+    Com eventos (EventBus), o TXT gerado é publicado como MetadataGenerated, apenas se houver assinantes,
+    em vez de uma mensagem em status_callback.
+    Retorna o caminho do arquivo do metadado, ou None em caso de erro.
     """
-    try:
-        base, _ = os.path.splitext(caminho_arquivo_gravacao)
-        caminho_arquivo_metadado = base + ".txt"
+    with tracing.span("metadado.gerar", "metadado", id=chamada.get('id')):
+        try:
+            if metadata_sink is not None:
+                return metadata_sink.registrar(chamada, situacao, caminho_arquivo_gravacao)
+
+            base, _ = os.path.splitext(caminho_arquivo_gravacao)
+            caminho_arquivo_metadado = base + ".txt"
+
+            with open(caminho_arquivo_metadado, 'w', encoding='utf-8') as f:
+                f.write(formatar_metadado_txt(chamada))
+
+            if eventos is not None:
+                if eventos.tem_assinantes(MetadataGenerated):
+                    eventos.publicar(MetadataGenerated(chamada.get('id', 'desconhecido'), caminho_arquivo_metadado))
+                return caminho_arquivo_metadado
+
+            mensagem = f"Arquivo de metadado gerado: {os.path.basename(caminho_arquivo_metadado)}"
+            # O status_callback do controlador já registra a mensagem no log.
+            if status_callback:
+                status_callback(mensagem)
+            else:
+                logger.info(mensagem)
+            return caminho_arquivo_metadado
+
+        except Exception as e:
+            chamada_id = chamada.get('id', 'desconhecido')
+            mensagem_erro = f"Erro ao gerar arquivo de metadado para Chamada ID {chamada_id}: {e}"
+            if status_callback:
+                status_callback(f"Erro: Falha ao gerar metadado para ID {chamada_id}.", level=logging.ERROR)
+            logger.error(mensagem_erro, exc_info=True)
+            return None
+
+
+def informar_sem_gravacao(chamada, gera_metadado, status_callback=None, eventos=None):
+    """
+    Informa que a chamada não tem gravação (INFO se o metadado será gerado, DEBUG se ela é ignorada).
+    Com eventos, publica RecordSkipped apenas se houver assinantes nesse nível; sem eventos, envia a
+    mensagem ao status_callback ou ao log.
+    """
+    nivel = logging.INFO if gera_metadado else logging.DEBUG
+    if eventos is not None and not eventos.tem_assinantes(RecordSkipped, nivel):
+        return
+    evento = RecordSkipped(chamada.get('id', 'desconhecido'), chamada.get('numero', 'desconhecido'),
+                           chamada.get('datahora', 'desconhecido'), gera_metadado)
+    if eventos is not None:
+        eventos.publicar(evento)
+    elif status_callback:
+        status_callback(evento.mensagem(), level=nivel)
+    else:
+        logger.log(nivel, "recording_downloader: %s", evento.mensagem())
+
+
+def componentes_datahora(datahora_str):
+    """
+    (ano, mês, dia, HHMMSS) da 'datahora' de uma chamada, para o diretório Ano/Mês/Dia e o nome dos arquivos.
+    Levanta ValueError (ou TypeError) se a datahora não estiver no formato da API.
+    """
+    data_chamada = datetime.datetime.strptime(datahora_str, '%Y-%m-%d %H:%M:%S')
+    return str(data_chamada.year), f"{data_chamada.month:02d}", f"{data_chamada.day:02d}", data_chamada.strftime('%H%M%S')
+
+
+def nome_base_arquivo(componentes, numero_chamada, chamada_id):
+    """Nome dos arquivos de uma chamada, sem sufixo nem extensão: Ano_Mes_Dia_Numero_HoraMinSeg_ID."""
+    ano, mes_str, dia_str, hora_min_seg = componentes
+    return f"{ano}_{mes_str}_{dia_str}_{numero_chamada}_{hora_min_seg}_{chamada_id}"
+
+
+def preparar_destino_gravacao(url_base, chamada, diretorio_base=None, status_callback=None, download_metadata_with_recording=True,
+                              metadata_sink=None):
+    """
+    Monta a URL da gravação e o caminho local (Ano/Mês/Dia) e cria os diretórios de destino.
+    Regras compartilhadas por todos os motores de download.
+    Retorna (url_gravacao, caminho_arquivo_local), ou None se não foi possível criar os diretórios
+    (nesse caso o metadado de erro _ERROR_DIR já foi gerado, se a opção estiver habilitada).
+    """
+    chamada_id = chamada.get('id', 'desconhecido')
+    numero_chamada = chamada.get('numero', 'desconhecido')
+
+    caminho_gravacao_api = chamada['gravacao'].replace("\\/", "/")
+    url_gravacao = f"{config.PROTOCOLO_SERVIDOR}://{url_base}/gravador28/{caminho_gravacao_api}.gsm"
 
-        metadata_content = "--- Metadados da Chamada ---\n"
-        for key, value in chamada.items():
-            metadata_content += f"{key.replace('_', ' ').capitalize()}: {value}\n"
 
-        with open(caminho_arquivo_metadado, 'w', encoding='utf-8') as f:
-            f.write(metadata_content)
+    datahora_str = chamada.get('datahora', '')
+    componentes = COMPONENTES_DATAHORA_PADRAO
+
+    try:
+        if datahora_str:
+             componentes = componentes_datahora(datahora_str)
+        else:
+             logger.warning(f"recording_downloader: Campo 'datahora' vazio para Chamada ID {chamada_id}. Usando data padrão.")
 
-        mensagem = f"Arquivo de metadado gerado: {os.path.basename(caminho_arquivo_metadado)}"
+    except (ValueError, TypeError) as e:
+        mensagem = f"Aviso: Formato de data/hora inválido ou ausente para a chamada com ID {chamada_id}. Usando data padrão (0000/00/00)."
         if status_callback:
-            status_callback(mensagem)
-        logger.info(mensagem)
+            status_callback(mensagem, level=logging.WARNING)
+        logger.warning(mensagem)
+
+    ano, mes_str, dia_str, _ = componentes
+    diretorio_raiz = diretorio_base if diretorio_base else config.DIRETORIO_BASE_GRAVACOES
+    diretorio_destino = os.path.join(diretorio_raiz, ano, mes_str, dia_str)
 
+
+    try:
+        os.makedirs(diretorio_destino, exist_ok=True)
     except Exception as e:
-        chamada_id = chamada.get('id', 'desconhecido')
-        mensagem_erro = f"Erro ao gerar arquivo de metadado para Chamada ID {chamada_id}: {e}"
+        logger.error(f"recording_downloader: Erro ao criar diretórios para Chamada ID {chamada_id} (Dir: {diretorio_destino}): {e}", exc_info=True)
         if status_callback:
-            status_callback(f"Erro: Falha ao gerar metadado para ID {chamada_id}.", level=logging.ERROR)
-        logger.error(mensagem_erro, exc_info=True)
+            status_callback(f"Erro: Não foi possível criar diretórios para Chamada ID {chamada_id}.", level=logging.ERROR)
+        # --- Tenta gerar metadado de erro APENAS SE A OPÇÃO DE METADADO COM GRAVAÇÃO ESTIVER HABILITADA ---
+        if download_metadata_with_recording:
+             try:
+                  nome_arquivo_base = nome_base_arquivo(componentes, numero_chamada, chamada_id)
+                  caminho_arquivo_metadado_erro_dir = os.path.join(diretorio_base if diretorio_base else ".", f"{nome_arquivo_base}_ERROR_DIR.txt")
+                  if metadata_sink is not None:
+                       gerar_arquivo_metadado(chamada, None, status_callback, metadata_sink, situacao_de_sufixo("_ERROR_DIR.txt"))
+                  else:
+                       gerar_arquivo_metadado(chamada, caminho_arquivo_metadado_erro_dir, status_callback)
+             except Exception as meta_e:
+                  logger.error(f"recording_downloader: Erro adicional ao gerar metadato de erro de diretório para Chamada ID {chamada_id}: {meta_e}", exc_info=True)
+        else:
+            logger.debug(f"recording_downloader: Geração de metadado de erro de diretório para Chamada ID {chamada_id} ignorada conforme opção.")
+        # --- FIM DA VERIFICAÇÃO DA OPÇÃO ---
+        return None
+
+
+    nome_arquivo = nome_base_arquivo(componentes, numero_chamada, chamada_id) + ".gsm"
+    caminho_arquivo_local = os.path.join(diretorio_destino, nome_arquivo)
+
+    return url_gravacao, caminho_arquivo_local
+
+
+def gerar_metadado_de_falha(chamada, caminho_arquivo_local, sufixo, status_callback=None,
+                            download_metadata_with_recording=True, contexto="falha", metadata_sink=None):
+    """
+    Gera o metadado de uma gravação que não pôde ser baixada (ex.: sufixo "_DOWNLOAD_FAILED.txt"),
+    apenas se a opção de metadado com gravação estiver habilitada.
+    Com metadata_sink, o sufixo define a situação do registro (ex.: 'download_failed').
+    """
+    chamada_id = chamada.get('id', 'desconhecido')
+    # --- Tenta gerar metadado de falha APENAS SE A OPÇÃO DE METADADO COM GRAVAÇÃO ESTIVER HABILITADA ---
+    if download_metadata_with_recording:
+         try:
+              if metadata_sink is not None:
+                   gerar_arquivo_metadado(chamada, caminho_arquivo_local, status_callback, metadata_sink, situacao_de_sufixo(sufixo))
+              else:
+                   gerar_arquivo_metadado(chamada, caminho_arquivo_local + sufixo, status_callback)
+         except Exception as meta_e:
+              logger.error(f"recording_downloader: Erro adicional ao gerar metadato de {contexto} para Chamada ID {chamada_id}: {meta_e}", exc_info=True)
+    else:
+         logger.debug(f"recording_downloader: Geração de metadado de {contexto} para Chamada ID {chamada_id} ignorada conforme opção.")
+    # --- FIM DA VERIFICAÇÃO DA OPÇÃO ---
+
+
+def caminho_parcial(caminho_arquivo_local):
+    """Caminho do arquivo parcial correspondente a uma gravação."""
+    return caminho_arquivo_local + SUFIXO_PARCIAL
+
+
+def tamanho_parcial_existente(caminho_arquivo_parcial):
+    """Tamanho em bytes do arquivo parcial existente, ou 0 se não houver."""
+    try:
+        return os.path.getsize(caminho_arquivo_parcial)
+    except OSError:
+        return 0
+
+
+def cabecalhos_retomada(offset):
+    """
+    Cabeçalhos da requisição de uma gravação. Pede o corpo sem compressão, para que os bytes
+    em disco correspondam aos offsets do servidor, e o restante do arquivo se houver parcial.
+    """
+    cabecalhos = {'Accept-Encoding': 'identity'}
+    if offset > 0:
+        cabecalhos['Range'] = f"bytes={offset}-"
+    return cabecalhos
+
+
+def _interpretar_content_range(valor):
+    """Interpreta 'bytes inicio-fim/total' ou 'bytes */total'. Retorna (inicio, total), com None onde ausente."""
+    try:
+        unidade, intervalo = valor.strip().split(' ', 1)
+        if unidade.lower() != 'bytes':
+            return None, None
+        faixa, total = intervalo.split('/', 1)
+        total = None if total.strip() == '*' else int(total)
+        inicio = None if faixa.strip() == '*' else int(faixa.split('-', 1)[0])
+        return inicio, total
+    except (AttributeError, ValueError):
+        return None, None
+
+
+def interpretar_resposta_retomada(status, cabecalhos, offset):
+    """
+    Decide como gravar o corpo de uma resposta a partir do offset solicitado.
+    Retorna (modo_abertura, offset_efetivo, tamanho_total_esperado):
+    - 206 com Content-Range iniciando no offset: anexa ao parcial ('ab');
+    - 200 (servidor ignorou o Range): reescreve desde o byte zero ('wb').
+    tamanho_total_esperado é None quando o servidor não o informa.
+    Levanta TransferenciaIncompletaError se o Content-Range não corresponder ao offset pedido.
+    """
+    if status == 206:
+        inicio, total = _interpretar_content_range(cabecalhos.get('Content-Range', ''))
+        if inicio != offset:
+            raise TransferenciaIncompletaError(f"Content-Range inesperado ({cabecalhos.get('Content-Range')}) para retomada no byte {offset}.")
+        if total is None and cabecalhos.get('Content-Length'):
+            total = offset + int(cabecalhos['Content-Length'])
+        return 'ab', offset, total
+
+    tamanho = cabecalhos.get('Content-Length')
+    return 'wb', 0, int(tamanho) if tamanho and tamanho.isdigit() else None
+
+
+def parcial_ja_completo(cabecalhos, offset):
+    """Para uma resposta 416, indica se o parcial existente já tem o tamanho total do arquivo."""
+    _, total = _interpretar_content_range(cabecalhos.get('Content-Range', ''))
+    return total is not None and total == offset
+
+
+def finalizar_parcial(caminho_arquivo_parcial, caminho_arquivo_local, tamanho_total_esperado):
+    """Confere o tamanho do parcial e o renomeia para o nome final da gravação. Retorna o tamanho final."""
+    tamanho_final = tamanho_parcial_existente(caminho_arquivo_parcial)
+    if tamanho_total_esperado is not None and tamanho_final != tamanho_total_esperado:
+        raise TransferenciaIncompletaError(
+            f"Tamanho recebido ({tamanho_final} bytes) difere do anunciado pelo servidor ({tamanho_total_esperado} bytes)."
+        )
+    os.replace(caminho_arquivo_parcial, caminho_arquivo_local)
+    return tamanho_final
+
+
+def iniciar_hash_parcial(caminho_arquivo_parcial, modo_abertura):
+    """
+    Inicia o SHA-256 incremental de uma gravação. Em uma retomada (modo 'ab'), os bytes do parcial
+    já existente entram no hash antes dos recebidos, de modo que o resultado é o hash do arquivo completo.
+    """
+    hash_gravacao = hashlib.sha256()
+    if modo_abertura == 'ab':
+        with open(caminho_arquivo_parcial, 'rb') as f:
+            while True:
+                bloco = f.read(TAMANHO_BLOCO_HASH)
+                if not bloco:
+                    break
+                hash_gravacao.update(bloco)
+    return hash_gravacao
+
+
+def registrar_gravacao_no_manifesto(manifest, chamada, caminho_arquivo_local, tamanho, hash_gravacao, com_metadado):
+    """
+    Registra uma gravação concluída no manifesto do destino, se houver um.
+    com_metadado: True somente se o metadado da gravação foi de fato gerado.
+    """
+    if manifest is None:
+        return
+    manifest.registrar(chamada.get('id'), TIPO_GRAVACAO, caminho_arquivo_local, tamanho,
+                       hash_gravacao.hexdigest() if hash_gravacao is not None else None,
+                       com_metadado=com_metadado)
+
+
+def descartar_parcial(caminho_arquivo_parcial):
+    """Remove um parcial inválido, para que a próxima tentativa baixe o arquivo completo."""
+    try:
+        os.remove(caminho_arquivo_parcial)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"recording_downloader: Erro ao remover arquivo parcial {caminho_arquivo_parcial}: {e}", exc_info=True)
+
+
+def classificar_erro(erro):
+    """
+    Classifica um erro de transferência em uma categoria estável:
+    'timeout', 'conexao', 'http_429', 'http_5xx', 'http_4xx' ou 'outro'.
+    Aceita exceções do requests e objetos com atributo 'status' (ex.: aiohttp.ClientResponseError).
+    """
+    status = None
+    resposta = getattr(erro, 'response', None)
+    if resposta is not None:
+        status = getattr(resposta, 'status_code', None)
+    if status is None:
+        status = getattr(erro, 'status', None)
+
+    if isinstance(status, int):
+        if status == 429:
+            return 'http_429'
+        if status >= 500:
+            return 'http_5xx'
+        return 'http_4xx'
+    if isinstance(erro, TransferenciaIncompletaError):
+        return 'conexao'
+    if isinstance(erro, (requests.exceptions.Timeout, TimeoutError)):
+        return 'timeout'
+    if isinstance(erro, (requests.exceptions.ConnectionError, ConnectionError)):
+        return 'conexao'
+    return 'outro'
+
+
+def notificar_observador(observador_transferencia, sucesso, duracao, bytes_transferidos, tipo_erro=None):
+    """Chama o observador de transferência, se houver, sem deixar que uma falha nele afete o download."""
+    if observador_transferencia is None:
+        return
+    try:
+        observador_transferencia(sucesso, duracao, bytes_transferidos, tipo_erro)
+    except Exception as e:
+        logger.error(f"recording_downloader: Erro ao chamar observador de transferência: {e}", exc_info=True)
+
+
+def _publicador_progresso(eventos, chamada_id, offset, tamanho_total):
+    """Callback de progresso de gravar_resposta que publica TransferProgress com o total de bytes do arquivo."""
+    def publicar(bytes_gravados):
+        eventos.publicar(TransferProgress(chamada_id, offset + bytes_gravados, tamanho_total))
+    return publicar
 
 
 # Adicionar download_metadata_with_recording e download_metadata_without_recording como parâmetros
 def baixar_gravacao(url_base, chamada, diretorio_base=None, status_callback=None, cancel_event=None,
-                    download_metadata_with_recording=True, download_metadata_without_recording=True): # --- NOVOS PARAMS ---
+                    download_metadata_with_recording=True, download_metadata_without_recording=True, # --- NOVOS PARAMS ---
+                    sessao_http=None, observador_transferencia=None, manifest=None, tentativa_unica=False,
+                    metadata_sink=None, eventos=None):
     """
     Baixa um arquivo de gravação para o diretório local com tentativas e suporte a cancelamento.
     Gera metadado opcionalmente para chamadas sem gravação ou em caso de falha.
@@ -55,42 +370,44 @@ def baixar_gravacao(url_base, chamada, diretorio_base=None, status_callback=None
     cancel_event: Um threading.Event para sinalizar o cancelamento.
     download_metadata_with_recording: Booleano para baixar metadados com gravação (default True). # --- NOVO ---
     download_metadata_without_recording: Booleano para baixar metadados sem gravação (default True). # --- NOVO ---
+    sessao_http: Objeto opcional com interface get() (ex.: HttpSessionPool) para reutilizar conexões keep-alive.
+    observador_transferencia: Função opcional chamada ao fim de cada tentativa HTTP com
+                              (sucesso, duracao_segundos, bytes_transferidos, tipo_erro).
+    manifest: DownloadManifest opcional onde a gravação concluída é registrada (caminho, tamanho e SHA-256).
+    tentativa_unica: se True, faz uma única tentativa e, em erro transitório (conexão, timeout, 5xx, 429),
+                     levanta TransferenciaRetentavelError em vez de aguardar e tentar de novo na mesma thread.
+    metadata_sink: MetadataSink opcional; se informado, os metadados vão para os arquivos diários do sink em vez de um TXT por chamada.
+    eventos: EventBus opcional; se informado, o início, o progresso e a conclusão de cada tentativa são publicados como
+             eventos (TransferStarted, TransferProgress, TransferDone) em vez de mensagens em status_callback.
     Retorna True em sucesso, False em falha, levanta DownloadCancelledError se cancelado.
     """
     chamada_id = chamada.get('id', 'desconhecido')
     numero_chamada = chamada.get('numero', 'desconhecido')
-    datahora_chamada = chamada.get('datahora', 'desconhecido')
 
     if cancel_event and cancel_event.is_set():
-        logger.debug(f"Baixar gravação: Cancelamento detectado antes de processar Chamada ID {chamada_id}.")
+        logger.debug("Baixar gravação: Cancelamento detectado antes de processar Chamada ID %s.", chamada_id)
         raise DownloadCancelledError(f"Processamento cancelado para Chamada ID {chamada_id}.")
 
 
     # Verifica se a chamada possui o campo 'gravacao'
     if 'gravacao' not in chamada or not chamada['gravacao']:
-        mensagem = f"Chamada: Número {numero_chamada} em {datahora_chamada} (ID {chamada_id}) - Não possui gravação."
         # --- Verifica a opção de metadado SEM gravação antes de processar ---
         if download_metadata_without_recording:
-             mensagem += " Gerando apenas metadado em pasta separada."
-             if status_callback:
-                  status_callback(mensagem, level=logging.INFO)
-             logger.info(f"recording_downloader: {mensagem}")
+             informar_sem_gravacao(chamada, True, status_callback, eventos)
 
              # Tenta gerar o metadado apenas se a opção estiver habilitada
              try:
+                 if metadata_sink is not None:
+                     if cancel_event and cancel_event.is_set():
+                         raise DownloadCancelledError(f"Geração de metadado cancelada para Chamada ID {chamada_id} (sem gravação).")
+                     return gerar_arquivo_metadado(chamada, None, status_callback, metadata_sink, SITUACAO_SEM_GRAVACAO) is not None
+
                  datahora_str = chamada.get('datahora', '')
-                 ano, mes_str, dia_str = "0000", "00", "00"
-                 hora_min_seg = "000000"
+                 componentes = COMPONENTES_DATAHORA_PADRAO
 
                  try:
                       if datahora_str:
-                           data_chamada = datetime.datetime.strptime(datahora_str, '%Y-%m-%d %H:%M:%S')
-                           ano = str(data_chamada.year)
-                           mes = data_chamada.month
-                           dia = data_chamada.day
-                           mes_str = f"{mes:02d}"
-                           dia_str = f"{dia:02d}"
-                           hora_min_seg = data_chamada.strftime('%H%M%S')
+                           componentes = componentes_datahora(datahora_str)
                       else:
                            logger.warning(f"recording_downloader: Campo 'datahora' vazio para Chamada ID {chamada_id}. Usando data padrão para metadado sem gravação.")
 
@@ -99,19 +416,20 @@ def baixar_gravacao(url_base, chamada, diretorio_base=None, status_callback=None
 
                  diretorio_raiz = diretorio_base if diretorio_base else config.DIRETORIO_BASE_GRAVACOES
 
+                 ano, mes_str, dia_str, _ = componentes
                  diretorio_base_metadado = os.path.join(diretorio_raiz, "Metadata_Only")
                  diretorio_destino_dia = os.path.join(diretorio_base_metadado, ano, mes_str, dia_str)
 
                  os.makedirs(diretorio_destino_dia, exist_ok=True)
 
-                 nome_arquivo_base = f"{ano}_{mes_str}_{dia_str}_{numero_chamada}_{hora_min_seg}_{chamada_id}"
+                 nome_arquivo_base = nome_base_arquivo(componentes, numero_chamada, chamada_id)
                  caminho_arquivo_metadado_sem_gravacao = os.path.join(diretorio_destino_dia, f"{nome_arquivo_base}_METADADO_SEM_GRAVACAO.txt")
 
                  if cancel_event and cancel_event.is_set():
-                     logger.debug(f"Baixar gravação: Cancelamento detectado antes de gerar metadado para Chamada ID {chamada_id}.")
+                     logger.debug("Baixar gravação: Cancelamento detectado antes de gerar metadado para Chamada ID %s.", chamada_id)
                      raise DownloadCancelledError(f"Geração de metadado cancelada para Chamada ID {chamada_id} (sem gravação).")
 
-                 gerar_arquivo_metadado(chamada, caminho_arquivo_metadado_sem_gravacao, status_callback)
+                 gerar_arquivo_metadado(chamada, caminho_arquivo_metadado_sem_gravacao, status_callback, eventos=eventos)
 
              except DownloadCancelledError:
                  raise
@@ -127,142 +445,155 @@ def baixar_gravacao(url_base, chamada, diretorio_base=None, status_callback=None
 
         else:
              # --- Caso a opção de metadado SEM gravação não esteja habilitada e não tenha gravação ---
-             mensagem += " Processamento ignorado conforme opção (sem gravação)."
-             if status_callback:
-                  status_callback(mensagem, level=logging.DEBUG)
-             logger.debug(f"recording_downloader: {mensagem}")
+             informar_sem_gravacao(chamada, False, status_callback, eventos)
              return True # Considerado processado/ignorado com sucesso
 
 
     # --- Continua a lógica de download APENAS SE HOUVER GRAVAÇÃO ---
-    caminho_gravacao_api = chamada['gravacao'].replace("\\/", "/")
-    url_gravacao = f"https://{url_base}/gravador28/{caminho_gravacao_api}.gsm"
-
-
-    datahora_str = chamada.get('datahora', '')
-    ano, mes_str, dia_str = "0000", "00", "00"
-    hora_min_seg = "000000"
-
-    try:
-        if datahora_str:
-             data_chamada = datetime.datetime.strptime(datahora_str, '%Y-%m-%d %H:%M:%S')
-             ano = str(data_chamada.year)
-             mes = data_chamada.month
-             dia = data_chamada.day
-             mes_str = f"{mes:02d}"
-             dia_str = f"{dia:02d}"
-             hora_min_seg = data_chamada.strftime('%H%M%S')
-        else:
-             logger.warning(f"recording_downloader: Campo 'datahora' vazio para Chamada ID {chamada_id}. Usando data padrão.")
-
-    except (ValueError, TypeError) as e:
-        mensagem = f"Aviso: Formato de data/hora inválido ou ausente para a chamada com ID {chamada_id}. Usando data padrão (0000/00/00)."
-        if status_callback:
-            status_callback(mensagem, level=logging.WARNING)
-        logger.warning(mensagem)
-
-    diretorio_raiz = diretorio_base if diretorio_base else config.DIRETORIO_BASE_GRAVACOES
-    diretorio_destino = os.path.join(diretorio_raiz, ano, mes_str, dia_str)
-
-
-    try:
-        os.makedirs(diretorio_destino, exist_ok=True)
-    except Exception as e:
-        logger.error(f"recording_downloader: Erro ao criar diretórios para Chamada ID {chamada_id} (Dir: {diretorio_destino}): {e}", exc_info=True)
-        if status_callback:
-            status_callback(f"Erro: Não foi possível criar diretórios para Chamada ID {chamada_id}.", level=logging.ERROR)
-        # --- Tenta gerar metadado de erro APENAS SE A OPÇÃO DE METADADO COM GRAVAÇÃO ESTIVER HABILITADA ---
-        if download_metadata_with_recording:
-             try:
-                  nome_arquivo_base = f"{ano}_{mes_str}_{dia_str}_{numero_chamada}_{hora_min_seg}_{chamada_id}"
-                  caminho_arquivo_metadado_erro_dir = os.path.join(diretorio_base if diretorio_base else ".", f"{nome_arquivo_base}_ERROR_DIR.txt")
-                  gerar_arquivo_metadado(chamada, caminho_arquivo_metadado_erro_dir, status_callback)
-             except Exception as meta_e:
-                  logger.error(f"recording_downloader: Erro adicional ao gerar metadato de erro de diretório para Chamada ID {chamada_id}: {meta_e}", exc_info=True)
-        else:
-            logger.debug(f"recording_downloader: Geração de metadado de erro de diretório para Chamada ID {chamada_id} ignorada conforme opção.")
-        # --- FIM DA VERIFICAÇÃO DA OPÇÃO ---
+    with tracing.span("download.preparar", "disco", id=chamada_id):
+        destino = preparar_destino_gravacao(url_base, chamada, diretorio_base, status_callback, download_metadata_with_recording,
+                                            metadata_sink)
+    if destino is None:
         return False
-
-
-    nome_arquivo = f"{ano}_{mes_str}_{dia_str}_{numero_chamada}_{hora_min_seg}_{chamada_id}.gsm"
-    caminho_arquivo_local = os.path.join(diretorio_destino, nome_arquivo)
+    url_gravacao, caminho_arquivo_local = destino
+    nome_arquivo = os.path.basename(caminho_arquivo_local)
+    caminho_arquivo_parcial = caminho_parcial(caminho_arquivo_local)
 
 
     # --- Lógica de Tentativas de Download ---
-    for attempt in range(MAX_RETRIES + 1):
+    for attempt in range(1 if tentativa_unica else MAX_RETRIES + 1):
+        inicio_tentativa = None
+        bytes_transferidos = 0
         try:
             if cancel_event and cancel_event.is_set():
-                logger.debug(f"Baixar gravação: Cancelamento detectado na tentativa {attempt} para Chamada ID {chamada_id}.")
+                logger.debug("Baixar gravação: Cancelamento detectado na tentativa %s para Chamada ID %s.", attempt, chamada_id)
                 raise DownloadCancelledError(f"Processo de download cancelado para Chamada ID {chamada_id}.")
 
             if attempt > 0:
                 mensagem_tentativa = f"Tentativa {attempt}/{MAX_RETRIES} de baixar: {url_gravacao} (Chamada ID {chamada_id}). Aguardando {RETRY_DELAY * attempt}s..."
                 if status_callback:
                     status_callback(mensagem_tentativa)
-                logger.info(mensagem_tentativa)
+                else:
+                    logger.info(mensagem_tentativa)
                 time.sleep(RETRY_DELAY * attempt)
 
-            else:
+            elif eventos is None:
                  mensagem_tentativa_inicial = f"Tentando baixar gravação da chamada {chamada_id}: {url_gravacao}"
                  if status_callback:
                       status_callback(mensagem_tentativa_inicial)
-                 logger.info(mensagem_tentativa_inicial)
-
-            response_gravacao = requests.get(url_gravacao, stream=True, timeout=30)
-            response_gravacao.raise_for_status()
-
-            with open(caminho_arquivo_local, 'wb') as f:
-                for chunk in response_gravacao.iter_content(chunk_size=8192):
-                    if cancel_event and cancel_event.is_set():
-                        logger.debug(f"Baixar gravação: Cancelamento detectado durante o download de Chamada ID {chamada_id}. Limpando arquivo parcial.")
-                        raise DownloadCancelledError(f"Download cancelado durante a transferência para Chamada ID {chamada_id}.")
-                    f.write(chunk)
-
-            mensagem_sucesso = f"Download bem-sucedido: {nome_arquivo} (Chamada ID {chamada_id})."
-            if status_callback:
-                status_callback(mensagem_sucesso, level=logging.INFO)
-            logger.info(mensagem_sucesso)
+                 else:
+                      logger.info(mensagem_tentativa_inicial)
+
+            inicio_tentativa = time.monotonic()
+            bytes_transferidos = 0
+            hash_gravacao = None
+            offset = tamanho_parcial_existente(caminho_arquivo_parcial)
+            if offset > 0:
+                logger.info("recording_downloader: Retomando download de %s a partir do byte %s (Chamada ID %s).", nome_arquivo, offset, chamada_id)
+            if eventos is not None and eventos.tem_assinantes(TransferStarted):
+                eventos.publicar(TransferStarted(chamada_id, url_gravacao, offset))
+
+            cliente_http = sessao_http if sessao_http is not None else requests
+            # Conexão (DNS/TCP/TLS, se não houver uma reaproveitável no pool) e espera pelos cabeçalhos (TTFB).
+            with tracing.span("download.conexao_ttfb", "rede", id=chamada_id, offset=offset):
+                response_gravacao = cliente_http.get(url_gravacao, stream=True, timeout=30, headers=cabecalhos_retomada(offset))
+            with response_gravacao:
+                if response_gravacao.status_code == 416 and offset > 0:
+                    # O servidor não tem bytes além do parcial: ou ele já está completo, ou é inválido.
+                    if not parcial_ja_completo(response_gravacao.headers, offset):
+                        descartar_parcial(caminho_arquivo_parcial)
+                        raise TransferenciaIncompletaError(f"Arquivo parcial de {offset} bytes inválido para Chamada ID {chamada_id}. Descartado.")
+                    tamanho_total_esperado = offset
+                    if manifest is not None:
+                        hash_gravacao = iniciar_hash_parcial(caminho_arquivo_parcial, 'ab')
+                else:
+                    response_gravacao.raise_for_status()
+                    try:
+                        modo_abertura, offset, tamanho_total_esperado = interpretar_resposta_retomada(
+                            response_gravacao.status_code, response_gravacao.headers, offset)
+                    except TransferenciaIncompletaError:
+                        descartar_parcial(caminho_arquivo_parcial)
+                        raise
+
+                    if manifest is not None:
+                        hash_gravacao = iniciar_hash_parcial(caminho_arquivo_parcial, modo_abertura)
+                    progresso = None
+                    if eventos is not None and eventos.tem_assinantes(TransferProgress):
+                        progresso = _publicador_progresso(eventos, chamada_id, offset, tamanho_total_esperado)
+                    # Corpo da resposta: leitura da rede e escrita em disco intercaladas, bloco a bloco.
+                    with open(caminho_arquivo_parcial, modo_abertura) as f, \
+                            tracing.span("download.corpo", "rede", id=chamada_id, tamanho=tamanho_total_esperado):
+                        try:
+                            bytes_transferidos = gravar_resposta(response_gravacao, f, offset, tamanho_total_esperado,
+                                                                 cancel_event, hash_gravacao, progresso)
+                        except DownloadCancelledError:
+                            logger.debug("Baixar gravação: Cancelamento detectado durante o download de Chamada ID %s. Mantendo arquivo parcial para retomada.", chamada_id)
+                            raise DownloadCancelledError(f"Download cancelado durante a transferência para Chamada ID {chamada_id}.")
+
+            with tracing.span("download.finalizar", "disco", id=chamada_id):
+                tamanho_final = finalizar_parcial(caminho_arquivo_parcial, caminho_arquivo_local, tamanho_total_esperado)
+
+            duracao = time.monotonic() - inicio_tentativa
+            notificar_observador(observador_transferencia, True, duracao, bytes_transferidos)
+
+            if eventos is not None:
+                eventos.publicar(TransferDone(chamada_id, nome_arquivo, tamanho_final, duracao))
+            else:
+                mensagem_sucesso = f"Download bem-sucedido: {nome_arquivo} (Chamada ID {chamada_id})."
+                if status_callback:
+                    status_callback(mensagem_sucesso, level=logging.INFO)
+                else:
+                    logger.info(mensagem_sucesso)
 
             if cancel_event and cancel_event.is_set():
-                logger.debug(f"Baixar gravação: Cancelamento detectado antes de gerar metadado pós-download para Chamada ID {chamada_id}.")
+                logger.debug("Baixar gravação: Cancelamento detectado antes de gerar metadado pós-download para Chamada ID %s.", chamada_id)
                 pass
 
             # --- Gerar metadado PÓS-DOWNLOAD APENAS SE A OPÇÃO DE METADADO COM GRAVAÇÃO ESTIVER HABILITADA ---
+            caminho_metadado = None
             if download_metadata_with_recording:
-                 gerar_arquivo_metadado(chamada, caminho_arquivo_local, status_callback)
+                 caminho_metadado = gerar_arquivo_metadado(chamada, caminho_arquivo_local, status_callback, metadata_sink,
+                                                           eventos=eventos)
             else:
-                 logger.debug(f"recording_downloader: Geração de metadado pós-download para Chamada ID {chamada_id} ignorada conforme opção.")
+                 logger.debug("recording_downloader: Geração de metadado pós-download para Chamada ID %s ignorada conforme opção.", chamada_id)
             # --- FIM DA VERIFICAÇÃO DA OPÇÃO ---
 
+            # Se o metadado falhou, a gravação não conta como concluída para quem exige metadado: a próxima execução o gera.
+            registrar_gravacao_no_manifesto(manifest, chamada, caminho_arquivo_local, tamanho_final, hash_gravacao,
+                                            com_metadado=caminho_metadado is not None)
             return True
 
         except DownloadCancelledError:
-            if os.path.exists(caminho_arquivo_local):
-                 try:
-                     os.remove(caminho_arquivo_local)
-                     logger.debug(f"Baixar gravação: Arquivo parcial removido para Chamada ID {chamada_id} após cancelamento.")
-                 except Exception as cleanup_e:
-                     logger.error(f"recording_downloader: Erro ao limpar arquivo parcial {caminho_arquivo_local} após cancelamento: {cleanup_e}", exc_info=True)
+            if os.path.exists(caminho_arquivo_parcial):
+                 logger.debug("Baixar gravação: Arquivo parcial mantido em %s para retomada (Chamada ID %s).", caminho_arquivo_parcial, chamada_id)
             raise
 
         except requests.exceptions.HTTPError as e:
+            tipo_erro = classificar_erro(e)
+            notificar_observador(observador_transferencia, False, time.monotonic() - inicio_tentativa, bytes_transferidos,
+                                 tipo_erro)
+            if tentativa_unica and tipo_erro in ERROS_HTTP_RETENTAVEIS:
+                logger.warning(f"recording_downloader: Erro HTTP {e.response.status_code} ao baixar gravação {url_gravacao} (Chamada ID {chamada_id}). Retentativa a cargo do agendador.")
+                raise TransferenciaRetentavelError(
+                    f"Erro HTTP {e.response.status_code} ao baixar gravação ID {chamada_id}.", tipo_erro,
+                    retry_after=interpretar_retry_after(e.response.headers.get('Retry-After')),
+                    caminho_arquivo_local=caminho_arquivo_local)
             mensagem_erro = f"Erro HTTP ({e.response.status_code} - {e.response.reason}) ao baixar gravação {url_gravacao} (Chamada ID {chamada_id}). Não será retentado."
             if status_callback:
                 status_callback(f"Erro HTTP {e.response.status_code} ao baixar gravação ID {chamada_id}.", level=logging.ERROR)
             logger.error(mensagem_erro, exc_info=True)
-            # --- Tenta gerar metadado de falha APENAS SE A OPÇÃO DE METADADO COM GRAVAÇÃO ESTIVER HABILITADA ---
-            if download_metadata_with_recording:
-                 try:
-                      gerar_arquivo_metadado(chamada, caminho_arquivo_local + "_DOWNLOAD_FAILED.txt", status_callback)
-                 except Exception as meta_e:
-                      logger.error(f"recording_downloader: Erro adicional ao gerar metadato de falha para Chamada ID {chamada_id}: {meta_e}", exc_info=True)
-            else:
-                 logger.debug(f"recording_downloader: Geração de metadado de falha para Chamada ID {chamada_id} ignorada conforme opção (erro HTTP).")
-            # --- FIM DA VERIFICAÇÃO DA OPÇÃO ---
+            gerar_metadado_de_falha(chamada, caminho_arquivo_local, "_DOWNLOAD_FAILED.txt", status_callback,
+                                    download_metadata_with_recording, contexto="falha (erro HTTP)", metadata_sink=metadata_sink)
             return False
 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, TransferenciaIncompletaError) as e:
+            if inicio_tentativa is not None:
+                notificar_observador(observador_transferencia, False, time.monotonic() - inicio_tentativa, bytes_transferidos,
+                                     classificar_erro(e))
+            if tentativa_unica:
+                logger.warning(f"recording_downloader: Erro na requisição de download para {url_gravacao} (Chamada ID {chamada_id}): {e}. Retentativa a cargo do agendador.")
+                raise TransferenciaRetentavelError(f"Erro na requisição ao baixar gravação ID {chamada_id}: {e}",
+                                                   classificar_erro(e), caminho_arquivo_local=caminho_arquivo_local)
             mensagem_erro = f"Erro na requisição ao baixar gravação {url_gravacao} (Chamada ID {chamada_id}): {e}"
             if status_callback:
                 status_callback(f"Erro na requisição ao baixar gravação ID {chamada_id}.", level=logging.ERROR)
@@ -275,15 +606,8 @@ def baixar_gravacao(url_base, chamada, diretorio_base=None, status_callback=None
                 if status_callback:
                     status_callback(f"Falha final ao baixar gravação ID {chamada_id}.", level=logging.ERROR)
                 logger.error(mensagem_falha_final)
-                # --- Tenta gerar metadado de falha APENAS SE A OPÇÃO DE METADADO COM GRAVAÇÃO ESTIVER HABILITADA ---
-                if download_metadata_with_recording:
-                     try:
-                          gerar_arquivo_metadado(chamada, caminho_arquivo_local + "_DOWNLOAD_FAILED.txt", status_callback)
-                     except Exception as meta_e:
-                          logger.error(f"recording_downloader: Erro adicional ao gerar metadato de falha final para Chamada ID {chamada_id}: {meta_e}", exc_info=True)
-                else:
-                     logger.debug(f"recording_downloader: Geração de metadado de falha final para Chamada ID {chamada_id} ignorada conforme opção (falha na requisição).")
-                # --- FIM DA VERIFICAÇÃO DA OPÇÃO ---
+                gerar_metadado_de_falha(chamada, caminho_arquivo_local, "_DOWNLOAD_FAILED.txt", status_callback,
+                                        download_metadata_with_recording, contexto="falha final", metadata_sink=metadata_sink)
                 return False
 
         except Exception as e:
@@ -291,15 +615,8 @@ def baixar_gravacao(url_base, chamada, diretorio_base=None, status_callback=None
             if status_callback:
                 status_callback(f"Erro inesperado ao processar gravação ID {chamada_id}.", level=logging.ERROR)
             logger.exception(mensagem_erro_inesperado)
-            # --- Tenta gerar metadado de erro inesperado APENAS SE A OPÇÃO DE METADADO COM GRAVAÇÃO ESTIVER HABILITADA ---
-            if download_metadata_with_recording:
-                 try:
-                      gerar_arquivo_metadado(chamada, caminho_arquivo_local + "_PROCESS_ERROR.txt", status_callback)
-                 except Exception as meta_e:
-                      logger.error(f"recording_downloader: Erro adicional ao gerar metadato de erro inesperado para Chamada ID {chamada_id}: {meta_e}", exc_info=True)
-            else:
-                 logger.debug(f"recording_downloader: Geração de metadado de erro inesperado para Chamada ID {chamada_id} ignorada conforme opção.")
-            # --- FIM DA VERIFICAÇÃO DA OPÇÃO ---
+            gerar_metadado_de_falha(chamada, caminho_arquivo_local, "_PROCESS_ERROR.txt", status_callback,
+                                    download_metadata_with_recording, contexto="erro inesperado", metadata_sink=metadata_sink)
             return False
 
     logger.error(f"recording_downloader: Função baixar_gravacao terminou sem retornar para Chamada ID {chamada_id}. Considerado falha.")
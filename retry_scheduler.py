@@ -0,0 +1,109 @@
+# retry_scheduler.py
+import heapq
+import itertools
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+
+class PoliticaRetentativa:
+    """
+    Política de retentativa de uma categoria de erro: número máximo de tentativas (incluindo a primeira)
+    e backoff exponencial com jitter completo, limitado a atraso_maximo.
+    respeitar_retry_after: usa o cabeçalho Retry-After do servidor como atraso mínimo.
+    """
+
+    def __init__(self, max_tentativas, atraso_base, atraso_maximo, respeitar_retry_after=False):
+        self.max_tentativas = max_tentativas
+        self.atraso_base = atraso_base
+        self.atraso_maximo = atraso_maximo
+        self.respeitar_retry_after = respeitar_retry_after
+
+    def calcular_atraso(self, tentativa, retry_after=None):
+        """
+        Atraso (segundos) antes da próxima tentativa, após a falha da tentativa de número 'tentativa' (1 = primeira).
+        Retorna None se as tentativas se esgotaram.
+        """
+        if tentativa >= self.max_tentativas:
+            return None
+        teto = min(self.atraso_maximo, self.atraso_base * (2 ** (tentativa - 1)))
+        atraso = random.uniform(0, teto)
+        if self.respeitar_retry_after and retry_after is not None:
+            atraso = max(atraso, min(retry_after, self.atraso_maximo))
+        return atraso
+
+
+# Políticas por categoria de recording_downloader.classificar_erro. Categorias ausentes não são retentadas.
+POLITICAS_RETENTATIVA = {
+    # Queda ou recusa de conexão costuma ser momentânea: tenta logo e mais vezes.
+    'conexao': PoliticaRetentativa(max_tentativas=5, atraso_base=1.0, atraso_maximo=30.0),
+    # Timeout indica servidor lento ou sobrecarregado: espera mais entre tentativas.
+    'timeout': PoliticaRetentativa(max_tentativas=4, atraso_base=5.0, atraso_maximo=60.0),
+    'http_5xx': PoliticaRetentativa(max_tentativas=4, atraso_base=2.0, atraso_maximo=60.0),
+    # 429: o servidor informa quando tentar de novo (Retry-After).
+    'http_429': PoliticaRetentativa(max_tentativas=6, atraso_base=5.0, atraso_maximo=300.0, respeitar_retry_after=True),
+}
+
+
+def interpretar_retry_after(valor):
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos. Retorna None se ausente ou inválido."""
+    if not valor:
+        return None
+    valor = valor.strip()
+    if valor.isdigit():
+        return float(valor)
+    try:
+        instante = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    if instante.tzinfo is None:
+        instante = instante.replace(tzinfo=timezone.utc)
+    return max((instante - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def calcular_atraso_retentativa(tipo_erro, tentativa, retry_after=None, politicas=None):
+    """Atraso antes da próxima tentativa para a categoria de erro, ou None se não deve ser retentado."""
+    politica = (politicas or POLITICAS_RETENTATIVA).get(tipo_erro)
+    if politica is None:
+        return None
+    return politica.calcular_atraso(tentativa, retry_after)
+
+
+class RetryScheduler:
+    """
+    Fila de atraso (heap por instante de vencimento) das retentativas pendentes.
+    Usada pela thread orquestradora do download: nenhuma thread dorme esperando uma retentativa,
+    e os workers seguem processando outros registros enquanto ela não vence. Não é thread-safe.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._sequencia = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def agendar(self, item, atraso):
+        heapq.heappush(self._heap, (time.monotonic() + atraso, next(self._sequencia), item))
+
+    def tempo_ate_proximo(self):
+        """Segundos até a próxima retentativa vencer (0 se já venceu), ou None se a fila está vazia."""
+        if not self._heap:
+            return None
+        return max(self._heap[0][0] - time.monotonic(), 0.0)
+
+    def retirar_vencido(self):
+        """Remove e retorna o item vencido mais antigo, ou None se nenhum venceu."""
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def retirar_todos(self):
+        """Remove e retorna todos os itens pendentes (ex.: no cancelamento)."""
+        itens = [item for _, _, item in self._heap]
+        self._heap.clear()
+        return itens
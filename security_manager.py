@@ -58,6 +58,8 @@ def load_configuration():
         # Usa .get(key, default_value) para compatibilidade com arquivos antigos
         config_data["download_metadata_with_recording"] = config_data.get("download_metadata_with_recording", True) # Default é True
         config_data["download_metadata_without_recording"] = config_data.get("download_metadata_without_recording", True) # Default é True
+        config_data["granularidade_listagem"] = config_data.get("granularidade_listagem") # Default é None (sequencial)
+        config_data["motor_download"] = config_data.get("motor_download", "threads") # Default é o motor com threads
         # --- Fim do carregamento das novas opções ---
 
         logger.info(f"Configurações carregadas de {CONFIG_FILE}.")
@@ -0,0 +1,42 @@
+# status_buffer.py
+import threading
+from collections import deque
+
+# Capacidade padrão: mensagens acumuladas entre duas descargas além deste limite são descartadas (as mais antigas).
+CAPACIDADE_PADRAO = 5000
+
+
+class StatusBuffer:
+    """
+    Buffer circular (thread-safe) de mensagens de status.
+
+    As threads do download apenas acrescentam mensagens; a GUI retira todas de uma vez a cada tick
+    da interface, em vez de agendar uma atualização do Tk por mensagem. Se o buffer encher entre
+    duas descargas, as mensagens mais antigas são descartadas e contadas em 'descartadas'.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE_PADRAO):
+        self._mensagens = deque(maxlen=capacidade)
+        self._lock = threading.Lock()
+        self._descartadas = 0
+
+    def adicionar(self, mensagem, tag=None):
+        with self._lock:
+            if len(self._mensagens) == self._mensagens.maxlen:
+                self._descartadas += 1
+            self._mensagens.append((mensagem, tag))
+
+    def retirar_todas(self):
+        """Retorna (lista de (mensagem, tag), número de mensagens descartadas desde a última retirada)."""
+        with self._lock:
+            if not self._mensagens and not self._descartadas:
+                return [], 0
+            mensagens = list(self._mensagens)
+            self._mensagens.clear()
+            descartadas, self._descartadas = self._descartadas, 0
+        return mensagens, descartadas
+
+    def limpar(self):
+        with self._lock:
+            self._mensagens.clear()
+            self._descartadas = 0
@@ -0,0 +1,143 @@
+# sync_state.py
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Arquivo das marcas d'água, criado na raiz do diretório de destino.
+NOME_ARQUIVO_SINCRONIZACAO = ".widevoice_sync.json"
+
+# Sobreposição de segurança: a listagem incremental recomeça um pouco antes da marca d'água, para
+# incluir chamadas registradas no servidor depois da última sincronização com datahora anterior a ela.
+# Os registros repetidos são ignorados pelo manifesto.
+SOBREPOSICAO_SEGURANCA = timedelta(minutes=10)
+
+FORMATO_DATAHORA = "%Y-%m-%d %H:%M:%S"
+
+
+def chave_sincronizacao(url_base, login):
+    """Chave da marca d'água: servidor (sem esquema) e login."""
+    servidor = url_base.replace("http://", "").replace("https://", "").strip("/").lower()
+    return f"{servidor}|{login}"
+
+
+class SyncState:
+    """
+    Marca d'água (high-watermark) da sincronização incremental de um servidor e login: a maior
+    'datahora' sincronizada e os 'id's vistos nesse segundo.
+
+    Uso pelo controlador em uma execução:
+    - inicio_listagem(): início da listagem (marca d'água menos a sobreposição de segurança);
+    - filtrar(): descarta os registros do segundo da marca d'água que já foram sincronizados;
+    - observar() / registrar_pendencia(): acompanham os registros listados e os que não foram concluídos;
+    - avancar(): ao fim de um job completo, grava a nova marca d'água. Se algum registro falhou,
+      a marca para logo antes do primeiro deles, para que a próxima execução o liste de novo.
+
+    observar() e registrar_pendencia() são chamados pela thread orquestradora e filtrar() pela produtora.
+    """
+
+    def __init__(self, diretorio_raiz, url_base, login, sobreposicao=SOBREPOSICAO_SEGURANCA):
+        self.caminho = os.path.join(os.path.abspath(diretorio_raiz), NOME_ARQUIVO_SINCRONIZACAO)
+        self.chave = chave_sincronizacao(url_base, login)
+        self._sobreposicao = sobreposicao
+        self._lock = threading.Lock()
+
+        marca = self._ler_marcas().get(self.chave) or {}
+        self.datahora = marca.get('datahora')
+        self._ids_da_marca = set(marca.get('ids', []))
+
+        self._maior_datahora = None
+        self._ids_maior_datahora = set()
+        self._primeira_pendencia = None
+
+    def _ler_marcas(self):
+        if not os.path.exists(self.caminho):
+            return {}
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                marcas = json.load(f)
+            return marcas if isinstance(marcas, dict) else {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"SyncState: Não foi possível ler as marcas d'água em {self.caminho} ({e}). Sincronização completa.")
+            return {}
+
+    def inicio_listagem(self, datainicio_padrao):
+        """Início da listagem: marca d'água menos a sobreposição, ou datainicio_padrao se não houver marca."""
+        if not self.datahora:
+            return datainicio_padrao
+        try:
+            inicio = datetime.strptime(self.datahora, FORMATO_DATAHORA) - self._sobreposicao
+        except ValueError:
+            logger.warning(f"SyncState: Marca d'água inválida ({self.datahora}). Usando a data inicial informada.")
+            return datainicio_padrao
+        return inicio.strftime(FORMATO_DATAHORA)
+
+    def filtrar(self, registros):
+        """Remove os registros do segundo da marca d'água cujos 'id's já foram sincronizados."""
+        if not self._ids_da_marca:
+            return registros
+        return [chamada for chamada in registros
+                if not (chamada.get('datahora') == self.datahora and str(chamada.get('id')) in self._ids_da_marca)]
+
+    def observar(self, chamada):
+        datahora = chamada.get('datahora')
+        if not datahora:
+            return
+        with self._lock:
+            if self._maior_datahora is None or datahora > self._maior_datahora:
+                self._maior_datahora = datahora
+                self._ids_maior_datahora = set()
+            if datahora == self._maior_datahora:
+                self._ids_maior_datahora.add(str(chamada.get('id')))
+
+    def registrar_pendencia(self, chamada):
+        """Registra um registro que falhou ou foi cancelado: a marca d'água não passará dele."""
+        datahora = chamada.get('datahora')
+        if not datahora:
+            return
+        with self._lock:
+            if self._primeira_pendencia is None or datahora < self._primeira_pendencia:
+                self._primeira_pendencia = datahora
+
+    def avancar(self):
+        """
+        Grava a nova marca d'água após um job completo. Retorna a datahora gravada, ou None se a
+        marca não mudou (nenhum registro novo listado).
+        """
+        with self._lock:
+            if self._primeira_pendencia is not None:
+                try:
+                    anterior = datetime.strptime(self._primeira_pendencia, FORMATO_DATAHORA) - timedelta(seconds=1)
+                except ValueError:
+                    return None
+                nova_datahora, ids = anterior.strftime(FORMATO_DATAHORA), set()
+            elif self._maior_datahora is not None:
+                # A sobreposição lista registros anteriores à marca, e os do segundo da marca são
+                # filtrados: sem pendências, a marca nunca recua.
+                if self.datahora and self._maior_datahora < self.datahora:
+                    return None
+                nova_datahora, ids = self._maior_datahora, set(self._ids_maior_datahora)
+                if nova_datahora == self.datahora:
+                    ids |= self._ids_da_marca
+            else:
+                return None
+
+        marcas = self._ler_marcas()
+        marcas[self.chave] = {
+            'datahora': nova_datahora,
+            'ids': sorted(ids),
+            'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+        }
+        temporario = self.caminho + ".tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(marcas, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.caminho)
+
+        self.datahora, self._ids_da_marca = nova_datahora, ids
+        logger.info(f"SyncState: Marca d'água de {self.chave} gravada: {nova_datahora} ({len(ids)} ids nesse segundo).")
+        return nova_datahora
@@ -0,0 +1,8 @@
+# conftest.py
+import os
+import sys
+
+# Os módulos do aplicativo ficam na raiz do repositório (sem pacote instalável), e o servidor simulado em benchmarks/.
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
@@ -0,0 +1,110 @@
+# test_call_catalog.py
+import json
+
+import pytest
+
+import call_catalog
+from call_catalog import CallCatalog
+
+
+def chamada(chamada_id, numero, datahora, gravacao=""):
+    return {"id": chamada_id, "numero": numero, "datahora": datahora, "duracao": "30", "gravacao": gravacao}
+
+
+@pytest.fixture
+def catalogo(tmp_path):
+    catalogo = CallCatalog(str(tmp_path))
+    catalogo.registrar([
+        chamada("1", "5500000001", "2024-01-01 08:00:00", "2024\\/01\\/01\\/20240101080000_1"),
+        chamada("2", "5500000002", "2024-01-01 23:59:59"),
+        chamada("3", "5500000001", "2024-01-02 00:00:00", "2024\\/01\\/02\\/20240102000000_3"),
+        chamada("4", "5500000001", "2024-01-03 12:00:00"),
+    ], servidor="pabx-a")
+    yield catalogo
+    catalogo.fechar()
+
+
+def ids(chamadas):
+    return [c["id"] for c in chamadas]
+
+
+def test_consulta_sem_filtros_em_ordem_de_datahora(catalogo):
+    assert ids(catalogo.consultar()) == ["1", "2", "3", "4"]
+    assert catalogo.total() == 4
+
+
+def test_consulta_por_numero_e_presenca_de_gravacao(catalogo):
+    assert ids(catalogo.consultar(numero="5500000001")) == ["1", "3", "4"]
+    assert ids(catalogo.consultar(numero="5500000001", com_gravacao=True)) == ["1", "3"]
+    assert ids(catalogo.consultar(com_gravacao=False)) == ["2", "4"]
+
+
+def test_data_sem_hora_cobre_o_dia_inteiro(catalogo):
+    assert ids(catalogo.consultar(inicio="2024-01-01", fim="2024-01-01")) == ["1", "2"]
+    assert ids(catalogo.consultar(inicio="2024-01-02")) == ["3", "4"]
+    assert ids(catalogo.consultar(fim="2024-01-01 12:00:00")) == ["1"]
+
+
+def test_consulta_devolve_o_registro_completo(catalogo):
+    registro, = catalogo.consultar(chamada_id=3)
+    assert registro["gravacao"] == "2024\\/01\\/02\\/20240102000000_3"
+    assert registro["duracao"] == "30"
+    assert registro["_servidor"] == "pabx-a"
+    assert registro["_tem_gravacao"] is True
+
+
+def test_contar_e_limite(catalogo):
+    assert catalogo.contar(numero="5500000001") == 3
+    assert ids(catalogo.consultar(numero="5500000001", limite=2)) == ["1", "3"]
+
+
+def test_registrar_de_novo_atualiza_sem_duplicar(catalogo):
+    catalogo.registrar([chamada("2", "5500000002", "2024-01-01 23:59:59", "2024\\/01\\/01\\/20240101235959_2")],
+                       servidor="pabx-a")
+    assert catalogo.total() == 4
+    assert ids(catalogo.consultar(com_gravacao=True)) == ["1", "2", "3"]
+
+
+def test_mesmo_id_em_outro_servidor_e_outra_chamada(catalogo):
+    catalogo.registrar([chamada("1", "5500000009", "2024-01-05 10:00:00")], servidor="pabx-b")
+    assert catalogo.total() == 5
+    assert ids(catalogo.consultar(servidor="pabx-b")) == ["1"]
+    assert [c["_servidor"] for c in catalogo.consultar(chamada_id="1")] == ["pabx-a", "pabx-b"]
+
+
+def test_registros_sem_id_sao_ignorados(catalogo):
+    assert catalogo.registrar([{"numero": "1"}, {"id": "", "numero": "2"}]) == 0
+    assert catalogo.total() == 4
+
+
+def test_catalogo_persiste_entre_aberturas(catalogo, tmp_path):
+    catalogo.fechar()
+    reaberto = CallCatalog(str(tmp_path), somente_leitura=True)
+    try:
+        assert reaberto.total() == 4
+    finally:
+        reaberto.fechar()
+
+
+def test_somente_leitura_sem_catalogo(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        CallCatalog(str(tmp_path / "vazio"), somente_leitura=True)
+
+
+def test_cli_consulta_em_json(catalogo, tmp_path, capsys):
+    catalogo.fechar()
+    assert call_catalog.main(["--diretorio", str(tmp_path), "--numero", "5500000001", "--com-gravacao",
+                              "--formato", "json"]) == 0
+    linhas = capsys.readouterr().out.splitlines()
+    assert [json.loads(linha)["id"] for linha in linhas] == ["1", "3"]
+
+
+def test_cli_contar(catalogo, tmp_path, capsys):
+    catalogo.fechar()
+    assert call_catalog.main(["--diretorio", str(tmp_path), "--inicio", "2024-01-02", "--contar"]) == 0
+    assert capsys.readouterr().out.strip() == "2"
+
+
+def test_cli_sem_catalogo(tmp_path, capsys):
+    assert call_catalog.main(["--diretorio", str(tmp_path)]) == 1
+    assert "Catálogo não encontrado" in capsys.readouterr().err
@@ -0,0 +1,152 @@
+# test_concurrency_controller.py
+import pytest
+
+import concurrency_controller
+from concurrency_controller import AdaptiveConcurrencyController
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """Relógio controlado pelo teste (segundos de time.monotonic); avance com relogio['agora'] += n."""
+    estado = {'agora': 1000.0}
+    monkeypatch.setattr(concurrency_controller.time, "monotonic", lambda: estado['agora'])
+    return estado
+
+
+def sucessos(controle, quantidade, duracao=1.0, bytes_transferidos=1000):
+    for _ in range(quantidade):
+        controle.registrar(True, duracao, bytes_transferidos)
+
+
+def test_partida_lenta_soma_um_por_sucesso(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=5)
+    sucessos(controle, 3)
+    assert controle.limite == 8
+
+
+def test_limite_maximo_nao_e_ultrapassado(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=5, limite_maximo=7)
+    sucessos(controle, 10)
+    assert controle.limite == 7
+
+
+def test_erro_de_sobrecarga_reduz_pela_metade(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=16)
+    controle.registrar(False, 0.5, 0, 'timeout')
+    assert controle.limite == 8
+    assert controle.reducoes == 1
+
+
+@pytest.mark.parametrize("tipo_erro", ['http_4xx', 'integridade', None])
+def test_erros_que_nao_indicam_sobrecarga_nao_reduzem(relogio, tipo_erro):
+    controle = AdaptiveConcurrencyController(limite_inicial=16)
+    controle.registrar(False, 0.5, 0, tipo_erro)
+    assert controle.limite == 16
+    assert controle.falhas == 1
+
+
+def test_falha_iniciada_antes_do_corte_e_ignorada(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=16)
+    controle.registrar(False, 0.5, 0, 'http_5xx')
+    relogio['agora'] += 1.0
+    # Transferência de 2s: começou antes do corte, mesmo que tenham terminado tentativas suficientes desde então.
+    sucessos(controle, 8)
+    limite = controle.limite
+    controle.registrar(False, 2.0, 0, 'http_5xx')
+    assert controle.limite == limite
+    assert controle.reducoes == 1
+
+
+def test_no_maximo_um_corte_por_rodada(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=32)
+    controle.registrar(False, 0.5, 0, 'http_5xx')
+    assert controle.limite == 16
+    relogio['agora'] += 10.0
+    # Menos de 'limite' tentativas concluídas desde o corte: as falhas não cortam de novo.
+    for _ in range(15):
+        controle.registrar(False, 0.1, 0, 'http_5xx')
+    assert controle.limite == 16
+    # A 16ª conclusão fecha a rodada e a falha seguinte pode cortar.
+    controle.registrar(False, 0.1, 0, 'http_5xx')
+    assert controle.limite == 8
+    assert controle.reducoes == 2
+
+
+def test_erros_esparsos_nao_levam_o_limite_abaixo_do_piso(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=32)
+    for _ in range(20):
+        relogio['agora'] += 10.0
+        sucessos(controle, controle.limite)
+        controle.registrar(False, 0.1, 0, 'timeout')
+    assert controle.limite == concurrency_controller.PISO_REDUCAO
+
+
+def test_corte_abaixo_do_piso_nao_aumenta_o_limite(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=2)
+    controle.registrar(False, 0.1, 0, 'conexao')
+    assert controle.limite == 2
+    relogio['agora'] += 10.0
+    controle.registrar(False, 0.1, 0, 'conexao')
+    controle.registrar(False, 0.1, 0, 'conexao')
+    assert controle.limite == 2
+
+
+def test_piso_configuravel_ate_o_limite_minimo(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=8, limite_minimo=1, piso_reducao=1)
+    for _ in range(5):
+        relogio['agora'] += 10.0
+        sucessos(controle, controle.limite, duracao=1.0)
+        controle.registrar(False, 0.1, 0, 'http_429')
+    assert controle.limite == 1
+
+
+def test_aumento_aditivo_depois_do_corte(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=16)
+    controle.registrar(False, 0.1, 0, 'timeout')
+    assert controle.limite == 8
+    sucessos(controle, 7)
+    assert controle.limite == 8
+    sucessos(controle, 1)
+    assert controle.limite == 9
+
+
+def test_vazao_saturada_interrompe_o_crescimento(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=5)
+    sucessos(controle, 3, duracao=1.0, bytes_transferidos=10000)
+    limite = controle.limite
+    # Vazão por transferência cai a 1% da melhor observada: a média móvel logo passa do limiar de saturação.
+    sucessos(controle, 20, duracao=1.0, bytes_transferidos=100)
+    assert controle.limite < limite + 20
+    crescimento = controle.limite
+    sucessos(controle, 50, duracao=1.0, bytes_transferidos=100)
+    assert controle.limite == crescimento
+
+
+def test_ao_alterar_limite_recebe_cada_mudanca(relogio):
+    limites = []
+    controle = AdaptiveConcurrencyController(limite_inicial=8, ao_alterar_limite=limites.append)
+    sucessos(controle, 2)
+    controle.registrar(False, 0.1, 0, 'timeout')
+    controle.registrar(False, 0.1, 0, 'http_4xx')
+    assert limites == [9, 10, 5]
+
+
+def test_erro_no_callback_nao_interrompe_o_controle(relogio):
+    def _falhar(limite):
+        raise RuntimeError("callback com defeito")
+
+    controle = AdaptiveConcurrencyController(limite_inicial=8, ao_alterar_limite=_falhar)
+    sucessos(controle, 1)
+    assert controle.limite == 9
+
+
+def test_snapshot(relogio):
+    controle = AdaptiveConcurrencyController(limite_inicial=8)
+    sucessos(controle, 1, duracao=2.0, bytes_transferidos=4000)
+    controle.registrar(False, 0.1, 0, 'timeout')
+    snapshot = controle.snapshot()
+    assert snapshot['limite'] == 4
+    assert snapshot['sucessos'] == 1 and snapshot['falhas'] == 1 and snapshot['reducoes'] == 1
+    assert snapshot['latencia_media'] == 2.0
+    assert snapshot['vazao_media'] == 2000.0
+    assert 0.0 < snapshot['taxa_erros'] < 1.0
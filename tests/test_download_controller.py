@@ -0,0 +1,318 @@
+# test_download_controller.py
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+import config
+import download_controller
+import recording_downloader
+import retry_scheduler
+from event_bus import EventBus, MetadataGenerated, RecordSkipped, Retry, TransferDone, TransferFailed
+from exceptions import ListagemAPIError, TransferenciaRetentavelError
+from job_journal import DIRETORIO_JOBS
+from mock_widevoice_server import MockWidevoiceServer, OpcoesServidor
+
+
+def registro(indice):
+    return {'id': str(indice), 'datahora': f"2024-01-01 00:{indice // 60:02d}:{indice % 60:02d}",
+            'gravacao': f"2024\\/01\\/01\\/gravacao_{indice}"}
+
+
+class DownloadsSimulados:
+    """Substitui baixar_gravacao: registra os IDs baixados e sinaliza o primeiro download."""
+
+    def __init__(self):
+        self.ids = []
+        self.primeiro = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, url_base, chamada, diretorio, status_callback, cancel_event, *args, **kwargs):
+        with self._lock:
+            self.ids.append(chamada['id'])
+        self.primeiro.set()
+        return True
+
+
+def executar(controller, tmp_path):
+    concluido = threading.Event()
+    controller._completion_callback = concluido.set
+    controller._directory_getter = lambda: str(tmp_path)
+    controller.start_download("pabx.exemplo", "operador", "segredo", "2024-01-01 00:00:00", "2024-01-01 23:59:59",
+                              threading.Event(), False, False, usar_cache_listagem=False)
+    assert concluido.wait(10), "o processo não terminou"
+
+
+def test_downloads_comecam_antes_do_fim_da_listagem(monkeypatch, tmp_path):
+    downloads = DownloadsSimulados()
+    baixado_durante_listagem = []
+
+    def _paginas(*args, **kwargs):
+        yield [registro(i) for i in range(3)]
+        # A segunda página só é produzida depois que um registro da primeira foi baixado (ou após 5 s).
+        baixado_durante_listagem.append(downloads.primeiro.wait(5))
+        yield [registro(i) for i in range(3, 6)]
+
+    monkeypatch.setattr(download_controller, "iterar_paginas_chamadas", _paginas)
+    monkeypatch.setattr(download_controller, "baixar_gravacao", downloads)
+    executar(download_controller.DownloadController(), tmp_path)
+
+    assert baixado_durante_listagem == [True]
+    assert sorted(downloads.ids, key=int) == [str(i) for i in range(6)]
+
+
+def test_registros_listados_antes_de_uma_falha_sao_processados(monkeypatch, tmp_path):
+    downloads = DownloadsSimulados()
+    mensagens = []
+
+    def _paginas(*args, **kwargs):
+        yield [registro(i) for i in range(4)]
+        raise ListagemAPIError("Falha ao consultar a API.")
+
+    monkeypatch.setattr(download_controller, "iterar_paginas_chamadas", _paginas)
+    monkeypatch.setattr(download_controller, "baixar_gravacao", downloads)
+    executar(download_controller.DownloadController(status_callback=lambda m, nivel=None: mensagens.append(m)), tmp_path)
+
+    assert sorted(downloads.ids) == ["0", "1", "2", "3"]
+    assert any("listagem da API foi interrompida" in m for m in mensagens)
+
+
+def test_fila_cheia_bloqueia_a_listagem_e_desiste_no_cancelamento():
+    controller = download_controller.DownloadController()
+    controller._cancel_event = threading.Event()
+    fila = queue.Queue(maxsize=2)
+    encerrado = threading.Event()
+    assert controller._colocar_na_fila(fila, 1, encerrado) and controller._colocar_na_fila(fila, 2, encerrado)
+
+    resultado = []
+    produtor = threading.Thread(target=lambda: resultado.append(controller._colocar_na_fila(fila, 3, encerrado)))
+    produtor.start()
+    produtor.join(0.3)
+    assert produtor.is_alive(), "a produtora deveria esperar por espaço na fila"
+    controller._cancel_event.set()
+    produtor.join(2)
+    assert resultado == [False]
+    assert fila.qsize() == 2
+
+
+def test_consumidor_propaga_a_falha_da_listagem():
+    controller = download_controller.DownloadController()
+    fila = queue.Queue()
+    for item in ({'id': '1'}, {'id': '2'}, download_controller._FimDaListagem(ListagemAPIError("falhou"))):
+        fila.put(item)
+    consumidos = []
+    with pytest.raises(ListagemAPIError):
+        for chamada in controller._consumir_registros(fila):
+            consumidos.append(chamada['id'])
+    assert consumidos == ["1", "2"]
+
+
+def test_produtora_termina_quando_o_orquestrador_falha_com_a_fila_cheia(monkeypatch, tmp_path):
+    monkeypatch.setattr(download_controller, "TAMANHO_FILA_TRABALHO", 2)
+    monkeypatch.setattr(download_controller, "iterar_paginas_chamadas", lambda *a, **k: iter([[registro(i) for i in range(10)]]))
+    controller = download_controller.DownloadController()
+
+    def _falhar(*args):
+        raise RuntimeError("falha no orquestrador")
+
+    monkeypatch.setattr(controller, "_ja_concluido", _falhar)
+    executar(controller, tmp_path)
+
+    # Sem consumidor, nem os registros restantes nem o _FimDaListagem cabem na fila: a produtora desiste.
+    produtoras = [t for t in threading.enumerate() if t.name == "ListagemAPI"]
+    for produtora in produtoras:
+        produtora.join(2)
+    assert not [t for t in produtoras if t.is_alive()]
+
+
+def test_tarefas_concluidas_sao_contabilizadas_enquanto_a_listagem_esta_lenta(monkeypatch, tmp_path):
+    downloads = DownloadsSimulados()
+    contabilizados = threading.Event()
+    contabilizados_durante_listagem = []
+
+    def _progresso(valor, total=None):
+        if valor == 3:
+            contabilizados.set()
+
+    def _paginas(*args, **kwargs):
+        yield [registro(i) for i in range(3)]
+        # A segunda página só chega depois que os downloads da primeira foram contabilizados (ou após 5 s).
+        contabilizados_durante_listagem.append(contabilizados.wait(5))
+        yield [registro(3)]
+
+    monkeypatch.setattr(download_controller, "iterar_paginas_chamadas", _paginas)
+    monkeypatch.setattr(download_controller, "baixar_gravacao", downloads)
+    executar(download_controller.DownloadController(progress_callback=_progresso), tmp_path)
+
+    assert contabilizados_durante_listagem == [True]
+    assert sorted(downloads.ids, key=int) == ["0", "1", "2", "3"]
+
+
+def test_submissoes_param_no_limite_de_tarefas_em_voo(monkeypatch, tmp_path):
+    liberar = threading.Event()
+    downloads = DownloadsSimulados()
+    submetidas = []
+    mensagens = []
+
+    def _baixar_quando_liberado(*args, **kwargs):
+        liberar.wait(10)
+        return downloads(*args, **kwargs)
+
+    monkeypatch.setattr(download_controller, "iterar_paginas_chamadas", lambda *a, **k: iter([[registro(i) for i in range(20)]]))
+    monkeypatch.setattr(download_controller, "baixar_gravacao", _baixar_quando_liberado)
+    controller = download_controller.DownloadController(status_callback=lambda m, nivel=None: mensagens.append(m),
+                                                        max_workers=2, max_tarefas_em_voo=3, concorrencia_adaptativa=False)
+    submeter_chamada = controller._submeter_chamada
+
+    def _submeter_contando(chamada, *args):
+        submetidas.append(chamada['id'])
+        return submeter_chamada(chamada, *args)
+
+    controller._submeter_chamada = _submeter_contando
+    concluido = threading.Event()
+    controller._completion_callback = concluido.set
+    controller._directory_getter = lambda: str(tmp_path)
+    controller.start_download("pabx.exemplo", "operador", "segredo", "2024-01-01 00:00:00", "2024-01-01 23:59:59",
+                              threading.Event(), False, False, usar_cache_listagem=False)
+
+    # Nenhuma tarefa termina enquanto os downloads estão bloqueados: o controlador para em 3 submissões.
+    for _ in range(50):
+        if len(submetidas) >= 3:
+            break
+        liberar.wait(0.02)
+    liberar.wait(0.3)
+    assert len(submetidas) == 3
+
+    liberar.set()
+    assert concluido.wait(10)
+    assert len(downloads.ids) == 20
+    assert "Controlador: Gravações baixadas com sucesso: 20" in mensagens
+
+
+def test_job_interrompido_e_retomado_pelo_journal(monkeypatch, tmp_path):
+    # 1ª execução: a listagem cai depois da primeira página, e o download do registro 1 falha.
+    falhas = {'1'}
+    downloads = DownloadsSimulados()
+
+    def _baixar(url_base, chamada, *args, **kwargs):
+        downloads(url_base, chamada, *args, **kwargs)
+        return chamada['id'] not in falhas
+
+    def _listagem_interrompida(*args, **kwargs):
+        yield [registro(i) for i in range(4)]
+        raise ListagemAPIError("Falha ao consultar a API.")
+
+    monkeypatch.setattr(download_controller, "baixar_gravacao", _baixar)
+    monkeypatch.setattr(download_controller, "iterar_paginas_chamadas", _listagem_interrompida)
+    executar(download_controller.DownloadController(), tmp_path)
+    assert sorted(downloads.ids) == ["0", "1", "2", "3"]
+    assert len(os.listdir(tmp_path / DIRETORIO_JOBS)) == 1
+
+    # 2ª execução: a listagem continua do cursor (a API devolve de novo o registro do último segundo).
+    inicios_listagem = []
+    falhas.clear()
+    downloads.ids.clear()
+
+    def _listagem_continuada(url_api, datainicio_str, *args, **kwargs):
+        inicios_listagem.append(datainicio_str)
+        yield [registro(i) for i in range(3, 6)]
+
+    monkeypatch.setattr(download_controller, "iterar_paginas_chamadas", _listagem_continuada)
+    executar(download_controller.DownloadController(), tmp_path)
+
+    assert inicios_listagem == [registro(3)['datahora']]
+    assert sorted(downloads.ids) == ["1", "4", "5"]
+    # Job terminado: o journal é removido.
+    assert os.listdir(tmp_path / DIRETORIO_JOBS) == []
+
+
+def test_falhas_transitorias_seguem_a_politica_da_categoria(monkeypatch, tmp_path):
+    monkeypatch.setitem(retry_scheduler.POLITICAS_RETENTATIVA, 'http_5xx',
+                        retry_scheduler.PoliticaRetentativa(max_tentativas=3, atraso_base=0.01, atraso_maximo=0.01))
+    # Registro 1: 503 duas vezes e depois sucesso. Registro 2: 503 sempre (esgota as 3 tentativas).
+    # Registro 3: 429 com Retry-After de 0,3 s. Registro 4: 404, que não é retentado.
+    roteiro = {'1': ['http_5xx', 'http_5xx'], '2': ['http_5xx'] * 3, '3': ['http_429'], '4': ['http_4xx']}
+    tentativas = {}
+    instantes = {}
+    mensagens = []
+
+    def _baixar(url_base, chamada, *args, **kwargs):
+        chamada_id = chamada['id']
+        tentativas[chamada_id] = tentativas.get(chamada_id, 0) + 1
+        instantes.setdefault(chamada_id, []).append(time.monotonic())
+        erros = roteiro.get(chamada_id, [])
+        if tentativas[chamada_id] <= len(erros):
+            tipo_erro = erros[tentativas[chamada_id] - 1]
+            raise TransferenciaRetentavelError(f"Falha simulada ({tipo_erro})", tipo_erro,
+                                               retry_after=0.3 if tipo_erro == 'http_429' else None)
+        return True
+
+    monkeypatch.setattr(download_controller, "iterar_paginas_chamadas", lambda *a, **k: iter([[registro(i) for i in range(6)]]))
+    monkeypatch.setattr(download_controller, "baixar_gravacao", _baixar)
+    executar(download_controller.DownloadController(status_callback=lambda m, nivel=None: mensagens.append(m)), tmp_path)
+
+    assert tentativas == {'0': 1, '1': 3, '2': 3, '3': 2, '4': 1, '5': 1}
+    assert instantes['3'][1] - instantes['3'][0] >= 0.3
+    assert "Controlador: Retentativas agendadas após falhas transitórias: 5" in mensagens
+    assert "Controlador: Gravações baixadas com sucesso: 4" in mensagens
+
+
+def test_erros_503_do_servidor_simulado_sao_retentados_ate_concluir(monkeypatch, tmp_path):
+    # Backoff curto, e tentativas suficientes para que nenhuma gravação esgote as tentativas com 20% de erro.
+    monkeypatch.setitem(retry_scheduler.POLITICAS_RETENTATIVA, 'http_5xx',
+                        retry_scheduler.PoliticaRetentativa(max_tentativas=12, atraso_base=0.01, atraso_maximo=0.05))
+    monkeypatch.setattr(config, "PROTOCOLO_SERVIDOR", "http")
+    servidor = MockWidevoiceServer(OpcoesServidor(registros=120, fracao_com_gravacao=1.0, tamanho_min=1024,
+                                                  tamanho_max=4096, taxa_erro=0.2)).iniciar()
+    concluido = threading.Event()
+    eventos = []
+    try:
+        controller = download_controller.DownloadController(
+            completion_callback=concluido.set, directory_getter=lambda: str(tmp_path), max_workers=4)
+        controller.eventos.assinar((TransferDone, TransferFailed, Retry), eventos.append)
+        datainicio, datafim = servidor.opcoes.periodo()
+        controller.start_download(servidor.url_base, "teste", "teste", datainicio, datafim, threading.Event(),
+                                  False, False, usar_cache_listagem=False)
+        assert concluido.wait(60), "o download não terminou"
+    finally:
+        servidor.parar()
+
+    retentativas = [e for e in eventos if isinstance(e, Retry)]
+    assert {e.chamada_id for e in eventos if isinstance(e, TransferDone)} == {str(100000 + i) for i in range(120)}
+    assert not [e for e in eventos if isinstance(e, TransferFailed)]
+    assert retentativas and all(e.tipo_erro == 'http_5xx' for e in retentativas)
+    assert servidor._estado.requisicoes_gravacao == 120 + len(retentativas)
+
+
+def test_registros_sem_gravacao_publicam_eventos_tipados(monkeypatch, tmp_path):
+    registros = [dict(registro(i), gravacao='') for i in range(3)]
+    monkeypatch.setattr(download_controller, "iterar_paginas_chamadas", lambda *a, **k: iter([registros]))
+    controller = download_controller.DownloadController()
+    eventos = []
+    controller.eventos.assinar((RecordSkipped, MetadataGenerated), eventos.append)
+    concluido = threading.Event()
+    controller._completion_callback = concluido.set
+    controller._directory_getter = lambda: str(tmp_path)
+    controller.start_download("pabx.exemplo", "operador", "segredo", "2024-01-01 00:00:00", "2024-01-01 23:59:59",
+                              threading.Event(), False, True, usar_cache_listagem=False)
+    assert concluido.wait(10), "o processo não terminou"
+
+    assert sorted(e.chamada_id for e in eventos if isinstance(e, RecordSkipped) and e.gera_metadado) == ["0", "1", "2"]
+    gerados = [e for e in eventos if isinstance(e, MetadataGenerated)]
+    assert sorted(e.chamada_id for e in gerados) == ["0", "1", "2"]
+    assert all(os.path.exists(e.caminho) and "Metadata_Only" in e.caminho for e in gerados)
+
+
+def test_eventos_por_registro_nao_sao_criados_sem_assinantes(monkeypatch, tmp_path):
+    def _nao_criar(*args):
+        raise AssertionError("evento criado sem assinantes")
+
+    monkeypatch.setattr(RecordSkipped, "__init__", _nao_criar)
+    monkeypatch.setattr(MetadataGenerated, "__init__", _nao_criar)
+    barramento = EventBus()
+    chamada = dict(registro(1), gravacao='')
+    recording_downloader.informar_sem_gravacao(chamada, True, eventos=barramento)
+    caminho = recording_downloader.gerar_arquivo_metadado(chamada, str(tmp_path / "1.gsm"), eventos=barramento)
+    assert caminho == str(tmp_path / "1.txt") and os.path.exists(caminho)
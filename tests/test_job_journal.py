@@ -0,0 +1,100 @@
+# test_job_journal.py
+import os
+
+from job_journal import ESTADO_CONCLUIDO, ESTADO_FALHA, JobJournal
+
+PARAMETROS = {'url_base': 'pabx.exemplo.com.br', 'login': 'u', 'token': 'segredo',
+              'datainicio': '2024-01-01 00:00:00', 'datafim': '2024-01-31 23:59:59'}
+
+
+def _registro(indice):
+    return {'id': str(100 + indice), 'datahora': f"2024-01-01 00:00:{indice:02d}", 'gravacao': f"g{indice}"}
+
+
+def test_job_novo_nao_e_retomado_nem_grava_o_token(tmp_path):
+    journal = JobJournal(str(tmp_path), PARAMETROS)
+    journal.fechar()
+    assert not journal.retomado
+    with open(journal.caminho, encoding='utf-8') as f:
+        assert 'segredo' not in f.read()
+
+
+def test_retomada_reproduz_registros_estados_e_cursor(tmp_path):
+    journal = JobJournal(str(tmp_path), PARAMETROS)
+    journal.registrar_pagina([_registro(0), _registro(1)], cursor="2024-01-01 00:00:01")
+    journal.registrar_pagina([_registro(2)], cursor="2024-01-01 00:00:02")
+    journal.registrar_estado('100', ESTADO_CONCLUIDO)
+    journal.registrar_estado('101', ESTADO_FALHA)
+    journal.fechar()
+
+    retomado = JobJournal(str(tmp_path), PARAMETROS)
+    assert retomado.retomado
+    assert not retomado.listagem_concluida
+    assert retomado.cursor == "2024-01-01 00:00:02"
+    assert retomado.total_listado == 3
+    assert [chamada['id'] for chamada in retomado.registros_gravados()] == ['100', '101', '102']
+    assert retomado.ja_concluido('100')
+    assert not retomado.ja_concluido('101')
+    retomado.fechar()
+
+
+def test_falha_depois_de_concluido_volta_a_pendente(tmp_path):
+    journal = JobJournal(str(tmp_path), PARAMETROS)
+    journal.registrar_pagina([_registro(0)])
+    journal.registrar_estado('100', ESTADO_CONCLUIDO)
+    journal.registrar_estado('100', ESTADO_FALHA)
+    journal.fechar()
+    retomado = JobJournal(str(tmp_path), PARAMETROS)
+    assert not retomado.ja_concluido('100')
+    retomado.fechar()
+
+
+def test_listagem_continuada_nao_repete_registros_gravados(tmp_path):
+    journal = JobJournal(str(tmp_path), PARAMETROS)
+    journal.registrar_pagina([_registro(0), _registro(1)], cursor="2024-01-01 00:00:01")
+    journal.fechar()
+
+    retomado = JobJournal(str(tmp_path), PARAMETROS)
+    # A listagem recomeça no cursor e devolve de novo o registro do último segundo.
+    novos = retomado.registrar_pagina([_registro(1), _registro(2)], cursor="2024-01-01 00:00:02")
+    assert [chamada['id'] for chamada in novos] == ['102']
+    assert retomado.total_listado == 3
+    retomado.registrar_fim_listagem()
+    retomado.fechar()
+
+    final = JobJournal(str(tmp_path), PARAMETROS)
+    assert final.listagem_concluida
+    assert [chamada['id'] for chamada in final.registros_gravados()] == ['100', '101', '102']
+    final.fechar()
+
+
+def test_linha_incompleta_de_uma_queda_e_ignorada(tmp_path):
+    journal = JobJournal(str(tmp_path), PARAMETROS)
+    journal.registrar_pagina([_registro(0)], cursor="2024-01-01 00:00:00")
+    journal.fechar()
+    with open(journal.caminho, 'a', encoding='utf-8') as f:
+        f.write('{"ev": "estado", "id": "10')
+
+    retomado = JobJournal(str(tmp_path), PARAMETROS)
+    assert retomado.total_listado == 1
+    retomado.registrar_estado('100', ESTADO_CONCLUIDO)
+    retomado.fechar()
+    final = JobJournal(str(tmp_path), PARAMETROS)
+    assert final.ja_concluido('100')
+    final.fechar()
+
+
+def test_outro_periodo_e_outro_job(tmp_path):
+    JobJournal(str(tmp_path), PARAMETROS).fechar()
+    outro = JobJournal(str(tmp_path), dict(PARAMETROS, datafim='2024-02-29 23:59:59'))
+    assert not outro.retomado
+    outro.fechar()
+
+
+def test_concluir_remove_o_journal(tmp_path):
+    journal = JobJournal(str(tmp_path), PARAMETROS)
+    journal.concluir()
+    assert not os.path.exists(journal.caminho)
+    novo = JobJournal(str(tmp_path), PARAMETROS)
+    assert not novo.retomado
+    novo.fechar()
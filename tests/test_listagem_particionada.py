@@ -0,0 +1,154 @@
+# test_listagem_particionada.py
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import api_handler
+from api_handler import (
+    _bissectar_janela,
+    _datahora_na_faixa,
+    _dividir_periodo,
+    _mesclar_sem_duplicatas,
+    iterar_paginas_chamadas,
+    obter_dados_completos,
+    obter_dados_particionados,
+)
+from exceptions import DownloadCancelledError
+
+URL_API = "https://pabx.exemplo/api.php?acao=statusreport&login=operador&token=segredo"
+
+
+class ApiSimulada:
+    """statusreport em memória: registros com 'datahora' em [inicio, fim], no máximo 500 por resposta."""
+
+    def __init__(self, registros, falhar_em=None):
+        self.registros = registros
+        self.falhar_em = falhar_em
+        self.consultas = []
+        self._lock = threading.Lock()
+
+    def __call__(self, url_api, inicio_str, fim_str, status_callback=None, sessao_http=None):
+        with self._lock:
+            self.consultas.append((inicio_str, fim_str))
+        if self.falhar_em and inicio_str <= self.falhar_em <= fim_str:
+            return None
+        dentro = [r for r in self.registros if inicio_str <= r['datahora'] <= fim_str]
+        return dentro[:api_handler.LIMITE_REGISTROS_API]
+
+
+def registros_a_cada(segundos, quantidade, inicio=datetime(2024, 1, 1)):
+    return [{'id': str(i), 'datahora': (inicio + timedelta(seconds=i * segundos)).strftime("%Y-%m-%d %H:%M:%S")}
+            for i in range(quantidade)]
+
+
+def test_dividir_periodo_por_dia_e_por_hora():
+    inicio, fim = datetime(2024, 1, 1, 22, 30), datetime(2024, 1, 2, 1, 15)
+    assert _dividir_periodo(inicio, fim, 'dia') == [
+        (inicio, datetime(2024, 1, 1, 23, 59, 59)),
+        (datetime(2024, 1, 2), fim),
+    ]
+    assert [janela[0].hour for janela in _dividir_periodo(inicio, fim, 'hora')] == [22, 23, 0, 1]
+    with pytest.raises(ValueError):
+        _dividir_periodo(inicio, fim, 'semana')
+
+
+def test_bissectar_janela_em_metades_disjuntas():
+    inicio, fim = datetime(2024, 1, 1), datetime(2024, 1, 1, 0, 0, 9)
+    assert _bissectar_janela(inicio, fim) == ((inicio, datetime(2024, 1, 1, 0, 0, 4)),
+                                              (datetime(2024, 1, 1, 0, 0, 5), fim))
+    assert _bissectar_janela(inicio, inicio) is None
+
+
+def test_mesclar_remove_ids_repetidos_e_ordena_por_datahora():
+    paginas = [
+        [{'id': '2', 'datahora': '2024-01-01 10:00:00'}, {'id': '1', 'datahora': '2024-01-01 09:00:00'}],
+        [{'id': '1', 'datahora': '2024-01-01 09:00:00'}, {'datahora': '2024-01-01 08:00:00'}],
+    ]
+    assert [c.get('id') for c in _mesclar_sem_duplicatas(paginas)] == [None, '1', '2']
+
+
+@pytest.mark.parametrize("granularidade", ['dia', 'hora'])
+def test_particionada_lista_o_mesmo_que_a_sequencial(monkeypatch, granularidade):
+    # 1.440 registros por dia: as janelas diárias passam do limite de 500 e são bissectadas.
+    api = ApiSimulada(registros_a_cada(60, 2 * 1440))
+    monkeypatch.setattr(api_handler, "obter_dados_chamadas", api)
+    sequencial = obter_dados_completos(URL_API, "2024-01-01 00:00:00", "2024-01-02 23:59:59")
+    particionada = obter_dados_completos(URL_API, "2024-01-01 00:00:00", "2024-01-02 23:59:59",
+                                         granularidade_particao=granularidade)
+    assert len(sequencial) == 2 * 1440
+    assert particionada == sequencial
+
+
+def test_janelas_no_limite_sao_bissectadas(monkeypatch):
+    api = ApiSimulada(registros_a_cada(60, 1440))
+    monkeypatch.setattr(api_handler, "obter_dados_chamadas", api)
+    assert len(obter_dados_particionados(URL_API, "2024-01-01 00:00:00", "2024-01-01 23:59:59")) == 1440
+    respostas = [len(api(URL_API, inicio, fim)) for inicio, fim in list(api.consultas)]
+    # Cada janela que atingiu o limite foi trocada por duas metades; as demais cabem em uma requisição.
+    assert respostas.count(api_handler.LIMITE_REGISTROS_API) == (len(respostas) - 1) // 2
+    assert sum(n for n in respostas if n < api_handler.LIMITE_REGISTROS_API) == 1440
+
+
+def test_janelas_sao_submetidas_a_medida_que_as_paginas_sao_consumidas(monkeypatch):
+    # 72 janelas por hora; com 2 consultas simultâneas, no máximo 4 janelas ficam à frente do consumidor.
+    api = ApiSimulada(registros_a_cada(600, 6 * 72))
+    monkeypatch.setattr(api_handler, "obter_dados_chamadas", api)
+    paginas = iterar_paginas_chamadas(URL_API, "2024-01-01 00:00:00", "2024-01-03 23:59:59",
+                                      granularidade_particao='hora', max_consultas_paralelas=2)
+    primeira = next(paginas)
+    time.sleep(0.2)
+    assert len(api.consultas) <= 2 * api_handler.JANELAS_EM_VOO_POR_CONSULTA
+    restantes = [chamada for pagina in paginas for chamada in pagina]
+    assert len(api.consultas) == 72
+    assert len(primeira) + len(restantes) == 6 * 72
+
+
+def test_falha_em_uma_janela_retorna_none(monkeypatch):
+    monkeypatch.setattr(api_handler, "obter_dados_chamadas",
+                        ApiSimulada(registros_a_cada(600, 300), falhar_em="2024-01-02 12:00:00"))
+    assert obter_dados_particionados(URL_API, "2024-01-01 00:00:00", "2024-01-03 23:59:59") is None
+
+
+def test_cancelamento_durante_a_listagem(monkeypatch):
+    cancelar = threading.Event()
+    cancelar.set()
+    monkeypatch.setattr(api_handler, "obter_dados_chamadas", ApiSimulada([]))
+    with pytest.raises(DownloadCancelledError):
+        obter_dados_particionados(URL_API, "2024-01-01 00:00:00", "2024-01-03 23:59:59", cancel_event=cancelar)
+
+
+def test_periodo_invalido_retorna_none():
+    assert obter_dados_particionados(URL_API, "01/01/2024", "2024-01-03 23:59:59") is None
+
+
+@pytest.mark.parametrize("chamada, esperado", [
+    ({"datahora": "2024-01-01 00:00:00"}, True),
+    ({"datahora": "2024-01-01 23:59:59"}, True),
+    ({"datahora": "2023-12-31 23:59:59"}, False),
+    ({"datahora": "2024-01-02 00:00:00"}, False),
+    ({"datahora": "2024-01-01"}, None),
+    ({"datahora": None}, None),
+    ({}, None),
+    ("lixo", None),
+])
+def test_datahora_na_faixa(chamada, esperado):
+    assert _datahora_na_faixa(chamada, "2024-01-01 00:00:00", "2024-01-01 23:59:59") == esperado
+
+
+def test_registros_fora_da_janela_sao_produzidos_uma_unica_vez(monkeypatch):
+    # Servidor impreciso: cada janela devolve também a hora anterior ao seu início e um registro sem datahora.
+    registros = [{"id": str(i), "datahora": (datetime(2024, 1, 1) + timedelta(minutes=10 * i)).strftime("%Y-%m-%d %H:%M:%S")}
+                 for i in range(6 * 24 * 3)]
+    sem_datahora = {"id": "sem-datahora", "datahora": ""}
+
+    def _consultar(url_api, inicio_str, fim_str, *args, **kwargs):
+        inicio = (datetime.strptime(inicio_str, "%Y-%m-%d %H:%M:%S") - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+        return [r for r in registros if inicio <= r["datahora"] <= fim_str] + [sem_datahora]
+
+    monkeypatch.setattr(api_handler, "consultar_janela_api", _consultar)
+    listados = [c["id"] for pagina in iterar_paginas_chamadas(URL_API, "2024-01-01 00:00:00", "2024-01-03 23:59:59",
+                                                              granularidade_particao='dia')
+                for c in pagina]
+    assert sorted(listados) == sorted([r["id"] for r in registros] + ["sem-datahora"])
@@ -0,0 +1,126 @@
+# test_listing_cache.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from api_handler import construir_url_api, iterar_paginas_chamadas
+from listing_cache import ListingCache, identificar_origem
+from mock_widevoice_server import MockWidevoiceServer, OpcoesServidor
+
+URL_API = "https://pabx.exemplo:8443/api.php?acao=statusreport&login=operador&token=segredo"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ListingCache(str(tmp_path / "cache"))
+    yield cache
+    cache.fechar()
+
+
+def texto(instante):
+    return instante.strftime("%Y-%m-%d %H:%M:%S")
+
+
+@pytest.mark.parametrize("horizonte, esperado", [(1, datetime(2024, 3, 9)), (0, datetime(2024, 3, 10))])
+def test_limite_frescor_e_a_meia_noite_menos_o_horizonte(tmp_path, horizonte, esperado):
+    cache = ListingCache(str(tmp_path), horizonte_frescor_dias=horizonte)
+    try:
+        assert cache.limite_frescor(datetime(2024, 3, 10, 15, 30)) == esperado
+    finally:
+        cache.fechar()
+
+
+def test_apenas_janelas_anteriores_ao_limite_sao_cacheaveis(cache):
+    limite = cache.limite_frescor()
+    assert cache.cacheavel(texto(limite - timedelta(seconds=1)))
+    assert not cache.cacheavel(texto(limite))
+    assert not cache.cacheavel(texto(datetime.now()))
+    assert not cache.cacheavel("data invalida")
+    assert not cache.cacheavel(None)
+
+
+def test_identificar_origem_ignora_o_token():
+    assert identificar_origem(URL_API) == ("pabx.exemplo:8443", "operador")
+    assert identificar_origem(URL_API.replace("segredo", "outro")) == identificar_origem(URL_API)
+
+
+def test_dividir_periodo_passado_em_dias_do_calendario(cache):
+    janelas = cache.dividir_periodo(datetime(2024, 1, 1, 10, 0), datetime(2024, 1, 3, 8, 0))
+    assert janelas == [
+        (datetime(2024, 1, 1, 10, 0), datetime(2024, 1, 1, 23, 59, 59)),
+        (datetime(2024, 1, 2), datetime(2024, 1, 2, 23, 59, 59)),
+        (datetime(2024, 1, 3), datetime(2024, 1, 3, 8, 0)),
+    ]
+
+
+def test_dividir_periodo_mantem_a_parte_recente_em_uma_janela(cache):
+    limite = cache.limite_frescor()
+    inicio = limite - timedelta(days=1, hours=-6)
+    fim = datetime.now()
+    assert cache.dividir_periodo(inicio, fim) == [
+        (inicio, limite - timedelta(seconds=1)),
+        (limite, fim),
+    ]
+
+
+def test_dividir_periodo_inteiramente_recente(cache):
+    inicio = cache.limite_frescor() + timedelta(hours=1)
+    fim = datetime.now()
+    assert cache.dividir_periodo(inicio, fim) == [(inicio, fim)]
+
+
+def test_gravar_e_obter_janela_passada(cache):
+    registros = [{"id": "1", "datahora": "2024-01-01 08:00:00", "gravacao": ""}]
+    assert cache.obter(URL_API, "2024-01-01 00:00:00", "2024-01-01 23:59:59") is None
+    cache.gravar(URL_API, "2024-01-01 00:00:00", "2024-01-01 23:59:59", registros)
+    # O token não faz parte da chave; servidor, login e janela fazem.
+    assert cache.obter(URL_API.replace("segredo", "renovado"), "2024-01-01 00:00:00", "2024-01-01 23:59:59") == registros
+    assert cache.obter(URL_API.replace("operador", "outro"), "2024-01-01 00:00:00", "2024-01-01 23:59:59") is None
+    assert cache.obter(URL_API, "2024-01-01 00:00:00", "2024-01-02 23:59:59") is None
+    assert (cache.acertos, cache.faltas) == (1, 3)
+
+
+def test_janelas_recentes_e_respostas_invalidas_nao_sao_gravadas(cache):
+    inicio, fim = texto(cache.limite_frescor()), texto(datetime.now())
+    cache.gravar(URL_API, inicio, fim, [{"id": "1"}])
+    assert cache.obter(URL_API, inicio, fim) is None
+    cache.gravar(URL_API, "2024-01-01 00:00:00", "2024-01-01 23:59:59", {"erro": "token inválido"})
+    assert cache.obter(URL_API, "2024-01-01 00:00:00", "2024-01-01 23:59:59") is None
+
+
+def test_cache_persiste_entre_aberturas(tmp_path):
+    cache = ListingCache(str(tmp_path))
+    cache.gravar(URL_API, "2024-01-01 00:00:00", "2024-01-01 23:59:59", [{"id": "1"}])
+    cache.fechar()
+    reaberto = ListingCache(str(tmp_path))
+    try:
+        assert reaberto.obter(URL_API, "2024-01-01 00:00:00", "2024-01-01 23:59:59") == [{"id": "1"}]
+    finally:
+        reaberto.fechar()
+
+
+def test_listagem_estendida_consulta_apenas_os_dias_novos(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROTOCOLO_SERVIDOR", "http")
+    # 720 registros por dia: duas páginas da API (500 + 220) por dia.
+    servidor = MockWidevoiceServer(OpcoesServidor(registros=3 * 720, intervalo_segundos=120)).iniciar()
+    try:
+        url_api = construir_url_api(servidor.url_base, "operador", "segredo")
+
+        def listar(inicio, fim, cache_listagem):
+            antes = servidor._estado.requisicoes_api
+            ids = [c["id"] for pagina in iterar_paginas_chamadas(url_api, inicio, fim, cache_listagem=cache_listagem)
+                   for c in pagina]
+            return ids, servidor._estado.requisicoes_api - antes
+
+        ids_dois_dias, consultas = listar("2024-01-01 00:00:00", "2024-01-02 23:59:59", cache)
+        assert len(ids_dois_dias) == 2 * 720 and consultas == 4
+        assert listar("2024-01-01 00:00:00", "2024-01-02 23:59:59", cache) == (ids_dois_dias, 0)
+
+        ids_tres_dias, consultas = listar("2024-01-01 00:00:00", "2024-01-03 23:59:59", cache)
+        assert ids_tres_dias[:2 * 720] == ids_dois_dias
+        assert len(ids_tres_dias) == 3 * 720
+        # Apenas o terceiro dia chega à API, com as mesmas consultas de uma listagem só dele sem cache.
+        assert consultas == listar("2024-01-03 00:00:00", "2024-01-03 23:59:59", None)[1]
+    finally:
+        servidor.parar()
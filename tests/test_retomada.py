@@ -0,0 +1,175 @@
+# test_retomada.py
+import io
+
+import pytest
+import requests
+
+import recording_downloader
+from download_manifest import TIPO_GRAVACAO, DownloadManifest
+from exceptions import TransferenciaIncompletaError
+from recording_downloader import (
+    baixar_gravacao,
+    cabecalhos_retomada,
+    caminho_parcial,
+    finalizar_parcial,
+    iniciar_hash_parcial,
+    interpretar_resposta_retomada,
+    parcial_ja_completo,
+    preparar_destino_gravacao,
+)
+
+
+def test_cabecalhos_sem_parcial_nao_pedem_range():
+    assert cabecalhos_retomada(0) == {'Accept-Encoding': 'identity'}
+
+
+def test_cabecalhos_com_parcial_pedem_o_restante():
+    assert cabecalhos_retomada(1000)['Range'] == "bytes=1000-"
+
+
+def test_206_no_offset_anexa_ao_parcial():
+    cabecalhos = {'Content-Range': 'bytes 1000-4999/5000', 'Content-Length': '4000'}
+    assert interpretar_resposta_retomada(206, cabecalhos, 1000) == ('ab', 1000, 5000)
+
+
+def test_206_com_total_desconhecido_usa_content_length():
+    cabecalhos = {'Content-Range': 'bytes 1000-4999/*', 'Content-Length': '4000'}
+    assert interpretar_resposta_retomada(206, cabecalhos, 1000) == ('ab', 1000, 5000)
+
+
+def test_206_sem_total_nem_content_length():
+    assert interpretar_resposta_retomada(206, {'Content-Range': 'bytes 1000-4999/*'}, 1000) == ('ab', 1000, None)
+
+
+@pytest.mark.parametrize("content_range", ['bytes 0-4999/5000', 'bytes 999-4999/5000', 'itens 1000-4999/5000', 'lixo', ''])
+def test_206_fora_do_offset_e_rejeitado(content_range):
+    with pytest.raises(TransferenciaIncompletaError):
+        interpretar_resposta_retomada(206, {'Content-Range': content_range}, 1000)
+
+
+def test_200_reescreve_desde_o_inicio():
+    assert interpretar_resposta_retomada(200, {'Content-Length': '5000'}, 1000) == ('wb', 0, 5000)
+
+
+def test_200_sem_content_length():
+    assert interpretar_resposta_retomada(200, {}, 0) == ('wb', 0, None)
+
+
+def test_416_parcial_completo():
+    assert parcial_ja_completo({'Content-Range': 'bytes */5000'}, 5000)
+
+
+@pytest.mark.parametrize("cabecalhos", [{'Content-Range': 'bytes */5000'}, {'Content-Range': 'bytes */*'}, {}])
+def test_416_parcial_incompleto_ou_sem_total(cabecalhos):
+    assert not parcial_ja_completo(cabecalhos, 4000)
+
+
+def test_finalizar_parcial_renomeia_quando_o_tamanho_confere(tmp_path):
+    final = str(tmp_path / "gravacao.gsm")
+    with open(caminho_parcial(final), 'wb') as f:
+        f.write(b"x" * 10)
+    assert finalizar_parcial(caminho_parcial(final), final, 10) == 10
+    assert (tmp_path / "gravacao.gsm").read_bytes() == b"x" * 10
+
+
+def test_finalizar_parcial_rejeita_tamanho_divergente(tmp_path):
+    final = str(tmp_path / "gravacao.gsm")
+    with open(caminho_parcial(final), 'wb') as f:
+        f.write(b"x" * 9)
+    with pytest.raises(TransferenciaIncompletaError):
+        finalizar_parcial(caminho_parcial(final), final, 10)
+    assert not (tmp_path / "gravacao.gsm").exists()
+
+
+
+def test_hash_da_retomada_cobre_o_arquivo_inteiro(tmp_path):
+    import hashlib
+    parcial = tmp_path / "gravacao.gsm.part"
+    parcial.write_bytes(b"inicio-")
+    hash_gravacao = iniciar_hash_parcial(str(parcial), 'ab')
+    hash_gravacao.update(b"fim")
+    assert hash_gravacao.hexdigest() == hashlib.sha256(b"inicio-fim").hexdigest()
+    assert iniciar_hash_parcial(str(parcial), 'wb').hexdigest() == hashlib.sha256().hexdigest()
+
+
+CORPO = bytes(range(256)) * 40
+CHAMADA = {'id': '42', 'numero': '5500000001', 'datahora': '2024-01-01 08:00:00', 'gravacao': '2024\\/01\\/01\\/gravacao_42'}
+
+
+class RespostaSimulada:
+    def __init__(self, status_code, corpo=b"", headers=None):
+        self.status_code = status_code
+        self.reason = "Simulada"
+        self.headers = headers or {}
+        self.raw = io.BytesIO(corpo)
+        self.fechada = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechada = True
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code}", response=self)
+
+
+class ServidorDeGravacoes:
+    """Sessão HTTP simulada (interface get() do HttpSessionPool) que atende Range sobre CORPO."""
+
+    def __init__(self, status_fixo=None):
+        self.status_fixo = status_fixo
+        self.cabecalhos_recebidos = []
+        self.respostas = []
+
+    def get(self, url, stream=False, timeout=None, headers=None):
+        self.cabecalhos_recebidos.append(dict(headers or {}))
+        if self.status_fixo:
+            resposta = RespostaSimulada(self.status_fixo)
+        else:
+            inicio = int((headers or {}).get('Range', 'bytes=0-')[6:].split('-')[0])
+            if inicio:
+                resposta = RespostaSimulada(206, CORPO[inicio:], {
+                    'Content-Range': f"bytes {inicio}-{len(CORPO) - 1}/{len(CORPO)}",
+                    'Content-Length': str(len(CORPO) - inicio)})
+            else:
+                resposta = RespostaSimulada(200, CORPO, {'Content-Length': str(len(CORPO))})
+        self.respostas.append(resposta)
+        return resposta
+
+
+def test_baixar_gravacao_retoma_a_partir_do_parcial(tmp_path):
+    _, final = preparar_destino_gravacao("pabx.exemplo", CHAMADA, str(tmp_path))
+    with open(caminho_parcial(final), 'wb') as f:
+        f.write(CORPO[:3000])
+    servidor = ServidorDeGravacoes()
+
+    assert baixar_gravacao("pabx.exemplo", CHAMADA, str(tmp_path), sessao_http=servidor,
+                           download_metadata_with_recording=False) is True
+    assert servidor.cabecalhos_recebidos[0]['Range'] == "bytes=3000-"
+    with open(final, 'rb') as f:
+        assert f.read() == CORPO
+    assert not (tmp_path / caminho_parcial(final)).exists()
+    assert all(resposta.fechada for resposta in servidor.respostas)
+
+
+def test_erro_http_fecha_a_resposta(tmp_path):
+    servidor = ServidorDeGravacoes(status_fixo=404)
+    assert baixar_gravacao("pabx.exemplo", CHAMADA, str(tmp_path), sessao_http=servidor,
+                           download_metadata_with_recording=False) is False
+    assert servidor.respostas and all(resposta.fechada for resposta in servidor.respostas)
+
+
+@pytest.mark.parametrize("metadado_gerado", [True, False])
+def test_manifesto_so_marca_o_metadado_quando_ele_foi_gerado(tmp_path, monkeypatch, metadado_gerado):
+    if not metadado_gerado:
+        monkeypatch.setattr(recording_downloader, "gerar_arquivo_metadado", lambda *args, **kwargs: None)
+    manifest = DownloadManifest(str(tmp_path))
+    try:
+        assert baixar_gravacao("pabx.exemplo", CHAMADA, str(tmp_path), sessao_http=ServidorDeGravacoes(),
+                               manifest=manifest) is True
+        assert manifest.ja_concluido(CHAMADA['id'], TIPO_GRAVACAO)
+        assert manifest.ja_concluido(CHAMADA['id'], TIPO_GRAVACAO, exigir_metadado=True) is metadado_gerado
+    finally:
+        manifest.fechar()
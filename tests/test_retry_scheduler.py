@@ -0,0 +1,112 @@
+# test_retry_scheduler.py
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from retry_scheduler import (
+    POLITICAS_RETENTATIVA,
+    PoliticaRetentativa,
+    RetryScheduler,
+    calcular_atraso_retentativa,
+    interpretar_retry_after,
+)
+
+
+@pytest.mark.parametrize("tentativa, teto", [(1, 2.0), (2, 4.0), (3, 8.0), (4, 10.0), (5, 10.0)])
+def test_atraso_dentro_do_teto_exponencial(tentativa, teto):
+    politica = PoliticaRetentativa(max_tentativas=10, atraso_base=2.0, atraso_maximo=10.0)
+    for _ in range(200):
+        assert 0.0 <= politica.calcular_atraso(tentativa) <= teto
+
+
+def test_tentativas_esgotadas_retornam_none():
+    politica = PoliticaRetentativa(max_tentativas=3, atraso_base=1.0, atraso_maximo=10.0)
+    assert politica.calcular_atraso(2) is not None
+    assert politica.calcular_atraso(3) is None
+    assert politica.calcular_atraso(4) is None
+
+
+def test_retry_after_e_atraso_minimo_limitado_ao_maximo():
+    politica = PoliticaRetentativa(max_tentativas=5, atraso_base=0.01, atraso_maximo=30.0, respeitar_retry_after=True)
+    assert politica.calcular_atraso(1, retry_after=12.0) == 12.0
+    assert politica.calcular_atraso(1, retry_after=600.0) == 30.0
+
+
+def test_retry_after_ignorado_sem_respeitar_retry_after():
+    politica = PoliticaRetentativa(max_tentativas=5, atraso_base=0.01, atraso_maximo=30.0)
+    assert politica.calcular_atraso(1, retry_after=12.0) <= 0.01
+
+
+def test_categoria_sem_politica_nao_e_retentada():
+    assert calcular_atraso_retentativa('http_4xx', 1) is None
+    assert calcular_atraso_retentativa(None, 1) is None
+
+
+def test_politicas_padrao_por_categoria():
+    assert set(POLITICAS_RETENTATIVA) == {'conexao', 'timeout', 'http_5xx', 'http_429'}
+    assert calcular_atraso_retentativa('http_429', 1, retry_after=7.0) >= 7.0
+    assert calcular_atraso_retentativa('conexao', POLITICAS_RETENTATIVA['conexao'].max_tentativas) is None
+
+
+def test_politicas_personalizadas_substituem_as_padrao():
+    politicas = {'timeout': PoliticaRetentativa(max_tentativas=2, atraso_base=0.0, atraso_maximo=0.0)}
+    assert calcular_atraso_retentativa('timeout', 1, politicas=politicas) == 0.0
+    assert calcular_atraso_retentativa('timeout', 2, politicas=politicas) is None
+    assert calcular_atraso_retentativa('conexao', 1, politicas=politicas) is None
+
+
+@pytest.mark.parametrize("valor, esperado", [("120", 120.0), (" 5 ", 5.0), ("0", 0.0)])
+def test_retry_after_em_segundos(valor, esperado):
+    assert interpretar_retry_after(valor) == esperado
+
+
+def test_retry_after_em_data_http():
+    instante = datetime.now(timezone.utc) + timedelta(seconds=90)
+    assert 80.0 <= interpretar_retry_after(format_datetime(instante, usegmt=True)) <= 90.0
+
+
+def test_retry_after_com_data_no_passado_e_zero():
+    assert interpretar_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+@pytest.mark.parametrize("valor", [None, "", "   ", "-5", "1.5", "amanhã"])
+def test_retry_after_ausente_ou_invalido(valor):
+    assert interpretar_retry_after(valor) is None
+
+
+def test_agendador_entrega_na_ordem_de_vencimento():
+    agendador = RetryScheduler()
+    agendador.agendar("c", 0.0)
+    agendador.agendar("a", -2.0)
+    agendador.agendar("b", -1.0)
+    assert len(agendador) == 3
+    assert [agendador.retirar_vencido() for _ in range(3)] == ["a", "b", "c"]
+    assert agendador.retirar_vencido() is None
+    assert agendador.tempo_ate_proximo() is None
+
+
+def test_agendador_empata_pela_ordem_de_agendamento(monkeypatch):
+    monkeypatch.setattr("retry_scheduler.time.monotonic", lambda: 100.0)
+    agendador = RetryScheduler()
+    for item in ("primeiro", "segundo", "terceiro"):
+        agendador.agendar(item, 0.0)
+    assert [agendador.retirar_vencido() for _ in range(3)] == ["primeiro", "segundo", "terceiro"]
+
+
+def test_agendador_nao_entrega_antes_do_vencimento():
+    agendador = RetryScheduler()
+    agendador.agendar("futuro", 60.0)
+    assert agendador.retirar_vencido() is None
+    assert 59.0 < agendador.tempo_ate_proximo() <= 60.0
+    agendador.agendar("vencido", -1.0)
+    assert agendador.tempo_ate_proximo() == 0.0
+    assert agendador.retirar_vencido() == "vencido"
+
+
+def test_agendador_retirar_todos_esvazia_a_fila():
+    agendador = RetryScheduler()
+    agendador.agendar("a", 60.0)
+    agendador.agendar("b", -1.0)
+    assert sorted(agendador.retirar_todos()) == ["a", "b"]
+    assert len(agendador) == 0
@@ -0,0 +1,133 @@
+# tracing.py
+"""
+Spans de tempo por etapa (listagem da API, conexão/TTFB, corpo da transferência, finalização,
+metadados, laço do controlador), marcados com o 'id' da chamada e a thread, exportáveis no formato
+Chrome trace (JSON), que abre em chrome://tracing ou em https://ui.perfetto.dev.
+
+O tracing é ligado e desligado em tempo de execução (ativar/desativar). Desligado, span() devolve
+um contexto nulo compartilhado e o custo é uma chamada de função; ligado, cada span é uma tupla
+acrescentada a um deque limitado (append atômico, sem lock), e os mais antigos saem quando ele enche.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Máximo de spans guardados; com o buffer cheio, os mais antigos são descartados.
+CAPACIDADE_PADRAO = 500000
+
+_buffer = None
+_nomes_threads = {}
+_origem_ns = 0
+
+
+class _SpanNulo:
+    """Contexto usado com o tracing desligado: não mede nada."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traceback):
+        return False
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+class _Span:
+    __slots__ = ('_buffer', '_nome', '_categoria', '_args', '_inicio')
+
+    def __init__(self, buffer, nome, categoria, args):
+        self._buffer = buffer
+        self._nome = nome
+        self._categoria = categoria
+        self._args = args
+
+    def __enter__(self):
+        self._inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, tipo, valor, traceback):
+        fim = time.perf_counter_ns()
+        if tipo is not None:
+            self._args['erro'] = tipo.__name__
+        _registrar(self._buffer, self._nome, self._categoria, self._inicio, fim, self._args)
+        return False
+
+
+def _registrar(buffer, nome, categoria, inicio_ns, fim_ns, args):
+    tid = threading.get_ident()
+    if tid not in _nomes_threads:
+        _nomes_threads[tid] = threading.current_thread().name
+    buffer.append((nome, categoria, inicio_ns, fim_ns - inicio_ns, tid, args))
+
+
+def ativar(capacidade=CAPACIDADE_PADRAO):
+    """Liga o tracing com um buffer novo (os spans anteriores são descartados)."""
+    global _buffer, _origem_ns
+    _nomes_threads.clear()
+    _origem_ns = time.perf_counter_ns()
+    _buffer = deque(maxlen=capacidade)
+
+
+def desativar():
+    """Desliga o tracing e retorna os spans coletados (para exportar_chrome(caminho, spans))."""
+    global _buffer
+    buffer, _buffer = _buffer, None
+    return buffer
+
+
+def ativo():
+    return _buffer is not None
+
+
+def span(nome, categoria='geral', **args):
+    """
+    Contexto que mede um trecho: with tracing.span("download.corpo", "download", id=chamada_id): ...
+    args (ex.: id da chamada) aparecem nos detalhes do span no visualizador.
+    """
+    buffer = _buffer
+    if buffer is None:
+        return _SPAN_NULO
+    return _Span(buffer, nome, categoria, args)
+
+
+def com_span(funcao, nome, categoria='geral', **args):
+    """Devolve funcao embrulhada em um span (ex.: a tarefa submetida a um executor), ou a própria funcao se desligado."""
+    if _buffer is None:
+        return funcao
+
+    @functools.wraps(funcao)
+    def executar(*a, **kw):
+        with span(nome, categoria, **args):
+            return funcao(*a, **kw)
+    return executar
+
+
+def eventos_chrome(spans=None):
+    """Converte os spans (padrão: os do tracing ligado) em eventos do formato Chrome trace ('X' e metadados de thread)."""
+    if spans is None:
+        spans = _buffer if _buffer is not None else ()
+    pid = os.getpid()
+    eventos = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": nome}}
+               for tid, nome in list(_nomes_threads.items())]
+    for nome, categoria, inicio_ns, duracao_ns, tid, args in list(spans):
+        eventos.append({
+            "name": nome, "cat": categoria, "ph": "X", "pid": pid, "tid": tid,
+            "ts": (inicio_ns - _origem_ns) / 1000, "dur": duracao_ns / 1000, "args": args,
+        })
+    return eventos
+
+
+def exportar_chrome(caminho, spans=None):
+    """Grava os spans em 'caminho' como Chrome trace JSON. Retorna o número de spans exportados."""
+    eventos = eventos_chrome(spans)
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": eventos, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+    return sum(1 for evento in eventos if evento["ph"] == "X")
@@ -0,0 +1,149 @@
+# transfer_io.py
+import ctypes
+import ctypes.util
+import http.client
+import logging
+import os
+import socket
+import threading
+
+import requests
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+
+from exceptions import DownloadCancelledError, TransferenciaIncompletaError
+
+logger = logging.getLogger(__name__)
+
+# Faixa do tamanho de leitura. O tamanho inicial depende do Content-Length e dobra, até o máximo,
+# enquanto as leituras vierem cheias (dados chegando mais rápido do que são gravados).
+TAMANHO_BUFFER_MINIMO = 64 * 1024
+TAMANHO_BUFFER_MAXIMO = 1024 * 1024
+
+# Pré-alocação a partir do Content-Length: FALLOC_FL_KEEP_SIZE reserva os blocos sem alterar o
+# tamanho aparente do arquivo, que continua igual aos bytes gravados (base da retomada por Range).
+FALLOC_FL_KEEP_SIZE = 0x01
+TAMANHO_MINIMO_PREALOCACAO = 256 * 1024
+
+_local = threading.local()
+_fallocate = None
+
+
+def _carregar_fallocate():
+    """fallocate(2) da libc (Linux). Retorna None em sistemas sem a chamada."""
+    global _fallocate
+    if _fallocate is None:
+        _fallocate = False
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+                funcao = libc.fallocate
+                funcao.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+                funcao.restype = ctypes.c_int
+                _fallocate = funcao
+            except (OSError, AttributeError):
+                logger.debug("transfer_io: fallocate indisponível; arquivos não serão pré-alocados.")
+    return _fallocate or None
+
+
+def preallocar(arquivo, offset, tamanho):
+    """
+    Reserva espaço em disco para os próximos 'tamanho' bytes a partir de 'offset', reduzindo a
+    fragmentação e as extensões de metadados do sistema de arquivos durante a escrita.
+    Não altera o tamanho do arquivo. Sem suporte (outro SO ou sistema de arquivos), não faz nada.
+    Retorna True se o espaço foi reservado.
+    """
+    if tamanho < TAMANHO_MINIMO_PREALOCACAO:
+        return False
+    fallocate = _carregar_fallocate()
+    if fallocate is None:
+        return False
+    if fallocate(arquivo.fileno(), FALLOC_FL_KEEP_SIZE, offset, tamanho) != 0:
+        logger.debug(f"transfer_io: fallocate falhou (errno {ctypes.get_errno()}); seguindo sem pré-alocação.")
+        return False
+    return True
+
+
+def escolher_tamanho_buffer(tamanho_esperado=None):
+    """Tamanho de leitura inicial: ~1/4 do corpo esperado (potência de 2), entre o mínimo e o máximo."""
+    if not tamanho_esperado:
+        return TAMANHO_BUFFER_MINIMO
+    tamanho = TAMANHO_BUFFER_MINIMO
+    while tamanho < tamanho_esperado // 4 and tamanho < TAMANHO_BUFFER_MAXIMO:
+        tamanho *= 2
+    return tamanho
+
+
+def _buffer_da_thread():
+    """Buffer reutilizável da thread atual (alocado uma vez, no tamanho máximo)."""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        buffer = memoryview(bytearray(TAMANHO_BUFFER_MAXIMO))
+        _local.buffer = buffer
+    return buffer
+
+
+def _funcao_readinto(resposta):
+    """
+    Função readinto do corpo da resposta. Sem Content-Encoding, lê direto do http.client (sem a
+    cópia intermediária de urllib3.HTTPResponse.readinto); caso contrário, usa o urllib3, que decodifica.
+    """
+    bruto = resposta.raw
+    if not resposta.headers.get('Content-Encoding'):
+        leitor = getattr(bruto, '_fp', None)
+        if leitor is not None and hasattr(leitor, 'readinto'):
+            return leitor.readinto, True
+    return bruto.readinto, False
+
+
+def gravar_resposta(resposta, arquivo, offset=0, tamanho_esperado=None, cancel_event=None, hash_gravacao=None,
+                    progresso=None):
+    """
+    Grava o corpo de uma resposta requests (stream=True) em 'arquivo', lendo com readinto em um
+    buffer reutilizável por thread, sem criar um objeto bytes por bloco.
+    offset: posição do arquivo onde a escrita começa (bytes já existentes do parcial).
+    tamanho_esperado: tamanho total do arquivo, se conhecido, usado para pré-alocar e dimensionar o buffer.
+    hash_gravacao: objeto hashlib opcional atualizado com os bytes gravados.
+    progresso: função opcional chamada após cada bloco com o número de bytes gravados até então.
+    Retorna o número de bytes gravados; levanta DownloadCancelledError se cancelado e exceções
+    do requests (ou TransferenciaIncompletaError) em falhas de rede, como iter_content.
+    """
+    restante = tamanho_esperado - offset if tamanho_esperado else None
+    if restante:
+        preallocar(arquivo, offset, restante)
+
+    buffer = _buffer_da_thread()
+    tamanho_leitura = escolher_tamanho_buffer(restante)
+    readinto, leitura_direta = _funcao_readinto(resposta)
+    escrever = arquivo.write
+    bytes_gravados = 0
+
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            raise DownloadCancelledError("Download cancelado durante a transferência.")
+        try:
+            lidos = readinto(buffer[:tamanho_leitura])
+        # Os erros de leitura recebem as mesmas exceções que o requests levantaria em iter_content.
+        except http.client.IncompleteRead as e:
+            raise TransferenciaIncompletaError(f"Conexão encerrada antes do fim do corpo: {e!r}")
+        except (socket.timeout, ReadTimeoutError) as e:
+            raise requests.exceptions.ReadTimeout(e)
+        except DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except (OSError, ProtocolError) as e:
+            raise requests.exceptions.ConnectionError(e)
+        if not lidos:
+            break
+        bloco = buffer[:lidos]
+        escrever(bloco)
+        if hash_gravacao is not None:
+            hash_gravacao.update(bloco)
+        bytes_gravados += lidos
+        if progresso is not None:
+            progresso(bytes_gravados)
+        if lidos == tamanho_leitura and tamanho_leitura < TAMANHO_BUFFER_MAXIMO:
+            tamanho_leitura *= 2
+
+    if leitura_direta:
+        # O corpo foi consumido fora do urllib3: devolve a conexão ao pool para reutilização (keep-alive).
+        resposta.raw.release_conn()
+    return bytes_gravados